@@ -0,0 +1,103 @@
+# CasaDeCambioIS2/cache.py
+"""
+Backends de caché compartida con métricas de aciertos/fallos.
+
+.. module:: CasaDeCambioIS2.cache
+   :synopsis: Redis (producción) o archivos locales (desarrollo/tests) con contadores.
+
+Las reservas y OTP del TED (``ted:reserva:*``, ``ted:otp:*``) y la versión del
+tarifario (:mod:`core.tarifario`) deben verse desde todos los workers. Por eso
+``settings.CACHES`` usa:
+
+- :class:`RedisCacheConMetricas` cuando hay ``REDIS_URL`` (pool de conexiones por
+  proceso, configurable con ``CACHE_MAX_CONNECTIONS``).
+- :class:`FileCacheConMetricas` como alternativa local: varios procesos en la misma
+  máquina comparten el directorio, así que también sirve para pruebas con más de
+  un worker sin Redis.
+- :class:`LocMemCacheConMetricas` al correr los tests: vive sólo en el proceso,
+  así que una corrida no hereda versiones ni claves de la anterior.
+
+Ambos cuentan aciertos y fallos de lectura **por proceso**; se consultan con
+:func:`estadisticas_cache`.
+"""
+import threading
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+_FALTANTE = object()
+
+# Django crea una instancia de backend por hilo; los contadores se comparten por
+# ubicación (URL de Redis o directorio) para sumar todo el proceso.
+_lock_metricas = threading.Lock()
+_metricas = {}
+
+
+class MetricasCacheMixin:
+    """Cuenta aciertos y fallos de lectura sin cambiar la semántica de ``get``."""
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self._clave_metricas = f"{self.__class__.__name__}:{location}"
+        with _lock_metricas:
+            _metricas.setdefault(self._clave_metricas, [0, 0])
+
+    def _contar(self, hits: int, misses: int) -> None:
+        with _lock_metricas:
+            contadores = _metricas[self._clave_metricas]
+            contadores[0] += hits
+            contadores[1] += misses
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _FALTANTE, version=version)
+        if value is _FALTANTE:
+            self._contar(0, 1)
+            return default
+        self._contar(1, 0)
+        return value
+
+    def estadisticas(self) -> dict:
+        with _lock_metricas:
+            hits, misses = _metricas[self._clave_metricas]
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "ratio": (hits / total) if total else None,
+        }
+
+    def reiniciar_estadisticas(self) -> None:
+        with _lock_metricas:
+            _metricas[self._clave_metricas] = [0, 0]
+
+
+class RedisCacheConMetricas(MetricasCacheMixin, RedisCache):
+    """:class:`django.core.cache.backends.redis.RedisCache` con contadores."""
+
+    def get_many(self, keys, version=None):
+        # RedisCache resuelve get_many con un único MGET, sin pasar por get().
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        self._contar(len(found), len(keys) - len(found))
+        return found
+
+
+class FileCacheConMetricas(MetricasCacheMixin, FileBasedCache):
+    """:class:`django.core.cache.backends.filebased.FileBasedCache` con contadores."""
+
+
+class LocMemCacheConMetricas(MetricasCacheMixin, LocMemCache):
+    """:class:`django.core.cache.backends.locmem.LocMemCache` con contadores."""
+
+
+def estadisticas_cache(alias: str = "default") -> dict:
+    """
+    Devuelve ``{'hits', 'misses', 'ratio'}`` del proceso actual para ``alias``.
+    Si el backend configurado no lleva métricas, devuelve un diccionario vacío.
+    """
+    backend = caches[alias]
+    if isinstance(backend, MetricasCacheMixin):
+        return backend.estadisticas()
+    return {}
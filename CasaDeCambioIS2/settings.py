@@ -3,8 +3,10 @@ Django settings for CasaDeCambioIS2 project.
 """
 
 import os
+import sys
 from pathlib import Path
 import dj_database_url
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -149,6 +151,11 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 # STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# --- Archivos generados ---
+# Exportes de reportes generados en segundo plano (reportes.TrabajoReporte). Se
+# sirven sólo a través de reportes:descargar_trabajo, nunca como estáticos.
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", str(BASE_DIR / "media"))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # --- Auth redirects ---
@@ -156,6 +163,52 @@ LOGIN_URL = "/cuentas/login/"
 LOGIN_REDIRECT_URL = "usuarios:login_redirect"
 LOGOUT_REDIRECT_URL = "/"
 
+# --- Caché compartida ---
+# Las reservas/OTP del TED y la versión del tarifario deben verse desde todos los
+# workers. Con REDIS_URL se usa Redis (pool de conexiones por proceso); sin él, una
+# caché en archivos locales que comparten los procesos de la misma máquina.
+# Los tests sin REDIS_URL usan una caché en memoria del proceso: la de archivos
+# sobrevive entre corridas y arrastraría versiones de datos ya borrados.
+# Ver CasaDeCambioIS2/cache.py (contadores de aciertos/fallos).
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "casadecambio")
+TESTING = sys.argv[1:2] == ["test"] or "pytest" in sys.modules
+if TESTING and not REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "CasaDeCambioIS2.cache.LocMemCacheConMetricas",
+            "LOCATION": "casadecambio-tests",
+            "KEY_PREFIX": CACHE_KEY_PREFIX,
+            "TIMEOUT": 300,
+        }
+    }
+elif REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "CasaDeCambioIS2.cache.RedisCacheConMetricas",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": CACHE_KEY_PREFIX,
+            "TIMEOUT": 300,
+            "OPTIONS": {
+                "max_connections": int(os.getenv("CACHE_MAX_CONNECTIONS", "50")),
+                "socket_connect_timeout": 5,
+                "socket_timeout": 5,
+                "retry_on_timeout": True,
+                "health_check_interval": 30,
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "CasaDeCambioIS2.cache.FileCacheConMetricas",
+            "LOCATION": os.getenv("CACHE_DIR", str(BASE_DIR / ".cache" / "django")),
+            "KEY_PREFIX": CACHE_KEY_PREFIX,
+            "TIMEOUT": 300,
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
 # --- CELERY SETTINGS ---NOTIFICACION DE TASAS
 CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
@@ -163,6 +216,73 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Ventana (segundos) en la que los cambios sucesivos de una cotización se agrupan
+# en una sola notificación (ver notificaciones/agrupador.py). 0 = notificar cada cambio.
+NOTIFICACIONES_TASA_VENTANA_SEGUNDOS = int(os.getenv("NOTIFICACIONES_TASA_VENTANA_SEGUNDOS", 60))
+
+# --- Ingesta programada de cotizaciones externas (ver cotizaciones/ingesta.py) ---
+# PROVEEDOR: "cotizaciones.ingesta.ProveedorCurrencyApi" o, sin red,
+# "cotizaciones.ingesta.ProveedorArchivo" (lee ARCHIVO).
+COTIZACIONES_INGESTA = {
+    "PROVEEDOR": os.getenv("COTIZACIONES_PROVEEDOR", "cotizaciones.ingesta.ProveedorCurrencyApi"),
+    "ARCHIVO": os.getenv("COTIZACIONES_ARCHIVO", str(BASE_DIR / "cotizaciones" / "fixtures" / "tasas.json")),
+    "TIMEOUT": int(os.getenv("COTIZACIONES_TIMEOUT", 10)),
+    "INTERVALO_MINUTOS": int(os.getenv("COTIZACIONES_INTERVALO_MINUTOS", 15)),
+    "UMBRAL_FALLOS": int(os.getenv("COTIZACIONES_UMBRAL_FALLOS", 3)),
+    "ENFRIAMIENTO_SEGUNDOS": int(os.getenv("COTIZACIONES_ENFRIAMIENTO_SEGUNDOS", 600)),
+    "VIGENCIA_MINUTOS": int(os.getenv("COTIZACIONES_VIGENCIA_MINUTOS", 60)),
+}
+
+# --- Retención de históricos de cotizaciones (ver cotizaciones/retencion.py) ---
+# Completos los últimos DIAS_COMPLETOS días, uno por hora hasta DIAS_HORARIOS, luego uno por día.
+COTIZACIONES_RETENCION = {
+    "DIAS_COMPLETOS": int(os.getenv("COTIZACIONES_RETENCION_DIAS_COMPLETOS", 30)),
+    "DIAS_HORARIOS": int(os.getenv("COTIZACIONES_RETENCION_DIAS_HORARIOS", 365)),
+    "DIAS_POR_TANDA": 7,
+    "LOTE": 1000,
+}
+
+# --- Bandeja de salida de transacciones (ver transacciones/outbox.py) ---
+# Efectos secundarios (ganancias, facturación, notificaciones) despachados cada INTERVALO_SEGUNDOS.
+OUTBOX = {
+    "LOTE": int(os.getenv("OUTBOX_LOTE", 200)),
+    "INTERVALO_SEGUNDOS": int(os.getenv("OUTBOX_INTERVALO_SEGUNDOS", 10)),
+    "MAX_INTENTOS": int(os.getenv("OUTBOX_MAX_INTENTOS", 8)),
+    "ESPERA_SEGUNDOS": int(os.getenv("OUTBOX_ESPERA_SEGUNDOS", 30)),
+    "DIAS_RETENCION": int(os.getenv("OUTBOX_DIAS_RETENCION", 30)),
+}
+
+CELERY_BEAT_SCHEDULE = {
+    "ingerir-cotizaciones": {
+        "task": "cotizaciones.tasks.ingerir_cotizaciones_task",
+        "schedule": COTIZACIONES_INGESTA["INTERVALO_MINUTOS"] * 60,
+    },
+    "compactar-historicos-cotizaciones": {
+        "task": "cotizaciones.tasks.compactar_historicos_task",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "expirar-tasas-garantizadas": {
+        "task": "transacciones.tasks.expirar_tasas_vencidas_task",
+        "schedule": 60,
+    },
+    "despachar-eventos-transacciones": {
+        "task": "transacciones.tasks.despachar_eventos_task",
+        "schedule": OUTBOX["INTERVALO_SEGUNDOS"],
+    },
+    "purgar-eventos-transacciones": {
+        "task": "transacciones.tasks.purgar_eventos_task",
+        "schedule": crontab(hour=4, minute=0),
+    },
+    "liberar-reservas-ted": {
+        "task": "ted.tasks.liberar_reservas_vencidas_task",
+        "schedule": 60,
+    },
+    # Cortes horarios de stock TED; el de medianoche cierra el día de cada terminal.
+    "cortes-stock-ted": {
+        "task": "ted.tasks.tomar_cortes_task",
+        "schedule": crontab(minute=0),
+    },
+}
 
 # --- TED / Cotizaciones ---
 # Minutos de vigencia considerados "recientes" para una cotización.
@@ -173,6 +293,9 @@ TED_ALLOWED_STATES = {
     "deposito": {"pendiente_deposito_tauser", "pendiente_pago_cliente"},
     "retiro": {"pendiente_retiro_tauser", "pendiente_pago_cliente"}, }
 TED_REQUIRE_KEY = False
+# Política para elegir billetes cuando hay varias combinaciones (ver ted/dispensador.py):
+# "menos_billetes" o "preservar_escasas".
+TED_POLITICA_DISPENSADO = os.getenv("TED_POLITICA_DISPENSADO", "menos_billetes")
 
 
 # --- Configuración de Facturación Electrónica (FacturaSegura) ---
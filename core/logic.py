@@ -3,17 +3,27 @@ Módulo de lógica de negocio para cálculos de simulación de cambio de divisas
 
 Este módulo contiene la función principal para calcular simulaciones de compra y venta de divisas,
 aplicando tasas, comisiones y bonificaciones de cliente.
+
+Las monedas, cotizaciones y el stock TED se leen del tarifario en memoria
+(:mod:`core.tarifario`), por lo que una simulación no consulta la base de datos
+salvo para resolver el cliente del usuario autenticado.
 """
 from decimal import Decimal, ROUND_HALF_UP
 from django.contrib.auth import get_user_model
 from cotizaciones.models import Cotizacion
 from monedas.models import Moneda
 from django.core.exceptions import ObjectDoesNotExist
-from ted.logic import ajustar_monto_a_denominaciones_disponibles
+from ted.logic import ajustar_monto_con_stock, ajustar_monto_en_mejor_ubicacion
+from core.tarifario import obtener_tarifario
 
 User = get_user_model()
 
-def calcular_simulacion(monto_origen: Decimal, moneda_origen: str, moneda_destino: str, user: User = None) -> dict:
+# Valor de ``ubicacion`` que pide elegir la ubicación TED que mejor cubre el monto.
+UBICACION_MEJOR = "mejor"
+
+
+def calcular_simulacion(monto_origen: Decimal, moneda_origen: str, moneda_destino: str, user: User = None,
+                        ubicacion: str = None, terminal: str = None) -> dict:
     """
     Calcula una simulación de cambio de divisas entre una moneda de origen y una de destino.
 
@@ -30,8 +40,16 @@ def calcular_simulacion(monto_origen: Decimal, moneda_origen: str, moneda_destin
     :param user: El usuario que realiza la simulación, si está autenticado.
                  Se utiliza para aplicar bonificaciones.
     :type user: User, optional
+    :param ubicacion: Ubicación TED cuyo stock limita el monto a entregar en una venta.
+                      ``None`` suma el stock de todas las ubicaciones; :data:`UBICACION_MEJOR`
+                      elige la ubicación que puede entregar el monto más cercano al simulado.
+    :type ubicacion: str, optional
+    :param terminal: Serial de una :class:`ted.models.TedTerminal`; usa su ubicación.
+                     Tiene prioridad sobre ``ubicacion``.
+    :type terminal: str, optional
     :returns: Un diccionario con el resultado de la simulación, incluyendo el monto recibido,
-              la tasa aplicada, la bonificación aplicada y cualquier error.
+              la tasa aplicada, la bonificación aplicada, la ubicación usada para el ajuste
+              (``'ubicacion'``) y cualquier error.
     :rtype: dict
     """
     resultado = {
@@ -42,6 +60,7 @@ def calcular_simulacion(monto_origen: Decimal, moneda_origen: str, moneda_destin
         'comision_cotizacion': Decimal('0.0'), # Nuevo campo para la comisión de la cotización
         'monto_ajustado': False,
         'monto_maximo_posible': Decimal('0.0'),
+        'ubicacion': None,
     }
 
     moneda_origen_obj = None
@@ -49,15 +68,21 @@ def calcular_simulacion(monto_origen: Decimal, moneda_origen: str, moneda_destin
     cotizacion = None
 
     try:
+        tarifario = obtener_tarifario()
+
+        if terminal:
+            ubicacion = tarifario.ubicacion_de_terminal(terminal)
+            if ubicacion is None:
+                raise ValueError(f"Terminal TED '{terminal}' no encontrada.")
+        resultado['ubicacion'] = ubicacion if ubicacion != UBICACION_MEJOR else None
+
         # --- Búsqueda de Monedas ---
-        try:
-            moneda_origen_obj = Moneda.objects.get(codigo=moneda_origen)
-        except Moneda.DoesNotExist:
+        moneda_origen_obj = tarifario.moneda(moneda_origen)
+        if moneda_origen_obj is None:
             raise Moneda.DoesNotExist(f"Moneda de origen '{moneda_origen}' no encontrada.")
 
-        try:
-            moneda_destino_obj = Moneda.objects.get(codigo=moneda_destino)
-        except Moneda.DoesNotExist:
+        moneda_destino_obj = tarifario.moneda(moneda_destino)
+        if moneda_destino_obj is None:
             raise Moneda.DoesNotExist(f"Moneda de destino '{moneda_destino}' no encontrada.")
 
         # --- Validación de Monto Mínimo ---
@@ -78,9 +103,8 @@ def calcular_simulacion(monto_origen: Decimal, moneda_origen: str, moneda_destin
         # --- Determinar Tipo de Transacción y Obtener Cotización ---
         if moneda_origen == 'PYG' and moneda_destino != 'PYG':
             # VENTA DE DIVISA (La casa de cambios VENDE USD, EUR, etc. al cliente)
-            try:
-                cotizacion = Cotizacion.objects.get(moneda_base__codigo='PYG', moneda_destino__codigo=moneda_destino)
-            except Cotizacion.DoesNotExist:
+            cotizacion = tarifario.cotizacion(moneda_destino)
+            if cotizacion is None:
                 raise Cotizacion.DoesNotExist(f"No se encontró cotización para PYG -> {moneda_destino}.")
 
             comision_vta = cotizacion.comision_venta
@@ -93,10 +117,15 @@ def calcular_simulacion(monto_origen: Decimal, moneda_origen: str, moneda_destin
             monto_recibido = monto_origen / tasa_final
             resultado['comision_cotizacion'] = comision_vta # Guardar la comisión de venta
 
-            # Ajuste por denominaciones disponibles
-            ajuste = ajustar_monto_a_denominaciones_disponibles(
-                monto_recibido, moneda_destino_obj, 'venta'
-            )
+            # Ajuste por denominaciones disponibles (en una ubicación, la mejor o todas)
+            if ubicacion == UBICACION_MEJOR:
+                resultado['ubicacion'], ajuste = ajustar_monto_en_mejor_ubicacion(
+                    monto_recibido, tarifario.stock_por_ubicacion_de(moneda_destino), 'venta'
+                )
+            else:
+                ajuste = ajustar_monto_con_stock(
+                    monto_recibido, tarifario.stock_de(moneda_destino, ubicacion), 'venta'
+                )
             monto_recibido_ajustado = ajuste['monto_ajustado']
 
             if ajuste['ajustado']:
@@ -110,9 +139,8 @@ def calcular_simulacion(monto_origen: Decimal, moneda_origen: str, moneda_destin
 
         elif moneda_origen != 'PYG' and moneda_destino == 'PYG':
             # COMPRA DE DIVISA (La casa de cambios COMPRA USD, EUR, etc. al cliente)
-            try:
-                cotizacion = Cotizacion.objects.get(moneda_base__codigo='PYG', moneda_destino__codigo=moneda_origen)
-            except Cotizacion.DoesNotExist:
+            cotizacion = tarifario.cotizacion(moneda_origen)
+            if cotizacion is None:
                 raise Cotizacion.DoesNotExist(f"No se encontró cotización para {moneda_origen} -> PYG.")
 
             comision_com = cotizacion.comision_compra
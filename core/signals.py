@@ -0,0 +1,53 @@
+# core/signals.py
+"""
+Invalidación del tarifario en memoria (:mod:`core.tarifario`).
+
+Cualquier escritura sobre los modelos que alimentan el snapshot publica una
+nueva versión compartida para que todos los workers lo reconstruyan. Los
+``TedMovimiento`` también invalidan: todo cambio de stock queda registrado como
+movimiento, aunque la fila de inventario se haya actualizado sin ``save()``.
+
+Los cambios de cotizaciones y monedas también invalidan la tarjeta pública de
+tasas (:mod:`core.tarjeta_tasas`). Las actualizaciones en lote
+(``tablero_actualizado``) no pasan por ``save()`` e invalidan ambos una vez.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from cotizaciones.models import Cotizacion
+from cotizaciones.signals import cotizacion_actualizada, tablero_actualizado
+from monedas.models import Moneda, TedDenominacion, TedInventario, TedMovimiento
+from ted.models import TedTerminal
+from .tarifario import invalidar_tarifario
+from .tarjeta_tasas import invalidar_tarjeta
+
+
+@receiver(cotizacion_actualizada, dispatch_uid="tarifario_por_cambio_cotizacion")
+@receiver(tablero_actualizado, dispatch_uid="tarifario_por_cambio_tablero")
+def invalidar_por_cambio_cotizacion(sender, **kwargs):
+    invalidar_tarifario()
+
+
+@receiver(post_save, sender=Cotizacion, dispatch_uid="tarifario_cotizacion_save")
+@receiver(post_delete, sender=Cotizacion, dispatch_uid="tarifario_cotizacion_delete")
+@receiver(post_save, sender=Moneda, dispatch_uid="tarifario_moneda_save")
+@receiver(post_delete, sender=Moneda, dispatch_uid="tarifario_moneda_delete")
+@receiver(post_save, sender=TedDenominacion, dispatch_uid="tarifario_denominacion_save")
+@receiver(post_delete, sender=TedDenominacion, dispatch_uid="tarifario_denominacion_delete")
+@receiver(post_save, sender=TedInventario, dispatch_uid="tarifario_inventario_save")
+@receiver(post_delete, sender=TedInventario, dispatch_uid="tarifario_inventario_delete")
+@receiver(post_save, sender=TedMovimiento, dispatch_uid="tarifario_movimiento_save")
+@receiver(post_save, sender=TedTerminal, dispatch_uid="tarifario_terminal_save")
+@receiver(post_delete, sender=TedTerminal, dispatch_uid="tarifario_terminal_delete")
+def invalidar_por_escritura(sender, **kwargs):
+    invalidar_tarifario()
+
+
+@receiver(cotizacion_actualizada, dispatch_uid="tarjeta_por_cambio_cotizacion")
+@receiver(tablero_actualizado, dispatch_uid="tarjeta_por_cambio_tablero")
+@receiver(post_save, sender=Cotizacion, dispatch_uid="tarjeta_cotizacion_save")
+@receiver(post_delete, sender=Cotizacion, dispatch_uid="tarjeta_cotizacion_delete")
+@receiver(post_save, sender=Moneda, dispatch_uid="tarjeta_moneda_save")
+@receiver(post_delete, sender=Moneda, dispatch_uid="tarjeta_moneda_delete")
+def invalidar_tarjeta_de_tasas(sender, **kwargs):
+    invalidar_tarjeta()
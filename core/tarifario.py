@@ -0,0 +1,248 @@
+# core/tarifario.py
+"""
+Tarifario en memoria para la simulación de cambio
+=================================================
+
+.. module:: core.tarifario
+   :synopsis: Snapshot inmutable y versionado de cotizaciones PYG, monedas y stock TED.
+
+:func:`core.logic.calcular_simulacion` se ejecuta en cada interacción de la
+calculadora, en ``iniciar_operacion`` y al validar límites. En lugar de consultar
+``Moneda``, ``Cotizacion`` y ``TedInventario`` en cada llamada, cada proceso
+construye un :class:`Tarifario` y lo reutiliza mientras su versión coincida con la
+versión compartida guardada en la caché de Django (:data:`TARIFARIO_VERSION_KEY`).
+
+El stock TED **disponible** (``cantidad - reservada``: lo retenido por un
+preconteo no se puede ofrecer, ver :mod:`ted.stock`) se guarda sumado por
+moneda y también **por ubicación**, junto con la ubicación de cada terminal (``TedTerminal.serial -> direccion``), para que la
+simulación pueda ajustar el monto a lo que una terminal concreta puede entregar
+sin consultar la base de datos.
+
+Cualquier cambio relevante (señal ``cotizacion_actualizada`` o escrituras sobre
+monedas, cotizaciones, terminales, inventario y movimientos TED, ver
+:mod:`core.signals`, y reservas tomadas o liberadas en :mod:`ted.stock`) publica una nueva versión, de modo que todos los workers
+descartan su copia en la siguiente consulta.
+
+.. note::
+   La versión es un token aleatorio y no un contador: si la clave se pierde de la
+   caché (reinicio, desalojo), la nueva versión nunca coincide con la de un
+   snapshot ya construido.
+
+.. note::
+   Mientras la conexión actual tenga una invalidación sin confirmar (cambio dentro
+   de un ``atomic`` aún abierto), el snapshot se construye pero no se guarda: si la
+   transacción se revierte, el proceso no queda con datos que nunca existieron.
+"""
+from __future__ import annotations
+
+import uuid
+from dataclasses import dataclass, field
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+BASE_CODIGO = "PYG"
+TARIFARIO_VERSION_KEY = "core:tarifario:version"
+
+# Stock agregado de una moneda: ((valor, cantidad), ...) ordenado de mayor a menor valor.
+StockVector = Tuple[Tuple[int, int], ...]
+
+
+@dataclass(frozen=True)
+class MonedaTarifa:
+    """Datos de una moneda necesarios para simular (sin acceso a la BD)."""
+    codigo: str
+    nombre: str
+    decimales: int
+    minima_denominacion: Decimal
+
+
+@dataclass(frozen=True)
+class CotizacionTarifa:
+    """Cotización ``PYG -> codigo`` congelada al momento de construir el snapshot."""
+    codigo: str
+    valor_compra: Decimal
+    comision_compra: Decimal
+    valor_venta: Decimal
+    comision_venta: Decimal
+    fecha_actualizacion: object = None
+
+    @property
+    def total_compra(self) -> Decimal:
+        return self.valor_compra - self.comision_compra
+
+    @property
+    def total_venta(self) -> Decimal:
+        return self.valor_venta + self.comision_venta
+
+
+@dataclass(frozen=True)
+class Tarifario:
+    """
+    Snapshot inmutable del tarifario.
+
+    :param version: versión compartida vigente cuando se construyó.
+    :param monedas: ``codigo -> MonedaTarifa``.
+    :param cotizaciones: ``codigo destino -> CotizacionTarifa`` (base PYG).
+    :param stock: ``codigo -> StockVector`` disponible, sumando todas las ubicaciones.
+    :param stock_por_ubicacion: ``codigo -> {ubicacion -> StockVector}`` disponible.
+    :param terminales: ``serial -> ubicacion`` de cada :class:`ted.models.TedTerminal`.
+    """
+    version: str
+    monedas: Mapping[str, MonedaTarifa] = field(default_factory=lambda: MappingProxyType({}))
+    cotizaciones: Mapping[str, CotizacionTarifa] = field(default_factory=lambda: MappingProxyType({}))
+    stock: Mapping[str, StockVector] = field(default_factory=lambda: MappingProxyType({}))
+    stock_por_ubicacion: Mapping[str, Mapping[str, StockVector]] = field(
+        default_factory=lambda: MappingProxyType({})
+    )
+    terminales: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+
+    def moneda(self, codigo: str) -> Optional[MonedaTarifa]:
+        return self.monedas.get(codigo)
+
+    def cotizacion(self, codigo: str) -> Optional[CotizacionTarifa]:
+        return self.cotizaciones.get(codigo)
+
+    def stock_de(self, codigo: str, ubicacion: Optional[str] = None) -> StockVector:
+        """Stock de ``codigo`` en ``ubicacion``, o sumado en todas si es ``None``."""
+        if ubicacion is None:
+            return self.stock.get(codigo, ())
+        return self.stock_por_ubicacion.get(codigo, {}).get(ubicacion, ())
+
+    def stock_por_ubicacion_de(self, codigo: str) -> Mapping[str, StockVector]:
+        return self.stock_por_ubicacion.get(codigo, MappingProxyType({}))
+
+    def ubicacion_de_terminal(self, serial: str) -> Optional[str]:
+        return self.terminales.get(serial)
+
+
+_snapshot: Optional[Tarifario] = None
+
+
+def _nueva_version() -> str:
+    return uuid.uuid4().hex
+
+
+def version_actual() -> str:
+    """Devuelve la versión compartida, inicializándola si no existe en la caché."""
+    version = cache.get(TARIFARIO_VERSION_KEY)
+    if version is None:
+        cache.add(TARIFARIO_VERSION_KEY, _nueva_version(), None)
+        version = cache.get(TARIFARIO_VERSION_KEY)
+    return version
+
+
+def construir_tarifario(version: str) -> Tarifario:
+    """
+    Lee monedas, cotizaciones con base PYG, stock TED y terminales en cuatro
+    consultas y devuelve un :class:`Tarifario` inmutable.
+    """
+    from cotizaciones.models import Cotizacion
+    from monedas.models import Moneda, TedInventario
+    from ted.models import TedTerminal
+
+    monedas = {
+        m.codigo: MonedaTarifa(
+            codigo=m.codigo,
+            nombre=m.nombre,
+            decimales=m.decimales,
+            minima_denominacion=Decimal(m.minima_denominacion),
+        )
+        for m in Moneda.objects.all()
+    }
+
+    cotizaciones = {}
+    qs = (Cotizacion.objects
+          .filter(moneda_base__codigo=BASE_CODIGO)
+          .select_related("moneda_destino"))
+    for c in qs:
+        cotizaciones[c.moneda_destino.codigo] = CotizacionTarifa(
+            codigo=c.moneda_destino.codigo,
+            valor_compra=c.valor_compra,
+            comision_compra=c.comision_compra,
+            valor_venta=c.valor_venta,
+            comision_venta=c.comision_venta,
+            fecha_actualizacion=c.fecha_actualizacion,
+        )
+
+    acumulado = {}
+    por_ubicacion = {}
+    filas = (TedInventario.objects
+             .annotate(disponible=F("cantidad") - F("reservada"))
+             .filter(disponible__gt=0)
+             .values_list("denominacion__moneda__codigo", "ubicacion", "denominacion__valor", "disponible"))
+    for codigo, ubicacion, valor, cantidad in filas:
+        por_valor = acumulado.setdefault(codigo, {})
+        por_valor[valor] = por_valor.get(valor, 0) + cantidad
+        en_ubicacion = por_ubicacion.setdefault(codigo, {}).setdefault(ubicacion, {})
+        en_ubicacion[valor] = en_ubicacion.get(valor, 0) + cantidad
+    stock = {
+        codigo: _vector(por_valor)
+        for codigo, por_valor in acumulado.items()
+    }
+    stock_por_ubicacion = {
+        codigo: MappingProxyType({ubicacion: _vector(por_valor) for ubicacion, por_valor in ubicaciones.items()})
+        for codigo, ubicaciones in por_ubicacion.items()
+    }
+
+    terminales = dict(TedTerminal.objects.values_list("serial", "direccion"))
+
+    return Tarifario(
+        version=version,
+        monedas=MappingProxyType(monedas),
+        cotizaciones=MappingProxyType(cotizaciones),
+        stock=MappingProxyType(stock),
+        stock_por_ubicacion=MappingProxyType(stock_por_ubicacion),
+        terminales=MappingProxyType(terminales),
+    )
+
+
+def _vector(por_valor) -> StockVector:
+    return tuple(sorted(por_valor.items(), reverse=True))
+
+
+def _cambios_sin_confirmar() -> bool:
+    """Indica si esta conexión invalidó el tarifario dentro de una transacción abierta."""
+    conexion = transaction.get_connection()
+    return any(func is _publicar_nueva_version for _, func, _ in conexion.run_on_commit)
+
+
+def obtener_tarifario() -> Tarifario:
+    """
+    Devuelve el snapshot del proceso, reconstruyéndolo sólo si la versión
+    compartida cambió. En el camino caliente no se consulta la base de datos.
+    """
+    global _snapshot
+    if _cambios_sin_confirmar():
+        return construir_tarifario(version_actual())
+
+    version = version_actual()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        # La versión se lee antes de construir: si cambia durante la
+        # construcción, la próxima llamada detecta la diferencia y reconstruye.
+        snapshot = construir_tarifario(version)
+        _snapshot = snapshot
+    return snapshot
+
+
+def _publicar_nueva_version() -> None:
+    global _snapshot
+    _snapshot = None
+    cache.set(TARIFARIO_VERSION_KEY, _nueva_version(), None)
+
+
+def invalidar_tarifario() -> None:
+    """
+    Descarta el snapshot local y publica una nueva versión compartida.
+
+    Se publica de inmediato (para el propio proceso) y otra vez al confirmar la
+    transacción, para que otros workers que reconstruyeron con datos todavía no
+    confirmados vuelvan a leerlos.
+    """
+    _publicar_nueva_version()
+    transaction.on_commit(_publicar_nueva_version)
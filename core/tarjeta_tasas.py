@@ -0,0 +1,147 @@
+# core/tarjeta_tasas.py
+"""
+Tarjeta pública de cotizaciones
+===============================
+
+.. module:: core.tarjeta_tasas
+   :synopsis: JSON y fragmento HTML de las cotizaciones, versionados y cacheados.
+
+Las páginas públicas (tipos de cambio y calculadora) reciben la mayor parte del
+tráfico anónimo y muestran siempre lo mismo hasta que cambia una cotización. La
+:class:`TarjetaTasas` se construye una vez, con una sola consulta, y se guarda en
+la caché de Django bajo la versión compartida :data:`TARJETA_VERSION_KEY`:
+
+- ``contenido``: el JSON que sirve ``core:tarjeta_tasas`` (ver
+  :func:`core.views.tarjeta_tasas`), con ``ETag`` fuerte y ``Last-Modified``.
+- ``filas_html``: las filas de la tabla de ``site/rates.html`` ya renderizadas.
+
+La versión pública (``version`` en el JSON y ``Last-Modified``) es la última
+``Cotizacion.fecha_actualizacion``; el ``ETag`` es el hash del JSON, así que
+también cambia si cambia el nombre de una moneda.
+
+La señal ``cotizacion_actualizada`` y las escrituras sobre ``Cotizacion`` y
+``Moneda`` (ver :mod:`core.signals`) publican una nueva versión con
+:func:`invalidar_tarjeta`; mientras tanto, servir la tarjeta no consulta la base
+de datos.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from .tarifario import BASE_CODIGO
+
+TARJETA_VERSION_KEY = "core:tarjeta_tasas:version"
+TARJETA_CACHE_KEY = "core:tarjeta_tasas:{version}"
+
+# Las tarjetas de versiones viejas no se borran: vencen solas.
+TARJETA_TIMEOUT = 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class TarjetaTasas:
+    """
+    Snapshot serializado de las cotizaciones.
+
+    Se guarda en la caché compartida (se serializa con ``pickle``), por eso
+    ``tasas`` es un ``dict`` común y no un ``MappingProxyType``: no modificarlo.
+
+    :param version: última ``fecha_actualizacion`` en microsegundos desde epoch (``"0"`` si no hay).
+    :param ultima_modificacion: la misma fecha, para ``Last-Modified``.
+    :param etag: hash del ``contenido`` (ETag fuerte, sin comillas).
+    :param contenido: cuerpo JSON ya codificado.
+    :param tasas: ``codigo -> {compra, venta, emoji, name, actualizado}`` con base PYG.
+    :param filas_html: filas ``<tr>`` de la tabla de tipos de cambio.
+    """
+    version: str
+    ultima_modificacion: Optional[datetime]
+    etag: str
+    contenido: bytes
+    tasas: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    filas_html: str = ""
+
+
+def _token_actual() -> str:
+    token = cache.get(TARJETA_VERSION_KEY)
+    if token is None:
+        cache.add(TARJETA_VERSION_KEY, uuid.uuid4().hex, None)
+        token = cache.get(TARJETA_VERSION_KEY)
+    return token
+
+
+def construir_tarjeta() -> TarjetaTasas:
+    """Lee todas las cotizaciones en una consulta y serializa la tarjeta."""
+    from cotizaciones.models import Cotizacion
+
+    cotizaciones = list(
+        Cotizacion.objects
+        .select_related("moneda_base", "moneda_destino")
+        .order_by("moneda_base__codigo", "moneda_destino__codigo")
+    )
+    ultima = max((c.fecha_actualizacion for c in cotizaciones if c.fecha_actualizacion), default=None)
+    version = str(int(ultima.timestamp() * 1_000_000)) if ultima else "0"
+
+    tasas = {
+        c.moneda_destino.codigo: {
+            "compra": str(c.total_compra),
+            "venta": str(c.total_venta),
+            "emoji": getattr(c.moneda_destino, "emoji", ""),
+            "name": c.moneda_destino.nombre,
+            "actualizado": c.fecha_actualizacion.isoformat() if c.fecha_actualizacion else None,
+        }
+        for c in cotizaciones
+        if c.moneda_base.codigo == BASE_CODIGO
+    }
+    contenido = json.dumps(
+        {"version": version, "base": BASE_CODIGO, "tasas": tasas},
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")
+
+    return TarjetaTasas(
+        version=version,
+        ultima_modificacion=ultima,
+        etag=hashlib.sha256(contenido).hexdigest()[:32],
+        contenido=contenido,
+        tasas=tasas,
+        filas_html=render_to_string("partials/tarjeta_tasas_filas.html", {"cotizaciones": cotizaciones}),
+    )
+
+
+def obtener_tarjeta() -> TarjetaTasas:
+    """
+    Devuelve la tarjeta de la versión vigente, construyéndola sólo si no está en caché.
+
+    Con una invalidación sin confirmar en esta conexión se construye sin guardarla,
+    como hace :func:`core.tarifario.obtener_tarifario`.
+    """
+    conexion = transaction.get_connection()
+    if any(func is _publicar_nueva_version for _, func, _ in conexion.run_on_commit):
+        return construir_tarjeta()
+
+    clave = TARJETA_CACHE_KEY.format(version=_token_actual())
+    tarjeta = cache.get(clave)
+    if tarjeta is None:
+        tarjeta = construir_tarjeta()
+        cache.set(clave, tarjeta, TARJETA_TIMEOUT)
+    return tarjeta
+
+
+def _publicar_nueva_version() -> None:
+    cache.set(TARJETA_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidar_tarjeta() -> None:
+    """
+    Publica una nueva versión de la tarjeta, ahora y al confirmar la transacción
+    (igual que :func:`core.tarifario.invalidar_tarifario`).
+    """
+    _publicar_nueva_version()
+    transaction.on_commit(_publicar_nueva_version)
@@ -5,14 +5,18 @@ Este módulo contiene pruebas para la función `calcular_simulacion` en `core.lo
 asegurando que los cálculos de compra/venta, la aplicación de bonificaciones y
 el manejo de errores funcionen como se espera.
 """
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.db import transaction
 from decimal import Decimal
 from unittest.mock import patch, Mock
-from core.logic import calcular_simulacion
+from core.logic import calcular_simulacion, UBICACION_MEJOR
+from core.tarifario import Tarifario, MonedaTarifa, CotizacionTarifa, obtener_tarifario, invalidar_tarifario
+from types import MappingProxyType
 from django.contrib.auth import get_user_model
 from clientes.models import Cliente
 from cotizaciones.models import Cotizacion
-from monedas.models import Moneda
+from monedas.models import Moneda, TedDenominacion, TedInventario, TedMovimiento
+from ted.models import TedTerminal
 from django.utils import timezone # Importar timezone
 from datetime import timedelta # Importar timedelta
 # Importar excepciones específicas si se desea mockearlas con precisión
@@ -20,6 +24,25 @@ from django.core.exceptions import ObjectDoesNotExist as DjangoObjectDoesNotExis
 
 User = get_user_model()
 
+
+def _tarifario_de_prueba(cotizaciones, stock=None):
+    """
+    Construye un :class:`Tarifario` en memoria con las monedas PYG/USD/EUR y las
+    cotizaciones indicadas, para reemplazar al snapshot real en pruebas con mocks.
+    """
+    monedas = {
+        'PYG': MonedaTarifa('PYG', 'Guaraní Paraguayo', 0, Decimal('100')),
+        'USD': MonedaTarifa('USD', 'Dólar Estadounidense', 2, Decimal('0.01')),
+        'EUR': MonedaTarifa('EUR', 'Euro', 2, Decimal('0.01')),
+    }
+    return Tarifario(
+        version='test',
+        monedas=MappingProxyType(monedas),
+        cotizaciones=MappingProxyType({c.codigo: c for c in cotizaciones}),
+        stock=MappingProxyType(stock or {}),
+    )
+
+
 class SimulacionLogicTest(TestCase):
     """
     Conjunto de pruebas para la función `calcular_simulacion` en `core.logic`.
@@ -37,8 +60,8 @@ class SimulacionLogicTest(TestCase):
         # No creamos 'BTC' intencionalmente para probar escenarios de moneda no existente.
 
     @patch('clientes.models.Cliente.objects.first')
-    @patch('cotizaciones.models.Cotizacion.objects.get')
-    def test_venta_usd_minorista(self, mock_cotizacion_get, mock_cliente_first):
+    @patch('core.logic.obtener_tarifario')
+    def test_venta_usd_minorista(self, mock_obtener_tarifario, mock_cliente_first):
         """
         Prueba la venta de USD (PYG -> USD) para un cliente minorista sin bonificación.
 
@@ -49,13 +72,15 @@ class SimulacionLogicTest(TestCase):
         mock_client_instance.bonificacion = Decimal('0')
         mock_cliente_first.return_value = mock_client_instance
 
-        # Mock del objeto Cotizacion con precisión Decimal apropiada
-        mock_cotizacion_instance = Mock(spec=Cotizacion)
-        mock_cotizacion_instance.moneda_base.codigo = 'PYG'
-        mock_cotizacion_instance.moneda_destino.codigo = 'USD'
-        mock_cotizacion_instance.valor_venta = Decimal('7450.0000') # Precisión explícita
-        mock_cotizacion_instance.comision_venta = Decimal('100.0000') # Precisión explícita
-        mock_cotizacion_get.return_value = mock_cotizacion_instance
+        # Tarifario en memoria con precisión Decimal apropiada y stock suficiente de USD
+        cotizacion = CotizacionTarifa(
+            codigo='USD',
+            valor_compra=Decimal('7300.0000'),
+            comision_compra=Decimal('50.0000'),
+            valor_venta=Decimal('7450.0000'), # Precisión explícita
+            comision_venta=Decimal('100.0000'), # Precisión explícita
+        )
+        mock_obtener_tarifario.return_value = _tarifario_de_prueba([cotizacion], stock={'USD': ((100, 10),)})
 
         mock_user = User(pk=1)
 
@@ -71,14 +96,11 @@ class SimulacionLogicTest(TestCase):
         self.assertEqual(resultado['tasa_aplicada'], Decimal('7550.0000')) # Usar precisión consistente con el modelo
         self.assertEqual(resultado['bonificacion_aplicada'], Decimal('0.0000')) # Usar precisión consistente con el modelo
 
-        mock_cotizacion_get.assert_called_once_with(
-            moneda_base__codigo='PYG',
-            moneda_destino__codigo='USD'
-        )
+        mock_obtener_tarifario.assert_called_once_with()
 
 
-    @patch('cotizaciones.models.Cotizacion.objects.get')
-    def test_compra_eur_vip(self, mock_cotizacion_get):
+    @patch('core.logic.obtener_tarifario')
+    def test_compra_eur_vip(self, mock_obtener_tarifario):
         """
         Prueba la compra de EUR (EUR -> PYG) para un cliente VIP con 10% de bonificación.
 
@@ -89,13 +111,15 @@ class SimulacionLogicTest(TestCase):
         mock_client_instance.bonificacion = Decimal('10.0') # Precisión explícita
         mock_client_instance.tipo_cliente = 'VIP'
 
-        # Mock del objeto Cotizacion con precisión explícita
-        mock_cotizacion_instance = Mock(spec=Cotizacion)
-        mock_cotizacion_instance.moneda_base.codigo = 'PYG'
-        mock_cotizacion_instance.moneda_destino.codigo = 'EUR'
-        mock_cotizacion_instance.valor_compra = Decimal('8100.0000') # Precisión explícita
-        mock_cotizacion_instance.comision_compra = Decimal('60.0000') # Precisión explícita
-        mock_cotizacion_get.return_value = mock_cotizacion_instance
+        # Tarifario en memoria con precisión explícita
+        cotizacion = CotizacionTarifa(
+            codigo='EUR',
+            valor_compra=Decimal('8100.0000'), # Precisión explícita
+            comision_compra=Decimal('60.0000'), # Precisión explícita
+            valor_venta=Decimal('8300.0000'),
+            comision_venta=Decimal('80.0000'),
+        )
+        mock_obtener_tarifario.return_value = _tarifario_de_prueba([cotizacion])
 
         mock_user = Mock(spec=User) # Crear un mock de usuario
         mock_user.is_authenticated = True # Asegurar que el usuario está autenticado
@@ -114,10 +138,7 @@ class SimulacionLogicTest(TestCase):
         self.assertEqual(resultado['bonificacion_aplicada'], Decimal('6.0000')) # Precisión explícita
         self.assertEqual(resultado['tasa_aplicada'], Decimal('8046.0000')) # Precisión explícita
 
-        mock_cotizacion_get.assert_called_once_with(
-            moneda_base__codigo='PYG',
-            moneda_destino__codigo='EUR'
-        )
+        mock_obtener_tarifario.assert_called_once_with()
 
 
     @patch('monedas.models.Moneda.objects.get') # Mockear sin side_effect inicialmente
@@ -284,6 +305,109 @@ class SimulacionLogicConcrectTest(TestCase):
         self.assertEqual(resultado['monto_recibido'], Decimal('7252500'))
 
 
+class TarifarioSnapshotTest(TransactionTestCase):
+    """
+    Pruebas del tarifario en memoria (:mod:`core.tarifario`) que usa la simulación.
+
+    Se usa `TransactionTestCase` para que los cambios se confirmen realmente y el
+    snapshot pueda quedar guardado entre llamadas, como en producción.
+    """
+    def setUp(self):
+        self.pyg = Moneda.objects.create(codigo='PYG', nombre='Guaraní', decimales=0)
+        self.usd = Moneda.objects.create(codigo='USD', nombre='Dólar', decimales=2)
+        self.cotizacion = Cotizacion.objects.create(
+            moneda_base=self.pyg,
+            moneda_destino=self.usd,
+            valor_venta=Decimal('7300'),
+            comision_venta=Decimal('100'),
+            valor_compra=Decimal('7300'),
+            comision_compra=Decimal('50')
+        )
+
+    def tearDown(self):
+        # El flush de TransactionTestCase no emite señales.
+        invalidar_tarifario()
+
+    def test_simulacion_sin_consultas_con_snapshot_vigente(self):
+        """Con el snapshot ya construido, simular no consulta la base de datos."""
+        obtener_tarifario()
+        with self.assertNumQueries(0):
+            resultado = calcular_simulacion(Decimal('100'), 'USD', 'PYG', user=None)
+        self.assertIsNone(resultado['error'])
+        self.assertEqual(resultado['monto_recibido'], Decimal('725000'))
+
+    def test_snapshot_se_reutiliza_mientras_no_cambia_la_version(self):
+        self.assertIs(obtener_tarifario(), obtener_tarifario())
+
+    def test_cambio_de_cotizacion_invalida_snapshot(self):
+        """La señal `cotizacion_actualizada` publica una nueva versión del tarifario."""
+        anterior = obtener_tarifario()
+        self.cotizacion.valor_compra = Decimal('7400')
+        self.cotizacion.save()
+
+        actual = obtener_tarifario()
+        self.assertNotEqual(anterior.version, actual.version)
+        self.assertEqual(actual.cotizacion('USD').valor_compra, Decimal('7400'))
+
+        resultado = calcular_simulacion(Decimal('100'), 'USD', 'PYG', user=None)
+        self.assertEqual(resultado['monto_recibido'], Decimal('735000'))
+
+    def test_cambio_revertido_no_deja_snapshot_obsoleto(self):
+        """Un cambio dentro de una transacción revertida no queda en el snapshot."""
+        obtener_tarifario()
+        try:
+            with transaction.atomic():
+                self.cotizacion.valor_compra = Decimal('9999')
+                self.cotizacion.save()
+                self.assertEqual(obtener_tarifario().cotizacion('USD').valor_compra, Decimal('9999'))
+                raise RuntimeError("rollback")
+        except RuntimeError:
+            pass
+        self.assertEqual(obtener_tarifario().cotizacion('USD').valor_compra, Decimal('7300'))
+
+    def _stock_en_dos_ubicaciones(self):
+        """Centro: 1×50 + 1×20; Campus: 3×20. Sumadas cubren 90; ninguna ubicación sola."""
+        den50 = TedDenominacion.objects.create(moneda=self.usd, valor=50)
+        den20 = TedDenominacion.objects.create(moneda=self.usd, valor=20)
+        TedInventario.objects.create(denominacion=den50, ubicacion='Centro', cantidad=1)
+        TedInventario.objects.create(denominacion=den20, ubicacion='Centro', cantidad=1)
+        TedInventario.objects.create(denominacion=den20, ubicacion='Campus', cantidad=3)
+        TedTerminal.objects.create(serial='TED-0002', direccion='Campus')
+        return den20
+
+    def test_simulacion_por_ubicacion_sin_consultas(self):
+        """El ajuste por ubicación, terminal o mejor ubicación usa el vector cacheado."""
+        self._stock_en_dos_ubicaciones()
+        monto_pyg = Decimal('740000')  # 100 USD a 7400
+
+        obtener_tarifario()
+        with self.assertNumQueries(0):
+            total = calcular_simulacion(monto_pyg, 'PYG', 'USD')
+            centro = calcular_simulacion(monto_pyg, 'PYG', 'USD', ubicacion='Centro')
+            terminal = calcular_simulacion(monto_pyg, 'PYG', 'USD', terminal='TED-0002')
+            mejor = calcular_simulacion(monto_pyg, 'PYG', 'USD', ubicacion=UBICACION_MEJOR)
+
+        self.assertEqual(total['monto_recibido'], Decimal('90'))
+        self.assertEqual(centro['monto_recibido'], Decimal('70'))
+        self.assertEqual(centro['ubicacion'], 'Centro')
+        self.assertEqual(terminal['monto_recibido'], Decimal('60'))
+        self.assertEqual(terminal['ubicacion'], 'Campus')
+        self.assertEqual(mejor['monto_recibido'], Decimal('70'))
+        self.assertEqual(mejor['ubicacion'], 'Centro')
+
+        desconocida = calcular_simulacion(monto_pyg, 'PYG', 'USD', terminal='TED-9999')
+        self.assertIn('TED-9999', desconocida['error'])
+
+    def test_movimiento_ted_actualiza_stock_por_ubicacion(self):
+        den20 = self._stock_en_dos_ubicaciones()
+        self.assertEqual(obtener_tarifario().stock_de('USD', 'Campus'), ((20, 3),))
+
+        # Cambio de stock sin save() del inventario, registrado como movimiento.
+        TedInventario.objects.filter(denominacion=den20, ubicacion='Campus').update(cantidad=5)
+        TedMovimiento.objects.create(denominacion=den20, delta=2, motivo=TedMovimiento.MOTIVO_AJUSTE)
+
+        self.assertEqual(obtener_tarifario().stock_de('USD', 'Campus'), ((20, 5),))
+
 from django.urls import reverse
 from django.test import Client
 from transacciones.models import Transaccion
@@ -402,3 +526,71 @@ class CoreViewsTest(TestCase):
         
         # Permitimos una pequeña diferencia (ej. 5 segundos) para la ejecución del código
         self.assertTrue(abs(diferencia.total_seconds()) < 5)
+
+
+from core.tarjeta_tasas import invalidar_tarjeta
+
+
+class TarjetaTasasTest(TransactionTestCase):
+    """
+    Pruebas de la tarjeta pública de tasas (:mod:`core.tarjeta_tasas`) y sus vistas.
+
+    Como en `TarifarioSnapshotTest`, los cambios se confirman para que la tarjeta
+    quede guardada en la caché entre requests.
+    """
+    def setUp(self):
+        self.pyg = Moneda.objects.create(codigo='PYG', nombre='Guaraní')
+        self.usd = Moneda.objects.create(codigo='USD', nombre='Dólar')
+        self.cotizacion = Cotizacion.objects.create(
+            moneda_base=self.pyg,
+            moneda_destino=self.usd,
+            valor_venta=Decimal('7400'),
+            comision_venta=Decimal('100'),
+            valor_compra=Decimal('7300'),
+            comision_compra=Decimal('50')
+        )
+        self.url = reverse('core:tarjeta_tasas')
+
+    def tearDown(self):
+        # El flush de TransactionTestCase no emite señales.
+        invalidar_tarjeta()
+
+    def test_json_con_validadores_y_cache_control(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(datos['base'], 'PYG')
+        self.assertEqual(datos['tasas']['USD']['venta'], '7500.0000')
+        self.assertEqual(datos['tasas']['USD']['compra'], '7250.0000')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_revalidacion_sin_consultas(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.client.get(reverse('site_rates'))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_cambio_de_cotizacion_publica_nueva_version(self):
+        anterior = self.client.get(self.url)
+        self.cotizacion.valor_venta = Decimal('7600')
+        self.cotizacion.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=anterior['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], anterior['ETag'])
+        self.assertEqual(response.json()['tasas']['USD']['venta'], '7700.0000')
+        self.assertNotEqual(response.json()['version'], anterior.json()['version'])
+
+    def test_paginas_publicas_usan_la_tarjeta(self):
+        response = self.client.get(reverse('site_rates'))
+        self.assertContains(response, 'data-code="USD"')
+        self.assertContains(response, 'data-venta="7500"')
+
+        response = self.client.get(reverse('site_calculator'))
+        self.assertContains(response, self.url)
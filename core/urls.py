@@ -8,6 +8,7 @@ urlpatterns = [
     # Asumo que tienes otras URLs aquí, como la página de inicio
     path('calculadora/', views.calculadora_view, name='calculadora'),
     path('tasas/', views.site_rates, name='tasas'),
+    path('tasas/tarjeta.json', views.tarjeta_tasas, name='tarjeta_tasas'),
     path('operacion/iniciar/', views.iniciar_operacion, name='iniciar_operacion'),
     path('operacion/confirmar/', views.confirmar_operacion, name='confirmar_operacion'),
     path('operacion/verificar-otp-reserva/', views.VerificarOtpReservaView.as_view(), name='verificar_otp_reserva'), # Nueva URL para Flujo A
@@ -5,19 +5,25 @@ from django.contrib import messages
 from decimal import Decimal
 from django.utils.timezone import now
 from .forms import SimulacionForm, OperacionForm, CalculadoraForm
-from .logic import calcular_simulacion
+from .logic import calcular_simulacion, UBICACION_MEJOR
+from .tarjeta_tasas import obtener_tarjeta
+from django.http import HttpResponse
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
 from monedas.models import Moneda
 from cotizaciones.models import Cotizacion
 from clientes.models import Cliente
 from configuracion.models import TransactionLimit
-from transacciones.models import Transaccion
-import uuid
+from transacciones.estados import transicionar
+from transacciones.models import ConflictoVersion, Transaccion
 from django.utils import timezone
 from datetime import timedelta
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum
+from django.db.models import Q
 from django.utils.dateparse import parse_date
 from core.utils import validar_limite_transaccion
+from transacciones.limites import limite_restante
 from usuarios.utils import get_cliente_activo, send_otp_email, validate_otp_code # Importar funciones OTP
 import json
 from payments.stripe_service import create_payment_intent
@@ -46,9 +52,7 @@ def cancelar_transaccion(request, transaccion_id):
         'pendiente_pago_stripe',
     ]
 
-    if transaccion.estado in estados_cancelables:
-        transaccion.estado = 'cancelada'
-        transaccion.save()
+    if transicionar(transaccion, 'cancelada', desde=estados_cancelables):
         messages.success(request, f"La operación {transaccion.codigo_operacion_tauser} ha sido cancelada exitosamente.")
     else:
         messages.error(request, f"La operación {transaccion.codigo_operacion_tauser} no puede ser cancelada en su estado actual ({transaccion.get_estado_display()}).")
@@ -60,16 +64,8 @@ def calculadora_view(request):
     form = CalculadoraForm(request.POST or None)
     resultado = None
 
-    # Obtenemos las tasas para el gráfico de JS (Rate Card)
-    cotzs = Cotizacion.objects.filter(moneda_base__codigo='PYG').select_related('moneda_destino')
-    tasas_dict = {
-        c.moneda_destino.codigo: {
-            'compra': str(c.total_compra),
-            'venta':  str(c.total_venta),
-            'emoji': getattr(c.moneda_destino, 'emoji', ''), # Fallback seguro
-            'name': c.moneda_destino.nombre
-        } for c in cotzs
-    }
+    # Tasas de la tarjeta cacheada (ver core.tarjeta_tasas); el JS las pide a core:tarjeta_tasas
+    tasas_dict = obtener_tarjeta().tasas if request.method == 'POST' else {}
 
     if request.method == 'POST' and form.is_valid():
         operacion_usuario = form.cleaned_data['tipo_operacion'] # 'compra' o 'venta' (Perspectiva Usuario)
@@ -140,13 +136,36 @@ def calculadora_view(request):
                    'site/calculator.html', 
                    {'form': form,
                     'resultado': resultado,
-                    'iniciar_operacion_url': iniciar_operacion_url,
-                    'tasas_json': json.dumps(tasas_dict)})
+                    'iniciar_operacion_url': iniciar_operacion_url})
 
 
 def site_rates(request):
-    cotizaciones = Cotizacion.objects.all().select_related('moneda_base', 'moneda_destino')
-    return render(request, 'site/rates.html', {'cotizaciones': cotizaciones})
+    # Filas ya renderizadas de la tarjeta cacheada: sin consultas mientras no cambie una cotización.
+    return render(request, 'site/rates.html', {'filas_tasas': mark_safe(obtener_tarjeta().filas_html)})
+
+
+def _tarjeta_de(request):
+    """Lee la tarjeta una sola vez por request (la usan ``condition`` y la vista)."""
+    if not hasattr(request, '_tarjeta_tasas'):
+        request._tarjeta_tasas = obtener_tarjeta()
+    return request._tarjeta_tasas
+
+
+@require_safe
+@cache_control(public=True, no_cache=True)
+@condition(
+    etag_func=lambda request: _tarjeta_de(request).etag,
+    last_modified_func=lambda request: _tarjeta_de(request).ultima_modificacion,
+)
+def tarjeta_tasas(request):
+    """
+    Tarjeta de cotizaciones en JSON (``{version, base, tasas}``).
+
+    Responde ``304 Not Modified`` a ``If-None-Match`` / ``If-Modified-Since``
+    vigentes; ``Cache-Control: no-cache`` obliga a revalidar, que es gratis
+    mientras la tarjeta esté en caché.
+    """
+    return HttpResponse(_tarjeta_de(request).contenido, content_type='application/json')
 
 
 
@@ -197,7 +216,8 @@ def iniciar_operacion(request):
 
             monto_origen_decimal = Decimal(monto_from_url)
             temp_simulacion_result = calcular_simulacion(
-                monto_origen_decimal, moneda_origen_from_url, moneda_destino_from_url, user=request.user
+                monto_origen_decimal, moneda_origen_from_url, moneda_destino_from_url, user=request.user,
+                ubicacion=UBICACION_MEJOR,
             )
             if temp_simulacion_result and not temp_simulacion_result.get('error'):
                 resultado_simulacion = temp_simulacion_result # Usamos este resultado para el contexto
@@ -331,14 +351,11 @@ def iniciar_operacion(request):
         }
     medios_acreditacion_json = json.dumps(medios_acreditacion_para_js)
 
-    limite_cfg = TransactionLimit.objects.filter(moneda__codigo='PYG').first()
-    limite_disponible = Decimal(limite_cfg.monto_diario) if limite_cfg else Decimal(0)
-    hoy = now().date()
-    total_transacciones_hoy = Transaccion.objects.filter(
-        cliente=cliente,
-        fecha_creacion__date=hoy
-    ).aggregate(Sum('monto_origen'))['monto_origen__sum'] or Decimal(0)
-    limite_disponible -= total_transacciones_hoy
+    # Restante del cliente en PYG (un solo agregado, ver transacciones.limites)
+    restante_cliente = limite_restante(cliente)
+    limite_disponible = restante_cliente['disponible']
+    if limite_disponible is None:
+        limite_disponible = Decimal(0)
 
     if request.method == 'POST':
         action_type = request.POST.get('action_type')
@@ -499,7 +516,8 @@ def iniciar_operacion(request):
             moneda_origen_codigo = form.cleaned_data['moneda_origen']
             moneda_destino_codigo = form.cleaned_data['moneda_destino']
 
-            resultado_simulacion = calcular_simulacion(monto_origen, moneda_origen_codigo, moneda_destino_codigo, user=request.user)
+            resultado_simulacion = calcular_simulacion(monto_origen, moneda_origen_codigo, moneda_destino_codigo, user=request.user,
+                                                       ubicacion=UBICACION_MEJOR)
 
             if resultado_simulacion.get('error'):
                 messages.error(request, resultado_simulacion['error'])
@@ -513,7 +531,9 @@ def iniciar_operacion(request):
                     'medios_acreditacion_json': medios_acreditacion_json,
                 })
 
-            if monto_origen > limite_disponible:
+            # El límite está en PYG: comparar contra el tramo en guaraníes de la operación.
+            monto_pyg = monto_origen if moneda_origen_codigo == 'PYG' else resultado_simulacion['monto_recibido']
+            if restante_cliente['disponible'] is not None and monto_pyg > restante_cliente['disponible']:
                 messages.error(request, f"El monto excede el límite disponible de {limite_disponible} PYG.")
                 return render(request, 'core/iniciar_operacion.html', {
                     'form': form, 'cliente': cliente, 'medio_pago_form': medio_pago_form,
@@ -598,7 +618,6 @@ def iniciar_operacion(request):
                     tasa_cambio_aplicada=Decimal(operacion_data['tasa_aplicada']),
                     comision_aplicada=Decimal(operacion_data['comision_aplicada']),
                     comision_cotizacion=Decimal(operacion_data['comision_cotizacion']),
-                    codigo_operacion_tauser=str(uuid.uuid4())[:10],
                     tasa_garantizada_hasta=timezone.now() + timedelta(hours=2),
                     modalidad_tasa=modalidad_tasa,
                     medio_pago_utilizado=tipo_medio_pago_stripe,
@@ -620,7 +639,6 @@ def iniciar_operacion(request):
                     messages.error(request, "Error al encontrar las monedas para la transacción.")
                     return redirect('core:iniciar_operacion')
 
-                codigo_operacion_tauser = str(uuid.uuid4())[:10]
                 medio_pago_obj = None
                 medio_acreditacion_obj = None
 
@@ -681,7 +699,6 @@ def iniciar_operacion(request):
                         tasa_cambio_aplicada=Decimal(operacion_data['tasa_aplicada']),
                         comision_aplicada=Decimal(operacion_data['comision_aplicada']),
                         comision_cotizacion=Decimal(operacion_data['comision_cotizacion']),
-                        codigo_operacion_tauser=codigo_operacion_tauser,
                         modalidad_tasa=modalidad_tasa,
                         medio_pago_utilizado=medio_pago_obj,
                         medio_acreditacion_cliente=medio_acreditacion_obj, # Ahora es la instancia de clientes.MedioAcreditacion
@@ -803,7 +820,6 @@ class VerificarOtpCompraFlotanteView(LoginRequiredMixin, View):
                     tasa_cambio_aplicada=Decimal(operacion_pendiente['tasa_aplicada']),
                     comision_aplicada=Decimal(operacion_pendiente['comision_aplicada']),
                     comision_cotizacion=Decimal(operacion_pendiente.get('comision_cotizacion', '0.0')), # Usar .get con default
-                    codigo_operacion_tauser=str(uuid.uuid4())[:10],
                     tasa_garantizada_hasta=None, # Tasa flotante, no garantizada
                     modalidad_tasa='flotante',
                     medio_acreditacion_cliente=medio_acreditacion_para_transaccion, # Para compras
@@ -853,7 +869,6 @@ def confirmar_operacion(request):
                 return redirect('core:iniciar_operacion')
 
             estado_inicial = 'pendiente_pago_stripe'
-            codigo_operacion_tauser = str(uuid.uuid4())[:10]
             tasa_garantizada_hasta = timezone.now() + timedelta(hours=2) # Tasa bloqueada por 2 horas para Stripe
 
             # Obtener el TipoMedioPago para Stripe
@@ -875,7 +890,6 @@ def confirmar_operacion(request):
                 tasa_cambio_aplicada=operacion_pendiente['tasa_aplicada'],
                 comision_aplicada=operacion_pendiente['comision_aplicada'],
                 comision_cotizacion=operacion_pendiente['comision_cotizacion'], # Nuevo
-                codigo_operacion_tauser=codigo_operacion_tauser,
                 tasa_garantizada_hasta=tasa_garantizada_hasta,
                 modalidad_tasa=modalidad_tasa, # Se mantiene la modalidad seleccionada
                 medio_pago_utilizado=tipo_medio_pago_stripe, # Asignar el medio de pago Stripe
@@ -901,7 +915,6 @@ def confirmar_operacion(request):
                 return redirect('core:iniciar_operacion')
 
             estado_inicial_flotante = 'pendiente_confirmacion_pago'
-            codigo_operacion_tauser = str(uuid.uuid4())[:10]
 
             medio_pago_utilizado_obj = None
             medio_acreditacion_utilizado_obj = None
@@ -992,7 +1005,6 @@ def confirmar_operacion(request):
                     tasa_cambio_aplicada=Decimal(operacion_pendiente['tasa_aplicada']),
                     comision_aplicada=Decimal(operacion_pendiente['comision_aplicada']),
                     comision_cotizacion=Decimal(operacion_pendiente['comision_cotizacion']), # Nuevo
-                    codigo_operacion_tauser=codigo_operacion_tauser,
                     tasa_garantizada_hasta=None, # No hay tasa garantizada para flotante
                     modalidad_tasa=modalidad_tasa,
                     medio_acreditacion_cliente=medio_acreditacion_para_transaccion, # Para compras
@@ -1014,7 +1026,6 @@ def confirmar_operacion(request):
                     tasa_cambio_aplicada=Decimal(operacion_pendiente['tasa_aplicada']),
                     comision_aplicada=Decimal(operacion_pendiente['comision_aplicada']),
                     comision_cotizacion=Decimal(operacion_pendiente['comision_cotizacion']), # Nuevo
-                    codigo_operacion_tauser=codigo_operacion_tauser,
                     tasa_garantizada_hasta=None,
                     modalidad_tasa=modalidad_tasa,
                     medio_pago_utilizado=medio_pago_utilizado_obj, # Para ventas
@@ -1175,7 +1186,6 @@ class VerificarOtpReservaView(LoginRequiredMixin, View):
                     return redirect('core:iniciar_operacion')
 
                 estado_inicial = 'pendiente_pago_cliente'
-                codigo_operacion_tauser = str(uuid.uuid4())[:10]
                 modalidad_tasa = 'bloqueada'
 
                 tasa_garantizada_hasta = None
@@ -1206,7 +1216,6 @@ class VerificarOtpReservaView(LoginRequiredMixin, View):
                     tasa_cambio_aplicada=Decimal(operacion_pendiente['tasa_aplicada']),
                     comision_aplicada=Decimal(operacion_pendiente['comision_aplicada']),
                     comision_cotizacion=Decimal(operacion_pendiente['comision_cotizacion']), # Nuevo
-                    codigo_operacion_tauser=codigo_operacion_tauser,
                     tasa_garantizada_hasta=tasa_garantizada_hasta,
                     modalidad_tasa=modalidad_tasa,
                     medio_pago_utilizado=medio_pago_cliente_obj.tipo if medio_pago_cliente_obj else None,
@@ -1273,7 +1282,8 @@ class ConfirmacionFinalPagoView(LoginRequiredMixin, TemplateView):
                     monto_origen_inicial,
                     transaccion.moneda_origen.codigo,
                     transaccion.moneda_destino.codigo,
-                    user=self.request.user
+                    user=self.request.user,
+                    ubicacion=UBICACION_MEJOR,
                 )
 
                 if resultado_simulacion_actualizada.get('error'):
@@ -1356,19 +1366,25 @@ class ConfirmacionFinalPagoView(LoginRequiredMixin, TemplateView):
             messages.error(request, "No hay una operación pendiente para confirmar.")
             return redirect('core:iniciar_operacion')
 
-        # Actualizar la transacción con los valores de la sesión
-        transaccion.monto_origen = Decimal(operacion_pendiente['monto_origen'])
-        transaccion.tasa_cambio_aplicada = Decimal(operacion_pendiente['tasa_aplicada'])
-        # Asegurar que monto_destino y comision_aplicada siempre se actualicen con los valores de la sesión
-        transaccion.monto_destino = Decimal(operacion_pendiente['monto_recibido'])
-        transaccion.comision_aplicada = Decimal(operacion_pendiente['comision_aplicada'])
-        # Usar .get con un valor por defecto para evitar KeyError en caso de que no exista (ej. transacciones antiguas)
-        transaccion.comision_cotizacion = Decimal(operacion_pendiente.get('comision_cotizacion', '0.0'))
+        # Valores de la sesión; monto_destino y comision_aplicada siempre se actualizan
+        montos = {
+            'monto_origen': Decimal(operacion_pendiente['monto_origen']),
+            'tasa_cambio_aplicada': Decimal(operacion_pendiente['tasa_aplicada']),
+            'monto_destino': Decimal(operacion_pendiente['monto_recibido']),
+            'comision_aplicada': Decimal(operacion_pendiente['comision_aplicada']),
+            # Usar .get con un valor por defecto para evitar KeyError en caso de que no exista (ej. transacciones antiguas)
+            'comision_cotizacion': Decimal(operacion_pendiente.get('comision_cotizacion', '0.0')),
+        }
 
         # --- NEW LOGIC FOR COMPRA WITH TASA FLOTANTE ---
         if transaccion.tipo_operacion == 'compra' and transaccion.modalidad_tasa == 'flotante':
-            transaccion.estado = 'pendiente_pago_cliente' # Set the correct state
-            transaccion.save() # Save the transaction with the new state
+            # Montos y nuevo estado en un único UPDATE condicional (ver transacciones.estados)
+            resultado = transicionar(
+                transaccion, 'pendiente_pago_cliente', desde={'pendiente_confirmacion_pago'}, campos=montos,
+            )
+            if not resultado:
+                messages.error(request, f"La operación {transaccion.codigo_operacion_tauser} cambió de estado ({transaccion.get_estado_display()}) y no puede confirmarse.")
+                return redirect('core:detalle_transaccion', transaccion_id=transaccion.id)
             messages.success(request, "Operación registrada. Por favor, realiza el pago en el tauser.")
             request.session.pop('operacion_pendiente', None) # Clear session data
             # Redirect to a page showing the transaction status, e.g., detail or history
@@ -1376,7 +1392,14 @@ class ConfirmacionFinalPagoView(LoginRequiredMixin, TemplateView):
         # --- END NEW LOGIC ---
         else:
             # Existing logic for other cases (e.g., venta flotante, tasa bloqueada)
-            transaccion.save() # Save the updated amounts for these cases
+            for campo, valor in montos.items():
+                setattr(transaccion, campo, valor)
+            try:
+                # auto_now sólo se aplica a los campos listados en update_fields.
+                transaccion.save(update_fields=[*montos, 'fecha_actualizacion'])
+            except ConflictoVersion:
+                messages.error(request, f"La operación {transaccion.codigo_operacion_tauser} fue modificada mientras la confirmabas. Revisa su estado.")
+                return redirect('core:detalle_transaccion', transaccion_id=transaccion.id)
             messages.success(request, "Operación actualizada con la tasa de cambio actual. Procediendo al pago.")
             return redirect('transacciones:iniciar_pago', transaccion_id=transaccion_id)
 
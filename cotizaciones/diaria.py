@@ -0,0 +1,194 @@
+# cotizaciones/diaria.py
+"""
+Resumen diario de cotizaciones
+==============================
+
+.. module:: cotizaciones.diaria
+   :synopsis: Mantenimiento incremental y reconstrucción de :class:`~cotizaciones.models.CotizacionDiaria`.
+
+``api_serie`` grafica un punto por día. En vez de agrupar los
+:class:`~cotizaciones.models.CotizacionHistorica` de todo el rango en cada
+pedido, cada histórico nuevo se acumula en la fila de su par y día local
+(:func:`acumular_en_diaria`, llamada desde :mod:`cotizaciones.signals`, o
+:func:`acumular_lote_en_diaria` para las actualizaciones en lote de
+:mod:`cotizaciones.lote`).
+Todo cambio del resumen invalida las series cacheadas de ``api_serie``
+(:func:`cotizaciones.series.invalidar_series`).
+
+Los históricos que se cargan o mueven sin pasar por las señales (``bulk_create``,
+``update``) se resumen con :func:`reconstruir_diaria`, que recorre el rango con
+predicados ``fecha >= inicio AND fecha < fin`` sobre ``idx_hist_pair_fecha``.
+
+Los días anteriores a la última compactación (:mod:`cotizaciones.retencion`)
+sólo conservan un histórico por hora o por día: reconstruirlos reemplazaría el
+OHLC real por el cierre. Por eso :func:`reconstruir_diaria` empieza, salvo que
+se pida lo contrario, en :func:`primer_dia_completo`.
+"""
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import CompactacionHistorica, CotizacionDiaria, CotizacionHistorica
+from .series import invalidar_series
+
+FILAS_POR_INSERT = 500
+
+
+def totales(historico):
+    """``(total_compra, total_venta)`` de un histórico."""
+    return (historico.valor_compra - historico.comision_compra,
+            historico.valor_venta + historico.comision_venta)
+
+
+def inicio_del_dia(dia):
+    """Comienzo del día local ``dia`` como ``datetime`` con zona horaria."""
+    return timezone.make_aware(datetime.datetime.combine(dia, datetime.time.min))
+
+
+def acumular_en_diaria(historico):
+    """
+    Suma un :class:`~cotizaciones.models.CotizacionHistorica` a la fila de su día.
+
+    La fila se bloquea con ``select_for_update``; si dos procesos crean la misma
+    fila a la vez, el que pierde la restricción única la relee y acumula.
+    """
+    dia = timezone.localdate(historico.fecha)
+    compra, venta = totales(historico)
+    filtro = dict(moneda_base_id=historico.moneda_base_id,
+                  moneda_destino_id=historico.moneda_destino_id, dia=dia)
+
+    with transaction.atomic():
+        fila = CotizacionDiaria.objects.select_for_update().filter(**filtro).first()
+        if fila is None:
+            try:
+                with transaction.atomic():
+                    CotizacionDiaria.desde_muestra(
+                        historico.moneda_base_id, historico.moneda_destino_id,
+                        dia, historico.fecha, compra, venta,
+                    ).save(force_insert=True)
+                invalidar_series()
+                return
+            except IntegrityError:
+                fila = CotizacionDiaria.objects.select_for_update().get(**filtro)
+        fila.agregar(historico.fecha, compra, venta)
+        fila.save()
+        invalidar_series()
+
+
+def acumular_lote_en_diaria(historicos):
+    """
+    Versión en lote de :func:`acumular_en_diaria` para históricos creados con ``bulk_create``.
+
+    Bloquea de una vez las filas de los pares y días involucrados, acumula en
+    memoria y escribe con un ``bulk_update`` y un ``bulk_create``; las series se
+    invalidan una sola vez.
+    """
+    historicos = sorted(historicos, key=lambda h: h.fecha)
+    if not historicos:
+        return
+    claves = {(h.moneda_base_id, h.moneda_destino_id, timezone.localdate(h.fecha)) for h in historicos}
+
+    with transaction.atomic():
+        filas = {
+            (f.moneda_base_id, f.moneda_destino_id, f.dia): f
+            for f in CotizacionDiaria.objects.select_for_update().filter(
+                moneda_destino_id__in={c[1] for c in claves}, dia__in={c[2] for c in claves},
+            )
+            if (f.moneda_base_id, f.moneda_destino_id, f.dia) in claves
+        }
+        existentes = set(filas)
+        for historico in historicos:
+            clave = (historico.moneda_base_id, historico.moneda_destino_id, timezone.localdate(historico.fecha))
+            compra, venta = totales(historico)
+            if clave in filas:
+                filas[clave].agregar(historico.fecha, compra, venta)
+            else:
+                filas[clave] = CotizacionDiaria.desde_muestra(*clave, historico.fecha, compra, venta)
+
+        campos = [f.name for f in CotizacionDiaria._meta.concrete_fields
+                  if f.name not in ("id", "moneda_base", "moneda_destino", "dia")]
+        CotizacionDiaria.objects.bulk_update([filas[c] for c in existentes], campos)
+        nuevas = set(filas) - existentes
+        if not nuevas:
+            invalidar_series()
+            return
+        try:
+            with transaction.atomic():
+                CotizacionDiaria.objects.bulk_create([filas[c] for c in nuevas])
+        except IntegrityError:
+            # Otro proceso creó alguna de las filas mientras tanto: esas muestras se acumulan de a una.
+            for historico in historicos:
+                if (historico.moneda_base_id, historico.moneda_destino_id,
+                        timezone.localdate(historico.fecha)) in nuevas:
+                    acumular_en_diaria(historico)
+        invalidar_series()
+
+
+def primer_dia_completo():
+    """
+    Primer día local cuyos históricos siguen completos, según la última
+    :class:`~cotizaciones.models.CompactacionHistorica`; ``None`` si nunca se compactó.
+    """
+    corte = CompactacionHistorica.objects.aggregate(corte=Max("completas_desde"))["corte"]
+    return timezone.localdate(corte) if corte else None
+
+
+def reconstruir_diaria(desde=None, hasta=None, incluir_compactados=False):
+    """
+    Recalcula las filas diarias de ``desde`` a ``hasta`` (días locales, inclusive).
+
+    Sin límites se reconstruye todo lo que no fue compactado. Las filas del rango
+    se borran y se vuelven a crear recorriendo los históricos ordenados por par y
+    fecha, sin cargar el rango completo en memoria.
+
+    :param bool incluir_compactados: Reconstruye también los días anteriores a
+        :func:`primer_dia_completo`, con los históricos compactados (el OHLC de
+        esos días queda reducido a los cierres por hora o por día).
+    :returns: Cantidad de filas diarias creadas.
+    :rtype: int
+    """
+    if not incluir_compactados:
+        completo = primer_dia_completo()
+        if completo and (desde is None or desde < completo):
+            desde = completo
+        if desde and hasta and desde > hasta:
+            return 0
+
+    historicos = CotizacionHistorica.objects.order_by("moneda_base_id", "moneda_destino_id", "fecha")
+    diarias = CotizacionDiaria.objects.all()
+    if desde:
+        historicos = historicos.filter(fecha__gte=inicio_del_dia(desde))
+        diarias = diarias.filter(dia__gte=desde)
+    if hasta:
+        historicos = historicos.filter(fecha__lt=inicio_del_dia(hasta + datetime.timedelta(days=1)))
+        diarias = diarias.filter(dia__lte=hasta)
+
+    creadas = 0
+    pendientes = []
+    actual = None
+    with transaction.atomic():
+        diarias.delete()
+        for historico in historicos.iterator(chunk_size=2000):
+            dia = timezone.localdate(historico.fecha)
+            compra, venta = totales(historico)
+            if (actual is not None and actual.dia == dia
+                    and actual.moneda_base_id == historico.moneda_base_id
+                    and actual.moneda_destino_id == historico.moneda_destino_id):
+                actual.agregar(historico.fecha, compra, venta)
+                continue
+            actual = CotizacionDiaria.desde_muestra(
+                historico.moneda_base_id, historico.moneda_destino_id,
+                dia, historico.fecha, compra, venta,
+            )
+            pendientes.append(actual)
+            # La última fila puede seguir recibiendo muestras: se guarda en la próxima tanda.
+            if len(pendientes) > FILAS_POR_INSERT:
+                CotizacionDiaria.objects.bulk_create(pendientes[:-1])
+                creadas += len(pendientes) - 1
+                pendientes = pendientes[-1:]
+        CotizacionDiaria.objects.bulk_create(pendientes)
+        creadas += len(pendientes)
+        invalidar_series()
+    return creadas
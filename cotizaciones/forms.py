@@ -30,4 +30,17 @@ class CotizacionForm(forms.ModelForm):
                 'step': '0.0001', 
                 'onchange': 'calcularTotales()'
             }),
-        }
\ No newline at end of file
+        }
+
+class CotizacionLoteForm(forms.ModelForm):
+    """Fila del formulario de edición en lote: sólo valores y comisiones."""
+    class Meta:
+        model = Cotizacion
+        fields = ['valor_compra', 'comision_compra', 'valor_venta', 'comision_venta']
+        widgets = {
+            campo: forms.NumberInput(attrs={'class': 'form-control', 'step': '0.0001'})
+            for campo in fields
+        }
+
+
+CotizacionLoteFormSet = forms.modelformset_factory(Cotizacion, form=CotizacionLoteForm, extra=0)
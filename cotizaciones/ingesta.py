@@ -0,0 +1,312 @@
+# cotizaciones/ingesta.py
+"""
+Ingesta programada de cotizaciones externas
+===========================================
+
+.. module:: cotizaciones.ingesta
+   :synopsis: Proveedores de tasas, circuit breaker y staging en :class:`~cotizaciones.models.CotizacionExterna`.
+
+Una tarea periódica de Celery (``cotizaciones.tasks.ingerir_cotizaciones_task``)
+llama a :func:`ingerir_cotizaciones`, que:
+
+1. Pide al proveedor configurado **todas** las monedas de una vez, reutilizando
+   una única sesión HTTP con pool de conexiones (:func:`sesion_http`).
+2. Guarda los valores válidos en la tabla de staging. Las monedas sin dato o un
+   proveedor caído no borran nada: queda el último valor conocido bueno con el
+   error registrado.
+3. Cuenta los fallos en un :class:`CircuitBreaker` compartido por caché; con el
+   circuito abierto no se consulta al proveedor hasta que pase el enfriamiento.
+
+Configuración (``settings.COTIZACIONES_INGESTA``):
+
+- ``PROVEEDOR``: ruta a la clase del proveedor (:class:`ProveedorCurrencyApi`
+  por defecto, :class:`ProveedorArchivo` para correr sin red).
+- ``ARCHIVO``: JSON que lee :class:`ProveedorArchivo`.
+- ``TIMEOUT``, ``INTERVALO_MINUTOS``, ``UMBRAL_FALLOS``, ``ENFRIAMIENTO_SEGUNDOS``
+  y ``VIGENCIA_MINUTOS`` (antigüedad a partir de la cual un valor se informa como
+  desactualizado).
+"""
+import json
+import logging
+import time
+from decimal import Decimal, InvalidOperation
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from monedas.models import Moneda
+from .models import CotizacionExterna
+
+logger = logging.getLogger(__name__)
+
+BASE_CODIGO = "PYG"
+
+CONFIG_POR_DEFECTO = {
+    "PROVEEDOR": "cotizaciones.ingesta.ProveedorCurrencyApi",
+    "ARCHIVO": "",
+    "TIMEOUT": 10,
+    "INTERVALO_MINUTOS": 15,
+    "UMBRAL_FALLOS": 3,
+    "ENFRIAMIENTO_SEGUNDOS": 600,
+    "VIGENCIA_MINUTOS": 60,
+}
+
+
+def configuracion():
+    """``settings.COTIZACIONES_INGESTA`` completado con :data:`CONFIG_POR_DEFECTO`."""
+    return {**CONFIG_POR_DEFECTO, **getattr(settings, "COTIZACIONES_INGESTA", {})}
+
+
+class ErrorProveedor(Exception):
+    """El proveedor no pudo entregar tasas (red, formato, archivo)."""
+
+
+# ---------- Proveedores ----------
+
+class ProveedorTasas:
+    """
+    Interfaz de un proveedor de tasas.
+
+    :meth:`obtener` recibe los códigos de las monedas destino y devuelve
+    ``{codigo: (valor_compra, valor_venta)}`` en unidades de :data:`BASE_CODIGO`
+    por unidad de la moneda. Los códigos sin dato simplemente no aparecen; un
+    fallo total se informa con :class:`ErrorProveedor`.
+    """
+    nombre = ""
+
+    def __init__(self, config):
+        self.config = config
+
+    def obtener(self, codigos):
+        raise NotImplementedError
+
+
+_sesion = None
+
+
+def sesion_http():
+    """Sesión HTTP del proceso, con pool de conexiones y reintentos ante errores transitorios."""
+    global _sesion
+    if _sesion is None:
+        sesion = requests.Session()
+        reintentos = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504),
+                           allowed_methods=("GET",))
+        sesion.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=reintentos))
+        _sesion = sesion
+    return _sesion
+
+
+class ProveedorCurrencyApi(ProveedorTasas):
+    """
+    `currency-api <https://github.com/fawazahmed0/currency-api>`_ (sin clave).
+
+    Un solo pedido trae todas las monedas expresadas por unidad de PYG; se
+    invierten para obtener PYG por unidad. Compra y venta son el mismo valor
+    (la API no distingue).
+    """
+    nombre = "currency-api"
+    URL = "https://cdn.jsdelivr.net/gh/fawazahmed0/currency-api@1/latest/currencies/pyg.json"
+
+    def obtener(self, codigos):
+        try:
+            response = sesion_http().get(self.URL, timeout=self.config["TIMEOUT"])
+            response.raise_for_status()
+            tasas = response.json()["pyg"]
+        except (requests.RequestException, ValueError, KeyError) as exc:
+            raise ErrorProveedor(f"{self.nombre}: {exc}") from exc
+
+        valores = {}
+        for codigo in codigos:
+            try:
+                por_pyg = Decimal(str(tasas[codigo.lower()]))
+            except (KeyError, TypeError, InvalidOperation):
+                continue
+            if por_pyg > 0:
+                valor = (1 / por_pyg).quantize(Decimal("0.0001"))
+                valores[codigo] = (valor, valor)
+        return valores
+
+
+class ProveedorArchivo(ProveedorTasas):
+    """
+    Tasas desde un JSON local, para correr sin red (tests, desarrollo).
+
+    Acepta el formato de fixture de :class:`~cotizaciones.models.Cotizacion`
+    (``cotizaciones/fixtures/tasas.json``) o un mapa simple
+    ``{"USD": {"compra": 7200, "venta": 7300}}``.
+    """
+    nombre = "archivo"
+
+    def obtener(self, codigos):
+        ruta = self.config["ARCHIVO"]
+        try:
+            with open(ruta, encoding="utf-8") as archivo:
+                datos = json.load(archivo)
+        except (OSError, ValueError) as exc:
+            raise ErrorProveedor(f"{self.nombre}: {exc}") from exc
+
+        if isinstance(datos, list):
+            datos = {
+                d["fields"]["moneda_destino"]: {"compra": d["fields"]["valor_compra"],
+                                                "venta": d["fields"]["valor_venta"]}
+                for d in datos
+                if d.get("model") == "cotizaciones.cotizacion"
+                and d["fields"].get("moneda_base", BASE_CODIGO) == BASE_CODIGO
+            }
+
+        valores = {}
+        for codigo in codigos:
+            fila = datos.get(codigo)
+            if fila is None:
+                continue
+            try:
+                valores[codigo] = (Decimal(str(fila["compra"])), Decimal(str(fila["venta"])))
+            except (KeyError, TypeError, InvalidOperation):
+                continue
+        return valores
+
+
+def proveedor_configurado(config=None):
+    config = config or configuracion()
+    return import_string(config["PROVEEDOR"])(config)
+
+
+# ---------- Circuit breaker ----------
+
+class CircuitBreaker:
+    """
+    Circuit breaker compartido entre procesos a través de la caché.
+
+    Tras ``umbral`` fallos seguidos se abre durante ``enfriamiento`` segundos;
+    luego se permite un intento (semiabierto): si sale bien se cierra y si falla
+    vuelve a abrirse.
+    """
+    CLAVE = "cotizaciones:ingesta:circuito"
+
+    def __init__(self, umbral, enfriamiento):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+
+    def estado(self):
+        return cache.get(self.CLAVE) or {"fallos": 0, "abierto_hasta": 0}
+
+    def permite(self):
+        return time.time() >= self.estado()["abierto_hasta"]
+
+    def registrar_exito(self):
+        cache.delete(self.CLAVE)
+
+    def registrar_fallo(self):
+        estado = self.estado()
+        estado["fallos"] += 1
+        if estado["fallos"] >= self.umbral:
+            estado["abierto_hasta"] = time.time() + self.enfriamiento
+        cache.set(self.CLAVE, estado, None)
+        return estado
+
+
+def circuito(config=None):
+    config = config or configuracion()
+    return CircuitBreaker(config["UMBRAL_FALLOS"], config["ENFRIAMIENTO_SEGUNDOS"])
+
+
+# ---------- Ingesta ----------
+
+def ingerir_cotizaciones(proveedor=None):
+    """
+    Trae las tasas de todas las monedas (salvo la base) y actualiza el staging.
+
+    :param proveedor: Instancia de :class:`ProveedorTasas`; por defecto, el configurado.
+    :returns: Resumen con ``estado`` (``ok``, ``parcial``, ``error`` o ``circuito_abierto``),
+        ``actualizadas``, ``sin_dato`` y ``duracion_ms``.
+    :rtype: dict
+    """
+    config = configuracion()
+    proveedor = proveedor or proveedor_configurado(config)
+    breaker = circuito(config)
+    inicio = time.perf_counter()
+
+    if not breaker.permite():
+        logger.warning("Ingesta de cotizaciones omitida: circuito abierto.")
+        return {"estado": "circuito_abierto", "actualizadas": 0, "sin_dato": [], "duracion_ms": 0}
+
+    base = Moneda.objects.get(codigo=BASE_CODIGO)
+    monedas = {m.codigo: m for m in Moneda.objects.exclude(pk=base.pk)}
+    ahora = timezone.now()
+
+    try:
+        valores = proveedor.obtener(list(monedas))
+    except ErrorProveedor as exc:
+        estado = breaker.registrar_fallo()
+        logger.warning("Ingesta de cotizaciones fallida (%s fallos seguidos): %s", estado["fallos"], exc)
+        CotizacionExterna.objects.filter(moneda_base=base).update(intentado_en=ahora, error=str(exc)[:255])
+        return {"estado": "error", "actualizadas": 0, "sin_dato": sorted(monedas),
+                "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1)}
+    breaker.registrar_exito()
+
+    sin_dato = sorted(set(monedas) - set(valores))
+    with transaction.atomic():
+        existentes = {
+            e.moneda_destino_id: e
+            for e in CotizacionExterna.objects.select_for_update().filter(moneda_base=base)
+        }
+        nuevas, cambiadas = [], []
+        for codigo, (compra, venta) in valores.items():
+            fila = existentes.pop(monedas[codigo].pk, None)
+            if fila is None:
+                nuevas.append(CotizacionExterna(
+                    moneda_base=base, moneda_destino=monedas[codigo],
+                    valor_compra=compra, valor_venta=venta, proveedor=proveedor.nombre,
+                    obtenido_en=ahora, intentado_en=ahora,
+                ))
+                continue
+            fila.valor_compra, fila.valor_venta = compra, venta
+            fila.proveedor, fila.obtenido_en, fila.intentado_en, fila.error = proveedor.nombre, ahora, ahora, ""
+            cambiadas.append(fila)
+        # Sin dato en esta corrida: se conserva el último valor bueno.
+        for fila in existentes.values():
+            fila.intentado_en, fila.error = ahora, f"{proveedor.nombre}: sin dato"
+            cambiadas.append(fila)
+
+        CotizacionExterna.objects.bulk_create(nuevas)
+        CotizacionExterna.objects.bulk_update(
+            cambiadas,
+            ["valor_compra", "valor_venta", "proveedor", "obtenido_en", "intentado_en", "error"],
+        )
+
+    resumen = {
+        "estado": "parcial" if sin_dato else "ok",
+        "actualizadas": len(valores),
+        "sin_dato": sin_dato,
+        "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1),
+    }
+    logger.info("Ingesta de cotizaciones: %s", resumen)
+    return resumen
+
+
+def valores_ingestados(moneda_destino, base_codigo=BASE_CODIGO):
+    """
+    Último valor bueno del staging para ``moneda_destino``.
+
+    :returns: ``dict`` con ``valor_compra``, ``valor_venta``, ``proveedor``,
+        ``obtenido_en`` y ``desactualizado``, o ``None`` si nunca se obtuvo.
+    """
+    fila = (CotizacionExterna.objects
+            .filter(moneda_base__codigo=base_codigo, moneda_destino=moneda_destino)
+            .first())
+    if fila is None:
+        return None
+    vigencia = configuracion()["VIGENCIA_MINUTOS"]
+    return {
+        "valor_compra": fila.valor_compra,
+        "valor_venta": fila.valor_venta,
+        "proveedor": fila.proveedor,
+        "obtenido_en": fila.obtenido_en,
+        "desactualizado": timezone.now() - fila.obtenido_en > timezone.timedelta(minutes=vigencia),
+    }
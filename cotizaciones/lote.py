@@ -0,0 +1,120 @@
+# cotizaciones/lote.py
+"""
+Actualización en lote de cotizaciones
+=====================================
+
+.. module:: cotizaciones.lote
+   :synopsis: Actualiza muchas cotizaciones en una transacción con un único evento.
+
+Guardar cotizaciones de a una con ``save()`` escribe un histórico, acumula el
+resumen diario y lanza una notificación por cada par. :func:`actualizar_cotizaciones_en_lote`
+hace lo mismo para todo el tablero con:
+
+- un ``bulk_update`` de las cotizaciones que realmente cambiaron,
+- un ``bulk_create`` de sus históricos y una sola acumulación en el resumen
+  diario (:func:`cotizaciones.diaria.acumular_lote_en_diaria`),
+- una única señal :data:`cotizaciones.signals.tablero_actualizado` con la lista
+  de pares cambiados, enviada al confirmar la transacción.
+
+Como ``bulk_update`` no dispara ``post_save`` ni ``cotizacion_actualizada``, los
+receptores de ``tablero_actualizado`` se encargan de invalidar cachés y de
+notificar a los usuarios (ver ``core.signals`` y ``notificaciones.signals``).
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .diaria import acumular_lote_en_diaria
+from .models import Cotizacion, CotizacionHistorica
+from .signals import tablero_actualizado
+
+CAMPOS_VALORES = ("valor_compra", "comision_compra", "valor_venta", "comision_venta")
+
+
+def _decimal(campo, valor):
+    try:
+        valor = Decimal(str(valor))
+    except InvalidOperation:
+        raise ValidationError({campo: "Debe ser un número."})
+    if not valor.is_finite() or valor < 0:
+        raise ValidationError({campo: "Debe ser un número mayor o igual a 0."})
+    return valor
+
+
+def actualizar_cotizaciones_en_lote(cambios, fuente="lote"):
+    """
+    Aplica varios cambios de cotización en una sola transacción.
+
+    :param dict cambios: ``{cotizacion_id: {campo: valor}}`` con campos de
+        :data:`CAMPOS_VALORES`; los campos omitidos no se modifican.
+    :param str fuente: Valor de ``CotizacionHistorica.fuente`` de los históricos creados.
+    :returns: Un dict por par cambiado con ``cotizacion_id``, ``moneda``,
+        ``compra_cambio`` y ``venta_cambio``. Los pares sin cambios no se escriben.
+    :rtype: list
+    :raises ValidationError: Si un campo no existe o un valor no es un número ``>= 0``.
+    :raises Cotizacion.DoesNotExist: Si algún ``cotizacion_id`` no existe.
+    """
+    normalizados = {}
+    for cotizacion_id, valores in cambios.items():
+        desconocidos = set(valores) - set(CAMPOS_VALORES)
+        if desconocidos:
+            raise ValidationError(f"Campos no editables en lote: {', '.join(sorted(desconocidos))}.")
+        normalizados[int(cotizacion_id)] = {campo: _decimal(campo, v) for campo, v in valores.items()}
+    if not normalizados:
+        return []
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        cotizaciones = list(
+            Cotizacion.objects.select_for_update(of=("self",))
+            .select_related("moneda_base", "moneda_destino")
+            .filter(pk__in=normalizados)
+            .order_by("pk")
+        )
+        faltantes = set(normalizados) - {c.pk for c in cotizaciones}
+        if faltantes:
+            raise Cotizacion.DoesNotExist(f"Cotizaciones inexistentes: {sorted(faltantes)}.")
+
+        actualizadas, resultado = [], []
+        for cotizacion in cotizaciones:
+            for campo, valor in normalizados[cotizacion.pk].items():
+                setattr(cotizacion, campo, valor)
+            compra_cambio, venta_cambio = cotizacion.cambios_detectados()
+            if not (compra_cambio or venta_cambio):
+                continue
+            # ``auto_now`` no se aplica en ``bulk_update``.
+            cotizacion.fecha_actualizacion = ahora
+            actualizadas.append(cotizacion)
+            resultado.append({
+                "cotizacion_id": cotizacion.pk,
+                "moneda": cotizacion.moneda_destino.codigo,
+                "compra_cambio": compra_cambio,
+                "venta_cambio": venta_cambio,
+            })
+        if not actualizadas:
+            return []
+
+        Cotizacion.objects.bulk_update(actualizadas, [*CAMPOS_VALORES, "fecha_actualizacion"])
+        historicos = CotizacionHistorica.objects.bulk_create([
+            CotizacionHistorica(
+                moneda_base_id=c.moneda_base_id,
+                moneda_destino_id=c.moneda_destino_id,
+                valor_compra=c.valor_compra,
+                comision_compra=c.comision_compra,
+                valor_venta=c.valor_venta,
+                comision_venta=c.comision_venta,
+                fecha=ahora,
+                fuente=fuente,
+            )
+            for c in actualizadas
+        ])
+        acumular_lote_en_diaria(historicos)
+        for cotizacion in actualizadas:
+            cotizacion.fijar_originales()
+
+        transaction.on_commit(lambda: tablero_actualizado.send(
+            sender=Cotizacion, cotizaciones=actualizadas, cambios=resultado,
+        ))
+    return resultado
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cotizaciones.retencion import compactar_historicos, politica
+
+
+class Command(BaseCommand):
+    help = (
+        "Compacta CotizacionHistorica según la política de retención "
+        "(settings.COTIZACIONES_RETENCION): completos los últimos días, uno por hora "
+        "hasta DIAS_HORARIOS y uno por día para lo más viejo."
+    )
+
+    def add_arguments(self, parser):
+        config = politica()
+        parser.add_argument(
+            "--dias-completos",
+            type=int,
+            default=config["DIAS_COMPLETOS"],
+            help=f"Días recientes que se conservan completos. Por defecto: {config['DIAS_COMPLETOS']}.",
+        )
+        parser.add_argument(
+            "--dias-horarios",
+            type=int,
+            default=config["DIAS_HORARIOS"],
+            help=f"Hasta cuántos días atrás se deja una fila por hora. Por defecto: {config['DIAS_HORARIOS']}.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Muestra cuántas filas se recuperarían, pero SIN modificar la base de datos.",
+        )
+
+    def handle(self, *args, **options):
+        if options["dias_completos"] < 0 or options["dias_horarios"] < options["dias_completos"]:
+            raise CommandError("Se requiere 0 <= --dias-completos <= --dias-horarios.")
+
+        resumen = compactar_historicos(
+            simular=options["dry_run"],
+            DIAS_COMPLETOS=options["dias_completos"],
+            DIAS_HORARIOS=options["dias_horarios"],
+        )
+
+        prefijo = "[DRY-RUN] " if resumen["simulacion"] else ""
+        self.stdout.write(
+            f"{prefijo}Completos desde {resumen['completas_desde']:%Y-%m-%d}, "
+            f"uno por hora desde {resumen['horarias_desde']:%Y-%m-%d}."
+        )
+        for nivel, detalle in resumen["por_nivel"].items():
+            self.stdout.write(
+                f"  - por {nivel}: {detalle['leidas']} leídas, {detalle['borradas']} borradas, "
+                f"{detalle['creadas']} creadas"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefijo}Filas recuperadas: {resumen['recuperadas']} ({resumen['duracion_ms']} ms)."
+        ))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from cotizaciones.diaria import primer_dia_completo, reconstruir_diaria
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el resumen diario (CotizacionDiaria) a partir de CotizacionHistorica.\n"
+        "Usar después de cargar o mover históricos sin pasar por las señales "
+        "(bulk_create, update) o para el llenado inicial.\n"
+        "Los días ya compactados (ver compactar_cotizaciones_historicas) se omiten: "
+        "sus históricos no alcanzan para recalcular apertura, máximo, mínimo y promedio."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--desde",
+            help="Primer día a reconstruir (YYYY-MM-DD). Por defecto: desde el principio.",
+        )
+        parser.add_argument(
+            "--hasta",
+            help="Último día a reconstruir (YYYY-MM-DD). Por defecto: hasta el final.",
+        )
+        parser.add_argument(
+            "--incluir-compactados",
+            action="store_true",
+            help="Reconstruye también los días compactados; su OHLC queda reducido a los cierres.",
+        )
+
+    def _fecha(self, valor, nombre):
+        if not valor:
+            return None
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise CommandError(f"--{nombre} inválido: {valor!r} (formato YYYY-MM-DD).")
+        return fecha
+
+    def handle(self, *args, **options):
+        desde = self._fecha(options["desde"], "desde")
+        hasta = self._fecha(options["hasta"], "hasta")
+        if desde and hasta and desde > hasta:
+            raise CommandError("--desde no puede ser posterior a --hasta.")
+
+        incluir = options["incluir_compactados"]
+        completo = primer_dia_completo()
+        if completo and not incluir and (desde is None or desde < completo):
+            self.stdout.write(self.style.WARNING(
+                f"Se omiten los días anteriores a {completo:%Y-%m-%d} (compactados); "
+                "usar --incluir-compactados para reconstruirlos igual."
+            ))
+
+        creadas = reconstruir_diaria(desde, hasta, incluir_compactados=incluir)
+        self.stdout.write(self.style.SUCCESS(f"Resumen diario reconstruido: {creadas} filas."))
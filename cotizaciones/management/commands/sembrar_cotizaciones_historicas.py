@@ -6,6 +6,7 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.utils import timezone
 
+from cotizaciones.diaria import reconstruir_diaria
 from cotizaciones.models import Cotizacion, CotizacionHistorica
 
 
@@ -307,10 +308,13 @@ class Command(BaseCommand):
                 )
             )
         else:
+            # bulk_create no dispara señales: rehacer el resumen diario del rango
+            diarias = reconstruir_diaria(start_date, end_date)
             self.stdout.write(
                 self.style.SUCCESS(
                     f"\nSiembra completada.\n"
                     f"  Cotizaciones históricas creadas: {total_creadas}\n"
                     f"  Cotizaciones históricas borradas (si clear-year): {total_borradas}\n"
+                    f"  Días resumidos en CotizacionDiaria: {diarias}\n"
                 )
             )
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:40
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def _fila_diaria(CotizacionDiaria, base_id, destino_id, dia, muestras):
+    """Fila OHLC de un día a partir de ``[(fecha, compra, venta), ...]`` ordenadas por fecha."""
+    compras = [compra for _, compra, _ in muestras]
+    ventas = [venta for _, _, venta in muestras]
+    cuatro = Decimal("0.0001")
+    return CotizacionDiaria(
+        moneda_base_id=base_id, moneda_destino_id=destino_id, dia=dia,
+        compra_apertura=compras[0], compra_maximo=max(compras), compra_minimo=min(compras),
+        compra_cierre=compras[-1], compra_suma=sum(compras),
+        compra_promedio=(sum(compras) / len(compras)).quantize(cuatro),
+        venta_apertura=ventas[0], venta_maximo=max(ventas), venta_minimo=min(ventas),
+        venta_cierre=ventas[-1], venta_suma=sum(ventas),
+        venta_promedio=(sum(ventas) / len(ventas)).quantize(cuatro),
+        muestras=len(muestras), apertura_fecha=muestras[0][0], cierre_fecha=muestras[-1][0],
+    )
+
+
+def poblar_diarias(apps, schema_editor):
+    """
+    Agrega los históricos existentes en filas diarias, para que ``api_serie`` no
+    quede sin datos hasta correr ``reconstruir_cotizaciones_diarias`` a mano.
+
+    Mismo cálculo que ``cotizaciones.diaria.reconstruir_diaria``, copiado aquí
+    sobre los modelos históricos para que cambios futuros no alteren la migración.
+    """
+    CotizacionHistorica = apps.get_model("cotizaciones", "CotizacionHistorica")
+    CotizacionDiaria = apps.get_model("cotizaciones", "CotizacionDiaria")
+
+    historicos = (
+        CotizacionHistorica.objects
+        .order_by("moneda_base_id", "moneda_destino_id", "fecha")
+        .values_list("moneda_base_id", "moneda_destino_id", "fecha",
+                     "valor_compra", "comision_compra", "valor_venta", "comision_venta")
+    )
+    pendientes, clave, muestras = [], None, []
+    for base_id, destino_id, fecha, v_compra, c_compra, v_venta, c_venta in historicos.iterator(chunk_size=2000):
+        actual = (base_id, destino_id, timezone.localdate(fecha))
+        if actual != clave:
+            if muestras:
+                pendientes.append(_fila_diaria(CotizacionDiaria, *clave, muestras))
+            clave, muestras = actual, []
+        muestras.append((fecha, v_compra - c_compra, v_venta + c_venta))
+        if len(pendientes) >= 500:
+            CotizacionDiaria.objects.bulk_create(pendientes)
+            pendientes = []
+    if muestras:
+        pendientes.append(_fila_diaria(CotizacionDiaria, *clave, muestras))
+    CotizacionDiaria.objects.bulk_create(pendientes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0005_cotizacionhistorica'),
+        ('monedas', '0011_alter_tedinventario_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CotizacionDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('compra_apertura', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('compra_maximo', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('compra_minimo', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('compra_cierre', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('compra_promedio', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('compra_suma', models.DecimalField(decimal_places=4, max_digits=20)),
+                ('venta_apertura', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('venta_maximo', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('venta_minimo', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('venta_cierre', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('venta_promedio', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('venta_suma', models.DecimalField(decimal_places=4, max_digits=20)),
+                ('muestras', models.PositiveIntegerField(default=0)),
+                ('apertura_fecha', models.DateTimeField()),
+                ('cierre_fecha', models.DateTimeField()),
+                ('moneda_base', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='diaria_base', to='monedas.moneda')),
+                ('moneda_destino', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='diaria_destino', to='monedas.moneda')),
+            ],
+            options={
+                'verbose_name': 'Cotización diaria',
+                'verbose_name_plural': 'Cotizaciones diarias',
+                'constraints': [models.UniqueConstraint(fields=('moneda_base', 'moneda_destino', 'dia'), name='uniq_diaria_pair_dia')],
+            },
+        ),
+        migrations.RunPython(poblar_diarias, migrations.RunPython.noop),
+    ]
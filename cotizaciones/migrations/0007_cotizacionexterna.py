@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0006_cotizaciondiaria'),
+        ('monedas', '0011_alter_tedinventario_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CotizacionExterna',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor_compra', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('valor_venta', models.DecimalField(decimal_places=4, max_digits=18)),
+                ('proveedor', models.CharField(max_length=40)),
+                ('obtenido_en', models.DateTimeField(help_text='Fecha del último valor válido.')),
+                ('intentado_en', models.DateTimeField(help_text='Fecha del último intento, exitoso o no.')),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+                ('moneda_base', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='externa_base', to='monedas.moneda')),
+                ('moneda_destino', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='externa_destino', to='monedas.moneda')),
+            ],
+            options={
+                'verbose_name': 'Cotización externa',
+                'verbose_name_plural': 'Cotizaciones externas',
+                'constraints': [models.UniqueConstraint(fields=('moneda_base', 'moneda_destino'), name='uniq_externa_pair')],
+            },
+        ),
+    ]
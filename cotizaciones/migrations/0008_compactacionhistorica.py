@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones', '0007_cotizacionexterna'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompactacionHistorica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ejecutada_en', models.DateTimeField(auto_now_add=True)),
+                ('completas_desde', models.DateTimeField()),
+                ('horarias_desde', models.DateTimeField()),
+                ('filas_leidas', models.PositiveIntegerField(default=0)),
+                ('filas_borradas', models.PositiveIntegerField(default=0)),
+                ('filas_creadas', models.PositiveIntegerField(default=0)),
+                ('duracion_ms', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Compactación de históricos',
+                'verbose_name_plural': 'Compactaciones de históricos',
+                'ordering': ['-ejecutada_en'],
+            },
+        ),
+    ]
@@ -1,3 +1,4 @@
+from decimal import Decimal
 from django.db import models
 from monedas.models import Moneda
 from django.core.validators import MinValueValidator
@@ -35,6 +36,32 @@ class Cotizacion(models.Model):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Guardar los valores originales para comparar en save()
+        self.fijar_originales()
+
+    def cambios_detectados(self):
+        """``(compra_cambio, venta_cambio)`` respecto de los valores originales de la instancia."""
+        # Un cambio en la compra ocurre si el valor base O la comisión cambian.
+        compra_cambio = (self.valor_compra != self.__original_valor_compra or
+                         self.comision_compra != self.__original_comision_compra)
+        # Un cambio en la venta ocurre si el valor base O la comisión cambian.
+        venta_cambio = (self.valor_venta != self.__original_valor_venta or
+                        self.comision_venta != self.__original_comision_venta)
+        return compra_cambio, venta_cambio
+
+    def totales_originales(self):
+        """
+        ``(total_compra, total_venta)`` con los valores originales de la instancia;
+        ``None`` en el lado que no tenía valores (instancia nueva).
+        """
+        compra = venta = None
+        if self.__original_valor_compra is not None and self.__original_comision_compra is not None:
+            compra = self.__original_valor_compra - self.__original_comision_compra
+        if self.__original_valor_venta is not None and self.__original_comision_venta is not None:
+            venta = self.__original_valor_venta + self.__original_comision_venta
+        return compra, venta
+
+    def fijar_originales(self):
+        """Toma los valores actuales como originales (tras guardarlos sin ``save()``)."""
         self.__original_valor_venta = self.valor_venta
         self.__original_comision_venta = self.comision_venta
         self.__original_valor_compra = self.valor_compra
@@ -43,14 +70,8 @@ class Cotizacion(models.Model):
     def save(self, *args, **kwargs):
         # Lógica para detectar cambio y enviar señal
         super().save(*args, **kwargs) # Guardar primero
-        
-        # Un cambio en la venta ocurre si el valor base O la comisión cambian.
-        venta_cambio = (self.valor_venta != self.__original_valor_venta or 
-                        self.comision_venta != self.__original_comision_venta)
-        
-        # Un cambio en la compra ocurre si el valor base O la comisión cambian.
-        compra_cambio = (self.valor_compra != self.__original_valor_compra or
-                         self.comision_compra != self.__original_comision_compra)
+
+        compra_cambio, venta_cambio = self.cambios_detectados()
 
         if venta_cambio or compra_cambio:
             from .signals import cotizacion_actualizada
@@ -80,4 +101,141 @@ class CotizacionHistorica(models.Model):
         verbose_name_plural = "Cotizaciones históricas"
 
     def __str__(self):
-        return f"{self.moneda_base.codigo}->{self.moneda_destino.codigo} @ {self.fecha:%Y-%m-%d %H:%M}"
\ No newline at end of file
+        return f"{self.moneda_base.codigo}->{self.moneda_destino.codigo} @ {self.fecha:%Y-%m-%d %H:%M}"
+
+class CotizacionDiaria(models.Model):
+    """
+    Resumen diario (OHLC) de :class:`CotizacionHistorica` por par y día local.
+
+    Los valores son **totales** (``total_compra = valor_compra - comision_compra``,
+    ``total_venta = valor_venta + comision_venta``), los mismos que grafica
+    ``api_serie``. Se mantiene de forma incremental al registrar cada histórico
+    (ver :mod:`cotizaciones.diaria`) y se reconstruye con el comando
+    ``reconstruir_cotizaciones_diarias``.
+
+    ``apertura_fecha`` y ``cierre_fecha`` son la fecha del primer y del último
+    histórico del día, para que un registro fuera de orden no pise la apertura o
+    el cierre. El promedio es ``suma / muestras``.
+    """
+    moneda_base = models.ForeignKey(Moneda, on_delete=models.PROTECT, related_name='diaria_base')
+    moneda_destino = models.ForeignKey(Moneda, on_delete=models.PROTECT, related_name='diaria_destino')
+    dia = models.DateField()
+
+    compra_apertura = models.DecimalField(max_digits=12, decimal_places=4)
+    compra_maximo = models.DecimalField(max_digits=12, decimal_places=4)
+    compra_minimo = models.DecimalField(max_digits=12, decimal_places=4)
+    compra_cierre = models.DecimalField(max_digits=12, decimal_places=4)
+    compra_promedio = models.DecimalField(max_digits=12, decimal_places=4)
+    compra_suma = models.DecimalField(max_digits=20, decimal_places=4)
+
+    venta_apertura = models.DecimalField(max_digits=12, decimal_places=4)
+    venta_maximo = models.DecimalField(max_digits=12, decimal_places=4)
+    venta_minimo = models.DecimalField(max_digits=12, decimal_places=4)
+    venta_cierre = models.DecimalField(max_digits=12, decimal_places=4)
+    venta_promedio = models.DecimalField(max_digits=12, decimal_places=4)
+    venta_suma = models.DecimalField(max_digits=20, decimal_places=4)
+
+    muestras = models.PositiveIntegerField(default=0)
+    apertura_fecha = models.DateTimeField()
+    cierre_fecha = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["moneda_base", "moneda_destino", "dia"], name="uniq_diaria_pair_dia"),
+        ]
+        verbose_name = "Cotización diaria"
+        verbose_name_plural = "Cotizaciones diarias"
+
+    def __str__(self):
+        return f"{self.moneda_base_id}->{self.moneda_destino_id} @ {self.dia:%Y-%m-%d}"
+
+    @classmethod
+    def desde_muestra(cls, moneda_base_id, moneda_destino_id, dia, fecha, compra, venta):
+        """Fila de un día con una sola muestra (sin guardar)."""
+        return cls(
+            moneda_base_id=moneda_base_id, moneda_destino_id=moneda_destino_id, dia=dia,
+            compra_apertura=compra, compra_maximo=compra, compra_minimo=compra,
+            compra_cierre=compra, compra_promedio=compra, compra_suma=compra,
+            venta_apertura=venta, venta_maximo=venta, venta_minimo=venta,
+            venta_cierre=venta, venta_promedio=venta, venta_suma=venta,
+            muestras=1, apertura_fecha=fecha, cierre_fecha=fecha,
+        )
+
+    def agregar(self, fecha, compra, venta):
+        """Incorpora una muestra del mismo día (sin guardar)."""
+        if fecha < self.apertura_fecha:
+            self.apertura_fecha = fecha
+            self.compra_apertura = compra
+            self.venta_apertura = venta
+        if fecha >= self.cierre_fecha:
+            self.cierre_fecha = fecha
+            self.compra_cierre = compra
+            self.venta_cierre = venta
+        self.compra_maximo = max(self.compra_maximo, compra)
+        self.compra_minimo = min(self.compra_minimo, compra)
+        self.venta_maximo = max(self.venta_maximo, venta)
+        self.venta_minimo = min(self.venta_minimo, venta)
+        self.muestras += 1
+        self.compra_suma += compra
+        self.venta_suma += venta
+        cuatro = Decimal("0.0001")
+        self.compra_promedio = (self.compra_suma / self.muestras).quantize(cuatro)
+        self.venta_promedio = (self.venta_suma / self.muestras).quantize(cuatro)
+
+
+class CotizacionExterna(models.Model):
+    """
+    Último valor **válido** obtenido de un proveedor externo para un par (tabla de staging).
+
+    La ingesta programada (:mod:`cotizaciones.ingesta`) la actualiza en lote. Si un
+    intento falla, los valores no se tocan (último valor conocido bueno) y sólo se
+    registran ``intentado_en`` y ``error``. El botón "obtener desde la API" del
+    formulario de cotizaciones lee esta tabla en vez de consultar la red.
+
+    Los valores están expresados como unidades de ``moneda_base`` por una unidad
+    de ``moneda_destino``, igual que :class:`Cotizacion`.
+    """
+    moneda_base = models.ForeignKey(Moneda, on_delete=models.PROTECT, related_name='externa_base')
+    moneda_destino = models.ForeignKey(Moneda, on_delete=models.PROTECT, related_name='externa_destino')
+    valor_compra = models.DecimalField(max_digits=18, decimal_places=4)
+    valor_venta = models.DecimalField(max_digits=18, decimal_places=4)
+    proveedor = models.CharField(max_length=40)
+    obtenido_en = models.DateTimeField(help_text="Fecha del último valor válido.")
+    intentado_en = models.DateTimeField(help_text="Fecha del último intento, exitoso o no.")
+    error = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["moneda_base", "moneda_destino"], name="uniq_externa_pair"),
+        ]
+        verbose_name = "Cotización externa"
+        verbose_name_plural = "Cotizaciones externas"
+
+    def __str__(self):
+        return f"{self.moneda_base_id}->{self.moneda_destino_id} ({self.proveedor})"
+
+
+class CompactacionHistorica(models.Model):
+    """
+    Registro de cada corrida de la compactación de :class:`CotizacionHistorica`
+    (ver :mod:`cotizaciones.retencion`).
+
+    ``completas_desde`` y ``horarias_desde`` son los cortes usados: los históricos
+    desde ``completas_desde`` se conservan completos, los anteriores hasta
+    ``horarias_desde`` quedan con uno por hora y los más viejos con uno por día.
+    """
+    ejecutada_en = models.DateTimeField(auto_now_add=True)
+    completas_desde = models.DateTimeField()
+    horarias_desde = models.DateTimeField()
+    filas_leidas = models.PositiveIntegerField(default=0)
+    filas_borradas = models.PositiveIntegerField(default=0)
+    filas_creadas = models.PositiveIntegerField(default=0)
+    duracion_ms = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-ejecutada_en"]
+        verbose_name = "Compactación de históricos"
+        verbose_name_plural = "Compactaciones de históricos"
+
+    def __str__(self):
+        return f"Compactación {self.ejecutada_en:%Y-%m-%d %H:%M}: -{self.filas_borradas - self.filas_creadas} filas"
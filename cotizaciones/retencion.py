@@ -0,0 +1,167 @@
+# cotizaciones/retencion.py
+"""
+Retención y compactación de históricos
+======================================
+
+.. module:: cotizaciones.retencion
+   :synopsis: Reduce :class:`~cotizaciones.models.CotizacionHistorica` a una fila por hora o por día según su antigüedad.
+
+Cada cambio de cotización agrega un histórico y nada los borra. Para que la tabla
+y ``idx_hist_pair_fecha`` no crezcan sin límite, :func:`compactar_historicos`
+aplica la política ``settings.COTIZACIONES_RETENCION``:
+
+- los últimos ``DIAS_COMPLETOS`` días se conservan completos;
+- hasta ``DIAS_HORARIOS`` días atrás queda una fila por par y hora local;
+- lo más viejo queda con una fila por par y día local.
+
+La fila representativa de cada tramo es una copia del **último** histórico del
+tramo (su cierre), con ``fuente`` ``compactada:hora`` o ``compactada:dia``; los
+originales se borran. Los tramos que ya tienen una sola fila no se tocan, así
+que correrla de nuevo no cambia nada.
+
+El trabajo avanza par por par en ventanas de ``DIAS_POR_TANDA`` días: cada
+ventana se lee completa, se escribe con ``bulk_create`` y se borra por ``pk`` en
+lotes de ``LOTE``, dentro de su propia transacción.
+
+El resumen diario (:class:`~cotizaciones.models.CotizacionDiaria`) no se toca:
+ya guarda apertura, máximo, mínimo y promedio de los ticks originales. Por eso
+:func:`cotizaciones.diaria.reconstruir_diaria` (y ``reconstruir_cotizaciones_diarias``)
+omite los días anteriores a ``completas_desde`` de la última compactación, salvo
+con ``incluir_compactados``.
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .diaria import inicio_del_dia
+from .models import CompactacionHistorica, CotizacionHistorica
+
+POLITICA_POR_DEFECTO = {
+    "DIAS_COMPLETOS": 30,
+    "DIAS_HORARIOS": 365,
+    "DIAS_POR_TANDA": 7,
+    "LOTE": 1000,
+}
+
+CAMPOS_VALORES = ("valor_compra", "comision_compra", "valor_venta", "comision_venta")
+
+
+def politica():
+    """``settings.COTIZACIONES_RETENCION`` completada con :data:`POLITICA_POR_DEFECTO`."""
+    return {**POLITICA_POR_DEFECTO, **getattr(settings, "COTIZACIONES_RETENCION", {})}
+
+
+def _hora_local(fecha):
+    return timezone.localtime(fecha).replace(minute=0, second=0, microsecond=0)
+
+
+def _compactar_ventana(base_id, destino_id, inicio, fin, nivel, lote, simular):
+    """
+    Compacta los históricos de un par en ``[inicio, fin)``.
+
+    :returns: ``(leidas, borradas, creadas)``.
+    """
+    tramo = _hora_local if nivel == "hora" else timezone.localdate
+    filas = list(
+        CotizacionHistorica.objects
+        .filter(moneda_base_id=base_id, moneda_destino_id=destino_id, fecha__gte=inicio, fecha__lt=fin)
+        .order_by("fecha", "pk")
+        .only("pk", "fecha", *CAMPOS_VALORES)
+    )
+    grupos = {}
+    for fila in filas:
+        grupos.setdefault(tramo(fila.fecha), []).append(fila)
+
+    nuevas, borrar = [], []
+    for grupo in grupos.values():
+        if len(grupo) < 2:
+            continue
+        ultima = grupo[-1]
+        nuevas.append(CotizacionHistorica(
+            moneda_base_id=base_id, moneda_destino_id=destino_id, fecha=ultima.fecha,
+            fuente=f"compactada:{nivel}", **{campo: getattr(ultima, campo) for campo in CAMPOS_VALORES},
+        ))
+        borrar.extend(fila.pk for fila in grupo)
+
+    if nuevas and not simular:
+        with transaction.atomic():
+            CotizacionHistorica.objects.bulk_create(nuevas, batch_size=lote)
+            for desde in range(0, len(borrar), lote):
+                CotizacionHistorica.objects.filter(pk__in=borrar[desde:desde + lote]).delete()
+    return len(filas), len(borrar), len(nuevas)
+
+
+def compactar_historicos(simular=False, ahora=None, **cambios_politica):
+    """
+    Aplica la política de retención a todos los pares.
+
+    :param bool simular: Sólo calcula lo que se haría; no escribe ni registra nada.
+    :param ahora: Momento de referencia para los cortes (por defecto, ``timezone.now()``).
+    :param cambios_politica: Reemplazos puntuales de :func:`politica` (p. ej. ``DIAS_COMPLETOS=7``).
+    :returns: Resumen con los cortes, ``leidas``, ``borradas``, ``creadas``,
+        ``recuperadas`` (``borradas - creadas``) y el detalle ``por_nivel``.
+    :rtype: dict
+    """
+    config = {**politica(), **cambios_politica}
+    if config["DIAS_HORARIOS"] < config["DIAS_COMPLETOS"]:
+        raise ValueError("DIAS_HORARIOS no puede ser menor que DIAS_COMPLETOS.")
+    inicio_reloj = time.perf_counter()
+    hoy = timezone.localdate(ahora or timezone.now())
+    completas_desde = inicio_del_dia(hoy - datetime.timedelta(days=config["DIAS_COMPLETOS"]))
+    horarias_desde = inicio_del_dia(hoy - datetime.timedelta(days=config["DIAS_HORARIOS"]))
+    tanda = datetime.timedelta(days=config["DIAS_POR_TANDA"])
+
+    por_nivel = {"dia": [0, 0, 0], "hora": [0, 0, 0]}
+    pares = (
+        CotizacionHistorica.objects.filter(fecha__lt=completas_desde)
+        .values("moneda_base_id", "moneda_destino_id")
+        .annotate(primera=Min("fecha"))
+        .order_by("moneda_base_id", "moneda_destino_id")
+    )
+    for par in pares:
+        dia = timezone.localdate(par["primera"])
+        inicio = inicio_del_dia(dia)
+        while inicio < completas_desde:
+            dia += tanda
+            fin = min(inicio_del_dia(dia), completas_desde)
+            # Una ventana nunca cruza el corte horario: se parte en dos.
+            tramos = [(inicio, fin)]
+            if inicio < horarias_desde < fin:
+                tramos = [(inicio, horarias_desde), (horarias_desde, fin)]
+            for desde, hasta in tramos:
+                nivel = "dia" if desde < horarias_desde else "hora"
+                resultado = _compactar_ventana(
+                    par["moneda_base_id"], par["moneda_destino_id"], desde, hasta,
+                    nivel, config["LOTE"], simular,
+                )
+                por_nivel[nivel] = [a + b for a, b in zip(por_nivel[nivel], resultado)]
+            inicio = fin
+
+    leidas = sum(n[0] for n in por_nivel.values())
+    borradas = sum(n[1] for n in por_nivel.values())
+    creadas = sum(n[2] for n in por_nivel.values())
+    duracion_ms = round((time.perf_counter() - inicio_reloj) * 1000)
+    if not simular:
+        CompactacionHistorica.objects.create(
+            completas_desde=completas_desde, horarias_desde=horarias_desde,
+            filas_leidas=leidas, filas_borradas=borradas, filas_creadas=creadas,
+            duracion_ms=duracion_ms,
+        )
+    return {
+        "simulacion": simular,
+        "completas_desde": completas_desde,
+        "horarias_desde": horarias_desde,
+        "leidas": leidas,
+        "borradas": borradas,
+        "creadas": creadas,
+        "recuperadas": borradas - creadas,
+        "por_nivel": {
+            nivel: dict(zip(("leidas", "borradas", "creadas"), valores))
+            for nivel, valores in por_nivel.items()
+        },
+        "duracion_ms": duracion_ms,
+    }
@@ -0,0 +1,200 @@
+# cotizaciones/series.py
+"""
+Series diarias para los gráficos de cotizaciones
+================================================
+
+.. module:: cotizaciones.series
+   :synopsis: Lectura agrupada del resumen diario, reducción de puntos y caché de ``api_serie``.
+
+:func:`series_diarias` lee de :class:`~cotizaciones.models.CotizacionDiaria`
+uno o varios pares con una sola consulta. Si se pide una cantidad máxima de
+puntos, cada serie se reduce en el servidor:
+
+- ``lttb`` (*Largest-Triangle-Three-Buckets*): conserva la forma de la curva
+  eligiendo un punto por tramo.
+- ``minmax``: el mínimo y el máximo de cada tramo, en orden.
+- Las series ``ohlc`` se combinan por tramo (apertura del primero, máximo,
+  mínimo y cierre del último), sin importar el método pedido.
+
+Las respuestas se guardan en la caché bajo una clave que incluye los pares, el
+rango, el campo, la agregación, la resolución y la versión publicada por
+:func:`invalidar_series` cada vez que cambia el resumen diario.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Cotizacion, CotizacionDiaria
+
+SERIE_VERSION_KEY = "cotizaciones:serie:version"
+SERIE_TIMEOUT = 10 * 60
+
+MUESTREOS = ("lttb", "minmax")
+
+
+def version_series():
+    """Versión compartida de las series, inicializándola si no existe en la caché."""
+    version = cache.get(SERIE_VERSION_KEY)
+    if version is None:
+        cache.add(SERIE_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(SERIE_VERSION_KEY)
+    return version
+
+
+def _publicar_nueva_version():
+    cache.set(SERIE_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidar_series():
+    """
+    Descarta todas las series cacheadas publicando una nueva versión, ahora y al
+    confirmar la transacción en curso.
+    """
+    _publicar_nueva_version()
+    transaction.on_commit(_publicar_nueva_version)
+
+
+def clave_series(base, destinos, campo, agg, desde, hasta, puntos, muestreo, lote=False):
+    """Clave de caché de una respuesta de ``api_serie`` (``lote``: forma con ``series``)."""
+    partes = "|".join(str(p) for p in (
+        base, ",".join(sorted(destinos)), campo, agg,
+        desde.isoformat(), hasta.isoformat(), puntos or "", muestreo, int(lote),
+    ))
+    resumen = hashlib.sha256(partes.encode("utf-8")).hexdigest()[:32]
+    return f"cotizaciones:serie:{version_series()}:{resumen}"
+
+
+def _tramos(cantidad, tramos):
+    """Límites ``(inicio, fin)`` de ``tramos`` tramos consecutivos sobre ``cantidad`` elementos."""
+    return [(cantidad * i // tramos, cantidad * (i + 1) // tramos) for i in range(tramos)]
+
+
+def lttb(puntos, umbral):
+    """
+    Reduce ``puntos`` (ordenados por ``x``) a ``umbral`` puntos con LTTB.
+
+    Se conservan el primero y el último; ``x`` es la posición del punto, ya que
+    la serie tiene a lo sumo un punto por día.
+    """
+    cantidad = len(puntos)
+    if umbral >= cantidad or umbral < 3:
+        return list(puntos)
+
+    elegidos = [puntos[0]]
+    tramos = _tramos(cantidad - 2, umbral - 2)
+    anterior = 0
+    for i, (inicio, fin) in enumerate(tramos):
+        inicio, fin = inicio + 1, fin + 1
+        # Promedio del tramo siguiente (o el último punto).
+        if i + 1 < len(tramos):
+            sig_inicio, sig_fin = tramos[i + 1][0] + 1, tramos[i + 1][1] + 1
+        else:
+            sig_inicio, sig_fin = cantidad - 1, cantidad
+        prom_x = (sig_inicio + sig_fin - 1) / 2
+        prom_y = sum(p["y"] for p in puntos[sig_inicio:sig_fin]) / (sig_fin - sig_inicio)
+
+        ax, ay = anterior, puntos[anterior]["y"]
+        mejor, mejor_area = inicio, -1.0
+        for j in range(inicio, fin):
+            area = abs((ax - prom_x) * (puntos[j]["y"] - ay) - (ax - j) * (prom_y - ay))
+            if area > mejor_area:
+                mejor, mejor_area = j, area
+        elegidos.append(puntos[mejor])
+        anterior = mejor
+    elegidos.append(puntos[-1])
+    return elegidos
+
+
+def minmax(puntos, umbral):
+    """Reduce ``puntos`` a lo sumo a ``umbral`` puntos: mínimo y máximo de cada tramo, en orden."""
+    cantidad = len(puntos)
+    if umbral >= cantidad or umbral < 2:
+        return list(puntos)
+
+    elegidos = []
+    for inicio, fin in _tramos(cantidad, umbral // 2):
+        tramo = range(inicio, fin)
+        menor = min(tramo, key=lambda j: puntos[j]["y"])
+        mayor = max(tramo, key=lambda j: puntos[j]["y"])
+        elegidos.extend(puntos[j] for j in sorted({menor, mayor}))
+    return elegidos
+
+
+def combinar_ohlc(puntos, umbral):
+    """Combina velas consecutivas hasta dejar a lo sumo ``umbral``; cada una toma la fecha de la primera."""
+    cantidad = len(puntos)
+    if umbral >= cantidad or umbral < 1:
+        return list(puntos)
+
+    velas = []
+    for inicio, fin in _tramos(cantidad, umbral):
+        tramo = puntos[inicio:fin]
+        cierre = tramo[-1]["c"]
+        velas.append({
+            "x": tramo[0]["x"],
+            "o": tramo[0]["o"],
+            "h": max(p["h"] for p in tramo),
+            "l": min(p["l"] for p in tramo),
+            "c": cierre,
+            "y": cierre,
+        })
+    return velas
+
+
+def reducir(puntos, umbral, agg, muestreo="lttb"):
+    """Aplica la reducción que corresponde a ``agg`` y ``muestreo``; sin ``umbral`` no cambia nada."""
+    if not umbral:
+        return puntos
+    if agg == "ohlc":
+        return combinar_ohlc(puntos, umbral)
+    if muestreo == "minmax":
+        return minmax(puntos, umbral)
+    return lttb(puntos, umbral)
+
+
+def series_diarias(base, destinos, campo, agg, desde, hasta):
+    """
+    Puntos diarios de cada par ``base -> destino`` entre ``desde`` y ``hasta``.
+
+    Una consulta sobre el resumen diario para todos los destinos y, sólo para los
+    que no tienen resumen en el rango, otra sobre :class:`Cotizacion` para
+    devolver el valor actual en ``hasta``.
+
+    :param base: :class:`~monedas.models.Moneda` base.
+    :param destinos: ``{codigo: Moneda}`` de los destinos.
+    :returns: ``{codigo: [punto, ...]}`` en el orden de ``destinos``.
+    """
+    series = {codigo: [] for codigo in destinos}
+    codigos = {moneda.pk: codigo for codigo, moneda in destinos.items()}
+
+    # Rango sobre la restricción única (par, día): igual en SQLite y PostgreSQL.
+    qs = CotizacionDiaria.objects.filter(
+        moneda_base=base, moneda_destino__in=list(codigos),
+        dia__gte=desde, dia__lte=hasta,
+    ).order_by("moneda_destino_id", "dia")
+
+    if agg == "ohlc":
+        filas = qs.values_list("moneda_destino_id", "dia", f"{campo}_apertura", f"{campo}_maximo",
+                               f"{campo}_minimo", f"{campo}_cierre")
+        for destino_id, dia, o, h, l, c in filas:
+            series[codigos[destino_id]].append(
+                {"x": dia.isoformat(), "o": float(o), "h": float(h), "l": float(l), "c": float(c), "y": float(c)}
+            )
+    else:
+        columna = f"{campo}_promedio" if agg == "avg" else f"{campo}_cierre"
+        for destino_id, dia, valor in qs.values_list("moneda_destino_id", "dia", columna):
+            series[codigos[destino_id]].append({"x": dia.isoformat(), "y": float(valor)})
+
+    # Fallback: si aún no hay histórico, devolvemos el valor actual
+    vacios = [destinos[codigo].pk for codigo, puntos in series.items() if not puntos]
+    if vacios:
+        actuales = Cotizacion.objects.filter(moneda_base=base, moneda_destino__in=vacios)
+        for cur in actuales:
+            total = float(cur.total_venta if campo == "venta" else cur.total_compra)
+            punto = {"x": hasta.isoformat(), "y": total}
+            if agg == "ohlc":
+                punto.update(o=total, h=total, l=total, c=total)
+            series[codigos[cur.moneda_destino_id]] = [punto]
+    return series
@@ -3,14 +3,20 @@ from django.dispatch import Signal, receiver
 from django.db.models.signals import post_save
 from django.utils import timezone
 from .models import Cotizacion, CotizacionHistorica
+from .diaria import acumular_en_diaria
 
 # Señal propia ya usada en tu modelo
 cotizacion_actualizada = Signal()
 
+# Una sola vez por actualización en lote (cotizaciones.lote), al confirmar la transacción.
+# Argumentos: ``cotizaciones`` (instancias actualizadas) y ``cambios`` (lista de dicts con
+# ``cotizacion_id``, ``moneda``, ``compra_cambio`` y ``venta_cambio``).
+tablero_actualizado = Signal()
+
 @receiver(cotizacion_actualizada, dispatch_uid="cotiz_hist_por_cambio")
 def registrar_historico_por_cambio(sender, instance: Cotizacion, venta_cambio: bool, compra_cambio: bool, **kwargs):
-    # Registra snapshot cuando cambian valores/comisiones
-    CotizacionHistorica.objects.create(
+    # Registra snapshot cuando cambian valores/comisiones y lo acumula en el resumen diario
+    historico = CotizacionHistorica.objects.create(
         moneda_base=instance.moneda_base,
         moneda_destino=instance.moneda_destino,
         valor_compra=instance.valor_compra,
@@ -20,12 +26,13 @@ def registrar_historico_por_cambio(sender, instance: Cotizacion, venta_cambio: b
         fecha=timezone.now(),
         fuente="manual/api",
     )
+    acumular_en_diaria(historico)
 
 @receiver(post_save, sender=Cotizacion, dispatch_uid="cotiz_hist_en_creacion")
 def registrar_historico_en_creacion(sender, instance: Cotizacion, created: bool, **kwargs):
     # En la creación inicial tu save() no dispara la señal custom → garantizamos primer snapshot
     if created:
-        CotizacionHistorica.objects.create(
+        historico = CotizacionHistorica.objects.create(
             moneda_base=instance.moneda_base,
             moneda_destino=instance.moneda_destino,
             valor_compra=instance.valor_compra,
@@ -35,3 +42,4 @@ def registrar_historico_en_creacion(sender, instance: Cotizacion, created: bool,
             fecha=timezone.now(),
             fuente="inicial",
         )
+        acumular_en_diaria(historico)
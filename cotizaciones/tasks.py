@@ -0,0 +1,30 @@
+# cotizaciones/tasks.py
+from celery import shared_task
+
+from .ingesta import ingerir_cotizaciones
+from .retencion import compactar_historicos
+
+
+@shared_task
+def ingerir_cotizaciones_task():
+    """
+    Tarea periódica (``CELERY_BEAT_SCHEDULE``) que trae las tasas del proveedor
+    configurado y actualiza el staging de cotizaciones externas.
+
+    :return: Resumen de la corrida (ver :func:`cotizaciones.ingesta.ingerir_cotizaciones`).
+    :rtype: dict
+    """
+    return ingerir_cotizaciones()
+
+
+@shared_task
+def compactar_historicos_task():
+    """
+    Tarea periódica (``CELERY_BEAT_SCHEDULE``) que aplica la política de retención
+    de :mod:`cotizaciones.retencion`.
+
+    :return: Resumen de la corrida, sin las fechas de corte (serialización JSON).
+    :rtype: dict
+    """
+    resumen = compactar_historicos()
+    return {clave: valor for clave, valor in resumen.items() if clave not in ("completas_desde", "horarias_desde")}
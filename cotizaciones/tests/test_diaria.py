@@ -0,0 +1,99 @@
+import datetime
+import io
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from cotizaciones.diaria import acumular_en_diaria, inicio_del_dia
+from cotizaciones.models import Cotizacion, CotizacionDiaria, CotizacionHistorica
+from monedas.models import Moneda
+
+
+class CotizacionDiariaTest(TestCase):
+    """Pruebas del resumen diario (:mod:`cotizaciones.diaria`) y de ``api_serie``."""
+
+    def setUp(self):
+        self.pyg = Moneda.objects.create(codigo="PYG", nombre="Guaraní")
+        self.usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        self.cotizacion = Cotizacion.objects.create(
+            moneda_base=self.pyg, moneda_destino=self.usd,
+            valor_compra=Decimal("7000"), comision_compra=Decimal("50"),
+            valor_venta=Decimal("7100"), comision_venta=Decimal("100"),
+        )
+        self.hoy = timezone.localdate()
+
+    def _historico(self, fecha, compra, venta):
+        return CotizacionHistorica(
+            moneda_base=self.pyg, moneda_destino=self.usd,
+            valor_compra=Decimal(compra), valor_venta=Decimal(venta), fecha=fecha,
+        )
+
+    def _serie(self, **params):
+        params.setdefault("destino", "USD")
+        return self.client.get(reverse("cotizaciones:api_serie"), params).json()
+
+    def test_cada_cambio_se_acumula_en_el_dia(self):
+        for venta in ("7300", "7000"):
+            self.cotizacion.valor_venta = Decimal(venta)
+            self.cotizacion.save()
+
+        fila = CotizacionDiaria.objects.get(dia=self.hoy)
+        self.assertEqual(fila.muestras, 3)
+        self.assertEqual(fila.venta_apertura, Decimal("7200"))
+        self.assertEqual(fila.venta_maximo, Decimal("7400"))
+        self.assertEqual(fila.venta_minimo, Decimal("7100"))
+        self.assertEqual(fila.venta_cierre, Decimal("7100"))
+        self.assertEqual(fila.venta_promedio, Decimal("7233.3333"))
+        self.assertEqual(fila.compra_cierre, Decimal("6950"))
+
+    def test_muestra_fuera_de_orden_no_pisa_el_cierre(self):
+        fila = CotizacionDiaria.objects.get(dia=self.hoy)
+        antes = fila.apertura_fecha - datetime.timedelta(seconds=1)
+        if timezone.localdate(antes) != self.hoy:
+            self.skipTest("La prueba corre justo a la medianoche local.")
+
+        acumular_en_diaria(self._historico(antes, "6000", "6500"))
+
+        fila.refresh_from_db()
+        self.assertEqual(fila.venta_apertura, Decimal("6500"))
+        self.assertEqual(fila.venta_cierre, Decimal("7200"))
+        self.assertEqual(fila.compra_minimo, Decimal("6000"))
+
+    def test_reconstruir_agrupa_por_dia_local(self):
+        ayer = self.hoy - datetime.timedelta(days=1)
+        medianoche = inicio_del_dia(self.hoy)
+        CotizacionHistorica.objects.bulk_create([
+            self._historico(medianoche - datetime.timedelta(minutes=1), "6900", "7000"),
+            self._historico(medianoche - datetime.timedelta(hours=5), "6800", "6900"),
+        ])
+
+        call_command("reconstruir_cotizaciones_diarias", "--desde", ayer.isoformat(), stdout=io.StringIO())
+
+        fila = CotizacionDiaria.objects.get(dia=ayer)
+        self.assertEqual(fila.muestras, 2)
+        self.assertEqual(fila.venta_apertura, Decimal("6900"))
+        self.assertEqual(fila.venta_cierre, Decimal("7000"))
+        self.assertEqual(CotizacionDiaria.objects.get(dia=self.hoy).muestras, 1)
+
+    def test_api_serie_last_avg_y_ohlc(self):
+        self.cotizacion.valor_venta = Decimal("7300")
+        self.cotizacion.save()
+
+        self.assertEqual(self._serie()["points"], [{"x": self.hoy.isoformat(), "y": 7400.0}])
+        self.assertEqual(self._serie(agg="avg")["points"][0]["y"], 7300.0)
+
+        datos = self._serie(agg="ohlc", campo="venta")
+        self.assertEqual(datos["agg"], "ohlc")
+        self.assertEqual(
+            datos["points"],
+            [{"x": self.hoy.isoformat(), "o": 7200.0, "h": 7400.0, "l": 7200.0, "c": 7400.0, "y": 7400.0}],
+        )
+
+    def test_api_serie_sin_resumen_usa_valor_actual(self):
+        CotizacionDiaria.objects.all().delete()
+        datos = self._serie(agg="ohlc", campo="compra")
+        self.assertEqual(datos["points"][0]["c"], 6950.0)
+        self.assertEqual(datos["points"][0]["x"], self.hoy.isoformat())
@@ -0,0 +1,114 @@
+import datetime
+import json
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from cotizaciones.ingesta import (CircuitBreaker, ErrorProveedor, ProveedorArchivo, ProveedorTasas,
+                                  configuracion, ingerir_cotizaciones)
+from cotizaciones.models import CotizacionExterna
+from cotizaciones.tasks import ingerir_cotizaciones_task
+from monedas.models import Moneda
+
+FIXTURE_TASAS = str(Path(settings.BASE_DIR) / "cotizaciones" / "fixtures" / "tasas.json")
+
+
+class ProveedorQueFalla(ProveedorTasas):
+    nombre = "falla"
+    llamadas = 0
+
+    def obtener(self, codigos):
+        type(self).llamadas += 1
+        raise ErrorProveedor("sin conexión")
+
+
+@override_settings(COTIZACIONES_INGESTA={
+    "PROVEEDOR": "cotizaciones.ingesta.ProveedorArchivo",
+    "ARCHIVO": FIXTURE_TASAS,
+    "UMBRAL_FALLOS": 2,
+    "ENFRIAMIENTO_SEGUNDOS": 600,
+    "VIGENCIA_MINUTOS": 60,
+})
+class IngestaCotizacionesTest(TestCase):
+    """Pruebas de :mod:`cotizaciones.ingesta` y de ``obtener_valores_api``."""
+
+    def setUp(self):
+        cache.clear()
+        ProveedorQueFalla.llamadas = 0
+        self.pyg = Moneda.objects.create(codigo="PYG", nombre="Guaraní")
+        self.usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        self.brl = Moneda.objects.create(codigo="BRL", nombre="Real")
+        self.xau = Moneda.objects.create(codigo="XAU", nombre="Oro")
+
+    def test_proveedor_archivo_lee_el_fixture_sin_red(self):
+        # apply() ejecuta la tarea en el proceso: no hace falta broker ni worker.
+        resumen = ingerir_cotizaciones_task.apply().get()
+
+        self.assertEqual(resumen["estado"], "parcial")
+        self.assertEqual(resumen["actualizadas"], 2)
+        self.assertEqual(resumen["sin_dato"], ["XAU"])
+        usd = CotizacionExterna.objects.get(moneda_destino=self.usd)
+        self.assertEqual((usd.valor_compra, usd.valor_venta), (Decimal("7236"), Decimal("7213")))
+        self.assertEqual(usd.proveedor, "archivo")
+        self.assertFalse(CotizacionExterna.objects.filter(moneda_destino=self.xau).exists())
+
+    def test_proveedor_archivo_acepta_mapa_simple(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as archivo:
+            json.dump({"USD": {"compra": "7100.5", "venta": 7300}}, archivo)
+        config = {**configuracion(), "ARCHIVO": archivo.name}
+        self.assertEqual(ProveedorArchivo(config).obtener(["USD", "BRL"]),
+                         {"USD": (Decimal("7100.5"), Decimal("7300"))})
+        Path(archivo.name).unlink()
+
+    def test_fallo_conserva_el_ultimo_valor_bueno(self):
+        ingerir_cotizaciones()
+        resumen = ingerir_cotizaciones(ProveedorQueFalla(configuracion()))
+
+        self.assertEqual(resumen["estado"], "error")
+        usd = CotizacionExterna.objects.get(moneda_destino=self.usd)
+        self.assertEqual(usd.valor_compra, Decimal("7236"))
+        self.assertEqual(usd.error, "sin conexión")
+        self.assertGreater(usd.intentado_en, usd.obtenido_en)
+
+    def test_circuito_se_abre_tras_fallos_seguidos(self):
+        proveedor = ProveedorQueFalla(configuracion())
+        ingerir_cotizaciones(proveedor)
+        ingerir_cotizaciones(proveedor)
+        resumen = ingerir_cotizaciones(proveedor)
+
+        self.assertEqual(resumen["estado"], "circuito_abierto")
+        self.assertEqual(ProveedorQueFalla.llamadas, 2)
+
+        # Pasado el enfriamiento se permite un intento; si sale bien se cierra.
+        estado = cache.get(CircuitBreaker.CLAVE)
+        estado["abierto_hasta"] = 0
+        cache.set(CircuitBreaker.CLAVE, estado)
+        self.assertEqual(ingerir_cotizaciones()["estado"], "parcial")
+        self.assertIsNone(cache.get(CircuitBreaker.CLAVE))
+
+    def test_vista_lee_los_valores_ingestados(self):
+        staff = get_user_model().objects.create_user(
+            email="staff@example.com", password="clave-segura-123",
+            is_active=True, is_verified=True, is_staff=True,
+        )
+        self.client.force_login(staff)
+        url = reverse("cotizaciones:api_valores")
+
+        self.assertEqual(self.client.get(url, {"moneda_destino_id": self.usd.pk}).status_code, 404)
+
+        ingerir_cotizaciones()
+        with self.assertNumQueries(4):  # sesión, usuario, moneda y staging: sin pedidos de red
+            datos = self.client.get(url, {"moneda_destino_id": self.usd.pk}).json()
+        self.assertTrue(datos["success"])
+        self.assertEqual(datos["valor_venta"], 7213.0)
+        self.assertFalse(datos["desactualizado"])
+
+        CotizacionExterna.objects.update(obtenido_en=timezone.now() - datetime.timedelta(hours=2))
+        self.assertTrue(self.client.get(url, {"moneda_destino_id": self.usd.pk}).json()["desactualizado"])
@@ -0,0 +1,119 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import ContentType, Permission
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cotizaciones.lote import actualizar_cotizaciones_en_lote
+from cotizaciones.models import Cotizacion, CotizacionDiaria, CotizacionHistorica
+from cotizaciones.signals import cotizacion_actualizada, tablero_actualizado
+from monedas.models import Moneda
+from roles.models import Role
+
+
+class ActualizacionEnLoteTest(TestCase):
+    """Pruebas de :func:`cotizaciones.lote.actualizar_cotizaciones_en_lote` y de su formulario."""
+
+    def setUp(self):
+        self.pyg = Moneda.objects.create(codigo="PYG", nombre="Guaraní")
+        self.cotizaciones = {
+            codigo: Cotizacion.objects.create(
+                moneda_base=self.pyg,
+                moneda_destino=Moneda.objects.create(codigo=codigo, nombre=codigo),
+                valor_compra=Decimal(valor), valor_venta=Decimal(valor) + 100,
+            )
+            for codigo, valor in (("USD", 7000), ("EUR", 8000), ("BRL", 1400))
+        }
+        self.eventos = []
+        self.individuales = []
+        tablero_actualizado.connect(self._registrar_evento, dispatch_uid="test_tablero")
+        cotizacion_actualizada.connect(self._registrar_individual, dispatch_uid="test_individual")
+        self.addCleanup(tablero_actualizado.disconnect, dispatch_uid="test_tablero")
+        self.addCleanup(cotizacion_actualizada.disconnect, dispatch_uid="test_individual")
+
+    def _registrar_evento(self, sender, cotizaciones, cambios, **kwargs):
+        self.eventos.append(cambios)
+
+    def _registrar_individual(self, sender, **kwargs):
+        self.individuales.append(kwargs["instance"].pk)
+
+    def test_un_evento_con_los_pares_cambiados(self):
+        usd, eur, brl = (self.cotizaciones[c] for c in ("USD", "EUR", "BRL"))
+        with self.captureOnCommitCallbacks(execute=True):
+            # Lock + update + históricos + resumen diario (lock + update), sin contar savepoints.
+            with CaptureQueriesContext(connection) as consultas:
+                cambios = actualizar_cotizaciones_en_lote({
+                    usd.pk: {"valor_compra": "7050", "comision_compra": 25},
+                    eur.pk: {"valor_venta": "8200.0000"},
+                    brl.pk: {"valor_venta": Decimal("1500")},  # sin cambios
+                })
+            self.assertEqual(self.eventos, [])
+        sentencias = [q["sql"] for q in consultas.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(len(sentencias), 5)
+
+        self.assertEqual(cambios, [
+            {"cotizacion_id": usd.pk, "moneda": "USD", "compra_cambio": True, "venta_cambio": False},
+            {"cotizacion_id": eur.pk, "moneda": "EUR", "compra_cambio": False, "venta_cambio": True},
+        ])
+        self.assertEqual(self.eventos, [cambios])
+        self.assertEqual(self.individuales, [])
+
+        usd.refresh_from_db()
+        self.assertEqual(usd.total_compra, Decimal("7025"))
+        self.assertEqual(CotizacionHistorica.objects.filter(fuente="lote").count(), 2)
+        fila = CotizacionDiaria.objects.get(moneda_destino=usd.moneda_destino, dia=timezone.localdate())
+        self.assertEqual(fila.muestras, 2)
+        self.assertEqual(fila.compra_cierre, Decimal("7025"))
+        self.assertEqual(CotizacionDiaria.objects.get(moneda_destino=brl.moneda_destino).muestras, 1)
+
+    def test_valores_invalidos_no_escriben_nada(self):
+        usd = self.cotizaciones["USD"]
+        with self.assertRaises(ValidationError):
+            actualizar_cotizaciones_en_lote({usd.pk: {"valor_compra": "-1"}})
+        with self.assertRaises(ValidationError):
+            actualizar_cotizaciones_en_lote({usd.pk: {"moneda_destino": self.pyg.pk}})
+        with self.assertRaises(Cotizacion.DoesNotExist):
+            actualizar_cotizaciones_en_lote({usd.pk: {"valor_compra": 1}, 999999: {"valor_compra": 1}})
+        usd.refresh_from_db()
+        self.assertEqual(usd.valor_compra, Decimal("7000"))
+        self.assertFalse(CotizacionHistorica.objects.filter(fuente="lote").exists())
+
+    def test_formulario_en_lote(self):
+        usuario = get_user_model().objects.create_user(
+            email="lote@example.com", password="testpass123", is_active=True, is_verified=True,
+        )
+        rol = Role.objects.create(name="Rol Lote Cotizaciones")
+        rol.permissions.set(Permission.objects.filter(
+            content_type=ContentType.objects.get_for_model(Cotizacion)))
+        usuario.roles.add(rol)
+        self.client.force_login(usuario)
+        url = reverse("cotizaciones:cotizacion_lote")
+
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        formset = respuesta.context["formset"]
+        datos = {
+            "form-TOTAL_FORMS": len(formset.forms),
+            "form-INITIAL_FORMS": len(formset.forms),
+            "form-MIN_NUM_FORMS": 0,
+            "form-MAX_NUM_FORMS": 1000,
+        }
+        for i, form in enumerate(formset.forms):
+            datos[f"form-{i}-id"] = form.instance.pk
+            for campo in ("valor_compra", "comision_compra", "valor_venta", "comision_venta"):
+                datos[f"form-{i}-{campo}"] = getattr(form.instance, campo)
+            if form.instance.moneda_destino.codigo == "EUR":
+                datos[f"form-{i}-valor_venta"] = "8300"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(url, datos)
+
+        self.assertRedirects(respuesta, reverse("cotizaciones:cotizacion_list"))
+        self.assertEqual(len(self.eventos), 1)
+        self.assertEqual([c["moneda"] for c in self.eventos[0]], ["EUR"])
+        self.assertEqual(Cotizacion.objects.get(pk=self.cotizaciones["EUR"].pk).valor_venta, Decimal("8300"))
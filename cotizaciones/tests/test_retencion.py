@@ -0,0 +1,93 @@
+import datetime
+import io
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from cotizaciones.diaria import inicio_del_dia, reconstruir_diaria
+from cotizaciones.models import CompactacionHistorica, CotizacionDiaria, CotizacionHistorica
+from cotizaciones.retencion import compactar_historicos
+from monedas.models import Moneda
+
+
+class CompactacionHistoricosTest(TestCase):
+    """Pruebas de :mod:`cotizaciones.retencion`."""
+
+    def setUp(self):
+        self.pyg = Moneda.objects.create(codigo="PYG", nombre="Guaraní")
+        self.usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        self.hoy = timezone.localdate()
+        hace_40 = inicio_del_dia(self.hoy - datetime.timedelta(days=40))
+        hace_400 = inicio_del_dia(self.hoy - datetime.timedelta(days=400))
+        ticks = [
+            # Hace 40 días: dos horas con 3 y 2 ticks -> una fila por hora.
+            (hace_40 + datetime.timedelta(hours=10, minutes=5), 7000),
+            (hace_40 + datetime.timedelta(hours=10, minutes=20), 7010),
+            (hace_40 + datetime.timedelta(hours=10, minutes=55), 7020),
+            (hace_40 + datetime.timedelta(hours=11, minutes=1), 7030),
+            (hace_40 + datetime.timedelta(hours=11, minutes=2), 7040),
+            (hace_40 + datetime.timedelta(hours=15), 7050),  # ya es una sola fila
+            # Hace 400 días: cuatro ticks en el día -> una fila por día.
+            *((hace_400 + datetime.timedelta(hours=h), 6000 + h) for h in (8, 9, 13, 18)),
+            # Recientes: se conservan completos.
+            *((inicio_del_dia(self.hoy) + datetime.timedelta(minutes=m), 7300 + m) for m in (1, 2, 3)),
+        ]
+        CotizacionHistorica.objects.bulk_create([
+            CotizacionHistorica(moneda_base=self.pyg, moneda_destino=self.usd, fecha=fecha,
+                                valor_compra=Decimal(valor), valor_venta=Decimal(valor) + 100)
+            for fecha, valor in ticks
+        ])
+        reconstruir_diaria()
+        self.diaria_antes = list(CotizacionDiaria.objects.order_by("dia").values())
+
+    def _politica(self, **opciones):
+        return compactar_historicos(DIAS_COMPLETOS=30, DIAS_HORARIOS=365, **opciones)
+
+    def test_compacta_por_hora_y_por_dia(self):
+        resumen = self._politica()
+
+        self.assertEqual(resumen["por_nivel"]["hora"], {"leidas": 6, "borradas": 5, "creadas": 2})
+        self.assertEqual(resumen["por_nivel"]["dia"], {"leidas": 4, "borradas": 4, "creadas": 1})
+        self.assertEqual(resumen["recuperadas"], 6)
+        self.assertEqual(CotizacionHistorica.objects.count(), 13 - 6)
+
+        por_hora = CotizacionHistorica.objects.filter(fuente="compactada:hora").order_by("fecha")
+        self.assertEqual([h.valor_compra for h in por_hora], [Decimal("7020"), Decimal("7040")])
+        por_dia = CotizacionHistorica.objects.get(fuente="compactada:dia")
+        self.assertEqual(por_dia.valor_venta, Decimal("6118"))
+        self.assertEqual(CotizacionHistorica.objects.filter(fecha__gte=inicio_del_dia(self.hoy)).count(), 3)
+
+        registro = CompactacionHistorica.objects.get()
+        self.assertEqual((registro.filas_borradas, registro.filas_creadas), (9, 3))
+        # El resumen diario no cambia.
+        self.assertEqual(list(CotizacionDiaria.objects.order_by("dia").values()), self.diaria_antes)
+
+        # Idempotente: una segunda corrida no encuentra nada que compactar.
+        self.assertEqual(self._politica()["recuperadas"], 0)
+
+    def test_dry_run_no_modifica_nada(self):
+        salida = io.StringIO()
+        call_command("compactar_cotizaciones_historicas", "--dry-run", stdout=salida)
+
+        self.assertIn("[DRY-RUN] Filas recuperadas: 6", salida.getvalue())
+        self.assertEqual(CotizacionHistorica.objects.count(), 13)
+        self.assertFalse(CompactacionHistorica.objects.exists())
+
+    def test_reconstruir_no_pisa_el_ohlc_de_dias_compactados(self):
+        self._politica()
+
+        salida = io.StringIO()
+        call_command("reconstruir_cotizaciones_diarias", stdout=salida)
+
+        self.assertIn("--incluir-compactados", salida.getvalue())
+        # Los días compactados conservan el OHLC original; el reciente se recalcula igual.
+        sin_id = [{**fila, "id": None} for fila in self.diaria_antes]
+        self.assertEqual([{**fila, "id": None} for fila in CotizacionDiaria.objects.order_by("dia").values()],
+                         sin_id)
+
+        # Pedido explícito: el día compactado queda con una sola muestra (el cierre).
+        call_command("reconstruir_cotizaciones_diarias", "--incluir-compactados", stdout=io.StringIO())
+        viejo = CotizacionDiaria.objects.order_by("dia").first()
+        self.assertEqual((viejo.muestras, viejo.compra_apertura), (1, Decimal("6018")))
@@ -0,0 +1,119 @@
+import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from cotizaciones.diaria import reconstruir_diaria
+from cotizaciones.models import Cotizacion, CotizacionHistorica
+from cotizaciones.series import combinar_ohlc, lttb, minmax
+from monedas.models import Moneda
+
+
+def _serie(valores):
+    inicio = datetime.date(2025, 1, 1)
+    return [{"x": (inicio + datetime.timedelta(days=i)).isoformat(), "y": float(v)}
+            for i, v in enumerate(valores)]
+
+
+class ReduccionTest(SimpleTestCase):
+    """Pruebas de la reducción de puntos de :mod:`cotizaciones.series`."""
+
+    def test_lttb_conserva_extremos_y_picos(self):
+        valores = [10] * 100
+        valores[37] = 50
+        valores[71] = -20
+        reducida = lttb(_serie(valores), 10)
+
+        self.assertEqual(len(reducida), 10)
+        self.assertEqual(reducida[0]["x"], "2025-01-01")
+        self.assertEqual(reducida[-1]["x"], "2025-04-10")
+        self.assertIn(50.0, [p["y"] for p in reducida])
+        self.assertIn(-20.0, [p["y"] for p in reducida])
+        self.assertEqual([p["x"] for p in reducida], sorted(p["x"] for p in reducida))
+
+    def test_lttb_no_toca_series_cortas(self):
+        serie = _serie([1, 2, 3])
+        self.assertEqual(lttb(serie, 10), serie)
+
+    def test_minmax_por_tramo(self):
+        reducida = minmax(_serie([5, 1, 9, 3, 7, 2, 8, 4]), 4)
+        self.assertEqual([p["y"] for p in reducida], [1.0, 9.0, 2.0, 8.0])
+
+    def test_ohlc_combina_velas(self):
+        velas = [{"x": p["x"], "o": p["y"], "h": p["y"] + 1, "l": p["y"] - 1, "c": p["y"], "y": p["y"]}
+                 for p in _serie([1, 2, 3, 4])]
+        self.assertEqual(
+            combinar_ohlc(velas, 2),
+            [{"x": "2025-01-01", "o": 1.0, "h": 3.0, "l": 0.0, "c": 2.0, "y": 2.0},
+             {"x": "2025-01-03", "o": 3.0, "h": 5.0, "l": 2.0, "c": 4.0, "y": 4.0}],
+        )
+
+
+class ApiSerieLoteTest(TestCase):
+    """``api_serie`` con ``points`` y ``destinos``, y su caché."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pyg = Moneda.objects.create(codigo="PYG", nombre="Guaraní")
+        cls.usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        cls.eur = Moneda.objects.create(codigo="EUR", nombre="Euro")
+        cls.brl = Moneda.objects.create(codigo="BRL", nombre="Real")
+        for destino, valor in ((cls.usd, 7000), (cls.eur, 8000), (cls.brl, 1400)):
+            Cotizacion.objects.create(moneda_base=cls.pyg, moneda_destino=destino,
+                                      valor_compra=valor, valor_venta=valor)
+        # Histórico hasta ayer: hoy sólo tiene los históricos iniciales de las cotizaciones.
+        cls.hasta = timezone.localdate() - datetime.timedelta(days=1)
+        cls.desde = cls.hasta - datetime.timedelta(days=199)
+        CotizacionHistorica.objects.bulk_create([
+            CotizacionHistorica(
+                moneda_base=cls.pyg, moneda_destino=destino,
+                valor_compra=Decimal(base + dia), valor_venta=Decimal(base + dia),
+                fecha=timezone.make_aware(datetime.datetime.combine(
+                    cls.desde + datetime.timedelta(days=dia), datetime.time(12))),
+            )
+            for destino, base in ((cls.usd, 7000), (cls.eur, 8000))
+            for dia in range(200)
+        ])
+        reconstruir_diaria()
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("cotizaciones:api_serie")
+
+    def _get(self, **params):
+        params.setdefault("desde", self.desde.isoformat())
+        params.setdefault("hasta", self.hasta.isoformat())
+        return self.client.get(self.url, params)
+
+    def test_lote_con_una_consulta_agrupada(self):
+        # Monedas + resumen diario de los tres pares + valor actual de BRL (sin histórico en el rango).
+        with self.assertNumQueries(3):
+            datos = self._get(destinos="USD,EUR,BRL", points=50).json()
+
+        self.assertEqual(list(datos["series"]), ["USD", "EUR", "BRL"])
+        self.assertEqual(len(datos["series"]["USD"]), 50)
+        self.assertEqual(datos["series"]["USD"][-1]["y"], 7199.0)
+        self.assertEqual(datos["series"]["EUR"][0]["y"], 8000.0)
+        self.assertEqual(datos["series"]["BRL"], [{"x": self.hasta.isoformat(), "y": 1400.0}])
+
+    def test_respuesta_cacheada_hasta_que_cambia_el_resumen(self):
+        hoy = timezone.localdate().isoformat()
+        primera = self._get(destino="USD", points=20, hasta=hoy)
+        self.assertEqual(len(primera.json()["points"]), 20)
+        self.assertIn("max-age", primera["Cache-Control"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get(destino="USD", points=20, hasta=hoy).json(), primera.json())
+
+        cotizacion = Cotizacion.objects.get(moneda_destino=self.usd)
+        cotizacion.valor_venta = Decimal("9999")
+        cotizacion.save()
+        self.assertEqual(self._get(destino="USD", points=20, hasta=hoy).json()["points"][-1]["y"], 9999.0)
+
+    def test_validaciones(self):
+        self.assertEqual(self._get(destino="USD", points=2).status_code, 400)
+        self.assertEqual(self._get(destino="USD", points="muchos").status_code, 400)
+        self.assertEqual(self._get(destinos="USD,XXX").status_code, 404)
+        self.assertEqual(self._get(destinos="").status_code, 400)
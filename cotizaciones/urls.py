@@ -7,6 +7,7 @@ urlpatterns = [
     path('', views.cotizacion_list, name='cotizacion_list'),
     path('crear/', views.cotizacion_create, name='cotizacion_create'),
     path('editar/<int:pk>/', views.cotizacion_update, name='cotizacion_update'),
+    path('editar-lote/', views.cotizacion_lote, name='cotizacion_lote'),
     path('eliminar/<int:pk>/', views.cotizacion_delete, name='cotizacion_delete'),
     path('api/valores/', views.obtener_valores_api, name='api_valores'),
     path('api/serie/', views.api_serie, name='api_serie'),
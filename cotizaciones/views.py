@@ -1,18 +1,19 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-import requests
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from .models import Cotizacion
 from monedas.models import Moneda
-from .forms import CotizacionForm
-from django.db.models.functions import TruncDate
-from django.db.models import Avg, F, OuterRef, Subquery, DecimalField, ExpressionWrapper
+from .forms import CotizacionForm, CotizacionLoteFormSet
+from .lote import actualizar_cotizaciones_en_lote
+from .ingesta import valores_ingestados
 from django.utils.dateparse import parse_date
 from django.utils import timezone
 import datetime
 
-from .models import CotizacionHistorica
+from .series import MUESTREOS, SERIE_TIMEOUT, clave_series, reducir, series_diarias
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
 
 
 @login_required
@@ -68,6 +69,32 @@ def cotizacion_update(request, pk):
 
     return render(request, 'cotizaciones/cotizacion_form.html', {'form': form})
 
+# --- Actualizar todo el tablero en lote ---
+@login_required
+def cotizacion_lote(request):
+    if not request.user.has_perm("cotizaciones.access_cotizaciones"):
+        return redirect("home")
+
+    queryset = Cotizacion.objects.select_related('moneda_destino').order_by('moneda_destino__codigo')
+    if request.method == 'POST':
+        formset = CotizacionLoteFormSet(request.POST, queryset=queryset)
+        if formset.is_valid():
+            cambios = {
+                form.instance.pk: {campo: form.cleaned_data[campo] for campo in form.changed_data}
+                for form in formset.forms if form.has_changed()
+            }
+            actualizadas = actualizar_cotizaciones_en_lote(cambios, fuente="manual/lote")
+            if actualizadas:
+                monedas = ", ".join(c['moneda'] for c in actualizadas)
+                messages.success(request, f"Se actualizaron {len(actualizadas)} cotizaciones: {monedas}.")
+            else:
+                messages.info(request, "No hubo cambios en las cotizaciones.")
+            return redirect('cotizaciones:cotizacion_list')
+    else:
+        formset = CotizacionLoteFormSet(queryset=queryset)
+
+    return render(request, 'cotizaciones/cotizacion_lote.html', {'formset': formset})
+
 # --- Eliminar cotización ---
 @login_required
 def cotizacion_delete(request, pk):
@@ -95,121 +122,114 @@ def obtener_valores_api(request):
     
     try:
         moneda_destino = Moneda.objects.get(id=moneda_destino_id)
-        valores = obtener_cotizacion_api(moneda_destino.codigo)
-        
-        if valores:
-            return JsonResponse({
-                'success': True,
-                'valor_compra': valores['valor_compra'],
-                'valor_venta': valores['valor_venta'],
-                'moneda': moneda_destino.codigo,
-                'fuente': 'API en tiempo real'
-            })
-        else:
-            return JsonResponse({
-                'success': False,
-                'error': f"No se pudieron obtener valores para {moneda_destino.codigo} desde la API. Ingrese los valores manualmente."
-            }, status=404)
-            
     except Moneda.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Moneda no encontrada'}, status=404)
 
-# --- Función para consultar API HexaRate ---
-def obtener_cotizacion_api(moneda_destino_codigo):
+    # Valores traídos por la ingesta programada (cotizaciones.tasks): no se espera a la red.
+    valores = valores_ingestados(moneda_destino)
+    if valores is None:
+        return JsonResponse({
+            'success': False,
+            'error': f"No se pudieron obtener valores para {moneda_destino.codigo} desde la API. Ingrese los valores manualmente."
+        }, status=404)
 
-    
-    """
-    Obtiene valor de compra y venta desde currency-api (sin necesidad de clave)
-    Devuelve un diccionario: {'valor_compra': float, 'valor_venta': float} o None si falla.
-    """
-    api_url = f"https://cdn.jsdelivr.net/gh/fawazahmed0/currency-api@1/latest/currencies/pyg/{moneda_destino_codigo.lower()}.json"
-    
-    try:
-        response = requests.get(api_url, timeout=10)
-        data = response.json()
-        
-        tasa = data.get(moneda_destino_codigo.lower())
-        if tasa:
-            return {'valor_compra': float(tasa), 'valor_venta': float(tasa)}
-        
-        return None
-    except Exception as e:
-        print(f"Error con API {api_url}: {e}")
-        return None
+    return JsonResponse({
+        'success': True,
+        'valor_compra': float(valores['valor_compra']),
+        'valor_venta': float(valores['valor_venta']),
+        'moneda': moneda_destino.codigo,
+        'fuente': valores['proveedor'],
+        'obtenido_en': valores['obtenido_en'].isoformat(),
+        'desactualizado': valores['desactualizado'],
+    })
 
 # --- API Serie temporal (pública: no requiere login) ---
+MAX_DESTINOS_SERIE = 20
+MAX_PUNTOS_SERIE = 2000
+
+
 def api_serie(request):
+    """
+    Serie diaria de uno o varios pares, leída del resumen
+    :class:`~cotizaciones.models.CotizacionDiaria` (ver :mod:`cotizaciones.series`).
+
+    - ``agg``: ``last`` (cierre del día), ``avg`` (promedio del día) u ``ohlc``
+      (cada punto trae ``o``/``h``/``l``/``c`` y además ``y`` = cierre).
+    - ``points=N``: a lo sumo ``N`` puntos por serie, reducidos en el servidor con
+      ``muestreo=lttb`` (por defecto) o ``minmax``; las velas ``ohlc`` se combinan.
+    - ``destinos=USD,EUR``: varias series en una respuesta (``series``); con
+      ``destino`` se responde la forma de un solo par (``pair``/``points``).
+
+    Las respuestas se cachean por pares, rango, campo, agregación y resolución.
+    """
     base_code = (request.GET.get("base") or "PYG").upper()
-    dest_code = (request.GET.get("destino") or "").upper()
     campo = (request.GET.get("campo") or "venta").lower()      # "venta" | "compra"
-    agg = (request.GET.get("agg") or "last").lower()           # "last" | "avg"
+    agg = (request.GET.get("agg") or "last").lower()           # "last" | "avg" | "ohlc"
+    muestreo = (request.GET.get("muestreo") or "lttb").lower()  # "lttb" | "minmax"
+
+    lote = "destinos" in request.GET
+    if lote:
+        dest_codes = list(dict.fromkeys(
+            c.strip().upper() for c in request.GET["destinos"].split(",") if c.strip()
+        ))
+    else:
+        dest_codes = [(request.GET.get("destino") or "").upper()] if request.GET.get("destino") else []
 
-    if not dest_code:
+    if not dest_codes:
         return JsonResponse({"ok": False, "error": "Falta 'destino' (p.ej. USD)."}, status=400)
+    if len(dest_codes) > MAX_DESTINOS_SERIE:
+        return JsonResponse({"ok": False, "error": f"A lo sumo {MAX_DESTINOS_SERIE} destinos."}, status=400)
     if campo not in ("venta", "compra"):
         campo = "venta"
-    if agg not in ("last", "avg"):
+    if agg not in ("last", "avg", "ohlc"):
         agg = "last"
+    if muestreo not in MUESTREOS:
+        muestreo = "lttb"
+
+    puntos = request.GET.get("points")
+    if puntos:
+        try:
+            puntos = int(puntos)
+        except ValueError:
+            puntos = 0
+        if not 3 <= puntos <= MAX_PUNTOS_SERIE:
+            return JsonResponse(
+                {"ok": False, "error": f"'points' debe estar entre 3 y {MAX_PUNTOS_SERIE}."}, status=400
+            )
+    else:
+        puntos = None
 
     today = timezone.localdate()
     default_desde = today - datetime.timedelta(days=90)
     desde = parse_date(request.GET.get("desde") or "") or default_desde
     hasta = parse_date(request.GET.get("hasta") or "") or today
 
-    try:
-        base = Moneda.objects.get(codigo=base_code)
-        dest = Moneda.objects.get(codigo=dest_code)
-    except Moneda.DoesNotExist:
-        return JsonResponse({"ok": False, "error": "Moneda no encontrada."}, status=404)
-
-    qs = CotizacionHistorica.objects.filter(
-        moneda_base=base, moneda_destino=dest,
-        fecha__date__gte=desde, fecha__date__lte=hasta
-    )
-
-    # total_venta = valor_venta + comision_venta
-    # total_compra = valor_compra - comision_compra
-    if campo == "venta":
-        expr = ExpressionWrapper(F("valor_venta") + F("comision_venta"),
-                                 output_field=DecimalField(max_digits=12, decimal_places=4))
-    else:
-        expr = ExpressionWrapper(F("valor_compra") - F("comision_compra"),
-                                 output_field=DecimalField(max_digits=12, decimal_places=4))
-
-    if qs.exists():
-        if agg == "avg":
-            data_qs = (qs.annotate(dia=TruncDate("fecha"))
-                         .values("dia")
-                         .annotate(valor=Avg(expr))
-                         .order_by("dia"))
-            points = [{"x": r["dia"].isoformat(), "y": float(r["valor"])} for r in data_qs]
-        else:  # "last" del día
-            # Tomar el último registro de CADA día (DISTINCT ON)
-            data_qs = (
-                qs.annotate(dia=TruncDate("fecha"))
-                .annotate(calc=expr)
-                .order_by("dia", "-fecha")   # ordenar por día y dentro del día el más reciente
-                .distinct("dia")             # nos quedamos con 1 por día
-                .values("dia", "calc")
-                .order_by("dia")
-            )
-            points = [{"x": r["dia"].isoformat(), "y": float(r["calc"])} for r in data_qs]
-
-    else:
-        # Fallback: si aún no hay histórico, devolvemos el valor actual
-        try:
-            cur = Cotizacion.objects.get(moneda_base=base, moneda_destino=dest)
-            total = (cur.valor_venta + cur.comision_venta) if campo == "venta" else (cur.valor_compra - cur.comision_compra)
-            points = [{"x": hasta.isoformat(), "y": float(total)}]
-        except Cotizacion.DoesNotExist:
-            points = []
+    clave = clave_series(base_code, dest_codes, campo, agg, desde, hasta, puntos, muestreo, lote)
+    respuesta = cache.get(clave)
+    if respuesta is None:
+        monedas = {m.codigo: m for m in Moneda.objects.filter(codigo__in=[base_code, *dest_codes])}
+        if base_code not in monedas or any(c not in monedas for c in dest_codes):
+            return JsonResponse({"ok": False, "error": "Moneda no encontrada."}, status=404)
+
+        series = series_diarias(
+            monedas[base_code], {c: monedas[c] for c in dest_codes}, campo, agg, desde, hasta
+        )
+        series = {c: reducir(p, puntos, agg, muestreo) for c, p in series.items()}
+
+        respuesta = {
+            "ok": True,
+            "campo": campo,
+            "agg": agg,
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "max_points": puntos,
+        }
+        if lote:
+            respuesta.update(base=base_code, series=series)
+        else:
+            respuesta.update(pair=f"{base_code}/{dest_codes[0]}", points=series[dest_codes[0]])
+        cache.set(clave, respuesta, SERIE_TIMEOUT)
 
-    return JsonResponse({
-        "ok": True,
-        "pair": f"{base.codigo}/{dest.codigo}",
-        "campo": campo,
-        "agg": agg,
-        "desde": desde.isoformat(),
-        "hasta": hasta.isoformat(),
-        "points": points,
-    })
+    response = JsonResponse(respuesta)
+    patch_cache_control(response, public=True, max_age=60)
+    return response
@@ -0,0 +1,70 @@
+"""
+Manejador de eventos de la app Facturación Electrónica.
+
+.. module:: facturacion_electronica.eventos
+   :synopsis: Disparo idempotente de la factura de una transacción desde la bandeja de salida.
+
+El despachador de :mod:`transacciones.outbox` llama a :func:`emitir_factura`
+con cada evento ``facturacion``:
+
+- la transacción pasó a ``procesando_acreditacion`` (antes, un receptor
+  ``post_save`` en :mod:`transacciones.signals`);
+- el pago de la transacción se confirmó (``pendiente_pago_cliente`` a
+  ``pendiente_retiro_tauser``; antes, en línea en el webhook de
+  :mod:`pagos.services`).
+"""
+import logging
+
+from django.db import transaction
+
+from .models import DocumentoElectronico, EmisorFacturaElectronica
+from .tasks import generar_factura_electronica_task
+
+logger = logging.getLogger(__name__)
+
+# Un documento en estos estados no cuenta como factura emitida.
+ESTADOS_FALLIDOS = ('rechazado', 'inutilizado', 'error_api', 'error_sifen')
+
+
+def emitir_factura(evento):
+    """
+    Encola :func:`~facturacion_electronica.tasks.generar_factura_electronica_task`
+    para la transacción del evento, salvo que ya tenga un documento no fallido.
+
+    - ``procesando_acreditacion``: el emisor se resuelve dentro de la tarea y el
+      documento se envía al operador.
+    - Pago confirmado: requiere un emisor activo y se envía al cliente.
+
+    La tarea se encola al confirmar el lote del despachador, para que no corra
+    si el evento se revierte.
+
+    :param evento: Evento de la bandeja de salida.
+    :type evento: transacciones.models.EventoTransaccion
+    """
+    transaccion = evento.transaccion
+    emitida = (DocumentoElectronico.objects
+               .filter(transaccion_asociada=transaccion)
+               .exclude(estado_sifen__in=ESTADOS_FALLIDOS)
+               .exists())
+    if emitida:
+        logger.info("Ya existe documento para Tx %s; no se dispara nuevamente.", transaccion.id)
+        return
+
+    if evento.estado == 'procesando_acreditacion':
+        emisor_id = None  # El emisor se obtiene dentro de la tarea
+        email_receptor = transaccion.usuario_operador.email
+    else:
+        emisor = EmisorFacturaElectronica.objects.filter(activo=True).first()
+        if not emisor:
+            logger.warning("No hay Emisor ACTIVO configurado. No se emite factura para Tx %s.", transaccion.id)
+            return
+        emisor_id = str(emisor.id)
+        email_receptor = getattr(transaccion.cliente, "email", None) or "receptor@test.com"
+
+    transaccion_id = str(transaccion.id)
+    transaction.on_commit(lambda: generar_factura_electronica_task.delay(
+        emisor_id=emisor_id,
+        transaccion_id=transaccion_id,
+        json_de_completo=None,  # el builder de la task arma el DE a partir de la Transaccion
+        email_receptor=email_receptor,
+    ))
@@ -13,6 +13,7 @@ from django.utils import timezone
 from .services import FacturaSeguraAPIClient
 from notificaciones.tasks import enviar_factura_por_email_task
 from .models import DocumentoElectronico, EmisorFacturaElectronica
+from transacciones.estados import transicionar
 from transacciones.models import Transaccion
 
 
@@ -499,10 +500,10 @@ def generar_factura_electronica_task(self, emisor_id, transaccion_id, json_de_co
         #    (si actualizaste services con contrato estricto, ahí adentro ya se envía solo DE)
         doc_electronico = client.generar_de(de_completo, transaccion_id)
 
-        # Actualizar estado de la transacción a 'completada' si es una operación de 'compra'
+        # Actualizar estado de la transacción a 'completada' si es una operación de 'compra'.
+        # Si ya no está en un estado que lo permita (otra escritura ganó), se deja como está.
         if tx.tipo_operacion == 'compra':
-            tx.estado = 'completada'
-            tx.save(update_fields=['estado'])
+            transicionar(tx, 'completada')
 
         # 4) agendar consulta si corresponde
         if (
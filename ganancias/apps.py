@@ -4,6 +4,3 @@ class GananciasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ganancias'
     verbose_name = 'Módulo de Ganancias'
-
-    def ready(self):
-        import ganancias.signals  # Importar las señales aquí
@@ -1,19 +1,16 @@
 """
-Señales de la aplicación **ganancias**.
+Manejador de eventos de la aplicación **ganancias**.
 
-.. module:: ganancias.signals
-   :synopsis: Cálculo y registro automático de ganancias a partir de transacciones.
+.. module:: ganancias.eventos
+   :synopsis: Cálculo y registro de ganancias a partir de transacciones.
 
-Este módulo conecta la señal :data:`django.db.models.signals.post_save` del
-modelo :class:`transacciones.models.Transaccion` con la lógica de negocio que
-calcula y persiste instancias de :class:`ganancias.models.RegistroGanancia`.
+El despachador de :mod:`transacciones.outbox` llama a
+:func:`registrar_ganancia` con cada evento ``ganancias`` (una transacción
+escrita en estado ``completada``), fuera del request que hizo el cambio.
 """
 
 
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from django.utils import timezone # Importar timezone
-from transacciones.models import Transaccion
 from monedas.models import Moneda
 from decimal import Decimal # Importar Decimal para cálculos precisos
 from .models import RegistroGanancia
@@ -21,15 +18,14 @@ from .models import RegistroGanancia
 # from cotizaciones.models import Cotizacion
 # from clientes.models import Cliente
 
-@receiver(post_save, sender=Transaccion)
-def crear_o_actualizar_registro_ganancia(sender, instance, created, **kwargs):
+def registrar_ganancia(evento):
     """
-    Crea o actualiza un :class:`RegistroGanancia` cuando una transacción
-    se marca como ``completada``.
+    Crea o actualiza el :class:`RegistroGanancia` de la transacción del evento
+    si sigue ``completada``. Es idempotente (:meth:`update_or_create`).
 
     Lógica principal
     ----------------
-    1. Verifica que ``instance.estado == 'completada'``.
+    1. Verifica que ``instance.estado == 'completada'`` (el estado actual, no el del evento).
     2. Obtiene la moneda PYG (moneda base en la que se registra la ganancia).
     3. Determina la moneda operada según el tipo de operación:
 
@@ -52,14 +48,10 @@ def crear_o_actualizar_registro_ganancia(sender, instance, created, **kwargs):
        por el monto operado y registra el resultado en
        :class:`RegistroGanancia` mediante :meth:`update_or_create`.
 
-    :param sender: Modelo que dispara la señal (``Transaccion``).
-    :type sender: type
-    :param instance: Instancia de transacción recién guardada.
-    :type instance: transacciones.models.Transaccion
-    :param created: Indica si la instancia fue creada (``True``) o actualizada.
-    :type created: bool
-    :param kwargs: Parámetros adicionales de la señal (no utilizados).
+    :param evento: Evento de la bandeja de salida.
+    :type evento: transacciones.models.EventoTransaccion
     """
+    instance = evento.transaccion
     if instance.estado == 'completada':
         # Obtener la moneda PYG (asumiendo que es la moneda base)
         try:
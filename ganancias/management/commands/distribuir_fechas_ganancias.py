@@ -6,7 +6,9 @@ from django.db import transaction
 
 from ganancias.models import RegistroGanancia
 from transacciones.models import Transaccion
+from transacciones.limites import reconstruir_exposicion
 from cotizaciones.models import CotizacionHistorica   # 👈 NUEVO
+from cotizaciones.diaria import reconstruir_diaria
 
 
 class Command(BaseCommand):
@@ -239,12 +241,15 @@ class Command(BaseCommand):
                         fecha_creacion=nueva,
                         fecha_actualizacion=nueva,
                     )
+            if update_trans:
+                reconstruir_exposicion()
 
             self.stdout.write("Actualizando CotizacionHistorica...")
             for reg, vieja, nueva in mapeo_c:
                 CotizacionHistorica.objects.filter(pk=reg.pk).update(
                     fecha=nueva
                 )
+            reconstruir_diaria()
 
         self.stdout.write(self.style.SUCCESS(
             "\nFechas redistribuidas con éxito. "
@@ -7,7 +7,9 @@ from django.db.models import F
 
 from ganancias.models import RegistroGanancia
 from transacciones.models import Transaccion
+from transacciones.limites import reconstruir_exposicion
 from cotizaciones.models import CotizacionHistorica
+from cotizaciones.diaria import reconstruir_diaria
 
 
 class Command(BaseCommand):
@@ -122,10 +124,12 @@ class Command(BaseCommand):
                     fecha_creacion=F("fecha_creacion") - delta,
                     fecha_actualizacion=F("fecha_actualizacion") - delta,
                 )
+                reconstruir_exposicion()
 
                 self.stdout.write("Actualizando CotizacionHistorica...")
                 CotizacionHistorica.objects.update(
                     fecha=F("fecha") - delta
                 )
+                reconstruir_diaria()
 
         self.stdout.write(self.style.SUCCESS("Fechas desplazadas correctamente."))
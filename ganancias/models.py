@@ -35,9 +35,9 @@ class RegistroGanancia(models.Model):
       (por ejemplo USD, EUR).
     - ``fecha_registro``: Fecha y hora en la que se calculó/registró la ganancia.
 
-    Este modelo se crea o actualiza automáticamente desde
-    :mod:`ganancias.signals` cuando una transacción pasa al estado
-    ``completada``.
+    Este modelo se crea o actualiza desde :mod:`ganancias.eventos` (bandeja de
+    salida de :mod:`transacciones.outbox`) cuando una transacción pasa al
+    estado ``completada``.
     """
     
     transaccion = models.OneToOneField(
@@ -1,6 +1,5 @@
-# ganancias/tests/test_signals.py
+# ganancias/tests/test_eventos.py
 from django.test import TestCase
-from django.utils import timezone
 from decimal import Decimal
 import uuid
 
@@ -9,6 +8,7 @@ from monedas.models import Moneda
 from transacciones.models import Transaccion
 from ganancias.models import RegistroGanancia
 from clientes.models import Cliente
+from transacciones.outbox import despachar_eventos
 
 CustomUser = get_user_model()
 
@@ -39,6 +39,7 @@ class SignalVentaTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         esperado = ((Decimal("0.05") - Decimal("0.01")) * Decimal("80.00")).quantize(Decimal("0.00"))
         self.assertEqual(reg.ganancia_registrada, esperado)
@@ -55,10 +56,12 @@ class SignalVentaTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg1 = RegistroGanancia.objects.get(transaccion=tx)
         tx.comision_aplicada = Decimal("0.02")
         tx.monto_destino = Decimal("60.00")
         tx.save()
+        despachar_eventos()
         reg2 = RegistroGanancia.objects.get(transaccion=tx)
         esperado = ((Decimal("0.05") - Decimal("0.02")) * Decimal("60.00")).quantize(Decimal("0.00"))
         self.assertEqual(reg2.ganancia_registrada, esperado)
@@ -73,6 +76,7 @@ class SignalVentaTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         self.assertFalse(RegistroGanancia.objects.filter(transaccion=tx).exists())
 
     def test_crea_registro_al_cambiar_a_completada(self):
@@ -86,6 +90,7 @@ class SignalVentaTests(BaseSignalTest):
         )
         tx.estado = "completada"
         tx.save()
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         esperado = ((Decimal("0.05") - Decimal("0.01")) * Decimal("80.00")).quantize(Decimal("0.00"))
         self.assertEqual(reg.ganancia_registrada, esperado)
@@ -99,6 +104,7 @@ class SignalVentaTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         self.assertEqual(reg.moneda_operada, self.usd)
 
@@ -113,6 +119,7 @@ class SignalCompraTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         esperado = ((Decimal("0.03") - Decimal("0.01")) * Decimal("120.00")).quantize(Decimal("0.00"))
         self.assertEqual(reg.ganancia_registrada, esperado)
@@ -127,6 +134,7 @@ class SignalCompraTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         self.assertEqual(reg.moneda_operada, self.eur)
 
@@ -141,6 +149,7 @@ class SignalTipoOperacionTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         self.assertFalse(RegistroGanancia.objects.filter(transaccion=tx).exists())
 
 
@@ -155,6 +164,7 @@ class SignalMonedaPYGTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         self.assertFalse(RegistroGanancia.objects.filter(transaccion=tx).exists())
 
 
@@ -168,6 +178,7 @@ class SignalGananciaPrecisionTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         esperado = Decimal("0.00").quantize(Decimal("0.00"))
         self.assertEqual(reg.ganancia_registrada, esperado)
@@ -181,6 +192,7 @@ class SignalGananciaPrecisionTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         esperado = (Decimal("0.02") * Decimal("999999999999.99")).quantize(Decimal("0.00"))
         self.assertEqual(reg.ganancia_registrada, esperado)
@@ -194,6 +206,7 @@ class SignalGananciaPrecisionTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         esperado = (Decimal("0.10") * Decimal("1.23")).quantize(Decimal("0.00"))
         self.assertEqual(reg.ganancia_registrada, esperado)
@@ -207,6 +220,7 @@ class SignalGananciaPrecisionTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         esperado = Decimal("0.00").quantize(Decimal("0.00"))
         self.assertEqual(reg.ganancia_registrada, esperado)
@@ -220,6 +234,7 @@ class SignalGananciaPrecisionTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         esperado = Decimal("0.00").quantize(Decimal("0.00"))
         self.assertEqual(reg.ganancia_registrada, esperado)
@@ -233,8 +248,10 @@ class SignalGananciaPrecisionTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
-        esperado = ((Decimal("0.1234") - Decimal("0.0234")) * Decimal("1.2345")).quantize(Decimal("0.00"))
+        # El manejador usa los montos guardados (dos decimales en montos y comisión aplicada).
+        esperado = ((Decimal("0.1234") - Decimal("0.02")) * Decimal("1.23")).quantize(Decimal("0.00"))
         self.assertEqual(reg.ganancia_registrada, esperado)
 
 
@@ -248,6 +265,7 @@ class SignalFechaRegistroTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         self.assertIsNotNone(reg.fecha_registro)
 
@@ -260,10 +278,12 @@ class SignalFechaRegistroTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg1 = RegistroGanancia.objects.get(transaccion=tx)
         # Pequeña espera simulada con una nueva fecha al guardar
         tx.comision_aplicada = Decimal("0.00")
         tx.save()
+        despachar_eventos()
         reg2 = RegistroGanancia.objects.get(transaccion=tx)
         self.assertGreaterEqual(reg2.fecha_registro, reg1.fecha_registro)
 
@@ -278,9 +298,11 @@ class SignalUpdateOrCreateTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg1 = RegistroGanancia.objects.get(transaccion=tx)
         tx.monto_destino = Decimal("160.00")
         tx.save()
+        despachar_eventos()
         reg2 = RegistroGanancia.objects.get(transaccion=tx)
         self.assertEqual(reg1.transaccion_id, reg2.transaccion_id)
         self.assertEqual(RegistroGanancia.objects.count(), 1)
@@ -302,6 +324,7 @@ class SignalUpdateOrCreateTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         qs = RegistroGanancia.objects.filter(moneda_ganancia__codigo="PYG")
         self.assertEqual(qs.count(), 2)
 
@@ -323,6 +346,7 @@ class SignalUpdateOrCreateTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         qs_usd = RegistroGanancia.objects.filter(moneda_operada__codigo="USD")
         qs_eur = RegistroGanancia.objects.filter(moneda_operada__codigo="EUR")
         self.assertEqual(qs_usd.count(), 1)
@@ -345,6 +369,7 @@ class SignalUpdateOrCreateTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         r1 = RegistroGanancia.objects.get(transaccion=t1)
         r2 = RegistroGanancia.objects.get(transaccion=t2)
         registros = list(RegistroGanancia.objects.all())
@@ -362,6 +387,7 @@ class SignalRobustezTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         reg = RegistroGanancia.objects.get(transaccion=tx)
         esperado = ((Decimal("0.01") - Decimal("0.02")) * Decimal("80.00")).quantize(Decimal("0.00"))
         self.assertEqual(reg.ganancia_registrada, esperado)
@@ -375,6 +401,7 @@ class SignalRobustezTests(BaseSignalTest):
             tasa_cambio_aplicada=Decimal("7300.00"),
             cliente=self.cliente, usuario_operador=self.operador, codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         self.assertFalse(RegistroGanancia.objects.filter(transaccion=tx).exists())
 
     def test_registro_se_recalcula_en_multiples_updates(self):
@@ -388,16 +415,19 @@ class SignalRobustezTests(BaseSignalTest):
         )
         tx.comision_aplicada = Decimal("0.02")
         tx.save()
+        despachar_eventos()
         reg1 = RegistroGanancia.objects.get(transaccion=tx)
         esperado1 = ((Decimal("0.10") - Decimal("0.02")) * Decimal("10.00")).quantize(Decimal("0.00"))
         self.assertEqual(reg1.ganancia_registrada, esperado1)
         tx.comision_cotizacion = Decimal("0.20")
         tx.save()
+        despachar_eventos()
         reg2 = RegistroGanancia.objects.get(transaccion=tx)
         esperado2 = ((Decimal("0.20") - Decimal("0.02")) * Decimal("10.00")).quantize(Decimal("0.00"))
         self.assertEqual(reg2.ganancia_registrada, esperado2)
         tx.monto_destino = Decimal("5.00")
         tx.save()
+        despachar_eventos()
         reg3 = RegistroGanancia.objects.get(transaccion=tx)
         esperado3 = ((Decimal("0.20") - Decimal("0.02")) * Decimal("5.00")).quantize(Decimal("0.00"))
         self.assertEqual(reg3.ganancia_registrada, esperado3)
@@ -7,6 +7,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from monedas.models import Moneda
 from transacciones.models import Transaccion
+from transacciones.outbox import despachar_eventos
 from ganancias.models import RegistroGanancia
 from clientes.models import Cliente
 import uuid
@@ -108,6 +109,7 @@ class DashboardGananciasMetricsTest(TestCase):
             cliente=self.cliente, usuario_operador=self.operador,
             codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         # Asegurar fechas diferentes para gráfico
         r1 = RegistroGanancia.objects.get(transaccion=t1)
         r1.fecha_registro = timezone.now() - timezone.timedelta(days=1)
@@ -201,6 +203,7 @@ class DashboardGananciasFiltersTest(TestCase):
             cliente=self.cliente, usuario_operador=self.operador,
             codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         r1 = RegistroGanancia.objects.get(transaccion=t1)
         r1.fecha_registro = timezone.now() - timezone.timedelta(days=10)
         r1.save()
@@ -214,6 +217,7 @@ class DashboardGananciasFiltersTest(TestCase):
             cliente=self.cliente, usuario_operador=self.operador,
             codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         r2 = RegistroGanancia.objects.get(transaccion=t2)
         r2.fecha_registro = timezone.now() - timezone.timedelta(days=5)
         r2.save()
@@ -227,6 +231,7 @@ class DashboardGananciasFiltersTest(TestCase):
             cliente=self.cliente, usuario_operador=self.operador,
             codigo_operacion_tauser=str(uuid.uuid4())[:10],
         )
+        despachar_eventos()
         r3 = RegistroGanancia.objects.get(transaccion=t3)
         r3.fecha_registro = timezone.now()
         r3.save()
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monedas', '0011_alter_tedinventario_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tedinventario',
+            name='reservada',
+            field=models.PositiveIntegerField(default=0, help_text='Unidades retenidas por reservas activas (ver TedReserva). Disponible = cantidad - reservada.'),
+        ),
+        migrations.CreateModel(
+            name='TedReserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reserva_id', models.CharField(db_index=True, max_length=32)),
+                ('ubicacion', models.CharField(max_length=180)),
+                ('unidades', models.PositiveIntegerField()),
+                ('expira_en', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('denominacion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='reservas', to='monedas.teddenominacion')),
+            ],
+            options={
+                'ordering': ['expira_en'],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+
+def corte_inicial(apps, schema_editor):
+    """Los movimientos previos no tienen ubicación: el primer corte parte del stock actual."""
+    TedInventario = apps.get_model("monedas", "TedInventario")
+    TedMovimiento = apps.get_model("monedas", "TedMovimiento")
+    TedStockCorte = apps.get_model("monedas", "TedStockCorte")
+    hasta = TedMovimiento.objects.aggregate(ultimo=Max("pk"))["ultimo"] or 0
+    ahora = timezone.now()
+    TedStockCorte.objects.bulk_create([
+        TedStockCorte(denominacion_id=inv.denominacion_id, ubicacion=inv.ubicacion,
+                      cantidad=inv.cantidad, hasta_movimiento_id=hasta, tomado_en=ahora)
+        for inv in TedInventario.objects.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monedas', '0012_tedreserva'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TedStockCorte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ubicacion', models.CharField(max_length=180)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('hasta_movimiento_id', models.BigIntegerField(default=0, help_text='ID del último TedMovimiento reflejado en la cantidad.')),
+                ('tomado_en', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-tomado_en', 'ubicacion', 'denominacion_id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='tedmovimiento',
+            name='saldo',
+            field=models.IntegerField(blank=True, help_text='Stock de la denominación en la ubicación después del movimiento.', null=True),
+        ),
+        migrations.AddField(
+            model_name='tedmovimiento',
+            name='ubicacion',
+            field=models.CharField(blank=True, default='', help_text='Ubicación cuyo inventario se modificó (vacío en movimientos anteriores a este campo).', max_length=180),
+        ),
+        migrations.AddIndex(
+            model_name='tedmovimiento',
+            index=models.Index(fields=['ubicacion', 'created_at'], name='idx_tedmov_ubic_fecha'),
+        ),
+        migrations.AddField(
+            model_name='tedstockcorte',
+            name='denominacion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='cortes', to='monedas.teddenominacion'),
+        ),
+        migrations.AddIndex(
+            model_name='tedstockcorte',
+            index=models.Index(fields=['ubicacion', 'tomado_en'], name='idx_tedcorte_ubic_fecha'),
+        ),
+        migrations.RunPython(corte_inicial, migrations.RunPython.noop),
+    ]
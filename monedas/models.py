@@ -180,6 +180,10 @@ class TedInventario(models.Model):
         help_text="Ubicación física/lógica del TED (ej.: 'Campus, San Lorenzo – Paraguay')."
     )
     cantidad = models.PositiveIntegerField(default=0)
+    reservada = models.PositiveIntegerField(
+        default=0,
+        help_text="Unidades retenidas por reservas activas (ver TedReserva). Disponible = cantidad - reservada."
+    )
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -223,7 +227,18 @@ class TedMovimiento(models.Model):
         on_delete=models.PROTECT,
         related_name="movimientos"
     )
+    ubicacion = models.CharField(
+        max_length=180,
+        blank=True,
+        default="",
+        help_text="Ubicación cuyo inventario se modificó (vacío en movimientos anteriores a este campo)."
+    )
     delta = models.IntegerField(help_text="Variación de stock. Positivo suma, negativo resta.")
+    saldo = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Stock de la denominación en la ubicación después del movimiento."
+    )
     motivo = models.CharField(max_length=12, choices=MOTIVO_CHOICES, default=MOTIVO_OTRO)
     creado_por = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -242,7 +257,70 @@ class TedMovimiento(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["ubicacion", "created_at"], name="idx_tedmov_ubic_fecha"),
+        ]
 
     def __str__(self) -> str:
         signo = "+" if self.delta >= 0 else "-"
         return f"[{self.created_at:%Y-%m-%d %H:%M}] {self.denominacion} {signo}{abs(self.delta)} ({self.motivo})"
+
+
+class TedStockCorte(models.Model):
+    """
+    Foto del stock de una denominación en una ubicación en un momento dado.
+
+    Los cortes se toman en lote por ubicación (ver :func:`ted.stock.tomar_cortes`):
+    todas las filas de una corrida comparten ``tomado_en`` y ``hasta_movimiento_id``,
+    el último :class:`TedMovimiento` incluido. El stock a una fecha se obtiene del
+    corte más cercano anterior más los movimientos posteriores a ese ID.
+    """
+    denominacion = models.ForeignKey(
+        TedDenominacion,
+        on_delete=models.PROTECT,
+        related_name="cortes"
+    )
+    ubicacion = models.CharField(max_length=180)
+    cantidad = models.PositiveIntegerField()
+    hasta_movimiento_id = models.BigIntegerField(
+        default=0,
+        help_text="ID del último TedMovimiento reflejado en la cantidad."
+    )
+    tomado_en = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-tomado_en", "ubicacion", "denominacion_id"]
+        indexes = [
+            models.Index(fields=["ubicacion", "tomado_en"], name="idx_tedcorte_ubic_fecha"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Corte {self.denominacion} @ {self.ubicacion} = {self.cantidad} ({self.tomado_en:%Y-%m-%d %H:%M})"
+
+
+class TedReserva(models.Model):
+    """
+    Retención temporal de billetes para un retiro precontado en la terminal TED.
+
+    Cada fila retiene ``unidades`` de una denominación en una ubicación hasta
+    ``expira_en``; las filas de un mismo preconteo comparten ``reserva_id``.
+    El total retenido se refleja en ``TedInventario.reservada`` (ver
+    :mod:`ted.stock`): al confirmar, la retención se convierte en movimiento, y
+    las vencidas se liberan en lote.
+    """
+    reserva_id = models.CharField(max_length=32, db_index=True)
+    denominacion = models.ForeignKey(
+        TedDenominacion,
+        on_delete=models.PROTECT,
+        related_name="reservas"
+    )
+    ubicacion = models.CharField(max_length=180)
+    unidades = models.PositiveIntegerField()
+    expira_en = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["expira_en"]
+
+    def __str__(self) -> str:
+        return f"Reserva {self.reserva_id}: {self.denominacion} x{self.unidades} @ {self.ubicacion}"
@@ -0,0 +1,143 @@
+# notificaciones/agrupador.py
+"""
+Agrupación de cambios de tasa antes de notificar
+================================================
+
+.. module:: notificaciones.agrupador
+   :synopsis: Debounce por cotización de las notificaciones de cambio de tasa.
+
+Cuando una cotización cambia varias veces en pocos segundos, cada ``save()``
+encolaría una notificación y los mismos usuarios recibirían varios correos.
+En su lugar, cada cambio:
+
+1. Guarda en la caché compartida los totales **anteriores** al primer cambio de
+   la ventana (``cache.add``: sólo el primero los fija).
+2. Publica una nueva versión para la cotización y programa
+   ``notificar_cambio_agrupado`` con ``countdown`` igual a la ventana.
+
+Al ejecutarse, la tarea compara su versión con la publicada: si hubo un cambio
+posterior, se descarta (la tarea más nueva notificará). La última calcula el
+cambio neto entre los totales anteriores y los actuales y notifica una sola vez;
+si el valor volvió al original, no se notifica nada.
+
+Registrar un cambio y cerrar la ventana leen y escriben dos claves; ambas
+operaciones se serializan con un bloqueo por cotización (``cache.add``), para
+que un cambio que llega mientras se cierra la ventana no pierda su versión ni
+los totales anteriores. Si el bloqueo no se consigue a tiempo se lanza
+:class:`BloqueoOcupado` en lugar de seguir sin él; la tarea programada lo
+reintenta.
+
+Una actualización en lote del tablero (:mod:`cotizaciones.lote`) notifica en
+el momento y absorbe la ventana pendiente con :func:`descartar_pendiente`: la
+tarea programada queda reemplazada y el mensaje del tablero muestra los totales
+anteriores a la ventana.
+
+La ventana se configura con ``settings.NOTIFICACIONES_TASA_VENTANA_SEGUNDOS``.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+VENTANA_POR_DEFECTO = 60
+
+# Margen de vida de las claves más allá de la ventana, por si el worker demora.
+MARGEN_SEGUNDOS = 15 * 60
+
+# Vida del bloqueo y espera máxima para tomarlo: si quien lo tiene cayó, vence solo.
+BLOQUEO_SEGUNDOS = 5
+
+
+class BloqueoOcupado(Exception):
+    """
+    El bloqueo de la cotización sigue tomado por otro proceso al vencer la espera.
+
+    :ivar cotizacion_id: Cotización cuyo bloqueo no se pudo tomar.
+    """
+
+    def __init__(self, cotizacion_id):
+        self.cotizacion_id = cotizacion_id
+        super().__init__(f"Bloqueo de la cotización {cotizacion_id} ocupado tras {BLOQUEO_SEGUNDOS} s.")
+
+
+def ventana_segundos():
+    return getattr(settings, "NOTIFICACIONES_TASA_VENTANA_SEGUNDOS", VENTANA_POR_DEFECTO)
+
+
+def _clave_version(cotizacion_id):
+    return f"notificaciones:tasa:{cotizacion_id}:version"
+
+
+def _clave_antes(cotizacion_id):
+    return f"notificaciones:tasa:{cotizacion_id}:antes"
+
+
+@contextmanager
+def _bloqueo(cotizacion_id):
+    clave = f"notificaciones:tasa:{cotizacion_id}:bloqueo"
+    # El token identifica a quien tomó el bloqueo: si el nuestro venció y otro
+    # proceso lo tomó, no hay que liberárselo.
+    token = uuid.uuid4().hex
+    limite = time.monotonic() + BLOQUEO_SEGUNDOS
+    while not cache.add(clave, token, BLOQUEO_SEGUNDOS):
+        if time.monotonic() >= limite:
+            raise BloqueoOcupado(cotizacion_id)
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        if cache.get(clave) == token:
+            cache.delete(clave)
+
+
+def registrar_cambio(cotizacion):
+    """
+    Registra un cambio de ``cotizacion`` dentro de la ventana en curso.
+
+    :returns: Versión publicada, que la tarea programada debe presentar en
+        :func:`tomar_cambio`.
+    :rtype: str
+    """
+    vida = ventana_segundos() + MARGEN_SEGUNDOS
+    total_compra, total_venta = cotizacion.totales_originales()
+    antes = {lado: total for lado, total in (("compra", total_compra), ("venta", total_venta))
+             if total is not None}
+    version = uuid.uuid4().hex
+    with _bloqueo(cotizacion.pk):
+        cache.add(_clave_antes(cotizacion.pk), antes, vida)
+        cache.set(_clave_version(cotizacion.pk), version, vida)
+    return version
+
+
+def tomar_cambio(cotizacion_id, version):
+    """
+    Cierra la ventana de ``cotizacion_id`` si ``version`` sigue vigente.
+
+    :returns: Totales anteriores ``{"compra", "venta"}`` (o ``{}`` si se perdieron),
+        o ``None`` si la versión fue reemplazada por un cambio posterior.
+    """
+    with _bloqueo(cotizacion_id):
+        if cache.get(_clave_version(cotizacion_id)) != version:
+            return None
+        return _cerrar(cotizacion_id)
+
+
+def descartar_pendiente(cotizacion_id):
+    """
+    Cierra la ventana de ``cotizacion_id`` sin importar la versión, de modo que
+    la tarea programada se descarte.
+
+    :returns: Totales anteriores a la ventana, o ``None`` si no había una abierta.
+    """
+    with _bloqueo(cotizacion_id):
+        if cache.get(_clave_version(cotizacion_id)) is None:
+            return None
+        return _cerrar(cotizacion_id)
+
+
+def _cerrar(cotizacion_id):
+    antes = cache.get(_clave_antes(cotizacion_id)) or {}
+    cache.delete_many([_clave_version(cotizacion_id), _clave_antes(cotizacion_id)])
+    return antes
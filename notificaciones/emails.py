@@ -1,13 +1,15 @@
 # notificaciones/emails.py (NUEVO ARCHIVO)
 
-from django.core.mail import send_mail, EmailMessage, EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils.html import strip_tags
 
-def enviar_email_cambio_tasa(usuario, mensaje_notificacion, cotizacion, venta_cambio, compra_cambio):
+def construir_email_cambio_tasa(usuario, mensaje_notificacion, cotizacion, venta_cambio, compra_cambio):
     """
-    Envía un correo electrónico de notificación de cambio de tasa a un usuario.
+    Arma (sin enviar) el correo de notificación de cambio de tasa para un usuario.
+
+    :returns: :class:`~django.core.mail.EmailMultiAlternatives` con versión HTML y texto plano.
     """
     subject = f"Actualización de Tasa de Cambio: {cotizacion.moneda_destino.codigo}"
     
@@ -25,25 +27,44 @@ def enviar_email_cambio_tasa(usuario, mensaje_notificacion, cotizacion, venta_ca
     
     # Crear una versión de texto plano para clientes de correo que no soportan HTML
     plain_message = strip_tags(html_message)
-    
-    from_email = settings.DEFAULT_FROM_EMAIL
-    to_email = [usuario.email]
 
+    email = EmailMultiAlternatives(subject, plain_message, settings.DEFAULT_FROM_EMAIL, [usuario.email])
+    email.attach_alternative(html_message, "text/html")
+    return email
+
+
+def enviar_email_cambio_tasa(usuario, mensaje_notificacion, cotizacion, venta_cambio, compra_cambio):
+    """
+    Envía un correo electrónico de notificación de cambio de tasa a un usuario.
+    """
     try:
-        send_mail(
-            subject,
-            plain_message,
-            from_email,
-            to_email,
-            html_message=html_message,
-            fail_silently=False,
-        )
+        construir_email_cambio_tasa(
+            usuario, mensaje_notificacion, cotizacion, venta_cambio, compra_cambio
+        ).send(fail_silently=False)
         print(f"Correo de notificación enviado exitosamente a {usuario.email}")
     except Exception as e:
         # Es buena idea registrar el error en un log
         print(f"Error al enviar correo de notificación a {usuario.email}: {e}")
 
 
+def enviar_emails_cambio_tasa(usuarios, mensaje_notificacion, cotizacion, venta_cambio, compra_cambio):
+    """
+    Envía el correo de cambio de tasa a varios usuarios por **una sola** conexión SMTP.
+
+    :param usuarios: Iterable de usuarios destinatarios.
+    :returns: Cantidad de correos aceptados por el backend.
+    """
+    mensajes = [
+        construir_email_cambio_tasa(usuario, mensaje_notificacion, cotizacion, venta_cambio, compra_cambio)
+        for usuario in usuarios
+        if usuario.email
+    ]
+    if not mensajes:
+        return 0
+    with get_connection(fail_silently=False) as conexion:
+        return conexion.send_messages(mensajes) or 0
+
+
 def enviar_email_con_adjunto(destinatario_email, asunto, template_html, contexto, nombre_adjunto, contenido_adjunto, tipo_mime_adjunto='application/pdf'):
     """
     Envía un correo electrónico con un archivo adjunto.
@@ -0,0 +1,37 @@
+# notificaciones/eventos.py
+"""
+Manejador de eventos de la aplicación de notificaciones.
+
+.. module:: notificaciones.eventos
+   :synopsis: Notificación en el tablón de los cambios de estado de una transacción.
+
+El despachador de :mod:`transacciones.outbox` llama a :func:`notificar_estado`
+con cada evento ``notificaciones`` (un cambio a un estado que interesa al
+usuario: listo para retirar, completada, cancelada, anulada o con error).
+"""
+from django.urls import reverse
+
+from .models import Notificacion
+
+
+def notificar_estado(evento):
+    """
+    Crea una :class:`Notificacion` de tipo ``transaccion`` para el usuario que
+    operó la transacción del evento.
+
+    Es idempotente: una transacción llega a cada estado una sola vez, así que
+    el mensaje identifica el evento y no se repite si ya existe.
+
+    :param evento: Evento de la bandeja de salida.
+    :type evento: transacciones.models.EventoTransaccion
+    """
+    transaccion = evento.transaccion
+    estados = dict(type(transaccion)._meta.get_field('estado').choices)
+    mensaje = (f"Tu transacción {transaccion.codigo_operacion_tauser} pasó a "
+               f"'{estados.get(evento.estado, evento.estado)}'.")
+    Notificacion.objects.get_or_create(
+        destinatario_id=transaccion.usuario_operador_id,
+        tipo='transaccion',
+        mensaje=mensaje,
+        defaults={'url_destino': reverse('core:detalle_transaccion', args=[transaccion.id])},
+    )
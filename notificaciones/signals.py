@@ -3,9 +3,12 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.conf import settings
-from cotizaciones.signals import cotizacion_actualizada
+from cotizaciones.signals import cotizacion_actualizada, tablero_actualizado
 from .models import PreferenciasNotificacion, Notificacion
-from .tasks import notificar_cambio_de_tasa_a_usuarios
+from .agrupador import descartar_pendiente, registrar_cambio, ventana_segundos
+from .tasks import (mensaje_cambio_tasa, notificar_cambio_agrupado, notificar_cambio_de_tablero,
+                    notificar_cambio_de_tasa_a_usuarios)
+
 
 @receiver(cotizacion_actualizada)
 def crear_notificacion_por_cambio_tasa(sender, instance, venta_cambio=False, compra_cambio=False, **kwargs):
@@ -17,18 +20,48 @@ def crear_notificacion_por_cambio_tasa(sender, instance, venta_cambio=False, com
     if not venta_cambio and not compra_cambio:
         return
     User = get_user_model()  # Se obtiene el modelo de usuario.
-    
-    # Construir el mensaje usando las propiedades que incluyen comisión
-    mensaje = f"¡Atención! La cotización de {instance.moneda_destino.nombre} ({instance.moneda_destino.codigo}) ha cambiado. "
-    if venta_cambio:
-        mensaje += f"Nuevo precio de venta: {instance.total_venta:,.0f} Gs. "
-    if compra_cambio:
-        mensaje += f"Nuevo precio de compra: {instance.total_compra:,.0f} Gs."
 
-    # Llama a la tarea de Celery para que se ejecute en segundo plano
-    notificar_cambio_de_tasa_a_usuarios.delay(instance.id, mensaje, compra_cambio, venta_cambio)
+    ventana = ventana_segundos()
+    if ventana <= 0:
+        mensaje = mensaje_cambio_tasa(instance, venta_cambio, compra_cambio)
+        # Llama a la tarea de Celery para que se ejecute en segundo plano
+        notificar_cambio_de_tasa_a_usuarios.delay(instance.id, mensaje, compra_cambio, venta_cambio)
+        return
+
+    # Los cambios de la misma cotización dentro de la ventana se agrupan: sólo la
+    # última tarea programada notifica, con el cambio neto (ver notificaciones.agrupador).
+    version = registrar_cambio(instance)
+    notificar_cambio_agrupado.apply_async((instance.id, version), countdown=ventana)
+
 
 
+@receiver(tablero_actualizado, dispatch_uid="notificar_cambio_de_tablero")
+def notificar_por_cambio_de_tablero(sender, cotizaciones, cambios, **kwargs):
+    """
+    Una actualización en lote del tablero encola **una** tarea de notificación
+    con todos los pares cambiados.
+
+    Si un par tenía cambios individuales agrupándose (ver
+    :mod:`notificaciones.agrupador`), la ventana se cierra aquí: su tarea se
+    descarta y este mensaje informa el cambio desde los totales anteriores a ella.
+    """
+    por_id = {cotizacion.pk: cotizacion for cotizacion in cotizaciones}
+    pares = []
+    for cambio in cambios:
+        cotizacion = por_id[cambio['cotizacion_id']]
+        compra_cambio, venta_cambio = cambio['compra_cambio'], cambio['venta_cambio']
+        antes = descartar_pendiente(cotizacion.pk)
+        if antes:
+            compra_cambio = compra_cambio or antes.get('compra', cotizacion.total_compra) != cotizacion.total_compra
+            venta_cambio = venta_cambio or antes.get('venta', cotizacion.total_venta) != cotizacion.total_venta
+        pares.append({
+            'cotizacion_id': cotizacion.pk,
+            'mensaje': mensaje_cambio_tasa(cotizacion, venta_cambio, compra_cambio, antes),
+            'compra_cambio': compra_cambio,
+            'venta_cambio': venta_cambio,
+        })
+    notificar_cambio_de_tablero.delay(pares)
+
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def crear_preferencias_para_nuevo_usuario(sender, instance, created, **kwargs):
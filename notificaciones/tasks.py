@@ -1,12 +1,108 @@
 # notificaciones/tasks.py
+import logging
+from time import perf_counter
+
 from celery import shared_task
 from django.contrib.auth import get_user_model
 from transacciones.models import Transaccion
 from cotizaciones.models import Cotizacion
-from django.db.models import Q
-from .emails import enviar_email_cambio_tasa
+from django.db.models import Exists, OuterRef, Q
+from .agrupador import BloqueoOcupado, tomar_cambio
+from .emails import enviar_emails_cambio_tasa
 from django.utils import timezone
-from .models import Notificacion
+from .models import Notificacion, PreferenciasNotificacion
+
+logger = logging.getLogger(__name__)
+
+# Correos por sub-tarea; cada lote se envía por una única conexión SMTP.
+EMAILS_POR_LOTE = 50
+
+# Notificaciones por sentencia INSERT en ``bulk_create``.
+NOTIFICACIONES_POR_INSERT = 500
+
+
+def mensaje_cambio_tasa(cotizacion, venta_cambio, compra_cambio, antes=None):
+    """
+    Texto de la notificación de cambio de tasa.
+
+    :param dict antes: Totales previos ``{"compra", "venta"}``; si se indican, el
+        mensaje muestra también el valor anterior.
+    """
+    antes = antes or {}
+    # Construir el mensaje usando las propiedades que incluyen comisión
+    mensaje = f"¡Atención! La cotización de {cotizacion.moneda_destino.nombre} ({cotizacion.moneda_destino.codigo}) ha cambiado. "
+    if venta_cambio:
+        mensaje += f"Nuevo precio de venta: {cotizacion.total_venta:,.0f} Gs. "
+        if 'venta' in antes:
+            mensaje += f"(antes {antes['venta']:,.0f} Gs.) "
+    if compra_cambio:
+        mensaje += f"Nuevo precio de compra: {cotizacion.total_compra:,.0f} Gs."
+        if 'compra' in antes:
+            mensaje += f" (antes {antes['compra']:,.0f} Gs.)"
+    return mensaje
+
+
+def _usuarios_a_notificar(cotizacion, compra_cambio, venta_cambio):
+    """
+    Resuelve en **una sola consulta** los usuarios que deben recibir la notificación.
+
+    Cada usuario trae sus preferencias (``select_related``) y dos marcas calculadas
+    en la base de datos sobre ``monedas_seguidas``: si sigue alguna moneda y si sigue
+    la moneda de la cotización. Quien sigue monedas pero no ésta queda excluido.
+
+    :returns: QuerySet de usuarios distintos con ``preferencias_notificacion`` cargado.
+    """
+    # Estados de transacción que consideramos "pendientes"
+    estados_pendientes = [
+        'pendiente_pago_cliente',
+        'pendiente_confirmacion_pago',
+        'pendiente_deposito_tauser',
+        'pendiente_pago_stripe'
+    ]
+
+    moneda_extranjera = cotizacion.moneda_destino
+    ahora = timezone.now()
+
+    filtro_base = (
+        Q(estado__in=estados_pendientes) &
+        (Q(moneda_origen=moneda_extranjera) | Q(moneda_destino=moneda_extranjera)) &
+        # EXCLUIR transacciones cuya tasa garantizada ya expiró.
+        (Q(tasa_garantizada_hasta__isnull=True) | Q(tasa_garantizada_hasta__gte=ahora))
+    )
+
+    # Por tipo de operación, sólo si su tasa cambió:
+    # - Tasa flotante: siempre se notifica.
+    # - Tasa bloqueada: si la tasa guardada es diferente a la nueva.
+    afectadas = Q(pk__in=[])
+    if compra_cambio:
+        afectadas |= Q(tipo_operacion='compra') & (
+            Q(modalidad_tasa='flotante') |
+            (Q(modalidad_tasa='bloqueada') & ~Q(tasa_cambio_aplicada=cotizacion.valor_compra))
+        )
+    if venta_cambio:
+        afectadas |= Q(tipo_operacion='venta') & (
+            Q(modalidad_tasa='flotante') |
+            (Q(modalidad_tasa='bloqueada') & ~Q(tasa_cambio_aplicada=cotizacion.valor_venta))
+        )
+
+    transacciones = Transaccion.objects.filter(filtro_base & afectadas)
+
+    seguidas = PreferenciasNotificacion.monedas_seguidas.through.objects.filter(
+        preferenciasnotificacion__usuario=OuterRef('pk')
+    )
+    User = get_user_model()
+    return (
+        User.objects
+        .filter(pk__in=transacciones.values('usuario_operador'))
+        .select_related('preferencias_notificacion')
+        .annotate(
+            sigue_alguna=Exists(seguidas),
+            sigue_moneda=Exists(seguidas.filter(moneda_id=moneda_extranjera.pk)),
+        )
+        .filter(Q(sigue_alguna=False) | Q(sigue_moneda=True))
+        .order_by('pk')
+    )
+
 
 @shared_task
 def notificar_cambio_de_tasa_a_usuarios(cotizacion_id, mensaje, compra_cambio, venta_cambio):
@@ -22,128 +118,190 @@ def notificar_cambio_de_tasa_a_usuarios(cotizacion_id, mensaje, compra_cambio, v
     :param bool compra_cambio: Indica si hubo cambio en la tasa de **compra**.
     :param bool venta_cambio: Indica si hubo cambio en la tasa de **venta**.
 
-    :return: Texto indicando el resultado del proceso (por ejemplo, cuántos usuarios fueron notificados).
+    :return: Texto indicando el resultado del proceso (por ejemplo, cuántos usuarios fueron
+        notificados) junto con el tiempo de cada etapa.
     :rtype: str
 
     **Detalles del proceso:**
 
     1. Se obtiene la cotización correspondiente al ID recibido.
-    2. Se filtran las transacciones **pendientes** asociadas a la moneda afectada
-       (según los estados `pendiente_pago_cliente`, `pendiente_retiro_tauser` o
-       `pendiente_deposito_tauser`).
-    3. Se excluyen las transacciones cuya tasa garantizada ya expiró.
-    4. Se determinan los usuarios involucrados en las transacciones filtradas.
-    5. Para cada usuario:
-        - Se valida si tiene preferencias de notificación configuradas.
-        - Se verifica si sigue la moneda afectada.
-        - Se crea una notificación en el sistema.
-        - Si tiene habilitado recibir correos, se envía un email.
+    2. Con una sola consulta se resuelven los usuarios distintos con transacciones
+       **pendientes** de la moneda afectada cuya tasa cambió (ver
+       :func:`_usuarios_a_notificar`), junto con sus preferencias y las monedas que siguen.
+       Se excluyen las transacciones cuya tasa garantizada ya expiró.
+    3. Se crean todas las notificaciones del panel con ``bulk_create``.
+    4. Los usuarios con correo habilitado se reparten en lotes de ``EMAILS_POR_LOTE``;
+       cada lote es una sub-tarea (:func:`enviar_emails_cambio_tasa_task`) que usa una
+       única conexión SMTP.
 
     **Ejemplo:**
         >>> notificar_cambio_de_tasa_a_usuarios.delay(cotizacion_id, "Cambio en tasa USD/ARS", True, False)
-        "Notificaciones enviadas a 5 usuarios con transacciones pendientes."
+        "Notificaciones enviadas a 5 usuarios con transacciones pendientes. Tiempos (ms): ..."
 
     **Notas:**
         - Si no se encuentra la cotización, no se envía ninguna notificación.
-        - Evita duplicar notificaciones para el mismo usuario utilizando un conjunto (`set`).
+        - Los tiempos por etapa (``consulta``, ``notificaciones``, ``emails``) también se registran en el log.
     """
+    tiempos = {}
+    inicio = perf_counter()
+
     try:
-        cotizacion = Cotizacion.objects.get(pk=cotizacion_id)
+        cotizacion = Cotizacion.objects.select_related('moneda_destino').get(pk=cotizacion_id)
     except Cotizacion.DoesNotExist:
         return "Cotización no encontrada. No se enviaron notificaciones."
 
-    # 1. Definir los estados de transacción que consideramos "pendientes"
-    estados_pendientes = [
-        'pendiente_pago_cliente',
-        'pendiente_confirmacion_pago',
-        'pendiente_deposito_tauser',
-        'pendiente_pago_stripe'
-    ]
+    usuarios = list(_usuarios_a_notificar(cotizacion, compra_cambio, venta_cambio))
+    tiempos['consulta'] = perf_counter() - inicio
 
-    # 2. Construir el filtro base para transacciones pendientes de la moneda afectada
-    moneda_extranjera = cotizacion.moneda_destino
-    ahora = timezone.now()
+    if not usuarios:
+        return "No se encontraron usuarios con transacciones pendientes para notificar."
 
-    filtro_base = (
-        Q(estado__in=estados_pendientes) &
-        (Q(moneda_origen=moneda_extranjera) | Q(moneda_destino=moneda_extranjera)) &
-        # EXCLUIR transacciones cuya tasa garantizada ya expiró.
-        # Una transacción es válida para notificar SÓLO SI su garantía de tasa no ha expirado.
-        (Q(tasa_garantizada_hasta__isnull=True) | Q(tasa_garantizada_hasta__gte=ahora))
+    # Notificaciones del panel en lote
+    inicio = perf_counter()
+    Notificacion.objects.bulk_create(
+        [Notificacion(destinatario=usuario, mensaje=mensaje, tipo='tasa') for usuario in usuarios],
+        batch_size=NOTIFICACIONES_POR_INSERT,
     )
+    tiempos['notificaciones'] = perf_counter() - inicio
+
+    # Correos: sin preferencias se envían por defecto
+    inicio = perf_counter()
+    con_email = [
+        usuario.pk for usuario in usuarios
+        if getattr(usuario, 'preferencias_notificacion', None) is None
+        or usuario.preferencias_notificacion.recibir_email_tasa_cambio
+    ]
+    for desde in range(0, len(con_email), EMAILS_POR_LOTE):
+        enviar_emails_cambio_tasa_task.delay(
+            con_email[desde:desde + EMAILS_POR_LOTE], cotizacion.pk, mensaje, compra_cambio, venta_cambio
+        )
+    tiempos['emails'] = perf_counter() - inicio
 
-    transacciones_a_notificar = []
+    detalle = ", ".join(f"{etapa}={segundos * 1000:.1f}" for etapa, segundos in tiempos.items())
+    logger.info(
+        "Cambio de tasa %s: %d notificaciones, %d correos en %d lotes. Tiempos (ms): %s",
+        cotizacion.pk, len(usuarios), len(con_email), -(-len(con_email) // EMAILS_POR_LOTE), detalle,
+    )
+    return (f"Notificaciones enviadas a {len(usuarios)} usuarios con transacciones pendientes. "
+            f"Tiempos (ms): {detalle}")
 
-    # 3. Filtrar por tipo de operación y si la tasa realmente cambió
-    if compra_cambio:
-        # La empresa COMPRA divisa (cliente vende). Notificar si la tasa de compra cambió.
-        # - Tasa bloqueada: si la tasa guardada es diferente a la nueva.
-        # - Tasa flotante: siempre se notifica si la tasa de compra cambió.
-        trans_bloqueadas_compra = Transaccion.objects.filter(filtro_base, tipo_operacion='compra', modalidad_tasa='bloqueada').exclude(tasa_cambio_aplicada=cotizacion.valor_compra)
-        trans_flotantes_compra = Transaccion.objects.filter(filtro_base, tipo_operacion='compra', modalidad_tasa='flotante')
-        
-        transacciones_a_notificar.extend(list(trans_bloqueadas_compra))
-        transacciones_a_notificar.extend(list(trans_flotantes_compra))
 
-    if venta_cambio:
-        # La empresa VENDE divisa (cliente compra). Notificar si la tasa de venta cambió.
-        # - Tasa bloqueada: si la tasa guardada es diferente a la nueva.
-        # - Tasa flotante: siempre se notifica si la tasa de venta cambió.
-        trans_bloqueadas_venta = Transaccion.objects.filter(filtro_base, tipo_operacion='venta', modalidad_tasa='bloqueada').exclude(tasa_cambio_aplicada=cotizacion.valor_venta)
-        trans_flotantes_venta = Transaccion.objects.filter(filtro_base, tipo_operacion='venta', modalidad_tasa='flotante')
-
-        transacciones_a_notificar.extend(list(trans_bloqueadas_venta))
-        transacciones_a_notificar.extend(list(trans_flotantes_venta))
-
-    # 4. Obtener una lista única de usuarios a notificar
-    # Usamos un set para evitar enviar múltiples correos al mismo usuario si tiene varias transacciones pendientes
-    usuarios_a_notificar = set() # Usamos un set para evitar duplicados
-    User = get_user_model()
+@shared_task(bind=True, max_retries=3, default_retry_delay=5)
+def notificar_cambio_agrupado(self, cotizacion_id, version):
+    """
+    Cierra la ventana de agrupación de una cotización y notifica el cambio neto.
 
-    for t in transacciones_a_notificar:
-        usuario = None
-        # Lógica robusta para obtener el usuario, compatible con modelos antiguos y nuevos
-        if hasattr(t, 'usuario_operador'):
-            # Estructura nueva: el usuario está en `usuario_operador`
-            usuario = t.usuario_operador
-        elif isinstance(t.cliente, User):
-            # Estructura antigua: el usuario estaba directamente en el campo `cliente`
-            usuario = t.cliente
-        
-        if usuario:
-            usuarios_a_notificar.add(usuario)
+    La programa :func:`notificaciones.signals.crear_notificacion_por_cambio_tasa`
+    con ``countdown`` igual a la ventana (ver :mod:`notificaciones.agrupador`).
+    Sólo la tarea con la última versión publicada hace algo; las anteriores se
+    descartan. Si el bloqueo de la cotización está ocupado, se reintenta.
+
+    :param int cotizacion_id: Cotización que cambió.
+    :param str version: Versión publicada al programar la tarea.
+    :return: Resultado de :func:`notificar_cambio_de_tasa_a_usuarios` o el motivo del descarte.
+    :rtype: str
+    """
+    try:
+        antes = tomar_cambio(cotizacion_id, version)
+    except BloqueoOcupado as e:
+        self.retry(exc=e)
+    if antes is None:
+        return "Reemplazada por un cambio posterior de la misma cotización."
 
-    if not usuarios_a_notificar:
+    try:
+        cotizacion = Cotizacion.objects.select_related('moneda_destino').get(pk=cotizacion_id)
+    except Cotizacion.DoesNotExist:
+        return "Cotización no encontrada. No se enviaron notificaciones."
+
+    # Cambio neto de la ventana; sin los valores previos se notifica como cambio.
+    compra_cambio = antes.get('compra') != cotizacion.total_compra
+    venta_cambio = antes.get('venta') != cotizacion.total_venta
+    if not (compra_cambio or venta_cambio):
+        return "Sin cambio neto en la ventana. No se enviaron notificaciones."
+
+    mensaje = mensaje_cambio_tasa(cotizacion, venta_cambio, compra_cambio, antes)
+    return notificar_cambio_de_tasa_a_usuarios(cotizacion.pk, mensaje, compra_cambio, venta_cambio)
+
+
+@shared_task
+def notificar_cambio_de_tablero(cambios):
+    """
+    Fan-out único para una actualización en lote del tablero de cotizaciones.
+
+    Se encola una sola vez por cada ``tablero_actualizado``
+    (ver :func:`cotizaciones.lote.actualizar_cotizaciones_en_lote`). Cada usuario
+    afectado recibe **una** notificación del panel con los mensajes de todos los
+    pares que le corresponden; los correos siguen siendo uno por par, en lotes de
+    ``EMAILS_POR_LOTE`` (:func:`enviar_emails_cambio_tasa_task`).
+
+    :param list cambios: Dicts con ``cotizacion_id``, ``mensaje``, ``compra_cambio`` y ``venta_cambio``.
+    :return: Texto con la cantidad de usuarios y pares notificados.
+    :rtype: str
+    """
+    inicio = perf_counter()
+    cotizaciones = Cotizacion.objects.select_related('moneda_destino').in_bulk(
+        [cambio['cotizacion_id'] for cambio in cambios]
+    )
+
+    mensajes = {}
+    usuarios = {}
+    correos = []
+    for cambio in cambios:
+        cotizacion = cotizaciones.get(cambio['cotizacion_id'])
+        if cotizacion is None:
+            continue
+        con_email = []
+        for usuario in _usuarios_a_notificar(cotizacion, cambio['compra_cambio'], cambio['venta_cambio']):
+            usuarios.setdefault(usuario.pk, usuario)
+            mensajes.setdefault(usuario.pk, []).append(cambio['mensaje'])
+            preferencias = getattr(usuario, 'preferencias_notificacion', None)
+            if preferencias is None or preferencias.recibir_email_tasa_cambio:
+                con_email.append(usuario.pk)
+        if con_email:
+            correos.append((cambio, con_email))
+
+    if not usuarios:
         return "No se encontraron usuarios con transacciones pendientes para notificar."
 
-    # 5. Iterar sobre los usuarios únicos y enviar notificaciones/emails
-    for usuario in usuarios_a_notificar:
-        # Obtener las preferencias del usuario
-        preferencias = getattr(usuario, 'preferencias_notificacion', None)
-
-        # --- Lógica de Preferencias de Moneda ---
-        # Si el usuario tiene preferencias definidas y no sigue esta moneda, saltar.
-        if preferencias and preferencias.monedas_seguidas.exists():
-            if not preferencias.monedas_seguidas.filter(pk=cotizacion.moneda_destino.pk).exists():
-                continue  # El usuario no quiere notificaciones para esta moneda.
-
-        # Crear la notificación en el panel del usuario (esto es rápido)
-        Notificacion.objects.create(
-            destinatario=usuario,
-            mensaje=mensaje,
-            tipo='tasa',  # Asignamos el tipo de notificación
-        )
+    Notificacion.objects.bulk_create(
+        [Notificacion(destinatario=usuarios[pk], mensaje="\n".join(textos), tipo='tasa')
+         for pk, textos in mensajes.items()],
+        batch_size=NOTIFICACIONES_POR_INSERT,
+    )
+    for cambio, con_email in correos:
+        for desde in range(0, len(con_email), EMAILS_POR_LOTE):
+            enviar_emails_cambio_tasa_task.delay(
+                con_email[desde:desde + EMAILS_POR_LOTE], cambio['cotizacion_id'], cambio['mensaje'],
+                cambio['compra_cambio'], cambio['venta_cambio'],
+            )
+
+    logger.info(
+        "Cambio de tablero (%d pares): %d notificaciones en %.1f ms",
+        len(cambios), len(usuarios), (perf_counter() - inicio) * 1000,
+    )
+    return f"Notificaciones enviadas a {len(usuarios)} usuarios por {len(cambios)} cotizaciones."
 
-        # --- Lógica de Preferencias de Canal (Email) ---
-        quiere_recibir_email = True
-        if preferencias:
-            quiere_recibir_email = preferencias.recibir_email_tasa_cambio
 
-        if quiere_recibir_email:
-            enviar_email_cambio_tasa(usuario, mensaje, cotizacion, venta_cambio, compra_cambio)
+@shared_task
+def enviar_emails_cambio_tasa_task(usuario_ids, cotizacion_id, mensaje, compra_cambio, venta_cambio):
+    """
+    Envía un lote de correos de cambio de tasa reutilizando una conexión SMTP.
 
-    return f"Notificaciones enviadas a {len(usuarios_a_notificar)} usuarios con transacciones pendientes."
+    :param list usuario_ids: IDs de los destinatarios del lote.
+    :return: Cantidad de correos enviados.
+    :rtype: int
+    """
+    try:
+        cotizacion = Cotizacion.objects.select_related('moneda_destino').get(pk=cotizacion_id)
+    except Cotizacion.DoesNotExist:
+        return 0
 
+    usuarios = get_user_model().objects.filter(pk__in=usuario_ids).order_by('pk')
+    try:
+        return enviar_emails_cambio_tasa(usuarios, mensaje, cotizacion, venta_cambio, compra_cambio)
+    except Exception:
+        logger.exception("Error al enviar el lote de correos de cambio de tasa %s", cotizacion_id)
+        return 0
 
 
 
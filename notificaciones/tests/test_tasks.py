@@ -1,9 +1,21 @@
-from django.test import TestCase
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from clientes.models import Cliente
 from monedas.models import Moneda
+from cotizaciones.lote import actualizar_cotizaciones_en_lote
 from cotizaciones.models import Cotizacion
-from notificaciones.tasks import notificar_cambio_de_tasa_a_usuarios
+from notificaciones.agrupador import BloqueoOcupado, tomar_cambio
+from notificaciones.tasks import notificar_cambio_agrupado, notificar_cambio_de_tasa_a_usuarios
 from notificaciones.models import Notificacion, PreferenciasNotificacion
+from transacciones.models import Transaccion
 
 User = get_user_model()
 
@@ -125,4 +137,189 @@ class NotificacionesTasksTest(TestCase):
         
         # Sin transacciones pendientes, no debería crear notificaciones
         self.assertEqual(Notificacion.objects.count(), 0)
-        self.assertEqual(result, "No se encontraron usuarios con transacciones pendientes para notificar.")
\ No newline at end of file
+        self.assertEqual(result, "No se encontraron usuarios con transacciones pendientes para notificar.")
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+class NotificacionesEnLoteTest(TestCase):
+    """Reparto en lote: una consulta de usuarios, ``bulk_create`` y correos por lotes."""
+
+    def setUp(self):
+        self.pyg = Moneda.objects.create(nombre="Guaraní", codigo="PYG", admite_en_linea=True)
+        self.usd = Moneda.objects.create(nombre="Dólar", codigo="USD", admite_en_linea=True)
+        self.eur = Moneda.objects.create(nombre="Euro", codigo="EUR", admite_en_linea=True)
+        self.cotizacion = Cotizacion.objects.create(
+            moneda_base=self.pyg, moneda_destino=self.usd, valor_compra=7000, valor_venta=7100
+        )
+        self.cliente = Cliente.objects.create(nombre="Cliente Lote", categoria=Cliente.Categoria.MINORISTA)
+
+    def _usuario(self, numero, recibir_email=True, sigue=()):
+        usuario = User.objects.create_user(email=f"lote{numero}@test.com", password="pass123")
+        pref, _ = PreferenciasNotificacion.objects.get_or_create(usuario=usuario)
+        pref.recibir_email_tasa_cambio = recibir_email
+        pref.save()
+        pref.monedas_seguidas.set(sigue)
+        return usuario
+
+    def _pendiente(self, usuario, tipo="venta", modalidad="flotante", tasa=Decimal("7100")):
+        return Transaccion.objects.create(
+            cliente=self.cliente,
+            usuario_operador=usuario,
+            tipo_operacion=tipo,
+            estado="pendiente_pago_cliente",
+            modalidad_tasa=modalidad,
+            moneda_origen=self.pyg,
+            monto_origen=Decimal("710000"),
+            moneda_destino=self.usd,
+            monto_destino=Decimal("100"),
+            tasa_cambio_aplicada=tasa,
+            comision_aplicada=Decimal("0"),
+            codigo_operacion_tauser=uuid.uuid4().hex[:10],
+        )
+
+    def test_filtra_por_moneda_seguida_y_tasa_bloqueada(self):
+        sigue_usd = self._usuario(1, sigue=[self.usd])
+        sigue_eur = self._usuario(2, sigue=[self.eur])
+        bloqueada_igual = self._usuario(3)
+        sin_correo = self._usuario(4, recibir_email=False)
+        for usuario in (sigue_usd, sigue_usd, sigue_eur, sin_correo):
+            self._pendiente(usuario)
+        self._pendiente(bloqueada_igual, modalidad="bloqueada", tasa=Decimal("7100"))
+
+        result = notificar_cambio_de_tasa_a_usuarios(self.cotizacion.id, "Cambio USD", False, True)
+
+        self.assertTrue(result.startswith("Notificaciones enviadas a 2 usuarios con transacciones pendientes."))
+        self.assertIn("Tiempos (ms): consulta=", result)
+        self.assertCountEqual(
+            Notificacion.objects.filter(tipo="tasa").values_list("destinatario_id", flat=True),
+            [sigue_usd.pk, sin_correo.pk],
+        )
+        self.assertEqual([m.to for m in mail.outbox], [[sigue_usd.email]])
+
+    def test_correos_por_lotes_con_una_conexion(self):
+        usuarios = [self._usuario(n) for n in range(5)]
+        for usuario in usuarios:
+            self._pendiente(usuario, tipo="compra")
+
+        with mock.patch("notificaciones.tasks.EMAILS_POR_LOTE", 2), \
+                mock.patch("notificaciones.emails.get_connection", wraps=mail.get_connection) as conexion, \
+                CaptureQueriesContext(connection) as consultas:
+            notificar_cambio_de_tasa_a_usuarios(self.cotizacion.id, "Cambio USD", True, False)
+
+        self.assertEqual(Notificacion.objects.filter(tipo="tasa").count(), 5)
+        self.assertEqual(len(mail.outbox), 5)
+        # Tres lotes (2 + 2 + 1), una conexión por lote.
+        self.assertEqual(conexion.call_count, 3)
+        # Cotización + usuarios + INSERT de notificaciones; cada lote: cotización + usuarios.
+        self.assertEqual(len(consultas), 3 + 3 * 2)
+
+    def test_tablero_en_lote_una_notificacion_por_usuario(self):
+        eur = Cotizacion.objects.create(
+            moneda_base=self.pyg, moneda_destino=self.eur, valor_compra=8000, valor_venta=8100
+        )
+        ambos = self._usuario(1)
+        solo_usd = self._usuario(2, recibir_email=False)
+        self._pendiente(ambos)
+        self._pendiente(solo_usd)
+        en_eur = self._pendiente(ambos)
+        en_eur.moneda_destino = self.eur
+        en_eur.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            actualizar_cotizaciones_en_lote({
+                self.cotizacion.pk: {"valor_venta": "7200"},
+                eur.pk: {"valor_venta": "8200"},
+            })
+
+        notificaciones = {n.destinatario_id: n.mensaje for n in Notificacion.objects.filter(tipo="tasa")}
+        self.assertEqual(set(notificaciones), {ambos.pk, solo_usd.pk})
+        self.assertIn("(USD)", notificaciones[ambos.pk])
+        self.assertIn("(EUR)", notificaciones[ambos.pk])
+        self.assertNotIn("(EUR)", notificaciones[solo_usd.pk])
+        # Correos: uno por par para quien los recibe.
+        self.assertEqual(sorted(m.subject[-3:] for m in mail.outbox), ["EUR", "USD"])
+
+
+@override_settings(NOTIFICACIONES_TASA_VENTANA_SEGUNDOS=60)
+class NotificacionesAgrupadasTest(TestCase):
+    """Cambios sucesivos de una cotización dentro de la ventana: una sola notificación neta."""
+
+    setUp_lote = NotificacionesEnLoteTest.setUp
+    _usuario = NotificacionesEnLoteTest._usuario
+    _pendiente = NotificacionesEnLoteTest._pendiente
+
+    def setUp(self):
+        self.setUp_lote()
+        cache.clear()
+        self.usuario = self._usuario(1)
+        self._pendiente(self.usuario)
+
+    def _cambiar_venta(self, *valores):
+        with mock.patch.object(notificar_cambio_agrupado, "apply_async") as programar:
+            for valor in valores:
+                self.cotizacion.valor_venta = Decimal(valor)
+                self.cotizacion.save()
+        self.assertTrue(all(c.kwargs["countdown"] == 60 for c in programar.call_args_list))
+        return [c.args[0] for c in programar.call_args_list]
+
+    def test_solo_la_ultima_tarea_notifica_el_cambio_neto(self):
+        programadas = self._cambiar_venta("7150", "7200", "7300")
+
+        self.assertEqual(len(programadas), 3)
+        for args in programadas[:-1]:
+            self.assertEqual(notificar_cambio_agrupado(*args),
+                             "Reemplazada por un cambio posterior de la misma cotización.")
+        self.assertFalse(Notificacion.objects.exists())
+
+        resultado = notificar_cambio_agrupado(*programadas[-1])
+        self.assertTrue(resultado.startswith("Notificaciones enviadas a 1 usuarios"))
+        mensaje = Notificacion.objects.get(destinatario=self.usuario).mensaje
+        self.assertIn("Nuevo precio de venta: 7,300 Gs. (antes 7,100 Gs.)", mensaje)
+        self.assertNotIn("compra", mensaje)
+        self.assertEqual(len(mail.outbox), 1)
+
+        # La ventana se cerró: la tarea ya ejecutada no vuelve a notificar.
+        self.assertIn("Reemplazada", notificar_cambio_agrupado(*programadas[-1]))
+
+    def test_sin_cambio_neto_no_notifica(self):
+        programadas = self._cambiar_venta("7300", "7100")
+
+        self.assertEqual(notificar_cambio_agrupado(*programadas[-1]),
+                         "Sin cambio neto en la ventana. No se enviaron notificaciones.")
+        self.assertFalse(Notificacion.objects.exists())
+
+    @override_settings(NOTIFICACIONES_TASA_VENTANA_SEGUNDOS=0)
+    def test_ventana_cero_notifica_cada_cambio(self):
+        with mock.patch("notificaciones.signals.notificar_cambio_de_tasa_a_usuarios.delay") as encolar:
+            self._cambiar_venta("7150", "7200")
+        self.assertEqual(encolar.call_count, 2)
+
+    def test_tablero_absorbe_la_ventana_pendiente(self):
+        programadas = self._cambiar_venta("7150")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            actualizar_cotizaciones_en_lote({self.cotizacion.pk: {"valor_venta": "7300"}})
+
+        mensaje = Notificacion.objects.get(destinatario=self.usuario).mensaje
+        self.assertIn("Nuevo precio de venta: 7,300 Gs. (antes 7,100 Gs.)", mensaje)
+        self.assertIn("Reemplazada", notificar_cambio_agrupado(*programadas[-1]))
+        self.assertEqual(Notificacion.objects.count(), 1)
+
+    def test_bloqueo_ocupado_no_sigue_ni_libera_el_ajeno(self):
+        programadas = self._cambiar_venta("7300")
+        clave = f"notificaciones:tasa:{self.cotizacion.pk}:bloqueo"
+        cache.set(clave, "otro-worker", 60)
+
+        with mock.patch("notificaciones.agrupador.BLOQUEO_SEGUNDOS", 0.05):
+            with self.assertRaises(BloqueoOcupado):
+                notificar_cambio_agrupado(*programadas[-1])
+            # En modo eager los reintentos corren en el acto hasta agotar max_retries.
+            with mock.patch("notificaciones.tasks.tomar_cambio", wraps=tomar_cambio) as tomar:
+                resultado = notificar_cambio_agrupado.apply(programadas[-1])
+            self.assertIsInstance(resultado.result, BloqueoOcupado)
+            self.assertEqual(tomar.call_count, 1 + notificar_cambio_agrupado.max_retries)
+        self.assertEqual(cache.get(clave), "otro-worker")
+        self.assertFalse(Notificacion.objects.exists())
+
+        # Liberado por su dueño, el reintento cierra la ventana intacta.
+        cache.delete(clave)
+        self.assertTrue(notificar_cambio_agrupado(*programadas[-1]).startswith("Notificaciones enviadas a 1 usuarios"))
@@ -7,10 +7,14 @@ from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
+from transacciones.codigos import normalizar_codigo
+from transacciones.estados import transicionar
 from transacciones.models import Transaccion
 from cotizaciones.models import Cotizacion
 from pagos.services import ejecutar_acreditacion_a_cliente
 
+MENSAJE_ESTADO_CAMBIADO = 'La transacción cambió de estado mientras se procesaba. Valide el código nuevamente.'
+
 def obtener_tasa_de_cambio_actual(moneda_origen, moneda_destino):
     """
     Obtiene la tasa de cambio más reciente para un par de monedas.
@@ -38,12 +42,12 @@ def api_confirmar_deposito_tauser(request):
     if not codigo_operacion:
         return JsonResponse({'status': 'error', 'mensaje': 'El código de operación es requerido.'}, status=400)
 
-    transaccion = get_object_or_404(Transaccion, codigo_operacion_tauser=codigo_operacion, estado='pendiente_deposito_tauser')
+    transaccion = get_object_or_404(Transaccion, codigo_operacion_tauser=normalizar_codigo(codigo_operacion), estado='pendiente_deposito_tauser')
 
     # --- Verificación Proactiva de Expiración de Tasa ---
     if transaccion.is_tasa_expirada:
-        transaccion.estado = 'cancelada_tasa_expirada'
-        transaccion.save()
+        if not transicionar(transaccion, 'cancelada_tasa_expirada'):
+            return JsonResponse({'status': 'error', 'mensaje': MENSAJE_ESTADO_CAMBIADO}, status=409)
         return JsonResponse({
             'status': 'error',
             'mensaje': 'La operación no puede continuar porque la tasa garantizada ha expirado. La transacción ha sido cancelada.'
@@ -53,8 +57,8 @@ def api_confirmar_deposito_tauser(request):
     
     # 1. CAMINO FELIZ: Verificar si la garantía de la tasa sigue vigente.
     if transaccion.modalidad_tasa == 'bloqueada' and transaccion.tasa_garantizada_hasta and timezone.now() <= transaccion.tasa_garantizada_hasta:
-        transaccion.estado = 'procesando_acreditacion'
-        transaccion.save()
+        if not transicionar(transaccion, 'procesando_acreditacion'):
+            return JsonResponse({'status': 'error', 'mensaje': MENSAJE_ESTADO_CAMBIADO}, status=409)
         
         # Llamar al servicio de pagos para iniciar la acreditación
         ejecutar_acreditacion_a_cliente(transaccion)
@@ -69,8 +73,8 @@ def api_confirmar_deposito_tauser(request):
 
     # Si la tasa expiró pero casualmente es la misma, procedemos.
     if tasa_actual == transaccion.tasa_cambio_aplicada:
-        transaccion.estado = 'procesando_acreditacion'
-        transaccion.save()
+        if not transicionar(transaccion, 'procesando_acreditacion'):
+            return JsonResponse({'status': 'error', 'mensaje': MENSAJE_ESTADO_CAMBIADO}, status=409)
         ejecutar_acreditacion_a_cliente(transaccion)
         return JsonResponse({'status': 'ok', 'mensaje': 'Operación confirmada. Tasa expirada pero sin cambios.'})
     
@@ -98,7 +102,7 @@ def api_resolver_variacion_tasa(request):
     if not all([codigo_operacion, decision_cliente]):
         return JsonResponse({'status': 'error', 'mensaje': 'Faltan parámetros requeridos.'}, status=400)
 
-    transaccion = get_object_or_404(Transaccion, codigo_operacion_tauser=codigo_operacion)
+    transaccion = get_object_or_404(Transaccion, codigo_operacion_tauser=normalizar_codigo(codigo_operacion))
 
     if decision_cliente == 'aceptar':
         tasa_nueva_str = request.POST.get('tasa_nueva')
@@ -111,10 +115,12 @@ def api_resolver_variacion_tasa(request):
             return JsonResponse({'status': 'error', 'mensaje': 'Formato de tasa inválido.'}, status=400)
 
         # El cliente aceptó la nueva tasa. Actualizamos y procedemos.
-        transaccion.tasa_cambio_aplicada = tasa_nueva
-        transaccion.monto_destino = transaccion.monto_origen * tasa_nueva
-        transaccion.estado = 'procesando_acreditacion'
-        transaccion.save()
+        resultado = transicionar(transaccion, 'procesando_acreditacion', campos={
+            'tasa_cambio_aplicada': tasa_nueva,
+            'monto_destino': transaccion.monto_origen * tasa_nueva,
+        })
+        if not resultado:
+            return JsonResponse({'status': 'error', 'mensaje': MENSAJE_ESTADO_CAMBIADO}, status=409)
 
         # Iniciar la acreditación con la nueva tasa
         ejecutar_acreditacion_a_cliente(transaccion)
@@ -123,8 +129,8 @@ def api_resolver_variacion_tasa(request):
 
     elif decision_cliente == 'cancelar':
         # El cliente canceló. Marcamos la transacción.
-        transaccion.estado = 'cancelada_usuario_tasa'
-        transaccion.save()
+        if not transicionar(transaccion, 'cancelada_usuario_tasa'):
+            return JsonResponse({'status': 'error', 'mensaje': MENSAJE_ESTADO_CAMBIADO}, status=409)
         
         return JsonResponse({'status': 'cancelada', 'mensaje': 'Operación cancelada. Por favor, devuelva el dinero al cliente.'})
     
@@ -6,12 +6,12 @@ from datetime import timedelta      # Importar timedelta (si lo usas en otra par
 from django.urls import reverse     # Importar reverse para construir URLs
 from urllib.parse import urlencode  # Importar urlencode para construir parámetros de URL
 from .models import TipoMedioPago
+from transacciones.estados import transicionar
 from transacciones.models import Transaccion
 from payments.stripe_service import create_payment_intent  # Servicio de Stripe
 
 # >>> Integración con facturación electrónica (imports mínimos y seguros)
-from facturacion_electronica.tasks import generar_factura_electronica_task
-from facturacion_electronica.models import EmisorFacturaElectronica, DocumentoElectronico
+from facturacion_electronica.models import EmisorFacturaElectronica
 
 import uuid  # Necesario si simulas o generas ids en otros flujos
 
@@ -159,22 +159,16 @@ def handle_payment_webhook(payload: dict):
         if event_type == 'payment_intent.succeeded':
             try:
                 # Actualiza estado de transacción (mantengo tu lógica)
-                if transaccion.estado == 'pendiente_pago_cliente':
-                    transaccion.estado = 'pendiente_retiro_tauser'  # o 'completada' si tu flujo lo requiere
-                    transaccion.save(update_fields=['estado'])
+                # La factura se emite desde la bandeja de salida (transacciones.outbox).
+                transicionar(transaccion, 'pendiente_retiro_tauser', desde={'pendiente_pago_cliente'})
                 print(f"INFO: [STRIPE WEBHOOK] Éxito: Transacción {transaccion_id} actualizada.")
-
-                # --- Disparo idempotente de facturación electrónica ---
-                _emitir_factura_si_corresponde(transaccion)
                 return {'status': 'EXITOSO', 'message': 'Pago exitoso y transacción actualizada.'}
             except Exception as e:
-                print(f"ERROR: [STRIPE WEBHOOK] Error al actualizar Tx {transaccion_id} o emitir factura: {e}")
+                print(f"ERROR: [STRIPE WEBHOOK] Error al actualizar Tx {transaccion_id}: {e}")
                 return {'status': 'ERROR', 'message': f'Error al procesar: {e}'}
 
         elif event_type == 'payment_intent.payment_failed':
-            if transaccion.estado == 'pendiente_pago_cliente':
-                transaccion.estado = 'cancelada'
-                transaccion.save(update_fields=['estado'])
+            transicionar(transaccion, 'cancelada', desde={'pendiente_pago_cliente'})
             print(f"INFO: [STRIPE WEBHOOK] Tx {transaccion_id} marcada cancelada por fallo de pago.")
             return {'status': 'RECHAZADO', 'message': 'Pago fallido y transacción cancelada.'}
 
@@ -192,24 +186,17 @@ def handle_payment_webhook(payload: dict):
 
         # Validar expiración de tasa garantizada si aplica
         if transaccion.modalidad_tasa == 'bloqueada' and transaccion.estado == 'pendiente_pago_cliente' and getattr(transaccion, "is_tasa_expirada", False):
-            transaccion.estado = 'cancelada_tasa_expirada'
-            transaccion.save(update_fields=['estado'])
+            transicionar(transaccion, 'cancelada_tasa_expirada', desde={'pendiente_pago_cliente'})
             print(f"WARN: [PAGOS WEBHOOK] Tx {transaccion.id} cancelada por tasa expirada. Revisar reembolso.")
             return {'status': 'ERROR', 'message': 'Tasa garantizada expirada. Pago fuera de tiempo.'}
 
         if webhook_result.get('status') == 'EXITOSO':
-            if transaccion.estado == 'pendiente_pago_cliente':
-                transaccion.estado = 'pendiente_retiro_tauser'
-                transaccion.save(update_fields=['estado'])
+            if transicionar(transaccion, 'pendiente_retiro_tauser', desde={'pendiente_pago_cliente'}):
+                # La factura se emite desde la bandeja de salida (transacciones.outbox).
                 print(f"INFO: [PAGOS WEBHOOK] Tx {transaccion.id} -> 'pendiente_retiro_tauser'.")
 
-                # --- Disparo idempotente de facturación electrónica ---
-                _emitir_factura_si_corresponde(transaccion)
-
         elif webhook_result.get('status') == 'RECHAZADO':
-            if transaccion.estado == 'pendiente_pago_cliente':
-                transaccion.estado = 'cancelada'
-                transaccion.save(update_fields=['estado'])
+            if transicionar(transaccion, 'cancelada', desde={'pendiente_pago_cliente'}):
                 print(f"INFO: [PAGOS WEBHOOK] Tx {transaccion.id} -> 'cancelada'.")
 
         return webhook_result
@@ -225,44 +212,6 @@ def handle_payment_webhook(payload: dict):
         return {'status': 'ERROR', 'message': f'Error interno: {e}'}
 
 
-def _emitir_factura_si_corresponde(transaccion: Transaccion):
-    """
-    Emite la factura electrónica de forma idempotente:
-    - Requiere un Emisor ACTIVO.
-    - No emite si ya existe un DocumentoElectronico no finalizado con esta transacción.
-    - Delega el armado del DE y numeración a la task de facturación.
-    """
-    try:
-        existe = DocumentoElectronico.objects.filter(
-            transaccion_asociada=transaccion
-        ).exclude(
-            estado_sifen__in=['rechazado', 'inutilizado', 'error_api', 'error_sifen']
-        ).exists()
-
-        if existe:
-            print(f"INFO: [FACTURACION] Ya existe documento para Tx {transaccion.id}; no se dispara nuevamente.")
-            return
-
-        emisor = EmisorFacturaElectronica.objects.filter(activo=True).first()
-        if not emisor:
-            print("WARN: [FACTURACION] No hay Emisor ACTIVO configurado. No se emite factura.")
-            return
-
-        receptor_email = getattr(getattr(transaccion, "cliente", None), "email", "receptor@test.com")
-
-        # Llamamos a la task usando kwargs para evitar problemas de aridad en Celery
-        generar_factura_electronica_task.delay(
-            emisor_id=str(emisor.id),
-            transaccion_id=str(transaccion.id),
-            json_de_completo=None,             # el builder de la task arma el DE a partir de la Transaccion
-            email_receptor=receptor_email
-        )
-        print(f"INFO: [FACTURACION] Task disparada para Tx {transaccion.id} con Emisor {emisor.id}.")
-
-    except Exception as e:
-        print(f"ERROR: [FACTURACION] No se pudo disparar la emisión para Tx {transaccion.id}: {e}")
-
-
 def build_json_de_from_transaction(transaccion: Transaccion, emisor: EmisorFacturaElectronica) -> dict:
     """
     (Conservado por compatibilidad) Construye un JSON de DE a partir de una transacción.
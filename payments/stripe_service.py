@@ -55,6 +55,7 @@ def handle_webhook(payload: dict):
     Actualiza el estado de la transacción en la base de datos.
     """
     from transacciones.models import Transaccion # Importar aquí para evitar circular imports
+    from transacciones.estados import transicionar
 
     event_type = payload.get('type')
     data_object = payload.get('data', {}).get('object', {})
@@ -78,9 +79,7 @@ def handle_webhook(payload: dict):
 
     # Procesar diferentes tipos de eventos de Stripe
     if event_type == 'payment_intent.succeeded':
-        if transaccion.estado == 'pendiente_pago_stripe':
-            transaccion.estado = 'pendiente_retiro_tauser' # O el estado final después de un pago exitoso
-            transaccion.save(update_fields=['estado'])
+        if transicionar(transaccion, 'pendiente_retiro_tauser', desde={'pendiente_pago_stripe'}):
             print(f"INFO: [STRIPE WEBHOOK] Transacción {transaccion.id} (PaymentIntent {payment_intent_id}) actualizada a 'pendiente_retiro_tauser'.")
             return {'status': 'EXITOSO', 'message': 'Pago exitoso y transacción actualizada.'}
         else:
@@ -88,9 +87,7 @@ def handle_webhook(payload: dict):
             return {'status': 'EXITOSO', 'message': 'Pago exitoso, pero transacción ya procesada.'}
     
     elif event_type == 'payment_intent.payment_failed':
-        if transaccion.estado == 'pendiente_pago_stripe':
-            transaccion.estado = 'cancelada' # O un estado de fallo específico
-            transaccion.save(update_fields=['estado'])
+        if transicionar(transaccion, 'cancelada', desde={'pendiente_pago_stripe'}):
             print(f"INFO: [STRIPE WEBHOOK] Transacción {transaccion.id} (PaymentIntent {payment_intent_id}) actualizada a 'cancelada' por fallo de pago.")
             return {'status': 'RECHAZADO', 'message': 'Pago fallido y transacción cancelada.'}
         else:
@@ -26,3 +26,6 @@ class ReportesConfig(AppConfig):
     
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reportes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,262 @@
+#reportes/consultas.py
+
+"""
+Capa de consultas de los reportes de ganancias y transacciones.
+
+.. module:: reportes.consultas
+   :synopsis: Filtros, totales y filas de los reportes en pocas consultas.
+
+Las vistas web, PDF y Excel de :mod:`reportes.views` comparten esta capa:
+
+- :class:`FiltrosGanancias` interpreta los parámetros ``GET`` una sola vez.
+- :func:`transacciones_ganancias` devuelve las transacciones completadas con
+  ``cliente`` y monedas resueltos por ``select_related`` y la ganancia anotada
+  desde :class:`ganancias.models.RegistroGanancia` (``LEFT JOIN``), sin una
+  consulta por fila.
+- :func:`totales_ganancias` calcula ventas, compras, total general y cantidad
+  en la base de datos, con sumas condicionales en un único agregado.
+- :func:`filas_ganancias` recorre el resultado con ``.iterator(chunk_size=...)``
+  para que los exportes no carguen todas las instancias en memoria.
+- :class:`FiltrosTransacciones` y :func:`transacciones_reporte` hacen lo mismo
+  para el reporte de transacciones (todos los estados).
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from typing import Iterator, Optional
+
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from transacciones.models import Transaccion
+
+TIPOS_OPERACION = ('compra', 'venta')
+CHUNK_SIZE = 2000
+
+_GANANCIA = DecimalField(max_digits=15, decimal_places=2)
+
+
+@dataclass(frozen=True)
+class FiltrosGanancias:
+    """
+    Filtros del reporte de ganancias.
+
+    :param fecha_inicio: Día local inicial (inclusive).
+    :param fecha_fin: Día local final (inclusive).
+    :param tipo: ``'compra'`` o ``'venta'``; cualquier otro valor no filtra.
+    :param moneda: Código de la moneda operada; ``'todas'`` o vacío no filtra.
+    :param cliente: Parte del nombre del cliente.
+    """
+    fecha_inicio: Optional[object] = None
+    fecha_fin: Optional[object] = None
+    tipo: Optional[str] = None
+    moneda: Optional[str] = None
+    cliente: Optional[str] = None
+
+    @classmethod
+    def desde_request(cls, request):
+        """Construye los filtros desde ``request.GET``; ignora fechas mal formadas."""
+        params = request.GET
+
+        def fecha(nombre):
+            try:
+                return parse_date(params.get(nombre) or '')
+            except ValueError:
+                return None
+
+        tipo = params.get('tipo')
+        moneda = params.get('moneda')
+        return cls(
+            fecha_inicio=fecha('fecha_inicio'),
+            fecha_fin=fecha('fecha_fin'),
+            tipo=tipo if tipo in TIPOS_OPERACION else None,
+            moneda=moneda if moneda and moneda != 'todas' else None,
+            cliente=params.get('cliente') or None,
+        )
+
+    def como_dict(self) -> dict:
+        """Forma serializable a JSON (fechas en ISO); ver :meth:`desde_dict`."""
+        return {
+            'fecha_inicio': self.fecha_inicio.isoformat() if self.fecha_inicio else None,
+            'fecha_fin': self.fecha_fin.isoformat() if self.fecha_fin else None,
+            'tipo': self.tipo,
+            'moneda': self.moneda,
+            'cliente': self.cliente,
+        }
+
+    @classmethod
+    def desde_dict(cls, datos: dict):
+        """Inversa de :meth:`como_dict`."""
+        return cls(
+            fecha_inicio=parse_date(datos.get('fecha_inicio') or ''),
+            fecha_fin=parse_date(datos.get('fecha_fin') or ''),
+            tipo=datos.get('tipo'),
+            moneda=datos.get('moneda'),
+            cliente=datos.get('cliente'),
+        )
+
+
+@dataclass(frozen=True)
+class FiltrosTransacciones:
+    """
+    Filtros del reporte de transacciones.
+
+    :param fecha_inicio: Día local inicial (inclusive).
+    :param fecha_fin: Día local final (inclusive).
+    :param tipo: ``'compra'`` o ``'venta'``; cualquier otro valor no filtra.
+    :param estado: Estado de la transacción.
+    :param moneda: Código de la moneda operada; ``'todas'`` o vacío no filtra.
+    :param cliente: Parte del nombre del cliente.
+    """
+    fecha_inicio: Optional[object] = None
+    fecha_fin: Optional[object] = None
+    tipo: Optional[str] = None
+    estado: Optional[str] = None
+    moneda: Optional[str] = None
+    cliente: Optional[str] = None
+
+    @classmethod
+    def desde_request(cls, request):
+        """Construye los filtros desde ``request.GET``; ignora fechas mal formadas."""
+        ganancias = FiltrosGanancias.desde_request(request)
+        tipo = (request.GET.get('tipo') or '').lower()
+        return cls(
+            fecha_inicio=ganancias.fecha_inicio,
+            fecha_fin=ganancias.fecha_fin,
+            tipo=tipo if tipo in TIPOS_OPERACION else None,
+            estado=request.GET.get('estado') or None,
+            moneda=ganancias.moneda,
+            cliente=ganancias.cliente,
+        )
+
+    def como_dict(self) -> dict:
+        """Forma serializable a JSON (fechas en ISO); ver :meth:`desde_dict`."""
+        return {
+            'fecha_inicio': self.fecha_inicio.isoformat() if self.fecha_inicio else None,
+            'fecha_fin': self.fecha_fin.isoformat() if self.fecha_fin else None,
+            'tipo': self.tipo,
+            'estado': self.estado,
+            'moneda': self.moneda,
+            'cliente': self.cliente,
+        }
+
+    @classmethod
+    def desde_dict(cls, datos: dict):
+        """Inversa de :meth:`como_dict`."""
+        return cls(
+            fecha_inicio=parse_date(datos.get('fecha_inicio') or ''),
+            fecha_fin=parse_date(datos.get('fecha_fin') or ''),
+            tipo=datos.get('tipo'),
+            estado=datos.get('estado'),
+            moneda=datos.get('moneda'),
+            cliente=datos.get('cliente'),
+        )
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def transacciones_ganancias(filtros: FiltrosGanancias):
+    """
+    Transacciones completadas del reporte, más recientes primero.
+
+    Cada instancia trae ``ganancia`` anotada (0 si no hay registro) y no dispara
+    consultas al acceder a ``cliente``, ``moneda_origen`` o ``moneda_destino``.
+    Las fechas se filtran por rango sobre ``fecha_creacion`` para poder usar índices.
+    """
+    qs = (Transaccion.objects
+          .filter(estado='completada')
+          .select_related('cliente', 'moneda_origen', 'moneda_destino')
+          .annotate(ganancia=Coalesce(
+              'registro_ganancia__ganancia_registrada',
+              Value(Decimal('0')),
+              output_field=_GANANCIA,
+          ))
+          .order_by('-fecha_creacion'))
+
+    if filtros.tipo:
+        qs = qs.filter(tipo_operacion=filtros.tipo)
+    if filtros.moneda:
+        qs = qs.filter(Q(moneda_origen__codigo=filtros.moneda) | Q(moneda_destino__codigo=filtros.moneda))
+    if filtros.fecha_inicio:
+        qs = qs.filter(fecha_creacion__gte=_inicio_del_dia(filtros.fecha_inicio))
+    if filtros.fecha_fin:
+        qs = qs.filter(fecha_creacion__lt=_inicio_del_dia(filtros.fecha_fin + timedelta(days=1)))
+    if filtros.cliente:
+        qs = qs.filter(cliente__nombre__icontains=filtros.cliente)
+    return qs
+
+
+def transacciones_reporte(filtros: FiltrosTransacciones):
+    """Transacciones del reporte de transacciones (cualquier estado), más recientes primero."""
+    qs = Transaccion.objects.order_by('-fecha_creacion')
+    if filtros.tipo:
+        qs = qs.filter(tipo_operacion=filtros.tipo)
+    if filtros.estado:
+        qs = qs.filter(estado=filtros.estado)
+    if filtros.moneda:
+        qs = qs.filter(Q(moneda_origen__codigo=filtros.moneda) | Q(moneda_destino__codigo=filtros.moneda))
+    if filtros.fecha_inicio:
+        qs = qs.filter(fecha_creacion__gte=_inicio_del_dia(filtros.fecha_inicio))
+    if filtros.fecha_fin:
+        qs = qs.filter(fecha_creacion__lt=_inicio_del_dia(filtros.fecha_fin + timedelta(days=1)))
+    if filtros.cliente:
+        qs = qs.filter(cliente__nombre__icontains=filtros.cliente)
+    return qs
+
+
+def totales_ganancias(transacciones) -> dict:
+    """
+    Totales del reporte en un único agregado.
+
+    :param transacciones: QuerySet de :func:`transacciones_ganancias`.
+    :returns: ``{'total_ventas', 'total_compras', 'total_general', 'total_transacciones'}``
+    """
+    cero = Value(Decimal('0'), output_field=_GANANCIA)
+    return transacciones.order_by().aggregate(
+        total_ventas=Coalesce(Sum('ganancia', filter=Q(tipo_operacion='venta')), cero),
+        total_compras=Coalesce(Sum('ganancia', filter=Q(tipo_operacion='compra')), cero),
+        total_general=Coalesce(Sum('ganancia'), cero),
+        total_transacciones=Count('pk'),
+    )
+
+
+@dataclass(frozen=True)
+class FilaGanancia:
+    """Una fila del reporte, con la moneda y el monto de la divisa operada ya resueltos."""
+    numero: int
+    cliente: str
+    tipo_operacion: str
+    tipo_operacion_display: str
+    moneda_codigo: str
+    tasa_cambio_aplicada: Decimal
+    monto: Decimal
+    comision_final: Decimal
+    ganancia: Decimal
+    fecha_creacion: datetime
+
+
+def filas_ganancias(transacciones, chunk_size: int = CHUNK_SIZE) -> Iterator[FilaGanancia]:
+    """
+    Recorre ``transacciones`` por bloques de ``chunk_size`` filas.
+
+    :param transacciones: QuerySet de :func:`transacciones_ganancias`.
+    """
+    for numero, t in enumerate(transacciones.iterator(chunk_size=chunk_size), start=1):
+        es_venta = t.tipo_operacion == 'venta'
+        yield FilaGanancia(
+            numero=numero,
+            cliente=str(t.cliente),
+            tipo_operacion=t.tipo_operacion,
+            tipo_operacion_display=t.get_tipo_operacion_display(),
+            moneda_codigo=t.moneda_destino.codigo if es_venta else t.moneda_origen.codigo,
+            tasa_cambio_aplicada=t.tasa_cambio_aplicada,
+            monto=t.monto_destino if es_venta else t.monto_origen,
+            comision_final=t.comision_final,
+            ganancia=t.ganancia,
+            fecha_creacion=t.fecha_creacion,
+        )
@@ -0,0 +1,447 @@
+#reportes/exportes.py
+
+"""
+Generación de los archivos PDF y Excel de los reportes.
+
+.. module:: reportes.exportes
+   :synopsis: Exportes de ganancias y transacciones en memoria acotada.
+
+Las funciones escriben sobre un objeto tipo archivo (``destino``), así que sirven
+tanto para responder desde la vista como para guardar el artefacto en disco
+desde la tarea en segundo plano (:mod:`reportes.tasks`).
+
+Ningún exporte retiene todas las filas:
+
+- **Excel**: :class:`reportes.xlsx.LibroXlsx` escribe cada fila en el ZIP a
+  medida que llega. Los ``generar_excel_*`` son generadores que ceden el control
+  cada :data:`FILAS_POR_BLOQUE` filas; :func:`transmitir` los convierte en el
+  iterable de bytes de un ``StreamingHttpResponse``.
+- **PDF**: las filas se agrupan en tablas de :data:`FILAS_POR_BLOQUE` filas que
+  ``reportlab`` pide de a una (:class:`_FlowablesPerezosos`); cada tabla se
+  dibuja y se libera antes de armar la siguiente, y cada página se comprime al
+  cerrarla (:class:`_CanvasPorPaginas`). El PDF sólo se puede escribir
+  completo, por eso las vistas lo generan en un archivo temporal.
+"""
+
+import zlib
+from datetime import datetime
+from decimal import Decimal
+
+from django.utils.timezone import localtime, now
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFName, PDFStream
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from reportes.consultas import (
+    CHUNK_SIZE,
+    filas_ganancias,
+    totales_ganancias,
+    transacciones_ganancias,
+    transacciones_reporte,
+)
+from reportes.xlsx import (
+    ESTILO_DECIMAL,
+    ESTILO_ENCABEZADO,
+    ESTILO_FECHA,
+    ESTILO_MILES,
+    ESTILO_NORMAL,
+    ESTILO_TITULO,
+    LibroXlsx,
+    Tubo,
+    letra_columna,
+)
+
+FORMATO_PDF = 'pdf'
+FORMATO_EXCEL = 'xlsx'
+
+CONTENT_TYPES = {
+    FORMATO_PDF: 'application/pdf',
+    FORMATO_EXCEL: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Filas por tabla del PDF y entre vaciados del Excel.
+FILAS_POR_BLOQUE = 500
+
+_N, _M, _D, _F = ESTILO_NORMAL, ESTILO_MILES, ESTILO_DECIMAL, ESTILO_FECHA
+
+# --- Ganancias ---
+ENCABEZADOS_GANANCIAS = ["N°", "Cliente", "Tipo Operación", "Moneda", "Tasa aplicada",
+                         "Monto", "Comisión", "Ganancia (Gs)", "Fecha"]
+ANCHOS_EXCEL_GANANCIAS = [5, 30, 15, 10, 15, 16, 12, 16, 18]
+ESTILOS_EXCEL_GANANCIAS = [_N, _N, _N, _N, _M, _M, _D, _M, _F]
+ANCHOS_PDF_GANANCIAS = [35, 150, 60, 50, 75, 90, 70, 90, 90]
+
+# --- Transacciones ---
+ENCABEZADOS_TRANSACCIONES = ["N°", "Cliente", "Tipo", "Moneda", "Monto Origen", "Monto Destino", "Estado", "Fecha"]
+ANCHOS_EXCEL_TRANSACCIONES = [5, 25, 15, 10, 18, 18, 25, 20]
+ESTILOS_EXCEL_TRANSACCIONES = [_N, _N, _N, _N, _M, _M, _N, _F]
+ANCHOS_PDF_TRANSACCIONES = [30, 150, 80, 50, 90, 90, 140, 90]
+
+_ESTILO_PDF_GANANCIAS = [
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+]
+_ESTILO_PDF_TRANSACCIONES = [
+    ("BACKGROUND", (0,0), (-1,0), colors.lightgrey),
+    ("TEXTCOLOR", (0,0), (-1,0), colors.black),
+    ("ALIGN", (0,0), (-1,-1), "CENTER"),
+    ("GRID", (0,0), (-1,-1), 0.5, colors.grey),
+    ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
+    ("FONTNAME", (0,1), (-1,-1), "Helvetica"),
+    ("FONTSIZE", (0,0), (-1,-1), 9),
+    ("FONTSIZE", (6,1), (6,-1), 7),
+    ("BOTTOMPADDING", (0,0), (-1,0), 8),
+    ("BACKGROUND", (0,1), (-1,-1), colors.whitesmoke),
+]
+
+
+def nombre_de_usuario(user):
+    """Nombre que se imprime en el encabezado ("Generado por")."""
+    return getattr(user, "nombre", None) or getattr(user, "email", "Usuario desconocido")
+
+
+def _miles(valor):
+    return f"{valor:,.0f}".replace(',', '.')
+
+
+def _fecha_str(momento):
+    return localtime(momento).strftime("%d/%m/%Y %H:%M")
+
+
+def _fecha_excel(momento):
+    # Las celdas de fecha no llevan zona horaria: se escribe la hora local.
+    return localtime(momento).replace(tzinfo=None)
+
+
+# =========================
+# ESCRITORES GENÉRICOS
+# =========================
+def _generar_excel(destino, nombre_hoja, titulo, nombre_usuario, encabezados, anchos, estilos, filas, pie=()):
+    """
+    Generador que escribe la planilla y cede el control cada :data:`FILAS_POR_BLOQUE` filas.
+
+    :param filas: Iterable de listas de valores, una por fila.
+    :param pie: Filas finales ``(etiqueta, valor)`` que se ubican en las dos
+        columnas anteriores a la última.
+    """
+    libro = LibroXlsx(destino, nombre_hoja, anchos)
+    libro.fila([titulo], ESTILO_TITULO)
+    libro.combinar(f"A1:{letra_columna(len(encabezados))}1")
+    libro.fila()
+    libro.fila([f"Generado por: {nombre_usuario}"])
+    libro.fila([f"Fecha: {now().strftime('%d/%m/%Y %H:%M:%S')}"])
+    libro.fila()
+    libro.fila(encabezados, ESTILO_ENCABEZADO)
+
+    for i, valores in enumerate(filas, start=1):
+        libro.fila(valores, estilos)
+        if i % FILAS_POR_BLOQUE == 0:
+            libro.volcar()
+            yield
+
+    if pie:
+        libro.fila()
+        relleno = [''] * (len(encabezados) - 3)
+        for etiqueta, valor in pie:
+            libro.fila(relleno + [etiqueta, valor], [_N] * (len(relleno) + 1) + [_M])
+    libro.cerrar()
+    yield
+
+
+class _FlowablesPerezosos(list):
+    """
+    Lista de *flowables* que se rellena desde un generador a medida que
+    ``reportlab`` la consume.
+
+    ``BaseDocTemplate.build`` sólo usa ``len()``, el primer elemento y
+    ``del``/inserciones al frente (al partir tablas entre páginas), así que
+    alcanza con tener cargado el próximo elemento.
+    """
+
+    def __init__(self, generador):
+        super().__init__()
+        self._generador = generador
+
+    def _rellenar(self):
+        if not list.__len__(self):
+            siguiente = next(self._generador, None)
+            if siguiente is not None:
+                self.append(siguiente)
+
+    def __len__(self):
+        self._rellenar()
+        return list.__len__(self)
+
+    def __getitem__(self, indice):
+        self._rellenar()
+        return list.__getitem__(self, indice)
+
+
+class _CanvasPorPaginas(Canvas):
+    """
+    ``Canvas`` que comprime cada página al cerrarla.
+
+    ``reportlab`` guarda el contenido de todas las páginas sin comprimir hasta
+    ``save()``; aquí cada página queda retenida sólo como su *stream* ya
+    comprimido (``FlateDecode``), que es lo que finalmente ocupa en el PDF.
+    """
+
+    def showPage(self):
+        super().showPage()
+        pagina = self._doc.Pages.pages[-1]
+        if pagina.stream and not pagina.Contents:
+            contenido = PDFStream(content=zlib.compress(pagina.stream.encode('utf8')))
+            contenido.dictionary['Filter'] = PDFArray([PDFName('FlateDecode')])
+            contenido.__Comment__ = "page stream"
+            pagina.Contents = contenido
+            pagina.stream = None
+
+
+def _escribir_pdf(destino, encabezado, columnas, anchos, estilo, filas, pie=()):
+    """
+    Escribe un PDF apaisado con ``encabezado`` y una tabla por cada bloque de filas.
+
+    :param encabezado: *Flowables* iniciales (título, usuario, fecha).
+    :param columnas: Fila de encabezados; se repite al inicio de cada tabla y al
+        partirla entre páginas.
+    :param filas: Iterable de listas de valores ya formateados.
+    :param pie: Filas que se agregan a la última tabla (totales).
+    """
+    doc = SimpleDocTemplate(
+        destino,
+        pagesize=landscape(letter),
+        rightMargin=20, leftMargin=20,
+        topMargin=60, bottomMargin=40
+    )
+    estilo_tabla = TableStyle(estilo)
+
+    def tabla(data):
+        t = Table(data, colWidths=anchos, repeatRows=1, hAlign="CENTER")
+        t.setStyle(estilo_tabla)
+        return t
+
+    def flowables():
+        yield from encabezado
+        bloque = [columnas]
+        for valores in filas:
+            bloque.append(valores)
+            if len(bloque) > FILAS_POR_BLOQUE:
+                yield tabla(bloque)
+                bloque = [columnas]
+        if len(bloque) > 1 or pie:
+            yield tabla(bloque + list(pie))
+
+    doc.build(_FlowablesPerezosos(flowables()), canvasmaker=_CanvasPorPaginas)
+
+
+def _encabezado_pdf(titulo, nombre_usuario, espacio_titulo=False):
+    styles = getSampleStyleSheet()
+    elementos = [Paragraph(f"<b>{titulo}</b>", styles["Title"])]
+    if espacio_titulo:
+        elementos.append(Spacer(1, 12))
+    elementos.append(Paragraph(f"Generado por: {nombre_usuario}", styles["Normal"]))
+    elementos.append(Paragraph(f"Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", styles["Normal"]))
+    elementos.append(Spacer(1, 18))
+    return elementos
+
+
+def transmitir(generar, *args):
+    """
+    Iterable de bytes para ``StreamingHttpResponse`` a partir de un ``generar_excel_*``.
+
+    :param generar: Generador que recibe el destino como primer argumento.
+    """
+    tubo = Tubo()
+    for _ in generar(tubo, *args):
+        datos = tubo.vaciar()
+        if datos:
+            yield datos
+
+
+def _consumir(generador):
+    for _ in generador:
+        pass
+
+
+# =========================
+# GANANCIAS
+# =========================
+def generar_excel_ganancias(destino, filas, totales, nombre_usuario):
+    """
+    Generador que escribe el reporte de ganancias en ``.xlsx``.
+
+    :param filas: Iterable de :class:`reportes.consultas.FilaGanancia`.
+    :param totales: Resultado de :func:`reportes.consultas.totales_ganancias`.
+    """
+    valores = ([
+        fila.numero,
+        fila.cliente,
+        fila.tipo_operacion_display,
+        fila.moneda_codigo,
+        Decimal(fila.tasa_cambio_aplicada),
+        Decimal(fila.monto).quantize(Decimal("1")),
+        fila.comision_final,
+        Decimal(fila.ganancia).quantize(Decimal("1")),
+        _fecha_excel(fila.fecha_creacion),
+    ] for fila in filas)
+    pie = [
+        ("Total Ventas", totales['total_ventas']),
+        ("Total Compras", totales['total_compras']),
+        ("Total General", totales['total_general']),
+    ]
+    yield from _generar_excel(
+        destino, "Reporte de Ganancias", "Reporte de Ganancias - Global Exchange", nombre_usuario,
+        ENCABEZADOS_GANANCIAS, ANCHOS_EXCEL_GANANCIAS, ESTILOS_EXCEL_GANANCIAS, valores, pie,
+    )
+
+
+def pdf_ganancias(destino, filas, totales, nombre_usuario):
+    """
+    Escribe el reporte de ganancias en PDF.
+
+    :param filas: Iterable de :class:`reportes.consultas.FilaGanancia`.
+    :param totales: Resultado de :func:`reportes.consultas.totales_ganancias`.
+    """
+    valores = ([
+        fila.numero,
+        fila.cliente,
+        fila.tipo_operacion_display,
+        fila.moneda_codigo,
+        _miles(Decimal(fila.tasa_cambio_aplicada)),
+        _miles(Decimal(fila.monto)),
+        f"{Decimal(fila.comision_final).quantize(Decimal('0.0001'))}",
+        _miles(fila.ganancia),
+        _fecha_str(fila.fecha_creacion),
+    ] for fila in filas)
+    pie = [
+        ["", "", "", "", "", "", "Total Ventas:", _miles(totales['total_ventas']), ""],
+        ["", "", "", "", "", "", "Total Compras:", _miles(totales['total_compras']), ""],
+        ["", "", "", "", "", "", "Total General:", _miles(totales['total_general']), ""],
+    ]
+    columnas = ["#", "Cliente", "Tipo", "Moneda", "Tasa aplicada", "Monto", "Comisión", "Ganancia (Gs)", "Fecha"]
+    _escribir_pdf(
+        destino,
+        _encabezado_pdf("Reporte de Ganancias - Global Exchange", nombre_usuario),
+        columnas, ANCHOS_PDF_GANANCIAS, _ESTILO_PDF_GANANCIAS, valores, pie,
+    )
+
+
+def escribir_pdf_ganancias(destino, filtros, nombre_usuario):
+    """
+    Escribe el reporte de ganancias en PDF sobre ``destino``.
+
+    :param destino: Objeto tipo archivo (``HttpResponse``, archivo abierto, ``BytesIO``).
+    :param filtros: :class:`reportes.consultas.FiltrosGanancias`.
+    :param nombre_usuario: Texto del encabezado "Generado por".
+    """
+    transacciones = transacciones_ganancias(filtros)
+    totales = totales_ganancias(transacciones)
+    pdf_ganancias(destino, filas_ganancias(transacciones), totales, nombre_usuario)
+
+
+def escribir_excel_ganancias(destino, filtros, nombre_usuario):
+    """
+    Escribe el reporte de ganancias en ``.xlsx`` sobre ``destino``.
+
+    :param destino: Objeto tipo archivo (``HttpResponse``, archivo abierto, ``BytesIO``).
+    :param filtros: :class:`reportes.consultas.FiltrosGanancias`.
+    :param nombre_usuario: Texto del encabezado "Generado por".
+    """
+    transacciones = transacciones_ganancias(filtros)
+    totales = totales_ganancias(transacciones)
+    _consumir(generar_excel_ganancias(destino, filas_ganancias(transacciones), totales, nombre_usuario))
+
+
+# =========================
+# TRANSACCIONES
+# =========================
+def _recorrer_transacciones(transacciones):
+    """Recorre el QuerySet por bloques, con cliente y monedas resueltos por ``JOIN``."""
+    return (transacciones
+            .select_related('cliente', 'moneda_origen', 'moneda_destino')
+            .iterator(chunk_size=CHUNK_SIZE))
+
+
+def _moneda_transaccion(t):
+    return t.moneda_origen.codigo if t.tipo_operacion.lower() == 'compra' else t.moneda_destino.codigo
+
+
+def generar_excel_transacciones(destino, transacciones, nombre_usuario):
+    """
+    Generador que escribe el reporte de transacciones en ``.xlsx``.
+
+    :param transacciones: QuerySet de :class:`transacciones.models.Transaccion` ya filtrado.
+    """
+    valores = ([
+        i,
+        str(t.cliente),
+        t.get_tipo_operacion_display(),
+        _moneda_transaccion(t),
+        Decimal(t.monto_origen).quantize(Decimal("1")),
+        Decimal(t.monto_destino).quantize(Decimal("1")),
+        t.get_estado_display(),
+        _fecha_excel(t.fecha_creacion),
+    ] for i, t in enumerate(_recorrer_transacciones(transacciones), start=1))
+    yield from _generar_excel(
+        destino, "Transacciones", "Reporte de Transacciones - Global Exchange", nombre_usuario,
+        ENCABEZADOS_TRANSACCIONES, ANCHOS_EXCEL_TRANSACCIONES, ESTILOS_EXCEL_TRANSACCIONES, valores,
+    )
+
+
+def pdf_transacciones(destino, transacciones, nombre_usuario):
+    """
+    Escribe el reporte de transacciones en PDF.
+
+    :param transacciones: QuerySet de :class:`transacciones.models.Transaccion` ya filtrado.
+    """
+    valores = ([
+        i,
+        str(t.cliente),
+        t.get_tipo_operacion_display(),
+        _moneda_transaccion(t),
+        _miles(Decimal(t.monto_origen)),
+        _miles(Decimal(t.monto_destino)),
+        t.get_estado_display(),
+        _fecha_str(t.fecha_creacion),
+    ] for i, t in enumerate(_recorrer_transacciones(transacciones), start=1))
+    _escribir_pdf(
+        destino,
+        _encabezado_pdf("Reporte de Transacciones - Global Exchange", nombre_usuario, espacio_titulo=True),
+        ENCABEZADOS_TRANSACCIONES, ANCHOS_PDF_TRANSACCIONES, _ESTILO_PDF_TRANSACCIONES, valores,
+    )
+
+
+def escribir_pdf_transacciones(destino, filtros, nombre_usuario):
+    """
+    Escribe el reporte de transacciones en PDF sobre ``destino``.
+
+    :param filtros: :class:`reportes.consultas.FiltrosTransacciones`.
+    """
+    pdf_transacciones(destino, transacciones_reporte(filtros), nombre_usuario)
+
+
+def escribir_excel_transacciones(destino, filtros, nombre_usuario):
+    """
+    Escribe el reporte de transacciones en ``.xlsx`` sobre ``destino``.
+
+    :param filtros: :class:`reportes.consultas.FiltrosTransacciones`.
+    """
+    _consumir(generar_excel_transacciones(destino, transacciones_reporte(filtros), nombre_usuario))
+
+
+# reporte -> formato -> escritor con firma ``(destino, filtros, nombre_usuario)``.
+ESCRITORES = {
+    'ganancias': {
+        FORMATO_PDF: escribir_pdf_ganancias,
+        FORMATO_EXCEL: escribir_excel_ganancias,
+    },
+    'transacciones': {
+        FORMATO_PDF: escribir_pdf_transacciones,
+        FORMATO_EXCEL: escribir_excel_transacciones,
+    },
+}
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:58
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoReporte',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('reporte', models.CharField(default='ganancias', max_length=30)),
+                ('formato', models.CharField(choices=[('pdf', 'PDF'), ('xlsx', 'Excel')], max_length=4)),
+                ('clave', models.CharField(db_index=True, max_length=64)),
+                ('filtros', models.JSONField(default=dict)),
+                ('periodo_desde', models.DateField(blank=True, null=True)),
+                ('periodo_hasta', models.DateField(blank=True, null=True)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('listo', 'Listo'), ('error', 'Error')], default='pendiente', max_length=12)),
+                ('vigente', models.BooleanField(default=True)),
+                ('archivo', models.FileField(blank=True, upload_to='reportes/%Y/%m/')),
+                ('error', models.TextField(blank=True)),
+                ('fecha_solicitud', models.DateTimeField(auto_now_add=True)),
+                ('fecha_finalizacion', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trabajos_reporte', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trabajo de reporte',
+                'verbose_name_plural': 'Trabajos de reporte',
+                'ordering': ['-fecha_solicitud'],
+                'indexes': [models.Index(fields=['vigente', 'periodo_desde', 'periodo_hasta'], name='trabajo_reporte_periodo_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('vigente', True)), fields=('clave',), name='uniq_trabajo_reporte_vigente')],
+            },
+        ),
+    ]
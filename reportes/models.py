@@ -2,13 +2,89 @@
 Modelos de la aplicación de reportes.
 
 .. module:: reportes.models
-   :synopsis: Modelos relacionados con reportes.
+   :synopsis: Trabajos de generación de reportes en segundo plano.
 
-Actualmente esta app no define modelos propios. Todos los
-reportes se construyen a partir de los modelos de otras apps
-(por ejemplo ``transacciones`` y ``ganancias``).
+Los reportes se construyen a partir de los modelos de otras apps (por ejemplo
+``transacciones`` y ``ganancias``). Esta app sólo guarda los
+:class:`TrabajoReporte`: las exportaciones PDF/Excel generadas por Celery y su
+archivo resultante, para reutilizarlo mientras los datos del período no cambien.
 """
 
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
+
+
+class TrabajoReporte(models.Model):
+
+    """
+    Exportación de un reporte generada en segundo plano.
+
+    Campos principales
+    ------------------
+    - ``clave``: hash SHA-256 de reporte, formato, usuario y filtros
+      normalizados (ver :func:`reportes.trabajos.clave_trabajo`). Dos pedidos
+      idénticos comparten el mismo trabajo.
+    - ``filtros``: filtros del reporte en forma serializable.
+    - ``periodo_desde`` / ``periodo_hasta``: días cubiertos (``NULL`` = sin
+      límite). Una transacción o ganancia nueva dentro del período marca el
+      trabajo como no vigente.
+    - ``vigente``: si el archivo (o el que se está generando) refleja los datos
+      actuales. Sólo puede haber un trabajo vigente por ``clave``.
+    - ``archivo``: el artefacto terminado, en el almacenamiento por defecto.
+    """
+
+    class Estado(models.TextChoices):
+        PENDIENTE = 'pendiente', 'Pendiente'
+        PROCESANDO = 'procesando', 'Procesando'
+        LISTO = 'listo', 'Listo'
+        ERROR = 'error', 'Error'
+
+    class Formato(models.TextChoices):
+        PDF = 'pdf', 'PDF'
+        EXCEL = 'xlsx', 'Excel'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    reporte = models.CharField(max_length=30, default='ganancias')
+    formato = models.CharField(max_length=4, choices=Formato.choices)
+    clave = models.CharField(max_length=64, db_index=True)
+    filtros = models.JSONField(default=dict)
+    periodo_desde = models.DateField(null=True, blank=True)
+    periodo_hasta = models.DateField(null=True, blank=True)
+    estado = models.CharField(max_length=12, choices=Estado.choices, default=Estado.PENDIENTE)
+    vigente = models.BooleanField(default=True)
+    archivo = models.FileField(upload_to='reportes/%Y/%m/', blank=True)
+    error = models.TextField(blank=True)
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='trabajos_reporte',
+    )
+    fecha_solicitud = models.DateTimeField(auto_now_add=True)
+    fecha_finalizacion = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Trabajo de reporte'
+        verbose_name_plural = 'Trabajos de reporte'
+        ordering = ['-fecha_solicitud']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['clave'],
+                condition=Q(vigente=True),
+                name='uniq_trabajo_reporte_vigente',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['vigente', 'periodo_desde', 'periodo_hasta'],
+                         name='trabajo_reporte_periodo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.reporte} ({self.formato}) - {self.get_estado_display()}"
 
-# Create your models here.
+    @property
+    def nombre_descarga(self):
+        """Nombre de archivo sugerido al descargar."""
+        return f"reporte_{self.reporte}.{self.formato}"
@@ -0,0 +1,41 @@
+# reportes/signals.py
+"""
+Invalidación de los reportes generados en segundo plano.
+
+Una transacción o un registro de ganancia que se crea, modifica o elimina cambia
+el contenido de los reportes que cubren su día: los trabajos vigentes de ese
+período dejan de reutilizarse (:func:`reportes.trabajos.invalidar_periodo`).
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from ganancias.models import RegistroGanancia
+from transacciones.models import Transaccion
+from transacciones.signals import tasas_expiradas
+from .trabajos import invalidar_periodo
+
+
+@receiver(post_save, sender=Transaccion, dispatch_uid="reportes_transaccion_save")
+@receiver(post_delete, sender=Transaccion, dispatch_uid="reportes_transaccion_delete")
+def invalidar_por_transaccion(sender, instance, **kwargs):
+    if instance.fecha_creacion:
+        invalidar_periodo(timezone.localdate(instance.fecha_creacion))
+
+
+@receiver(tasas_expiradas, dispatch_uid="reportes_tasas_expiradas")
+def invalidar_por_tasas_expiradas(sender, dias, **kwargs):
+    # El barrido cambia estados con un UPDATE en bloque, sin post_save.
+    for dia in dias:
+        invalidar_periodo(dia)
+
+
+@receiver(post_save, sender=RegistroGanancia, dispatch_uid="reportes_ganancia_save")
+@receiver(post_delete, sender=RegistroGanancia, dispatch_uid="reportes_ganancia_delete")
+def invalidar_por_ganancia(sender, instance, **kwargs):
+    fecha = (Transaccion.objects
+             .filter(pk=instance.transaccion_id)
+             .values_list('fecha_creacion', flat=True)
+             .first())
+    if fecha:
+        invalidar_periodo(timezone.localdate(fecha))
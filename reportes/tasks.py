@@ -0,0 +1,22 @@
+# reportes/tasks.py
+from celery import shared_task
+
+from .trabajos import generar_reporte
+
+
+@shared_task
+def generar_reporte_task(trabajo_id):
+    """
+    Tarea de Celery que genera el archivo de un :class:`reportes.models.TrabajoReporte`.
+
+    :param str trabajo_id: UUID del trabajo.
+    :return: Texto con el resultado, para el backend de resultados.
+    :rtype: str
+
+    **Notas:**
+        - Si el trabajo ya fue tomado por otra ejecución, no hace nada.
+        - Los errores quedan registrados en el propio trabajo (``estado='error'``).
+    """
+    if generar_reporte(trabajo_id):
+        return f"Reporte {trabajo_id} generado."
+    return f"Reporte {trabajo_id} no generado."
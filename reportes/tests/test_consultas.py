@@ -0,0 +1,114 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from clientes.models import Cliente
+from ganancias.models import RegistroGanancia
+from monedas.models import Moneda
+from reportes.consultas import (
+    FiltrosGanancias,
+    filas_ganancias,
+    totales_ganancias,
+    transacciones_ganancias,
+)
+from transacciones.models import Transaccion
+from transacciones.outbox import despachar_eventos
+
+User = get_user_model()
+
+
+class ConsultasGananciasTest(TestCase):
+    """Pruebas de la capa de consultas compartida por los reportes de ganancias."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="reportes@test.com", password="pass1234", is_active=True)
+        cls.pyg = Moneda.objects.create(codigo="PYG", nombre="Guaraní")
+        cls.usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        cls.eur = Moneda.objects.create(codigo="EUR", nombre="Euro")
+        cls.cliente = Cliente.objects.create(nombre="Cliente Reporte", categoria=Cliente.Categoria.MINORISTA)
+
+        # Ganancia = (comision_cotizacion - comision_aplicada) * monto de la divisa.
+        cls._crear("venta", cls.usd, Decimal("100"), Decimal("50"))    # 5000
+        cls._crear("venta", cls.eur, Decimal("10"), Decimal("40"))     # 400
+        cls._crear("compra", cls.usd, Decimal("20"), Decimal("30"))    # 600
+        cls._crear("venta", cls.usd, Decimal("1"), Decimal("1"), estado="cancelada")
+        despachar_eventos()
+
+    @classmethod
+    def _crear(cls, tipo, divisa, monto_divisa, comision, estado="completada"):
+        venta = tipo == "venta"
+        return Transaccion.objects.create(
+            cliente=cls.cliente,
+            usuario_operador=cls.user,
+            tipo_operacion=tipo,
+            estado=estado,
+            moneda_origen=cls.pyg if venta else divisa,
+            monto_origen=monto_divisa * 7000 if venta else monto_divisa,
+            moneda_destino=divisa if venta else cls.pyg,
+            monto_destino=monto_divisa if venta else monto_divisa * 7000,
+            tasa_cambio_aplicada=Decimal("7000"),
+            comision_aplicada=Decimal("0"),
+            comision_cotizacion=comision,
+            codigo_operacion_tauser=uuid.uuid4().hex[:10],
+        )
+
+    def _request(self, **params):
+        return SimpleNamespace(GET=params)
+
+    def test_totales_en_un_solo_agregado(self):
+        qs = transacciones_ganancias(FiltrosGanancias())
+        with self.assertNumQueries(1):
+            totales = totales_ganancias(qs)
+        self.assertEqual(totales["total_ventas"], Decimal("5400"))
+        self.assertEqual(totales["total_compras"], Decimal("600"))
+        self.assertEqual(totales["total_general"], Decimal("6000"))
+        self.assertEqual(totales["total_transacciones"], 3)
+
+    def test_filas_sin_consultas_por_fila(self):
+        qs = transacciones_ganancias(FiltrosGanancias())
+        with self.assertNumQueries(1):
+            filas = list(filas_ganancias(qs, chunk_size=2))
+        self.assertEqual([f.numero for f in filas], [1, 2, 3])
+        compra = next(f for f in filas if f.tipo_operacion == "compra")
+        self.assertEqual(compra.moneda_codigo, "USD")
+        self.assertEqual(compra.monto, Decimal("20"))
+        self.assertEqual(compra.ganancia, Decimal("600"))
+        self.assertEqual(compra.cliente, str(self.cliente))
+
+    def test_transaccion_sin_registro_aporta_cero(self):
+        tx = Transaccion.objects.filter(tipo_operacion="compra").get()
+        RegistroGanancia.objects.filter(transaccion=tx).delete()
+        totales = totales_ganancias(transacciones_ganancias(FiltrosGanancias()))
+        self.assertEqual(totales["total_compras"], Decimal("0"))
+        self.assertEqual(totales["total_transacciones"], 3)
+
+    def test_filtros_desde_request(self):
+        filtros = FiltrosGanancias.desde_request(self._request(
+            tipo="venta", moneda="todas", fecha_inicio="no-es-fecha", cliente="",
+        ))
+        self.assertEqual(filtros, FiltrosGanancias(tipo="venta"))
+
+        filtros = FiltrosGanancias.desde_request(self._request(moneda="EUR"))
+        totales = totales_ganancias(transacciones_ganancias(filtros))
+        self.assertEqual(totales["total_general"], Decimal("400"))
+
+        ayer = timezone.localdate() - timedelta(days=1)
+        filtros = FiltrosGanancias(fecha_fin=ayer)
+        self.assertEqual(totales_ganancias(transacciones_ganancias(filtros))["total_transacciones"], 0)
+        filtros = FiltrosGanancias(fecha_inicio=ayer, fecha_fin=timezone.localdate())
+        self.assertEqual(totales_ganancias(transacciones_ganancias(filtros))["total_transacciones"], 3)
+
+    def test_vista_web_muestra_ganancia_de_la_pagina(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("reportes:reporte_ganancias"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total_ganancia"], Decimal("6000"))
+        ganancias = sorted(t.ganancia for t in response.context["page_obj"])
+        self.assertEqual(ganancias, [Decimal("400"), Decimal("600"), Decimal("5000")])
@@ -0,0 +1,154 @@
+import io
+import tracemalloc
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from clientes.models import Cliente
+from monedas.models import Moneda
+from reportes import exportes
+from reportes.consultas import FilaGanancia
+from reportes.xlsx import LibroXlsx
+from transacciones.models import Transaccion
+
+User = get_user_model()
+
+TOTALES = {
+    "total_ventas": Decimal("5000"),
+    "total_compras": Decimal("600"),
+    "total_general": Decimal("5600"),
+}
+
+
+def _filas(cantidad):
+    """Filas sintéticas del reporte de ganancias, sin pasar por la base de datos."""
+    ahora = timezone.now()
+    for numero in range(1, cantidad + 1):
+        yield FilaGanancia(
+            numero=numero,
+            cliente=f"Cliente {numero % 50}",
+            tipo_operacion="venta",
+            tipo_operacion_display="Venta",
+            moneda_codigo="USD",
+            tasa_cambio_aplicada=Decimal("7000"),
+            monto=Decimal("100"),
+            comision_final=Decimal("50.0000"),
+            ganancia=Decimal("5000"),
+            fecha_creacion=ahora,
+        )
+
+
+class ExportesStreamingTest(SimpleTestCase):
+    """Pruebas de los escritores por bloques de :mod:`reportes.exportes`."""
+
+    def test_excel_de_200k_filas_en_memoria_acotada(self):
+        techo = 16 * 1024 * 1024
+        enviados = 0
+        tracemalloc.start()
+        try:
+            for bloque in exportes.transmitir(
+                exportes.generar_excel_ganancias, _filas(200_000), TOTALES, "Usuario"
+            ):
+                enviados += len(bloque)
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertGreater(enviados, techo // 4)
+        self.assertLess(pico, techo, f"Pico de memoria: {pico / 1e6:.1f} MB")
+
+    def test_excel_valido_con_formatos(self):
+        destino = io.BytesIO()
+        for _ in exportes.generar_excel_ganancias(destino, _filas(3), TOTALES, "Ana <&>"):
+            pass
+
+        ws = load_workbook(io.BytesIO(destino.getvalue())).active
+        self.assertEqual(ws["A1"].value, "Reporte de Ganancias - Global Exchange")
+        self.assertIn("A1:I1", {str(r) for r in ws.merged_cells.ranges})
+        self.assertEqual(ws["A3"].value, "Generado por: Ana <&>")
+        self.assertEqual(ws["B6"].value, "Cliente")
+        self.assertEqual(ws["F7"].value, 100)
+        self.assertEqual(ws["F7"].number_format, "#,##0")
+        self.assertEqual(ws["I7"].number_format, "dd/mm/yyyy hh:mm")
+        self.assertEqual(ws["H9"].value, 5000)
+        self.assertEqual([ws["G13"].value, ws["H13"].value], ["Total General", 5600])
+
+    def test_pdf_por_bloques(self):
+        destino = io.BytesIO()
+        filas = exportes.FILAS_POR_BLOQUE * 2 + 10
+        exportes.pdf_ganancias(destino, _filas(filas), TOTALES, "Usuario")
+
+        pdf = destino.getvalue()
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        self.assertTrue(pdf.rstrip().endswith(b"%%EOF"))
+        # Cada página se comprimió al cerrarla (sólo FlateDecode, sin ASCII85).
+        paginas = pdf.count(b"/Type /Page\n")
+        self.assertGreater(paginas, 10)
+        self.assertEqual(pdf.count(b"/Filter [ /FlateDecode ]"), paginas)
+
+
+class LibroXlsxTest(SimpleTestCase):
+    """Valores que el XML de la hoja no admite tal cual (:mod:`reportes.xlsx`)."""
+
+    def test_quita_caracteres_de_control(self):
+        destino = io.BytesIO()
+        libro = LibroXlsx(destino, "Hoja", anchos=[10, 10])
+        libro.fila(["Cliente\x01raro", "tab\tok"])
+        libro.cerrar()
+
+        ws = load_workbook(io.BytesIO(destino.getvalue())).active
+        self.assertEqual([ws["A1"].value, ws["B1"].value], ["Clienteraro", "tab\tok"])
+
+    def test_rechaza_numeros_no_finitos(self):
+        for valor in (float("nan"), float("inf"), Decimal("NaN"), Decimal("-Infinity")):
+            with self.subTest(valor=valor), self.assertRaises(ValueError):
+                LibroXlsx(io.BytesIO(), "Hoja").fila([valor])
+
+
+class ExportesVistasTest(TestCase):
+    """Las vistas de exportación responden por streaming."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="exportes@test.com", password="pass1234", is_active=True)
+        pyg = Moneda.objects.create(codigo="PYG", nombre="Guaraní")
+        usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        cliente = Cliente.objects.create(nombre="Cliente Exporte", categoria=Cliente.Categoria.MINORISTA)
+        for _ in range(3):
+            Transaccion.objects.create(
+                cliente=cliente,
+                usuario_operador=cls.user,
+                tipo_operacion="venta",
+                estado="completada",
+                moneda_origen=pyg,
+                monto_origen=Decimal("700000"),
+                moneda_destino=usd,
+                monto_destino=Decimal("100"),
+                tasa_cambio_aplicada=Decimal("7000"),
+                comision_aplicada=Decimal("0"),
+                codigo_operacion_tauser=uuid.uuid4().hex[:10],
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_excel_transacciones_en_streaming(self):
+        response = self.client.get(reverse("reportes:reporte_transacciones_excel"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        ws = load_workbook(io.BytesIO(b"".join(response.streaming_content))).active
+        self.assertEqual(ws["B7"].value, str(Cliente.objects.get()))
+        self.assertEqual(ws["E7"].value, 700000)
+        self.assertIsNone(ws["A10"].value)
+
+    def test_pdf_desde_archivo_temporal(self):
+        response = self.client.get(reverse("reportes:reporte_ganancias_pdf"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn("reporte_ganancias.pdf", response["Content-Disposition"])
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
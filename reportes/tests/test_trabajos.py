@@ -0,0 +1,162 @@
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from clientes.models import Cliente
+from monedas.models import Moneda
+from reportes.consultas import FiltrosGanancias
+from reportes.models import TrabajoReporte
+from reportes.trabajos import generar_reporte, solicitar_reporte
+from transacciones.models import Transaccion
+
+User = get_user_model()
+
+MEDIA_TEMPORAL = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TEMPORAL)
+class TrabajosReporteTest(TestCase):
+    """Pruebas de los exportes en segundo plano (:mod:`reportes.trabajos`)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="trabajos@test.com", password="pass1234", is_active=True)
+        cls.otro = User.objects.create_user(email="otro@test.com", password="pass1234", is_active=True)
+        cls.pyg = Moneda.objects.create(codigo="PYG", nombre="Guaraní")
+        cls.usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        cls.cliente = Cliente.objects.create(nombre="Cliente Trabajos", categoria=Cliente.Categoria.MINORISTA)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_TEMPORAL, ignore_errors=True)
+
+    def _crear_transaccion(self):
+        return Transaccion.objects.create(
+            cliente=self.cliente,
+            usuario_operador=self.user,
+            tipo_operacion="venta",
+            estado="completada",
+            moneda_origen=self.pyg,
+            monto_origen=Decimal("700000"),
+            moneda_destino=self.usd,
+            monto_destino=Decimal("100"),
+            tasa_cambio_aplicada=Decimal("7000"),
+            comision_aplicada=Decimal("0"),
+            comision_cotizacion=Decimal("50"),
+            codigo_operacion_tauser=uuid.uuid4().hex[:10],
+        )
+
+    def _solicitar(self, filtros=None, formato="pdf", usuario=None):
+        with self.captureOnCommitCallbacks() as encolados:
+            resultado = solicitar_reporte(filtros or FiltrosGanancias(), formato, usuario or self.user)
+        return resultado, encolados
+
+    def test_pedidos_identicos_comparten_trabajo(self):
+        (trabajo, creado), encolados = self._solicitar(FiltrosGanancias(tipo="venta"))
+        self.assertTrue(creado)
+        self.assertEqual(len(encolados), 1)
+
+        (repetido, creado), encolados = self._solicitar(FiltrosGanancias(tipo="venta"))
+        self.assertFalse(creado)
+        self.assertEqual(repetido.pk, trabajo.pk)
+        self.assertEqual(encolados, [])
+
+        (excel, creado), _ = self._solicitar(FiltrosGanancias(tipo="venta"), formato="xlsx")
+        self.assertTrue(creado)
+        (ajeno, creado), _ = self._solicitar(FiltrosGanancias(tipo="venta"), usuario=self.otro)
+        self.assertTrue(creado)
+        self.assertEqual(len({trabajo.pk, excel.pk, ajeno.pk}), 3)
+
+    def test_generar_guarda_el_archivo_una_sola_vez(self):
+        self._crear_transaccion()
+        (trabajo, _), _ = self._solicitar()
+
+        self.assertTrue(generar_reporte(trabajo.pk))
+        self.assertFalse(generar_reporte(trabajo.pk))
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoReporte.Estado.LISTO)
+        with trabajo.archivo.open("rb") as archivo:
+            self.assertEqual(archivo.read(4), b"%PDF")
+
+    def test_transaccion_nueva_invalida_solo_el_periodo_cubierto(self):
+        ayer = timezone.localdate() - timedelta(days=1)
+        (abierto, _), _ = self._solicitar()
+        (pasado, _), _ = self._solicitar(FiltrosGanancias(fecha_fin=ayer))
+        generar_reporte(abierto.pk)
+
+        self._crear_transaccion()
+
+        abierto.refresh_from_db()
+        pasado.refresh_from_db()
+        self.assertFalse(abierto.vigente)
+        self.assertTrue(pasado.vigente)
+
+        # El siguiente pedido genera un trabajo nuevo y descarta el anterior con su archivo.
+        ruta = abierto.archivo.path
+        (nuevo, creado), _ = self._solicitar()
+        self.assertTrue(creado)
+        self.assertNotEqual(nuevo.pk, abierto.pk)
+        self.assertFalse(TrabajoReporte.objects.filter(pk=abierto.pk).exists())
+        self.assertFalse(os.path.exists(ruta))
+
+    def test_vistas_de_solicitud_estado_y_descarga(self):
+        self.client.force_login(self.user)
+        url = reverse("reportes:solicitar_reporte_ganancias", args=["xlsx"]) + "?tipo=venta"
+        with self.captureOnCommitCallbacks():
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 202)
+        datos = response.json()
+        self.assertFalse(datos["listo"])
+
+        descarga = reverse("reportes:descargar_trabajo", args=[datos["id"]])
+        self.assertEqual(self.client.get(descarga).status_code, 404)
+
+        generar_reporte(datos["id"])
+        estado = self.client.get(datos["url_estado"]).json()
+        self.assertTrue(estado["listo"])
+        self.assertEqual(estado["url_descarga"], descarga)
+
+        response = self.client.get(descarga)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("reporte_ganancias.xlsx", response["Content-Disposition"])
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"PK"))
+
+        # Otro usuario no ve el trabajo.
+        self.client.force_login(self.otro)
+        self.assertEqual(self.client.get(datos["url_estado"]).status_code, 404)
+
+        bad = reverse("reportes:solicitar_reporte_ganancias", args=["csv"])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(bad).status_code, 400)
+
+    def test_reporte_de_transacciones_en_segundo_plano(self):
+        self._crear_transaccion()
+        self.client.force_login(self.user)
+        url = reverse("reportes:solicitar_reporte_transacciones", args=["pdf"]) + "?tipo=venta&estado=completada"
+        with self.captureOnCommitCallbacks():
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 202)
+
+        trabajo = TrabajoReporte.objects.get(pk=response.json()["id"])
+        self.assertEqual(trabajo.reporte, "transacciones")
+        self.assertEqual(trabajo.filtros["estado"], "completada")
+        # Los mismos filtros del reporte de ganancias no comparten el trabajo.
+        (ganancias, creado), _ = self._solicitar(FiltrosGanancias(tipo="venta"))
+        self.assertTrue(creado)
+        self.assertNotEqual(ganancias.pk, trabajo.pk)
+
+        self.assertTrue(generar_reporte(trabajo.pk))
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.nombre_descarga, "reporte_transacciones.pdf")
+        with trabajo.archivo.open("rb") as archivo:
+            self.assertEqual(archivo.read(4), b"%PDF")
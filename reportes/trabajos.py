@@ -0,0 +1,185 @@
+#reportes/trabajos.py
+
+"""
+Trabajos de exportación en segundo plano.
+
+.. module:: reportes.trabajos
+   :synopsis: Deduplicación, generación e invalidación de :class:`~reportes.models.TrabajoReporte`.
+
+Flujo:
+
+1. :func:`solicitar_reporte` calcula la :func:`clave_trabajo` de los filtros
+   normalizados. Si ya hay un trabajo vigente con esa clave (pendiente, en curso
+   o listo) lo devuelve; si no, lo crea y encola :func:`reportes.tasks.generar_reporte_task`
+   al confirmar la transacción. La restricción única parcial sobre ``clave``
+   (sólo filas vigentes) resuelve dos pedidos simultáneos: el segundo ``INSERT``
+   falla y se reutiliza el del primero.
+2. :func:`generar_reporte` escribe el archivo con :mod:`reportes.exportes` en el
+   almacenamiento por defecto (``MEDIA_ROOT``).
+3. :func:`invalidar_periodo` (desde :mod:`reportes.signals`) marca como no
+   vigentes los trabajos cuyo período incluye el día de una transacción o
+   ganancia nueva; el próximo pedido genera un archivo nuevo.
+"""
+
+import hashlib
+import json
+import logging
+import tempfile
+
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from reportes.consultas import FiltrosGanancias, FiltrosTransacciones
+from reportes.exportes import ESCRITORES, nombre_de_usuario
+from reportes.models import TrabajoReporte
+
+logger = logging.getLogger(__name__)
+
+# Por encima de este tamaño el archivo temporal pasa de memoria a disco.
+MAX_EN_MEMORIA = 5 * 1024 * 1024
+
+# reporte -> clase de filtros (``como_dict`` / ``desde_dict``); los escritores están en ESCRITORES.
+FILTROS = {
+    'ganancias': FiltrosGanancias,
+    'transacciones': FiltrosTransacciones,
+}
+
+
+def clave_trabajo(filtros, formato: str, usuario_id, reporte: str = 'ganancias') -> str:
+    """
+    Hash estable de un pedido de exportación.
+
+    Incluye al usuario porque el archivo lleva su nombre en el encabezado.
+    """
+    contenido = json.dumps(
+        {
+            'reporte': reporte,
+            'formato': formato,
+            'usuario': str(usuario_id),
+            'filtros': filtros.como_dict(),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _vigente(clave):
+    return TrabajoReporte.objects.filter(clave=clave, vigente=True).first()
+
+
+def _descartar_anteriores(clave):
+    """Borra los trabajos no vigentes de ``clave`` junto con sus archivos."""
+    for anterior in TrabajoReporte.objects.filter(clave=clave, vigente=False):
+        if anterior.archivo:
+            anterior.archivo.delete(save=False)
+        anterior.delete()
+
+
+def solicitar_reporte(filtros, formato: str, usuario, reporte: str = 'ganancias'):
+    """
+    Devuelve el trabajo vigente para el pedido, creándolo y encolándolo si hace falta.
+
+    :param filtros: Filtros del reporte (:data:`FILTROS`), p. ej.
+        :class:`reportes.consultas.FiltrosGanancias`.
+    :param formato: Uno de :class:`TrabajoReporte.Formato`.
+    :param usuario: Usuario que solicita la exportación.
+    :param reporte: ``'ganancias'`` o ``'transacciones'``.
+    :returns: ``(trabajo, creado)``
+    :raises ValueError: Si el reporte o el formato no son válidos.
+    """
+    if formato not in ESCRITORES.get(reporte, {}):
+        raise ValueError(f"Formato de reporte desconocido: {reporte!r} ({formato!r}).")
+
+    clave = clave_trabajo(filtros, formato, usuario.pk, reporte)
+    trabajo = _vigente(clave)
+    if trabajo is not None:
+        return trabajo, False
+
+    _descartar_anteriores(clave)
+    try:
+        with transaction.atomic():
+            trabajo = TrabajoReporte.objects.create(
+                reporte=reporte,
+                formato=formato,
+                clave=clave,
+                filtros=filtros.como_dict(),
+                periodo_desde=filtros.fecha_inicio,
+                periodo_hasta=filtros.fecha_fin,
+                solicitado_por=usuario,
+            )
+    except IntegrityError:
+        # Un pedido idéntico creó el trabajo en paralelo.
+        return _vigente(clave), False
+
+    trabajo_id = trabajo.pk
+    transaction.on_commit(lambda: encolar(trabajo_id))
+    return trabajo, True
+
+
+def encolar(trabajo_id):
+    """Encola la generación; si el broker no responde, deja el trabajo en error."""
+    from reportes.tasks import generar_reporte_task
+
+    try:
+        generar_reporte_task.delay(str(trabajo_id))
+    except Exception as exc:
+        logger.exception("No se pudo encolar el trabajo de reporte %s", trabajo_id)
+        TrabajoReporte.objects.filter(pk=trabajo_id).update(
+            estado=TrabajoReporte.Estado.ERROR, vigente=False, error=str(exc),
+        )
+
+
+def generar_reporte(trabajo_id) -> bool:
+    """
+    Genera el archivo del trabajo ``trabajo_id``.
+
+    El paso ``pendiente → procesando`` es un ``UPDATE`` condicional, así que una
+    entrega duplicada de la tarea no genera el archivo dos veces.
+
+    :returns: ``True`` si este llamado generó el archivo.
+    """
+    tomados = (TrabajoReporte.objects
+               .filter(pk=trabajo_id, estado=TrabajoReporte.Estado.PENDIENTE)
+               .update(estado=TrabajoReporte.Estado.PROCESANDO))
+    if not tomados:
+        return False
+
+    trabajo = TrabajoReporte.objects.select_related('solicitado_por').get(pk=trabajo_id)
+    try:
+        escribir = ESCRITORES[trabajo.reporte][trabajo.formato]
+        filtros = FILTROS[trabajo.reporte].desde_dict(trabajo.filtros)
+        with tempfile.SpooledTemporaryFile(max_size=MAX_EN_MEMORIA) as temporal:
+            escribir(temporal, filtros, nombre_de_usuario(trabajo.solicitado_por))
+            temporal.seek(0)
+            trabajo.archivo.save(trabajo.nombre_descarga, File(temporal), save=False)
+    except Exception as exc:
+        logger.exception("Falló la generación del trabajo de reporte %s", trabajo_id)
+        TrabajoReporte.objects.filter(pk=trabajo_id).update(
+            estado=TrabajoReporte.Estado.ERROR,
+            vigente=False,
+            error=str(exc),
+            fecha_finalizacion=timezone.now(),
+        )
+        return False
+
+    # ``vigente`` no se escribe: una invalidación durante la generación se respeta.
+    trabajo.estado = TrabajoReporte.Estado.LISTO
+    trabajo.fecha_finalizacion = timezone.now()
+    trabajo.save(update_fields=['archivo', 'estado', 'fecha_finalizacion'])
+    return True
+
+
+def invalidar_periodo(dia) -> int:
+    """
+    Marca como no vigentes los trabajos cuyo período incluye ``dia``.
+
+    :param dia: Día local (``date``) de la transacción que cambió.
+    :returns: Cantidad de trabajos invalidados.
+    """
+    return (TrabajoReporte.objects
+            .filter(vigente=True)
+            .filter(Q(periodo_desde__isnull=True) | Q(periodo_desde__lte=dia))
+            .filter(Q(periodo_hasta__isnull=True) | Q(periodo_hasta__gte=dia))
+            .update(vigente=False))
@@ -9,6 +9,7 @@ Rutas de la aplicación de reportes.
 Define las rutas para:
 - Panel principal de reportes.
 - Reportes de ganancias (web, PDF y Excel).
+- Exportes en segundo plano (solicitud, estado y descarga).
 - Reportes de transacciones (web, PDF y Excel).
 """
 
@@ -24,9 +25,17 @@ urlpatterns = [
     path('ganancias/', views.reporte_ganancias, name='reporte_ganancias'),
     path('ganancias/pdf/', views.reporte_ganancias_pdf, name='reporte_ganancias_pdf'),
     path('ganancias/excel/', views.reporte_ganancias_excel, name='reporte_ganancias_excel'),
+    path('ganancias/solicitar/<str:formato>/', views.solicitar_reporte_ganancias,
+         name='solicitar_reporte_ganancias'),
+
+    # Exportes en segundo plano
+    path('trabajos/<uuid:trabajo_id>/', views.estado_trabajo, name='estado_trabajo'),
+    path('trabajos/<uuid:trabajo_id>/descargar/', views.descargar_trabajo, name='descargar_trabajo'),
 
     # Transacciones
     path('transacciones/', views.reporte_transacciones, name='reporte_transacciones'),
     path('transacciones/pdf/', views.reporte_transacciones_pdf, name='reporte_transacciones_pdf'),
     path('transacciones/excel/', views.reporte_transacciones_excel, name='reporte_transacciones_excel'),
+    path('transacciones/solicitar/<str:formato>/', views.solicitar_reporte_transacciones,
+         name='solicitar_reporte_transacciones'),
 ]
@@ -19,23 +19,14 @@ Los datos se obtienen principalmente de los modelos
 from django.shortcuts import render
 from django.http import HttpResponse
 from django.utils.timezone import now
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
 from django.contrib.auth.decorators import login_required
 from monedas.models import Moneda
 from transacciones.models import Transaccion
-from reportlab.lib.pagesizes import letter, landscape
 from django.core.paginator import Paginator
-from django.db.models import Q
 from django.shortcuts import render
 from decimal import Decimal
 from django.template.defaultfilters import floatformat
 from django.utils.formats import number_format
-from django.utils.timezone import localtime
 
 
 # =========================
@@ -68,7 +59,56 @@ from monedas.models import Moneda
 from datetime import datetime
 from decimal import Decimal
 
-from ganancias.models import RegistroGanancia
+from reportes.consultas import (
+    FiltrosGanancias,
+    FiltrosTransacciones,
+    filas_ganancias,
+    totales_ganancias,
+    transacciones_ganancias,
+    transacciones_reporte,
+)
+from reportes.exportes import (
+    CONTENT_TYPES,
+    FORMATO_EXCEL,
+    FORMATO_PDF,
+    escribir_pdf_ganancias,
+    escribir_pdf_transacciones,
+    generar_excel_ganancias,
+    generar_excel_transacciones,
+    nombre_de_usuario,
+    transmitir,
+)
+from reportes.models import TrabajoReporte
+from reportes.trabajos import solicitar_reporte
+import tempfile
+
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+
+
+def _adjunto_temporal(nombre_archivo, formato, escribir, *args):
+    """
+    Escribe el archivo en un temporal en disco y lo envía por bloques.
+
+    Para formatos que sólo se pueden escribir completos (PDF): la memoria no
+    depende del tamaño del reporte.
+    """
+    temporal = tempfile.TemporaryFile()
+    escribir(temporal, *args)
+    temporal.seek(0)
+    return FileResponse(
+        temporal, as_attachment=True, filename=nombre_archivo, content_type=CONTENT_TYPES[formato],
+    )
+
+
+def _adjunto_streaming(nombre_archivo, contenido):
+    """``StreamingHttpResponse`` de una planilla generada con :func:`reportes.exportes.transmitir`."""
+    response = StreamingHttpResponse(contenido, content_type=CONTENT_TYPES[FORMATO_EXCEL])
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return response
+
 
 @login_required
 def reporte_ganancias(request):
@@ -81,81 +121,36 @@ def reporte_ganancias(request):
     moneda, rango de fechas y cliente. También calcula totales
     separados para compras, ventas y un total general.
 
+    Las filas y los totales salen de :mod:`reportes.consultas`: la página
+    se obtiene con una consulta y los totales con un único agregado.
+
     :param request: Objeto HttpRequest de la petición actual, incluye filtros en ``GET``.
     :type request: django.http.HttpRequest
     :return: Respuesta con el template HTML del reporte de ganancias.
     :rtype: django.http.HttpResponse
     """
 
-    # 📌 Trae TODAS las transacciones COMPLETADAS (compra y venta)
-    transacciones = Transaccion.objects.filter(estado='completada').order_by('-fecha_creacion')
-
-    # --- FILTROS  ---
-    tipo = request.GET.get('tipo')
-    if tipo in ['compra', 'venta']:
-        transacciones = transacciones.filter(tipo_operacion=tipo)
-
-    moneda = request.GET.get('moneda')
-    if moneda and moneda != "todas":
-        transacciones = transacciones.filter(
-            Q(moneda_origen__codigo=moneda) | Q(moneda_destino__codigo=moneda)
-        )
-
-    fecha_desde = request.GET.get('fecha_inicio')
-    fecha_hasta = request.GET.get('fecha_fin')
-
-    if fecha_desde:
-        transacciones = transacciones.filter(fecha_creacion__date__gte=fecha_desde)
-
-    if fecha_hasta:
-        transacciones = transacciones.filter(fecha_creacion__date__lte=fecha_hasta)
-    cliente = request.GET.get('cliente')
-    if cliente:
-        transacciones = transacciones.filter(cliente__nombre__icontains=cliente)
-    # --- CÁLCULOS ---
-    total_ventas = Decimal('0')
-    total_compras = Decimal('0')
-    total_general = Decimal('0')
-    total_transacciones = transacciones.count()
-
-   # dentro del loop de cálculo de ganancias
-    for t in transacciones:
-        try:
-            registro = RegistroGanancia.objects.get(transaccion=t)
-            ganancia = registro.ganancia_registrada
-        except RegistroGanancia.DoesNotExist:
-            ganancia = Decimal('0')
-
-        t.ganancia = ganancia  # se muestra luego en tabla
-        t.ganancia_negativa = ganancia < 0  # <-- nueva variable para template
-
-        if t.tipo_operacion == "venta":
-            total_ventas += ganancia
-        elif t.tipo_operacion == "compra":
-            total_compras += ganancia
-
-        total_general += ganancia
-
+    filtros = FiltrosGanancias.desde_request(request)
+    transacciones = transacciones_ganancias(filtros)
+    totales = totales_ganancias(transacciones)
 
     # -----------------------------
     # 📌 PAGINACIÓN 
     # -----------------------------
-    paginator = Paginator(transacciones, 10)  # ← 20 items por página
+    paginator = Paginator(transacciones, 10)
+    paginator.count = totales['total_transacciones']  # evita un COUNT(*) adicional
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
-    # 
-    # -----------------------------
-
     context = {
         'user': request.user,
         'now': datetime.now(),
         'transacciones': page_obj,   # ← AHORA ESTA PAGINADO
         'page_obj': page_obj,        # ← NECESARIO PARA los botones
-        'total_ventas': total_ventas,
-        'total_compras': total_compras,
-        'total_ganancia': total_general,
-        'total_transacciones': total_transacciones,
+        'total_ventas': totales['total_ventas'],
+        'total_compras': totales['total_compras'],
+        'total_ganancia': totales['total_general'],
+        'total_transacciones': totales['total_transacciones'],
         'monedas': Moneda.objects.all().order_by('codigo'),
     }
 
@@ -175,134 +170,24 @@ def reporte_ganancias_pdf(request):
     tipo de operación, moneda, monto, comisión, ganancia, fecha)
     más los totales de compras, ventas y ganancia general.
 
+    Para rangos grandes conviene :func:`solicitar_reporte_ganancias`, que
+    genera el archivo en segundo plano y lo reutiliza.
+
     :param request: Objeto HttpRequest de la petición actual, con filtros en ``GET``.
     :type request: django.http.HttpRequest
     :return: Respuesta HTTP con el contenido PDF adjunto.
-    :rtype: django.http.HttpResponse
+    :rtype: django.http.FileResponse
     """
 
-    transacciones = Transaccion.objects.filter(estado='completada').order_by('-fecha_creacion')
-
-    # --- FILTROS ---
-    fecha_inicio = request.GET.get('fecha_inicio')
-    fecha_fin = request.GET.get('fecha_fin')
-    tipo = request.GET.get('tipo')
-    cliente = request.GET.get('cliente')
-    moneda = request.GET.get('moneda')
-
-    if fecha_inicio:
-        transacciones = transacciones.filter(fecha_creacion__date__gte=fecha_inicio)
-    if fecha_fin:
-        transacciones = transacciones.filter(fecha_creacion__date__lte=fecha_fin)
-    if tipo:
-        transacciones = transacciones.filter(tipo_operacion=tipo)
-    if cliente:
-        transacciones = transacciones.filter(cliente__nombre__icontains=cliente)
-    if moneda:
-        transacciones = transacciones.filter(
-            Q(moneda_origen__codigo=moneda) |
-            Q(moneda_destino__codigo=moneda)
-        )
-
-    # --- PDF ---
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="reporte_ganancias.pdf"'
-
-    doc = SimpleDocTemplate(
-        response,
-        pagesize=landscape(letter),
-        rightMargin=20, leftMargin=20,
-        topMargin=60, bottomMargin=40
+    filtros = FiltrosGanancias.desde_request(request)
+    return _adjunto_temporal(
+        'reporte_ganancias.pdf', FORMATO_PDF,
+        escribir_pdf_ganancias, filtros, nombre_de_usuario(request.user),
     )
 
-    styles = getSampleStyleSheet()
-    elements = []
-
-    user = request.user
-    nombre_usuario = getattr(user, "nombre", None) or user.email
-
-    elements.append(Paragraph("<b>Reporte de Ganancias - Global Exchange</b>", styles["Title"]))
-    elements.append(Paragraph(f"Generado por: {nombre_usuario}", styles["Normal"]))
-    elements.append(Paragraph(f"Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", styles["Normal"]))
-    elements.append(Spacer(1, 18))
-
-    # Encabezado tabla
-    data = [["#", "Cliente", "Tipo", "Moneda","Tasa aplicada", "Monto","Comisión", "Ganancia (Gs)", "Fecha"]]
-
-    total_ventas = Decimal('0')
-    total_compras = Decimal('0')
-    total_general = Decimal('0')
-
-    # ============================
-    # RECORRER TRANSACCIONES
-    # ============================
-    for idx, t in enumerate(transacciones, start=1):
-
-        # Ganancia registrada
-        try:
-            registro = RegistroGanancia.objects.get(transaccion=t)
-            ganancia = registro.ganancia_registrada
-        except RegistroGanancia.DoesNotExist:
-            ganancia = Decimal('0')
-
-        moneda_codigo = (
-            t.moneda_destino.codigo if t.tipo_operacion == "venta"
-            else t.moneda_origen.codigo
-        )
-
-        monto = (
-            t.monto_destino if t.tipo_operacion == "venta"
-            else t.monto_origen
-        )
-
-        # Acumular totales
-        if t.tipo_operacion == "venta":
-            total_ventas += ganancia
-        else:
-            total_compras += ganancia
-
-        total_general += ganancia
-        fecha_local = localtime(t.fecha_creacion)
-        fecha_str = fecha_local.strftime("%d/%m/%Y %H:%M")
-
-        # Agregar fila
-        data.append([
-            idx,
-            str(t.cliente),
-            t.get_tipo_operacion_display(),
-            moneda_codigo,
-            f"{Decimal(t.tasa_cambio_aplicada):,.0f}".replace(',', '.'),
-            f"{Decimal(monto):,.0f}".replace(',', '.'),
-            f"{Decimal(t.comision_final).quantize(Decimal('0.0001'))}",
-            f"{ganancia:,.0f}".replace(',', '.'),
-            fecha_str,
-        ])
-
-    # ============================
-    # TOTALES
-    # ============================
-    data.append(["", "", "", "", "","", "Total Ventas:", f"{total_ventas:,.0f}".replace(',', '.'), ""])
-    data.append(["", "", "", "", "","", "Total Compras:", f"{total_compras:,.0f}".replace(',', '.'), ""])
-    data.append(["", "", "", "", "", "","Total General:", f"{total_general:,.0f}".replace(',', '.'), ""])
-
-
-    table = Table(data, hAlign="CENTER")
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-    ]))
-
-    elements.append(table)
-    doc.build(elements)
-    return response
-
 # =========================
 # REPORTE DE GANANCIAS EXCEL 
 # =========================
-from openpyxl.utils import get_column_letter
-
 @login_required
 def reporte_ganancias_excel(request):
 
@@ -311,145 +196,132 @@ def reporte_ganancias_excel(request):
 
     Aplica filtros por fecha, tipo de operación, cliente y moneda,
     y construye una planilla con el detalle de cada transacción
-    y los totales de ganancias. Usa ``openpyxl`` para dar formato
-    a encabezados y columnas.
+    y los totales de ganancias (ver :mod:`reportes.exportes`).
+
+    La planilla se envía en streaming a medida que se recorren las filas.
 
     :param request: Objeto HttpRequest de la petición actual, con filtros en ``GET``.
     :type request: django.http.HttpRequest
     :return: Respuesta HTTP con el archivo ``.xlsx`` adjunto.
-    :rtype: django.http.HttpResponse
+    :rtype: django.http.StreamingHttpResponse
     """
 
-    transacciones = Transaccion.objects.filter(estado='completada').order_by('-fecha_creacion')
-
-    # --- FILTROS ---
-    fecha_inicio = request.GET.get('fecha_inicio')
-    fecha_fin = request.GET.get('fecha_fin')
-    tipo = request.GET.get('tipo')
-    cliente = request.GET.get('cliente')
-    moneda = request.GET.get('moneda')
-
-    if fecha_inicio:
-        transacciones = transacciones.filter(fecha_creacion__date__gte=fecha_inicio)
-    if fecha_fin:
-        transacciones = transacciones.filter(fecha_creacion__date__lte=fecha_fin)
-    if tipo:
-        transacciones = transacciones.filter(tipo_operacion=tipo)
-    if cliente:
-        transacciones = transacciones.filter(cliente__nombre__icontains=cliente)
-    if moneda:
-        transacciones = transacciones.filter(
-            Q(moneda_origen__codigo=moneda) |
-            Q(moneda_destino__codigo=moneda)
-        )
-
-    # --- Excel ---
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Reporte de Ganancias"
-
-    # ==============================
-    # ENCABEZADO (como reporte transacciones)
-    # ==============================
-    ws.merge_cells('A1:I1')
-    ws['A1'] = "Reporte de Ganancias - Global Exchange"
-    ws['A1'].font = Font(size=14, bold=True)
-    ws['A1'].alignment = Alignment(horizontal='center')
-
-    user = request.user
-    nombre_usuario = getattr(user, "nombre", None) or getattr(user, "email", "Usuario desconocido")
-    ws['A3'] = f"Generado por: {nombre_usuario}"
-    ws['A4'] = f"Fecha: {now().strftime('%d/%m/%Y %H:%M:%S')}"
-    ws.append([])
-
-    # ==============================
-    # ENCABEZADO TABLA
-    # ==============================
-    headers = ["N°", "Cliente", "Tipo Operación", "Moneda","Tasa aplicada",
-               "Monto","Comisión", "Ganancia (Gs)", "Fecha"]
-    ws.append(headers)
-
-    # Estilo encabezado tabla
-    header_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-    for cell in ws[ws.max_row]:
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal="center")
-        cell.fill = header_fill
-
-    
-    total_ventas = Decimal('0')
-    total_compras = Decimal('0')
-    total_general = Decimal('0')
-
-    for idx, t in enumerate(transacciones, start=1):
-        try:
-            registro = RegistroGanancia.objects.get(transaccion=t)
-            ganancia = registro.ganancia_registrada
-        except RegistroGanancia.DoesNotExist:
-            ganancia = Decimal('0')
-
-        moneda_codigo = t.moneda_destino.codigo if t.tipo_operacion == "venta" else t.moneda_origen.codigo
-        monto = t.monto_destino if t.tipo_operacion == "venta" else t.monto_origen
-        monto_excel = Decimal(monto).quantize(Decimal("1"))
-        ganancia_excel = Decimal(ganancia).quantize(Decimal("1"))
-
-        if t.tipo_operacion == "venta":
-            total_ventas += ganancia_excel
-        else:
-            total_compras += ganancia_excel
-        total_general += ganancia_excel
-        fecha_local = localtime(t.fecha_creacion)
-        fecha_str = fecha_local.strftime("%d/%m/%Y %H:%M")
-
-        ws.append([
-            idx,
-            str(t.cliente),
-            t.get_tipo_operacion_display(),
-            moneda_codigo,
-            f"{Decimal(t.tasa_cambio_aplicada):,.0f}".replace(',', '.'),
-            f"{Decimal(monto_excel):,.0f}".replace(',', '.'),
-            t.comision_final,  # ← Decimal directo, SIN :,.0f
-            f"{Decimal(ganancia_excel):,.0f}".replace(',', '.'),
-            fecha_str,
-        ])
-
-    # ==============================
-    # TOTALES
-    # ==============================
-    ws.append([])
-    ws.append(["", "", "", "","","", "Total Ventas", f"{total_ventas:,.0f}".replace(',', '.')])
-    ws.append(["", "", "", "","","","Total Compras", f"{total_compras:,.0f}".replace(',', '.')])
-    ws.append(["", "", "", "","", "","Total General", f"{total_general:,.0f}".replace(',', '.')])
-
-    # ==============================
-    # AJUSTE DE ANCHO DE COLUMNAS
-    # ==============================
-  # Ajustar automáticamente ancho de columnas
-    for i, column_cells in enumerate(ws.columns, 1):
-        column_letter = get_column_letter(i)
-        if i == 1:  # Columna N°
-            ws.column_dimensions[column_letter].width = 5  # ancho fijo para N°
-            continue
-        max_length = 0
-        for cell in column_cells:
-            try:
-                if cell.value:
-                    cell_length = len(str(cell.value))
-                    if cell_length > max_length:
-                        max_length = cell_length
-            except:
-                pass
-        ws.column_dimensions[column_letter].width = max_length + 2
-
-    # ==============================
-    # EXPORTAR
-    # ==============================
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    filtros = FiltrosGanancias.desde_request(request)
+    transacciones = transacciones_ganancias(filtros)
+    totales = totales_ganancias(transacciones)
+    return _adjunto_streaming(
+        'reporte_ganancias.xlsx',
+        transmitir(generar_excel_ganancias, filas_ganancias(transacciones), totales,
+                   nombre_de_usuario(request.user)),
+    )
+
+# =========================
+# EXPORTES EN SEGUNDO PLANO
+# =========================
+def _estado_trabajo_json(trabajo):
+    listo = trabajo.estado == TrabajoReporte.Estado.LISTO and bool(trabajo.archivo)
+    return {
+        'id': str(trabajo.pk),
+        'estado': trabajo.estado,
+        'vigente': trabajo.vigente,
+        'listo': listo,
+        'error': trabajo.error,
+        'url_estado': reverse('reportes:estado_trabajo', args=[trabajo.pk]),
+        'url_descarga': reverse('reportes:descargar_trabajo', args=[trabajo.pk]) if listo else None,
+    }
+
+
+@login_required
+@require_POST
+def solicitar_reporte_ganancias(request, formato):
+
+    """
+    Solicita la exportación del reporte de ganancias en segundo plano.
+
+    Los filtros se leen de la query string igual que en la vista web. Si ya
+    existe un trabajo vigente con los mismos filtros (del mismo usuario) se
+    reutiliza en lugar de generar otro archivo.
+
+    :param request: Objeto HttpRequest de la petición actual, con filtros en ``GET``.
+    :type request: django.http.HttpRequest
+    :param formato: ``'pdf'`` o ``'xlsx'``.
+    :return: JSON con el estado del trabajo (``202`` si se creó, ``200`` si se reutilizó).
+    :rtype: django.http.JsonResponse
+    """
+
+    filtros = FiltrosGanancias.desde_request(request)
+    return _solicitar(request, filtros, formato, 'ganancias')
+
+
+@login_required
+@require_POST
+def solicitar_reporte_transacciones(request, formato):
+
+    """
+    Solicita la exportación del reporte de transacciones en segundo plano.
+
+    Igual que :func:`solicitar_reporte_ganancias`, con los filtros del reporte
+    web de transacciones.
+
+    :param request: Objeto HttpRequest de la petición actual, con filtros en ``GET``.
+    :type request: django.http.HttpRequest
+    :param formato: ``'pdf'`` o ``'xlsx'``.
+    :return: JSON con el estado del trabajo (``202`` si se creó, ``200`` si se reutilizó).
+    :rtype: django.http.JsonResponse
+    """
+
+    filtros = FiltrosTransacciones.desde_request(request)
+    return _solicitar(request, filtros, formato, 'transacciones')
+
+
+def _solicitar(request, filtros, formato, reporte):
+    try:
+        trabajo, creado = solicitar_reporte(filtros, formato, request.user, reporte)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(_estado_trabajo_json(trabajo), status=202 if creado else 200)
+
+
+@login_required
+def estado_trabajo(request, trabajo_id):
+
+    """
+    Estado de un trabajo de exportación, para consultar periódicamente desde la UI.
+
+    :param trabajo_id: UUID del :class:`reportes.models.TrabajoReporte`.
+    :return: JSON con ``estado``, ``listo``, ``error`` y ``url_descarga``.
+    :rtype: django.http.JsonResponse
+    """
+
+    trabajo = get_object_or_404(TrabajoReporte, pk=trabajo_id, solicitado_por=request.user)
+    return JsonResponse(_estado_trabajo_json(trabajo))
+
+
+@login_required
+def descargar_trabajo(request, trabajo_id):
+
+    """
+    Descarga el archivo de un trabajo terminado.
+
+    :param trabajo_id: UUID del :class:`reportes.models.TrabajoReporte`.
+    :return: El archivo adjunto; ``404`` si el trabajo no es del usuario o aún no terminó.
+    :rtype: django.http.FileResponse
+    """
+
+    trabajo = get_object_or_404(
+        TrabajoReporte,
+        pk=trabajo_id,
+        solicitado_por=request.user,
+        estado=TrabajoReporte.Estado.LISTO,
+    )
+    if not trabajo.archivo:
+        raise Http404("El reporte no tiene archivo.")
+    return FileResponse(
+        trabajo.archivo.open('rb'),
+        as_attachment=True,
+        filename=trabajo.nombre_descarga,
+        content_type=CONTENT_TYPES[trabajo.formato],
     )
-    response['Content-Disposition'] = 'attachment; filename="reporte_ganancias.xlsx"'
-    wb.save(response)
-    return response
 
 
 
@@ -457,12 +329,6 @@ def reporte_ganancias_excel(request):
 from django.shortcuts import render
 from django.http import HttpResponse
 from django.utils.timezone import now
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
 from django.contrib.auth.decorators import login_required
 from transacciones.models import Transaccion
 
@@ -510,28 +376,8 @@ def reporte_transacciones(request):
     :rtype: django.http.HttpResponse
     """
         
-    transacciones = Transaccion.objects.all().order_by('-fecha_creacion')
-
-    # --- FILTROS ---
-    fecha_inicio = request.GET.get('fecha_inicio')
-    fecha_fin = request.GET.get('fecha_fin')
-    tipo = request.GET.get('tipo')
-    estado = request.GET.get('estado')
-    cliente = request.GET.get('cliente')
-    moneda = request.GET.get('moneda')
-
-    if fecha_inicio:
-        transacciones = transacciones.filter(fecha_creacion__date__gte=fecha_inicio)
-    if fecha_fin:
-        transacciones = transacciones.filter(fecha_creacion__date__lte=fecha_fin)
-    if tipo:
-        transacciones = transacciones.filter(tipo_operacion=tipo)
-    if estado:
-        transacciones = transacciones.filter(estado=estado)
-    if cliente:
-        transacciones = transacciones.filter(cliente__nombre__icontains=cliente) # type: ignore
-    if moneda:
-        transacciones = transacciones.filter(Q(moneda_origen__codigo=moneda) | Q(moneda_destino__codigo=moneda))
+    # --- FILTROS --- (los mismos que usan los exportes)
+    transacciones = transacciones_reporte(FiltrosTransacciones.desde_request(request))
 
 
     monedas_disponibles = Moneda.objects.all().order_by('codigo')
@@ -563,100 +409,28 @@ def reporte_transacciones_pdf(request):
 
     Genera un documento PDF en formato apaisado con la lista
     filtrada de transacciones (cliente, tipo, moneda, montos,
-    estado y fecha). Utiliza ``reportlab`` para construir la tabla
-    y aplicar estilos de presentación.
+    estado y fecha). Las filas se dibujan en tablas por bloques
+    (ver :func:`reportes.exportes.pdf_transacciones`).
+
+    Para rangos grandes conviene :func:`solicitar_reporte_transacciones`.
 
     :param request: Objeto HttpRequest de la petición actual, con filtros en ``GET``.
     :type request: django.http.HttpRequest
     :return: Respuesta HTTP con el archivo PDF adjunto.
-    :rtype: django.http.HttpResponse
+    :rtype: django.http.FileResponse
     """
 
-    transacciones = Transaccion.objects.all().order_by('-fecha_creacion')
-
-    # --- FILTROS ---
-    fecha_inicio = request.GET.get('fecha_inicio')
-    fecha_fin = request.GET.get('fecha_fin')
-    tipo = request.GET.get('tipo')
-    estado = request.GET.get('estado')
-    cliente = request.GET.get('cliente')
-    moneda = request.GET.get('moneda')
-
-    if fecha_inicio:
-        transacciones = transacciones.filter(fecha_creacion__date__gte=fecha_inicio)
-    if fecha_fin:
-        transacciones = transacciones.filter(fecha_creacion__date__lte=fecha_fin)
-    if tipo:
-        transacciones = transacciones.filter(tipo_operacion=tipo)
-    if estado:
-        transacciones = transacciones.filter(estado=estado)
-    if cliente:
-        transacciones = transacciones.filter(cliente__nombre__icontains=cliente)
-    if moneda:
-        transacciones = transacciones.filter(Q(moneda_origen__codigo=moneda) | Q(moneda_destino__codigo=moneda))
-
-    # --- PDF ---
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="reporte_transacciones.pdf"'
-
-    doc = SimpleDocTemplate(response, pagesize=landscape(letter), rightMargin=20, leftMargin=20, topMargin=60, bottomMargin=40)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    user = request.user
-    nombre_usuario = getattr(user, "nombre", None) or getattr(user, "email", "Usuario desconocido")
-
-    elements.append(Paragraph("<b>Reporte de Transacciones - Global Exchange</b>", styles["Title"]))
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph(f"Generado por: {nombre_usuario}", styles["Normal"]))
-    elements.append(Paragraph(f"Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", styles["Normal"]))
-    elements.append(Spacer(1, 18))
-
-    data = [["N°", "Cliente", "Tipo", "Moneda", "Monto Origen", "Monto Destino", "Estado", "Fecha"]]
-
-    for idx, t in enumerate(transacciones, start=1):
-        moneda_codigo = (
-            t.moneda_origen.codigo if t.tipo_operacion.lower() == 'compra' else t.moneda_destino.codigo
-        )
-        fecha_local = localtime(t.fecha_creacion)
-        fecha_str = fecha_local.strftime("%d/%m/%Y %H:%M")
-        data.append([
-            idx,
-            str(t.cliente),
-            t.get_tipo_operacion_display(),
-            moneda_codigo,
-            f"{Decimal(t.monto_origen):,.0f}".replace(',', '.'),
-            f"{Decimal(t.monto_destino):,.0f}".replace(',', '.'),
-            t.get_estado_display(),
-            fecha_str
-        ])
-
-    col_widths = [30, 150, 80, 50, 90, 90, 140, 90]
-    table = Table(data, colWidths=col_widths, hAlign="CENTER")
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0,0), (-1,0), colors.lightgrey),
-        ("TEXTCOLOR", (0,0), (-1,0), colors.black),
-        ("ALIGN", (0,0), (-1,-1), "CENTER"),
-        ("GRID", (0,0), (-1,-1), 0.5, colors.grey),
-        ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-        ("FONTNAME", (0,1), (-1,-1), "Helvetica"),
-        ("FONTSIZE", (0,0), (-1,-1), 9),
-        ("FONTSIZE", (6,1), (6,-1), 7),
-        ("BOTTOMPADDING", (0,0), (-1,0), 8),
-        ("BACKGROUND", (0,1), (-1,-1), colors.whitesmoke),
-    ]))
-
-    elements.append(table)
-    doc.build(elements)
-    return response
+    filtros = FiltrosTransacciones.desde_request(request)
+    return _adjunto_temporal(
+        'reporte_transacciones.pdf', FORMATO_PDF,
+        escribir_pdf_transacciones, filtros, nombre_de_usuario(request.user),
+    )
 
 
 
 # =========================
 # REPORTE DE TRANSACCIONES EXCEL
 # =========================
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
 
 @login_required
 def reporte_transacciones_excel(request):
@@ -667,85 +441,19 @@ def reporte_transacciones_excel(request):
     Aplica filtros por fecha, tipo, estado, cliente y moneda,
     y construye una planilla de Excel con cada transacción
     y columnas para cliente, tipo, moneda, montos, estado y fecha.
-    Da formato al encabezado y ajusta el ancho de las columnas.
+    Da formato al encabezado y fija el ancho de las columnas; la
+    planilla se envía en streaming a medida que se recorren las filas.
+
+    Para rangos grandes conviene :func:`solicitar_reporte_transacciones`.
 
     :param request: Objeto HttpRequest de la petición actual, con filtros en ``GET``.
     :type request: django.http.HttpRequest
     :return: Respuesta HTTP con el archivo ``.xlsx`` adjunto.
-    :rtype: django.http.HttpResponse
+    :rtype: django.http.StreamingHttpResponse
     """
 
-    transacciones = Transaccion.objects.all().order_by('-fecha_creacion')
-
-    # --- FILTROS ---
-    fecha_inicio = request.GET.get('fecha_inicio')
-    fecha_fin = request.GET.get('fecha_fin')
-    tipo = request.GET.get('tipo')
-    estado = request.GET.get('estado')
-    cliente = request.GET.get('cliente')
-    moneda = request.GET.get('moneda')
-
-    if fecha_inicio:
-        transacciones = transacciones.filter(fecha_creacion__date__gte=fecha_inicio)
-    if fecha_fin:
-        transacciones = transacciones.filter(fecha_creacion__date__lte=fecha_fin)
-    if tipo:
-        transacciones = transacciones.filter(tipo_operacion__iexact=tipo.upper())
-    if estado:
-        transacciones = transacciones.filter(estado=estado)
-    if cliente:
-        transacciones = transacciones.filter(cliente__nombre__icontains=cliente)
-    if moneda:
-        transacciones = transacciones.filter(Q(moneda_origen__codigo=moneda) | Q(moneda_destino__codigo=moneda))
-
-    # --- Excel ---
-    response = HttpResponse(content_type='application/vnd.ms-excel')
-    response['Content-Disposition'] = 'attachment; filename="reporte_transacciones.xlsx"'
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Transacciones"
-
-    ws.merge_cells('A1:H1')
-    ws['A1'] = "Reporte de Transacciones - Global Exchange"
-    ws['A1'].font = Font(size=14, bold=True)
-    ws['A1'].alignment = Alignment(horizontal='center')
-
-    user = request.user
-    nombre_usuario = getattr(user, "nombre", None) or getattr(user, "email", "Usuario desconocido")
-    ws['A3'] = f"Generado por: {nombre_usuario}"
-    ws['A4'] = f"Fecha: {now().strftime('%d/%m/%Y %H:%M:%S')}"
-    ws.append([])
-
-    headers = ["#", "Cliente", "Tipo", "Moneda", "Monto Origen", "Monto Destino", "Estado", "Fecha"]
-    ws.append(headers)
-
-    header_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-    for cell in ws[ws.max_row]:
-        cell.font = Font(bold=True)
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-
-    for i, t in enumerate(transacciones, start=1):
-        moneda_codigo = (
-            t.moneda_origen.codigo if t.tipo_operacion.lower() == 'compra' else t.moneda_destino.codigo
-        )
-        fecha_local = localtime(t.fecha_creacion)
-        fecha_str = fecha_local.strftime("%d/%m/%Y %H:%M")
-        ws.append([
-            i,
-            str(t.cliente),
-            t.get_tipo_operacion_display(),
-            moneda_codigo,
-            f"{Decimal(t.monto_origen):,.0f}".replace(',', '.'),
-            f"{Decimal(t.monto_destino):,.0f}".replace(',', '.'),
-            t.get_estado_display(),
-            fecha_str
-        ])
-
-    col_widths = [5, 25, 15, 10, 18, 18, 25, 20]
-    for i, w in enumerate(col_widths, start=1):
-        ws.column_dimensions[chr(64+i)].width = w
-
-    wb.save(response)
-    return response
+    filtros = FiltrosTransacciones.desde_request(request)
+    return _adjunto_streaming(
+        'reporte_transacciones.xlsx',
+        transmitir(generar_excel_transacciones, transacciones_reporte(filtros), nombre_de_usuario(request.user)),
+    )
@@ -0,0 +1,264 @@
+#reportes/xlsx.py
+
+"""
+Escritor XLSX de una hoja, fila por fila.
+
+.. module:: reportes.xlsx
+   :synopsis: Planillas ``.xlsx`` en memoria constante, aptas para respuestas en streaming.
+
+``openpyxl`` (incluso en modo *write-only*) crea un objeto por celda y resuelve
+el estilo de cada una; con cientos de miles de filas eso domina el tiempo de
+exportación. :class:`LibroXlsx` escribe directamente el XML de cada fila dentro
+del ZIP:
+
+- Los estilos están precalculados en ``styles.xml`` (ver ``ESTILO_*``); cada celda
+  sólo lleva el índice.
+- Los textos van como *inline strings*, así que no hay tabla de cadenas
+  compartidas que crezca con el archivo.
+- Sólo se retienen las celdas combinadas, que se escriben al cerrar.
+
+Como el XML se arma a mano, :meth:`LibroXlsx._celda` quita de los textos los
+caracteres de control que XML 1.0 no admite (Excel no abriría el archivo) y
+rechaza los números no finitos (``NaN``, ``inf``), que no tienen representación
+en la planilla.
+
+El destino puede ser un archivo, un ``BytesIO`` o un objeto sin ``seek`` (por
+ejemplo :class:`Tubo`, para ``StreamingHttpResponse``): ``zipfile`` usa
+descriptores de datos cuando no puede volver atrás.
+"""
+
+import math
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+# Índices de ``cellXfs`` en ``styles.xml``.
+ESTILO_NORMAL = 0
+ESTILO_TITULO = 1
+ESTILO_ENCABEZADO = 2
+ESTILO_MILES = 3
+ESTILO_DECIMAL = 4
+ESTILO_FECHA = 5
+
+_EPOCA_EXCEL = datetime(1899, 12, 30)
+
+# Caracteres de control no permitidos en XML 1.0 (se admiten tab, LF y CR).
+_CONTROL_INVALIDO = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{nombre}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2">'
+    '<numFmt numFmtId="164" formatCode="dd/mm/yyyy hh:mm"/>'
+    '<numFmt numFmtId="165" formatCode="0.0000"/>'
+    '</numFmts>'
+    '<fonts count="3">'
+    '<font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="14"/><name val="Calibri"/></font>'
+    '</fonts>'
+    '<fills count="3">'
+    '<fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FFD9E1F2"/><bgColor rgb="FFD9E1F2"/></patternFill></fill>'
+    '</fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="6">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="2" fillId="0" borderId="0" xfId="0" applyFont="1" applyAlignment="1">'
+    '<alignment horizontal="center"/></xf>'
+    '<xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1" applyAlignment="1">'
+    '<alignment horizontal="center"/></xf>'
+    '<xf numFmtId="3" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def letra_columna(indice):
+    """``1 → 'A'``, ``27 → 'AA'``."""
+    letras = ''
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+class Tubo:
+    """Destino sin ``seek`` que acumula bytes hasta que se los retira con :meth:`vaciar`."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+class LibroXlsx:
+    """
+    Libro de una sola hoja escrito fila por fila.
+
+    :param destino: Objeto tipo archivo donde se escribe el ``.xlsx``.
+    :param nombre_hoja: Nombre de la hoja (máx. 31 caracteres).
+    :param anchos: Ancho de cada columna, en caracteres.
+    """
+
+    # Filas que se acumulan antes de escribirlas en el ZIP.
+    FILAS_POR_ESCRITURA = 200
+
+    def __init__(self, destino, nombre_hoja, anchos=()):
+        self._zip = zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._zip.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        self._zip.writestr('_rels/.rels', _RELS)
+        self._zip.writestr('xl/workbook.xml', _WORKBOOK.format(nombre=escape(nombre_hoja[:31], {'"': '&quot;'})))
+        self._zip.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        self._zip.writestr('xl/styles.xml', _STYLES)
+
+        self._hoja = self._zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self._escribir(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        )
+        if anchos:
+            self._escribir('<cols>' + ''.join(
+                f'<col min="{i}" max="{i}" width="{ancho}" customWidth="1"/>'
+                for i, ancho in enumerate(anchos, start=1)
+            ) + '</cols>')
+        self._escribir('<sheetData>')
+        self._columnas = [letra_columna(i) for i in range(1, len(anchos) + 1)]
+        self._filas = 0
+        self._combinadas = []
+        self._pendiente = []
+
+    def _escribir(self, texto):
+        self._hoja.write(texto.encode('utf-8'))
+
+    def _columna(self, indice):
+        while len(self._columnas) < indice:
+            self._columnas.append(letra_columna(len(self._columnas) + 1))
+        return self._columnas[indice - 1]
+
+    def fila(self, valores=(), estilos=None):
+        """
+        Agrega una fila.
+
+        :param valores: Valores de la fila; ``None`` y ``''`` dejan la celda vacía.
+        :param estilos: Un ``ESTILO_*`` para toda la fila o una secuencia con uno
+            por columna; las fechas sin estilo usan :data:`ESTILO_FECHA`.
+        """
+        self._filas += 1
+        numero = self._filas
+        if valores:
+            self._columna(len(valores))
+        columnas = self._columnas
+        por_columna = not (estilos is None or isinstance(estilos, int))
+        estilo = ESTILO_NORMAL if estilos is None else estilos
+        celdas = []
+        for i, valor in enumerate(valores):
+            if valor is None or valor == '':
+                continue
+            if por_columna:
+                estilo = estilos[i]
+            celdas.append(self._celda(f'{columnas[i]}{numero}', valor, estilo))
+        self._pendiente.append(f'<row r="{numero}">{"".join(celdas)}</row>')
+        if len(self._pendiente) >= self.FILAS_POR_ESCRITURA:
+            self.volcar()
+
+    def volcar(self):
+        """Pasa al ZIP las filas acumuladas."""
+        if self._pendiente:
+            self._escribir(''.join(self._pendiente))
+            self._pendiente.clear()
+
+    @staticmethod
+    def _celda(ref, valor, estilo):
+        if isinstance(valor, bool):
+            return f'<c r="{ref}" s="{estilo}" t="b"><v>{int(valor)}</v></c>'
+        if isinstance(valor, (int, float, Decimal)):
+            finito = valor.is_finite() if isinstance(valor, Decimal) else math.isfinite(valor)
+            if not finito:
+                raise ValueError(f"Valor no finito en la celda {ref}: {valor}.")
+            return f'<c r="{ref}" s="{estilo}"><v>{valor}</v></c>'
+        if isinstance(valor, datetime):
+            dias = (valor.replace(tzinfo=None) - _EPOCA_EXCEL).total_seconds() / 86400
+            return f'<c r="{ref}" s="{estilo or ESTILO_FECHA}"><v>{dias}</v></c>'
+        if isinstance(valor, date):
+            dias = (valor - _EPOCA_EXCEL.date()).days
+            return f'<c r="{ref}" s="{estilo or ESTILO_FECHA}"><v>{dias}</v></c>'
+        texto = escape(_CONTROL_INVALIDO.sub('', str(valor)))
+        return (f'<c r="{ref}" s="{estilo}" t="inlineStr">'
+                f'<is><t xml:space="preserve">{texto}</t></is></c>')
+
+    def combinar(self, rango):
+        """Combina las celdas de ``rango`` (por ejemplo ``'A1:I1'``)."""
+        self._combinadas.append(rango)
+
+    def cerrar(self):
+        """Cierra la hoja y el ZIP; el destino no se cierra."""
+        self.volcar()
+        self._escribir('</sheetData>')
+        if self._combinadas:
+            self._escribir(f'<mergeCells count="{len(self._combinadas)}">' + ''.join(
+                f'<mergeCell ref="{rango}"/>' for rango in self._combinadas
+            ) + '</mergeCells>')
+        self._escribir('</worksheet>')
+        self._hoja.close()
+        self._zip.close()
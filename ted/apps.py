@@ -4,3 +4,6 @@ class TedConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ted"
     verbose_name = "Terminal TED"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,196 @@
+# ted/dispensador.py
+"""
+Selección de billetes para el TED
+=================================
+
+.. module:: ted.dispensador
+   :synopsis: Cambio con stock acotado (knapsack acotado) con memoización.
+
+El TED entrega divisas con el stock físico de cada denominación. Recorrer las
+denominaciones de mayor a menor (voraz) no encuentra combinaciones exactas que sí
+existen: 60 con ``{50×1, 20×3}`` da 50 y deja 10 sin cubrir, aunque ``20×3`` es
+exacto.
+
+:func:`resolver_billetes` resuelve el problema como un *knapsack* acotado:
+
+1. Si existe una combinación exacta para el objetivo, la devuelve.
+2. Si no, devuelve la suma alcanzable más cercana **por debajo** del objetivo.
+3. Entre las combinaciones con el mismo monto elige según la política:
+
+   - :data:`POLITICA_MENOS_BILLETES`: la menor cantidad de billetes.
+   - :data:`POLITICA_PRESERVAR_ESCASAS`: penaliza las denominaciones con poco stock
+     (y, a igual penalización, usa menos billetes).
+
+La política por defecto se toma de ``settings.TED_POLITICA_DISPENSADO``.
+
+Los resultados se memorizan por ``(vector de stock, monto, política)``; el vector
+es la tupla normalizada ``((valor, cantidad), ...)`` de mayor a menor, la misma
+forma que usa :class:`core.tarifario.Tarifario`.
+
+.. note::
+   Los montos se trabajan en múltiplos del MCD de las denominaciones, así que la
+   tabla tiene ``objetivo / mcd`` posiciones. Por encima de :data:`MAX_ESTADOS`
+   se usa el recorrido voraz como resguardo.
+"""
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache, reduce
+from math import gcd
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+
+POLITICA_MENOS_BILLETES = "menos_billetes"
+POLITICA_PRESERVAR_ESCASAS = "preservar_escasas"
+POLITICAS = (POLITICA_MENOS_BILLETES, POLITICA_PRESERVAR_ESCASAS)
+
+# Tamaño máximo de la tabla (objetivo / mcd) antes de recurrir al voraz.
+MAX_ESTADOS = 200_000
+
+# ((valor, cantidad), ...) de mayor a menor valor, sólo con cantidad > 0.
+StockVector = Tuple[Tuple[int, int], ...]
+Billetes = Tuple[Tuple[int, int], ...]
+
+_INF = float("inf")
+
+
+@dataclass(frozen=True)
+class Dispensacion:
+    """Resultado de :func:`resolver_billetes`."""
+    objetivo: int
+    monto: int
+    billetes: Billetes  # ((valor, unidades), ...) de mayor a menor, unidades > 0
+
+    @property
+    def exacto(self) -> bool:
+        return self.monto == self.objetivo
+
+    @property
+    def cantidad_billetes(self) -> int:
+        return sum(unidades for _, unidades in self.billetes)
+
+
+def politica_por_defecto() -> str:
+    return getattr(settings, "TED_POLITICA_DISPENSADO", POLITICA_MENOS_BILLETES)
+
+
+def normalizar_stock(stock: Iterable[Tuple[int, int]]) -> StockVector:
+    """
+    Agrupa por valor, descarta cantidades nulas y ordena de mayor a menor.
+
+    :param stock: Pares ``(valor, cantidad)`` en cualquier orden (pueden repetirse
+        valores, por ejemplo al sumar varias ubicaciones).
+    """
+    por_valor = {}
+    for valor, cantidad in stock:
+        valor, cantidad = int(valor), int(cantidad)
+        if valor > 0 and cantidad > 0:
+            por_valor[valor] = por_valor.get(valor, 0) + cantidad
+    return tuple(sorted(por_valor.items(), reverse=True))
+
+
+def resolver_billetes(objetivo, stock, politica: Optional[str] = None) -> Dispensacion:
+    """
+    Combinación de billetes para ``objetivo`` respetando el stock disponible.
+
+    :param objetivo: Monto a entregar; se trunca a entero (las denominaciones son enteras).
+    :param stock: Pares ``(valor, cantidad)``; ver :func:`normalizar_stock`.
+    :param politica: Una de :data:`POLITICAS`; por defecto :func:`politica_por_defecto`.
+    :returns: :class:`Dispensacion` exacta si existe; si no, la más cercana por debajo.
+    :raises ValueError: Si la política no es válida.
+    """
+    politica = politica or politica_por_defecto()
+    if politica not in POLITICAS:
+        raise ValueError(f"Política de dispensado desconocida: {politica!r}.")
+
+    objetivo = max(int(objetivo), 0)
+    vector = normalizar_stock(stock)
+    total = sum(valor * cantidad for valor, cantidad in vector)
+    if objetivo == 0 or total == 0:
+        return Dispensacion(objetivo=objetivo, monto=0, billetes=())
+
+    monto, billetes = _resolver(vector, min(objetivo, total), politica)
+    return Dispensacion(objetivo=objetivo, monto=monto, billetes=billetes)
+
+
+def resolver_voraz(objetivo, stock) -> Dispensacion:
+    """Recorrido de mayor a menor valor (el algoritmo anterior), para comparación."""
+    objetivo = max(int(objetivo), 0)
+    monto, billetes = _resolver_voraz(normalizar_stock(stock), objetivo)
+    return Dispensacion(objetivo=objetivo, monto=monto, billetes=billetes)
+
+
+def _resolver_voraz(stock: StockVector, objetivo: int) -> Tuple[int, Billetes]:
+    restante = objetivo
+    billetes = []
+    for valor, cantidad in stock:
+        unidades = min(cantidad, restante // valor)
+        if unidades > 0:
+            billetes.append((valor, unidades))
+            restante -= unidades * valor
+    return objetivo - restante, tuple(billetes)
+
+
+def _pesos(stock: StockVector, politica: str) -> Tuple[int, ...]:
+    """Costo por billete de cada denominación según la política."""
+    if politica == POLITICA_MENOS_BILLETES:
+        return tuple(1 for _ in stock)
+    # Escasez = cuántas veces más stock tiene la denominación más abundante. El
+    # factor ``escala`` (> total de billetes) hace que la cantidad de billetes sólo
+    # desempate entre combinaciones con la misma escasez acumulada.
+    mayor = max(cantidad for _, cantidad in stock)
+    escala = sum(cantidad for _, cantidad in stock) + 1
+    return tuple(-(-mayor // cantidad) * escala + 1 for _, cantidad in stock)
+
+
+@lru_cache(maxsize=2048)
+def _resolver(stock: StockVector, objetivo: int, politica: str) -> Tuple[int, Billetes]:
+    """
+    Knapsack acotado de costo mínimo sobre ``0..objetivo`` (en múltiplos del MCD).
+
+    Cada denominación se procesa en O(objetivo) con una ventana deslizante de
+    mínimos por residuo: ``costo'[s] = min_{0<=k<=cantidad} costo[s - k*valor] + k*peso``.
+    """
+    mcd = reduce(gcd, (valor for valor, _ in stock))
+    t = objetivo // mcd
+    if t > MAX_ESTADOS:
+        return _resolver_voraz(stock, objetivo)
+
+    costo = [0] + [_INF] * t
+    usados_por_denominacion = []
+    for (valor, cantidad), peso in zip(stock, _pesos(stock, politica)):
+        paso = valor // mcd
+        nuevo = [_INF] * (t + 1)
+        usados = [0] * (t + 1)
+        for residuo in range(min(paso, t + 1)):
+            ventana = deque()  # (j, costo[residuo + j*paso] - j*peso), claves crecientes
+            for j, s in enumerate(range(residuo, t + 1, paso)):
+                if costo[s] != _INF:
+                    clave = costo[s] - j * peso
+                    while ventana and ventana[-1][1] >= clave:
+                        ventana.pop()
+                    ventana.append((j, clave))
+                while ventana and ventana[0][0] < j - cantidad:
+                    ventana.popleft()
+                if ventana:
+                    j_base, clave_base = ventana[0]
+                    nuevo[s] = clave_base + j * peso
+                    usados[s] = j - j_base
+        costo = nuevo
+        usados_por_denominacion.append(usados)
+
+    mejor = t
+    while costo[mejor] == _INF:
+        mejor -= 1
+
+    billetes = []
+    s = mejor
+    for (valor, _), usados in zip(reversed(stock), reversed(usados_por_denominacion)):
+        unidades = usados[s]
+        if unidades:
+            billetes.append((valor, unidades))
+            s -= unidades * (valor // mcd)
+    billetes.reverse()
+    return mejor * mcd, tuple(billetes)
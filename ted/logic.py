@@ -1,6 +1,7 @@
 # ted/logic.py
 from decimal import Decimal
 from monedas.models import TedInventario
+from ted.dispensador import resolver_billetes
 
 def ajustar_monto_a_denominaciones_disponibles(monto, moneda, tipo_operacion):
     """
@@ -18,11 +19,11 @@ def ajustar_monto_a_denominaciones_disponibles(monto, moneda, tipo_operacion):
     
     - **Venta**: cuando la casa de cambios **vende divisas** al cliente, el monto debe ajustarse a las
       denominaciones disponibles en el inventario. El sistema busca la mejor combinación de billetes
-      disponibles (de mayor a menor valor) que no supere el monto solicitado y que respete las cantidades
-      en stock.
+      que no supere el monto solicitado y que respete las cantidades en stock
+      (ver :func:`ted.dispensador.resolver_billetes`).
 
-    El ajuste no intenta hacer una combinación exacta tipo "cambio exacto", sino que aproxima el monto
-    a la suma más cercana posible sin exceder el monto solicitado, de acuerdo con el inventario actual.
+    Si existe una combinación exacta se usa; si no, el monto se aproxima a la suma más cercana posible
+    sin exceder el monto solicitado, de acuerdo con el inventario actual.
 
     :param monto: 
         Monto total solicitado para la operación.  
@@ -60,9 +61,9 @@ def ajustar_monto_a_denominaciones_disponibles(monto, moneda, tipo_operacion):
     
     1. Se obtiene el inventario filtrado por moneda y con cantidad disponible mayor a cero.
     2. Se ordena el inventario de mayor a menor valor de denominación.
-    3. Se recorre cada denominación calculando cuántos billetes se pueden utilizar sin exceder el monto restante.
-    4. Se actualiza el monto ajustado y el monto restante en cada iteración.
-    5. Se devuelve el resultado final con el monto efectivamente ajustado y el máximo posible.
+    3. Se resuelve la combinación con stock acotado (:mod:`ted.dispensador`): exacta si existe,
+       o la suma alcanzable más cercana por debajo del monto.
+    4. Se devuelve el resultado final con el monto efectivamente ajustado y el máximo posible.
 
     **Ejemplo de uso:**
 
@@ -91,24 +92,49 @@ def ajustar_monto_a_denominaciones_disponibles(monto, moneda, tipo_operacion):
 
     - La función utiliza `select_related('denominacion')` para optimizar las consultas y reducir el número
       de accesos a la base de datos al acceder al valor de cada denominación.
-    - El ordenamiento descendente por `denominacion__valor` garantiza que se utilicen primero los billetes
-      de mayor valor, reduciendo la cantidad total de billetes necesarios.
+    - El cálculo en sí se delega en :func:`ajustar_monto_con_stock`, que opera sobre un vector
+      ``(valor, cantidad)`` en memoria y es el que usa la simulación a partir del tarifario cacheado.
+    - Entre combinaciones con el mismo monto se prefiere la de menos billetes o la que preserva las
+      denominaciones escasas, según ``settings.TED_POLITICA_DISPENSADO``.
     - El cálculo del monto máximo posible (`monto_maximo_posible`) es útil para verificar si una operación
       solicitada puede cubrirse completamente con el stock disponible.
 
     """
+    inventario = TedInventario.objects.filter(
+        denominacion__moneda=moneda,
+        cantidad__gt=0
+    ).select_related('denominacion').order_by('-denominacion__valor')
+
+    stock = [(item.denominacion.valor, item.cantidad) for item in inventario]
+    return ajustar_monto_con_stock(monto, stock, tipo_operacion)
+
+
+def ajustar_monto_con_stock(monto, stock, tipo_operacion, politica=None):
+    """
+    Variante en memoria de :func:`ajustar_monto_a_denominaciones_disponibles`.
+
+    Recibe el stock ya resuelto como una secuencia de pares ``(valor, cantidad)``
+    ordenada de mayor a menor valor (por ejemplo, el vector que guarda
+    :class:`core.tarifario.Tarifario`), por lo que no consulta la base de datos.
+
+    :param monto: Monto solicitado.
+    :type monto: Decimal
+    :param stock: Pares ``(valor, cantidad)`` con ``cantidad > 0``, de mayor a menor valor.
+    :type stock: Sequence[tuple[int, int]]
+    :param tipo_operacion: ``'compra'`` o ``'venta'``.
+    :type tipo_operacion: str
+    :param politica: Política de :mod:`ted.dispensador`; por defecto la configurada.
+    :type politica: str | None
+    :returns: El mismo diccionario que :func:`ajustar_monto_a_denominaciones_disponibles`.
+    :rtype: dict
+    """
+    monto_maximo_posible = sum(
+        (Decimal(valor) * cantidad for valor, cantidad in stock), Decimal('0')
+    )
+
     if tipo_operacion == 'compra':
         # Si la casa de cambios compra divisas, puede recibir cualquier denominación.
         # No se necesita ajuste.
-        inventario = TedInventario.objects.filter(
-            denominacion__moneda=moneda,
-            cantidad__gt=0
-        ).select_related('denominacion').order_by('-denominacion__valor')
-        
-        monto_maximo_posible = sum(
-            item.denominacion.valor * item.cantidad for item in inventario
-        )
-        
         return {
             'monto_ajustado': monto,
             'monto_maximo_posible': monto_maximo_posible,
@@ -116,41 +142,49 @@ def ajustar_monto_a_denominaciones_disponibles(monto, moneda, tipo_operacion):
         }
 
     # Si la casa de cambios vende divisas, debe usar los billetes que tiene en stock.
-    inventario = TedInventario.objects.filter(
-        denominacion__moneda=moneda,
-        cantidad__gt=0
-    ).select_related('denominacion').order_by('-denominacion__valor')
-
-    if not inventario.exists():
+    if not stock:
         return {
             'monto_ajustado': Decimal('0'),
             'monto_maximo_posible': Decimal('0'),
             'ajustado': True,
         }
 
-    monto_maximo_posible = sum(
-        item.denominacion.valor * item.cantidad for item in inventario
-    )
-    
     monto_a_entregar = min(monto, monto_maximo_posible)
-    monto_ajustado = Decimal('0')
-    monto_restante = monto_a_entregar
-
-    for item in inventario:
-        valor_denominacion = item.denominacion.valor
-        cantidad_disponible = item.cantidad
-
-        if monto_restante >= valor_denominacion:
-            cantidad_a_usar = int(min(
-                monto_restante // valor_denominacion,
-                cantidad_disponible
-            ))
-            
-            monto_ajustado += cantidad_a_usar * valor_denominacion
-            monto_restante -= cantidad_a_usar * valor_denominacion
+    dispensacion = resolver_billetes(monto_a_entregar, stock, politica)
+    monto_ajustado = Decimal(dispensacion.monto)
 
     return {
         'monto_ajustado': monto_ajustado,
         'monto_maximo_posible': monto_maximo_posible,
         'ajustado': monto_ajustado != monto,
     }
+
+
+def ajustar_monto_en_mejor_ubicacion(monto, stock_por_ubicacion, tipo_operacion, politica=None):
+    """
+    Aplica :func:`ajustar_monto_con_stock` en cada ubicación y elige la que puede
+    entregar el monto más cercano al solicitado.
+
+    A igual monto entregable se prefiere la ubicación con más stock (en valor) y,
+    después, el nombre, para que el resultado sea estable.
+
+    :param monto: Monto solicitado.
+    :type monto: Decimal
+    :param stock_por_ubicacion: ``ubicacion -> ((valor, cantidad), ...)``.
+    :type stock_por_ubicacion: Mapping[str, Sequence[tuple[int, int]]]
+    :param tipo_operacion: ``'compra'`` o ``'venta'``.
+    :type tipo_operacion: str
+    :returns: ``(ubicacion, ajuste)``; ``ubicacion`` es ``None`` si no hay stock en ninguna.
+    :rtype: tuple[str | None, dict]
+    """
+    mejor_ubicacion = None
+    mejor_ajuste = None
+    for ubicacion in sorted(stock_por_ubicacion):
+        ajuste = ajustar_monto_con_stock(monto, stock_por_ubicacion[ubicacion], tipo_operacion, politica)
+        clave = (ajuste['monto_ajustado'], ajuste['monto_maximo_posible'])
+        if mejor_ajuste is None or clave > (mejor_ajuste['monto_ajustado'], mejor_ajuste['monto_maximo_posible']):
+            mejor_ubicacion, mejor_ajuste = ubicacion, ajuste
+
+    if mejor_ajuste is None:
+        return None, ajustar_monto_con_stock(monto, (), tipo_operacion, politica)
+    return mejor_ubicacion, mejor_ajuste
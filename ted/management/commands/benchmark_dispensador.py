@@ -0,0 +1,55 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from ted.dispensador import _resolver, resolver_billetes, resolver_voraz
+
+DENOMINACIONES = (100, 50, 20, 10, 5, 2, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark del dispensador TED: compara el recorrido voraz con el "
+        "knapsack acotado (sin memoización y con memoización) sobre stocks aleatorios."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--casos", type=int, default=500, help="Cantidad de pares (stock, monto).")
+        parser.add_argument("--max-unidades", type=int, default=30, help="Stock máximo por denominación.")
+        parser.add_argument("--semilla", type=int, default=1234)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["semilla"])
+        casos = []
+        for _ in range(options["casos"]):
+            stock = [(valor, rnd.randint(0, options["max_unidades"])) for valor in DENOMINACIONES]
+            total = sum(valor * cantidad for valor, cantidad in stock)
+            casos.append((rnd.randint(1, max(total, 1)), stock))
+
+        inicio = time.perf_counter()
+        voraces = [resolver_voraz(monto, stock) for monto, stock in casos]
+        t_voraz = time.perf_counter() - inicio
+
+        _resolver.cache_clear()
+        inicio = time.perf_counter()
+        optimos = [resolver_billetes(monto, stock) for monto, stock in casos]
+        t_frio = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for monto, stock in casos:
+            resolver_billetes(monto, stock)
+        t_memo = time.perf_counter() - inicio
+
+        exactos_voraz = sum(1 for d in voraces if d.exacto)
+        exactos_optimo = sum(1 for d in optimos if d.exacto)
+        n = len(casos) or 1
+
+        self.stdout.write(self.style.MIGRATE_HEADING("==> DISPENSADOR TED: VORAZ vs KNAPSACK <=="))
+        self.stdout.write(f"Casos: {len(casos)}")
+        self.stdout.write(f"  Voraz           : {t_voraz * 1e6 / n:10.1f} µs/caso  exactos={exactos_voraz}")
+        self.stdout.write(f"  Knapsack (frío) : {t_frio * 1e6 / n:10.1f} µs/caso  exactos={exactos_optimo}")
+        self.stdout.write(f"  Knapsack (memo) : {t_memo * 1e6 / n:10.1f} µs/caso")
+        self.stdout.write(self.style.SUCCESS(
+            f"Combinaciones exactas que el voraz no encontró: {exactos_optimo - exactos_voraz}"
+        ))
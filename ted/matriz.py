@@ -0,0 +1,248 @@
+# ted/matriz.py
+"""
+Matriz de inventario TED
+========================
+
+.. module:: ted.matriz
+   :synopsis: Stock por moneda × denominación × ubicación, versionado y cacheado.
+
+El inventario del panel de administración y los endpoints JSON del kiosco
+(``monedas_disponibles``, ``ubicaciones_disponibles``) muestran siempre la misma
+grilla hasta que cambia el stock. :func:`construir_matriz` la arma con **una**
+consulta agrupada (denominaciones con ``LEFT JOIN`` a su inventario, agrupadas
+por denominación y ubicación) y calcula los totales por moneda y ubicación.
+
+La :class:`MatrizInventario` se guarda en la caché de Django bajo la versión
+compartida :data:`MATRIZ_VERSION_KEY`. Toda mutación de stock publica una nueva
+versión con :func:`invalidar_matriz`: :func:`ted.stock.aplicar_desglose` la llama
+explícitamente y :mod:`ted.signals` cubre los ``save()``/``delete()`` sobre
+inventario, denominaciones y monedas.
+
+Las consultas del panel y de los endpoints son recortes en memoria de la matriz
+(:meth:`MatrizInventario.grupos`, :meth:`MatrizInventario.monedas_con_stock`,
+etc.) y no tocan la base de datos.
+"""
+from __future__ import annotations
+
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+MATRIZ_VERSION_KEY = "ted:matriz_inventario:version"
+MATRIZ_CACHE_KEY = "ted:matriz_inventario:{version}"
+
+# Las matrices de versiones viejas no se borran: vencen solas.
+MATRIZ_TIMEOUT = 24 * 60 * 60
+
+EMOJI_MAP = {
+    "USD": "🇺🇸", "EUR": "🇪🇺", "BRL": "🇧🇷", "ARS": "🇦🇷",
+    "CLP": "🇨🇱", "PEN": "🇵🇪", "UYU": "🇺🇾", "JPY": "🇯🇵", "GBP": "🇬🇧",
+}
+
+
+@dataclass(frozen=True)
+class MonedaMatriz:
+    """Datos de una moneda que usan las plantillas del inventario."""
+    id: int
+    codigo: str
+    nombre: str
+    admite_terminal: bool
+
+    @property
+    def emoji_display(self) -> str:
+        return EMOJI_MAP.get(self.codigo.upper(), "💱")
+
+
+@dataclass(frozen=True)
+class DenominacionMatriz:
+    id: int
+    valor: int
+    moneda: str
+    activa: bool
+
+
+@dataclass(frozen=True)
+class MatrizInventario:
+    """
+    Grilla de stock congelada al momento de construirla.
+
+    Se guarda en la caché compartida (se serializa con ``pickle``): no modificar
+    sus ``dict``.
+
+    :param version: versión compartida vigente cuando se construyó.
+    :param monedas: ``codigo -> MonedaMatriz``, ordenado por código.
+    :param denominaciones: todas las denominaciones, ordenadas por moneda y valor.
+    :param ubicaciones: ubicaciones con al menos una fila de inventario, ordenadas.
+    :param stock: ``(denominacion_id, ubicacion) -> cantidad`` (sólo filas existentes).
+    :param totales: ``(codigo, ubicacion) -> {"billetes", "monto"}`` de las
+        denominaciones activas; ``ubicacion=None`` suma todas las ubicaciones.
+    """
+    version: str
+    monedas: Dict[str, MonedaMatriz] = field(default_factory=dict)
+    denominaciones: Tuple[DenominacionMatriz, ...] = ()
+    ubicaciones: Tuple[str, ...] = ()
+    stock: Dict[Tuple[int, str], int] = field(default_factory=dict)
+    totales: Dict[Tuple[str, Optional[str]], Dict[str, int]] = field(default_factory=dict)
+
+    def _visibles(self, moneda: Optional[str] = None) -> List[DenominacionMatriz]:
+        """Denominaciones activas de monedas habilitadas en la terminal (opcionalmente de ``moneda``)."""
+        return [
+            den for den in self.denominaciones
+            if den.activa and self.monedas[den.moneda].admite_terminal
+            and (moneda is None or den.moneda.upper() == moneda.upper())
+        ]
+
+    def _ubicaciones_con_filas(self, denominaciones, ubicacion: Optional[str] = None) -> List[str]:
+        ids = {den.id for den in denominaciones}
+        return sorted({
+            ubic for den_id, ubic in self.stock
+            if den_id in ids and (ubicacion is None or ubic == ubicacion)
+        })
+
+    def total(self, codigo: str, ubicacion: Optional[str] = None) -> Dict[str, int]:
+        return self.totales.get((codigo, ubicacion), {"billetes": 0, "monto": 0})
+
+    def monedas_con_inventario(self, ubicacion: Optional[str] = None) -> List[MonedaMatriz]:
+        """Monedas visibles con alguna fila de inventario (en ``ubicacion`` o en cualquiera)."""
+        codigos = {
+            den.moneda for den in self._visibles()
+            if self._ubicaciones_con_filas([den], ubicacion)
+        }
+        return [m for codigo, m in self.monedas.items() if codigo in codigos]
+
+    def monedas_con_stock(self, ubicacion: str) -> List[str]:
+        """Códigos (sin PYG) con al menos un billete en ``ubicacion``."""
+        codigos = {
+            den.moneda for den in self._visibles()
+            if self.stock.get((den.id, ubicacion), 0) > 0 and den.moneda.upper() != "PYG"
+        }
+        return sorted(codigos)
+
+    def grupos(self, ubicacion: Optional[str] = None, moneda: Optional[str] = None) -> List[dict]:
+        """
+        Estructura de ``ted/admin_inventario.html``.
+
+        Con ``ubicacion``: un grupo por moneda con ``items`` (denominación y stock).
+        Sin ella: un grupo por moneda con una sección por cada ubicación que tenga
+        inventario de las monedas listadas.
+        """
+        denominaciones = self._visibles(moneda)
+        por_moneda: Dict[str, List[DenominacionMatriz]] = {}
+        for den in denominaciones:
+            por_moneda.setdefault(den.moneda, []).append(den)
+
+        grupos = []
+        if ubicacion:
+            for codigo, dens in por_moneda.items():
+                grupos.append({
+                    "moneda": self.monedas[codigo],
+                    "items": [{"den": den, "stock": self.stock.get((den.id, ubicacion), 0)} for den in dens],
+                    "total": self.total(codigo, ubicacion),
+                })
+            return grupos
+
+        ubicaciones = self._ubicaciones_con_filas(denominaciones)
+        for codigo, dens in por_moneda.items():
+            grupos.append({
+                "moneda": self.monedas[codigo],
+                "secciones": [
+                    {
+                        "ubicacion": ubic,
+                        "items": [{"den": den, "stock": self.stock.get((den.id, ubic), 0)} for den in dens],
+                        "total": self.total(codigo, ubic),
+                    }
+                    for ubic in ubicaciones
+                ],
+                "total": self.total(codigo),
+            })
+        return grupos
+
+
+def _token_actual() -> str:
+    token = cache.get(MATRIZ_VERSION_KEY)
+    if token is None:
+        cache.add(MATRIZ_VERSION_KEY, uuid.uuid4().hex, None)
+        token = cache.get(MATRIZ_VERSION_KEY)
+    return token
+
+
+def construir_matriz(version: str = "") -> MatrizInventario:
+    """Lee denominaciones y stock en una consulta agrupada y arma la :class:`MatrizInventario`."""
+    from monedas.models import TedDenominacion
+
+    filas = (
+        TedDenominacion.objects
+        .order_by()
+        .values(
+            "id", "valor", "activa", "moneda_id", "moneda__codigo", "moneda__nombre",
+            "moneda__admite_terminal", "stock__ubicacion",
+        )
+        .annotate(cantidad=Sum("stock__cantidad"))
+    )
+
+    monedas, denominaciones, stock, totales = {}, {}, {}, {}
+    for fila in filas:
+        codigo = fila["moneda__codigo"]
+        moneda = monedas.setdefault(codigo, MonedaMatriz(
+            id=fila["moneda_id"], codigo=codigo, nombre=fila["moneda__nombre"],
+            admite_terminal=fila["moneda__admite_terminal"],
+        ))
+        den = denominaciones.setdefault(fila["id"], DenominacionMatriz(
+            id=fila["id"], valor=fila["valor"], moneda=codigo, activa=fila["activa"],
+        ))
+        ubicacion = fila["stock__ubicacion"]
+        if ubicacion is None:
+            continue  # denominación sin inventario (LEFT JOIN)
+        cantidad = fila["cantidad"] or 0
+        stock[(den.id, ubicacion)] = cantidad
+        if den.activa and moneda.admite_terminal:
+            for clave in ((codigo, ubicacion), (codigo, None)):
+                total = totales.setdefault(clave, {"billetes": 0, "monto": 0})
+                total["billetes"] += cantidad
+                total["monto"] += cantidad * den.valor
+
+    return MatrizInventario(
+        version=version,
+        monedas=dict(sorted(monedas.items())),
+        denominaciones=tuple(sorted(denominaciones.values(), key=lambda d: (d.moneda, d.valor))),
+        ubicaciones=tuple(sorted({ubic for _, ubic in stock if (ubic or "").strip()})),
+        stock=stock,
+        totales=totales,
+    )
+
+
+def obtener_matriz() -> MatrizInventario:
+    """
+    Devuelve la matriz de la versión vigente, construyéndola sólo si no está en caché.
+
+    Con una invalidación sin confirmar en esta conexión se construye sin guardarla,
+    como hace :func:`core.tarifario.obtener_tarifario`.
+    """
+    conexion = transaction.get_connection()
+    if any(func is _publicar_nueva_version for _, func, _ in conexion.run_on_commit):
+        return construir_matriz()
+
+    version = _token_actual()
+    clave = MATRIZ_CACHE_KEY.format(version=version)
+    matriz = cache.get(clave)
+    if matriz is None:
+        matriz = construir_matriz(version)
+        cache.set(clave, matriz, MATRIZ_TIMEOUT)
+    return matriz
+
+
+def _publicar_nueva_version() -> None:
+    cache.set(MATRIZ_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidar_matriz() -> None:
+    """
+    Publica una nueva versión de la matriz, ahora y al confirmar la transacción
+    (igual que :func:`core.tarifario.invalidar_tarifario`).
+    """
+    _publicar_nueva_version()
+    transaction.on_commit(_publicar_nueva_version)
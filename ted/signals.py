@@ -0,0 +1,23 @@
+# ted/signals.py
+"""
+Invalidación de la matriz de inventario (:mod:`ted.matriz`).
+
+Las escrituras con ``save()``/``delete()`` sobre inventario, denominaciones y
+monedas publican una nueva versión. Los desgloses de :mod:`ted.stock` usan
+``update()`` y la invalidan explícitamente.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from monedas.models import Moneda, TedDenominacion, TedInventario
+from .matriz import invalidar_matriz
+
+
+@receiver(post_save, sender=TedInventario, dispatch_uid="matriz_inventario_save")
+@receiver(post_delete, sender=TedInventario, dispatch_uid="matriz_inventario_delete")
+@receiver(post_save, sender=TedDenominacion, dispatch_uid="matriz_denominacion_save")
+@receiver(post_delete, sender=TedDenominacion, dispatch_uid="matriz_denominacion_delete")
+@receiver(post_save, sender=Moneda, dispatch_uid="matriz_moneda_save")
+@receiver(post_delete, sender=Moneda, dispatch_uid="matriz_moneda_delete")
+def invalidar_por_escritura(sender, **kwargs):
+    invalidar_matriz()
@@ -0,0 +1,373 @@
+# ted/stock.py
+"""
+Mutaciones de stock TED
+=======================
+
+.. module:: ted.stock
+   :synopsis: Aplica un desglose completo sobre ``TedInventario`` con UPDATE condicionales.
+
+En lugar de bloquear las filas de inventario con ``select_for_update``, leerlas,
+validar en Python y guardar cada una con ``save()``, :func:`aplicar_desglose`
+envía una sentencia por denominación:
+
+.. code-block:: sql
+
+   UPDATE monedas_tedinventario
+      SET cantidad = cantidad - n
+    WHERE denominacion_id = ? AND ubicacion = ? AND cantidad >= n
+
+La base de datos valida y descuenta en el mismo paso, así que dos terminales de
+la misma ubicación sólo esperan mientras dura cada UPDATE. Si una sentencia no
+afecta filas, el stock no alcanza: se lanza :class:`StockInsuficiente` y el
+bloque atómico del servicio revierte lo ya aplicado del desglose.
+
+Los movimientos (:class:`~monedas.models.TedMovimiento`) se insertan con un único
+``bulk_create``. Como ni ``update()`` ni ``bulk_create`` emiten ``post_save``,
+el servicio invalida el tarifario (:func:`core.tarifario.invalidar_tarifario`)
+y la matriz de inventario (:func:`ted.matriz.invalidar_matriz`) explícitamente.
+Tomar o liberar reservas cambia el stock disponible que ofrece el tarifario y
+también lo invalida; la matriz muestra existencias físicas y no cambia.
+
+Reservas
+--------
+El preconteo de un retiro retiene los billetes elegidos con
+:func:`reservar_desglose`: cada línea queda en :class:`~monedas.models.TedReserva`
+con su vencimiento y suma a ``TedInventario.reservada`` con el mismo UPDATE
+condicional. El stock disponible es ``cantidad - reservada``, y todo retiro
+exige ``cantidad >= reservada + n`` sobre las unidades que no vienen de una
+reserva propia. Al confirmar, :func:`aplicar_desglose` con ``reserva_id``
+consume la retención; :func:`liberar_reservas_vencidas` devuelve en lote las que
+vencieron sin confirmarse.
+
+Historial por ubicación
+-----------------------
+Cada movimiento guarda su ``ubicacion`` y el ``saldo`` resultante. Para
+responder "stock al momento T" sin recorrer todo el historial,
+:func:`tomar_cortes` fotografía periódicamente el inventario
+(:class:`~monedas.models.TedStockCorte`) y :func:`stock_al` parte del corte más
+cercano anterior a T y suma sólo los movimientos posteriores a ese corte.
+:func:`conciliar` compara ese cálculo con el inventario vigente.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Max, Q, Sum
+from django.utils import timezone
+
+from core.tarifario import invalidar_tarifario
+from monedas.models import TedInventario, TedMovimiento, TedReserva, TedStockCorte
+from .matriz import invalidar_matriz
+
+LOTE_LIBERACION = 500
+
+
+class StockInsuficiente(Exception):
+    """
+    El inventario de una denominación no alcanza para el desglose.
+
+    :ivar denominacion_id: Denominación sin stock suficiente.
+    :ivar solicitado: Unidades que se intentaron retirar.
+    :ivar disponible: Unidades disponibles al momento del intento.
+    """
+
+    def __init__(self, denominacion_id, ubicacion, solicitado, disponible):
+        self.denominacion_id = denominacion_id
+        self.ubicacion = ubicacion
+        self.solicitado = solicitado
+        self.disponible = disponible
+        super().__init__(
+            f"Stock insuficiente para la denominación {denominacion_id} en '{ubicacion}': "
+            f"solicitado {solicitado}, disponible {disponible}."
+        )
+
+
+def _agrupar(lineas):
+    """Suma los deltas por denominación y descarta los nulos, en orden de ``pk``."""
+    deltas = {}
+    for denominacion_id, delta in lineas:
+        deltas[int(denominacion_id)] = deltas.get(int(denominacion_id), 0) + int(delta)
+    return sorted((did, delta) for did, delta in deltas.items() if delta)
+
+
+def stock_disponible(ubicacion, denominaciones):
+    """
+    Unidades disponibles (``cantidad - reservada``) por denominación en ``ubicacion``.
+
+    :param denominaciones: Denominaciones o ``pk`` a consultar.
+    :returns: ``{denominacion_id: disponible}``; las denominaciones sin fila no aparecen.
+    :rtype: dict[int, int]
+    """
+    return dict(
+        TedInventario.objects
+        .filter(ubicacion=ubicacion, denominacion__in=denominaciones)
+        .order_by()
+        .annotate(disponible=F("cantidad") - F("reservada"))
+        .values_list("denominacion_id", "disponible")
+    )
+
+
+def _disponible(denominacion_id, ubicacion):
+    return stock_disponible(ubicacion, [denominacion_id]).get(denominacion_id, 0)
+
+
+def _tomar_reserva(reserva_id):
+    """Borra las retenciones vigentes de ``reserva_id`` y devuelve ``{denominacion_id: unidades}``."""
+    filas = list(
+        TedReserva.objects.select_for_update()
+        .filter(reserva_id=reserva_id)
+        .values_list("pk", "denominacion_id", "unidades")
+    )
+    retenidas = defaultdict(int)
+    for _, denominacion_id, unidades in filas:
+        retenidas[denominacion_id] += unidades
+    if filas:
+        TedReserva.objects.filter(pk__in=[pk for pk, _, _ in filas]).delete()
+    return retenidas
+
+
+def reservar_desglose(reserva_id, ubicacion, lineas, ttl_segundos):
+    """
+    Retiene los billetes de un retiro precontado hasta que se confirme o venza.
+
+    Antes de reservar libera las retenciones vencidas de ``ubicacion``, para que
+    no resten disponibilidad aunque el barrido periódico aún no haya corrido.
+
+    :param str reserva_id: Identificador del preconteo (``reserva_id`` de la API).
+    :param lineas: Iterable de ``(denominacion_id, unidades)`` a retener.
+    :param int ttl_segundos: Vigencia de la retención.
+    :returns: Momento de vencimiento.
+    :rtype: datetime.datetime
+    :raises StockInsuficiente: Si alguna línea supera el stock disponible; en ese
+        caso no se retiene nada.
+    """
+    liberar_reservas_vencidas(ubicacion=ubicacion)
+    lineas = [(did, unidades) for did, unidades in _agrupar(lineas) if unidades > 0]
+    expira_en = timezone.now() + datetime.timedelta(seconds=ttl_segundos)
+    with transaction.atomic():
+        for did, unidades in lineas:
+            actualizadas = (
+                TedInventario.objects
+                .filter(denominacion_id=did, ubicacion=ubicacion, cantidad__gte=F("reservada") + unidades)
+                .update(reservada=F("reservada") + unidades)
+            )
+            if not actualizadas:
+                raise StockInsuficiente(did, ubicacion, unidades, _disponible(did, ubicacion))
+        TedReserva.objects.bulk_create([
+            TedReserva(reserva_id=reserva_id, denominacion_id=did, ubicacion=ubicacion,
+                       unidades=unidades, expira_en=expira_en)
+            for did, unidades in lineas
+        ])
+    if lineas:
+        invalidar_tarifario()
+    return expira_en
+
+
+def liberar_reservas_vencidas(ubicacion=None, ahora=None, lote=LOTE_LIBERACION):
+    """
+    Devuelve al stock disponible las retenciones vencidas.
+
+    Trabaja en lotes de ``lote`` filas, cada uno en su propia transacción: toma
+    las filas con ``select_for_update(skip_locked=True)`` (una confirmación en
+    curso las tiene bloqueadas y se las queda), las borra y descuenta
+    ``reservada`` con un UPDATE por denominación y ubicación.
+
+    :param ubicacion: Limita el barrido a una ubicación (por defecto, todas).
+    :param ahora: Momento de referencia (por defecto, ``timezone.now()``).
+    :returns: Cantidad de retenciones liberadas.
+    :rtype: int
+    """
+    ahora = ahora or timezone.now()
+    vencidas = TedReserva.objects.filter(expira_en__lte=ahora)
+    if ubicacion is not None:
+        vencidas = vencidas.filter(ubicacion=ubicacion)
+
+    liberadas = 0
+    while True:
+        with transaction.atomic():
+            filas = list(
+                vencidas.select_for_update(skip_locked=True)
+                .order_by("pk")
+                .values_list("pk", "denominacion_id", "ubicacion", "unidades")[:lote]
+            )
+            if not filas:
+                break
+            TedReserva.objects.filter(pk__in=[fila[0] for fila in filas]).delete()
+            por_stock = defaultdict(int)
+            for _, denominacion_id, ubic, unidades in filas:
+                por_stock[(denominacion_id, ubic)] += unidades
+            for (denominacion_id, ubic), unidades in sorted(por_stock.items()):
+                TedInventario.objects.filter(denominacion_id=denominacion_id, ubicacion=ubic).update(
+                    reservada=F("reservada") - unidades
+                )
+        liberadas += len(filas)
+        if len(filas) < lote:
+            break
+
+    if liberadas:
+        invalidar_tarifario()
+    return liberadas
+
+
+def aplicar_desglose(ubicacion, lineas, motivo, usuario=None, referencia="", reserva_id=None):
+    """
+    Aplica un desglose de billetes sobre el inventario de ``ubicacion``.
+
+    Las filas de inventario se actualizan en orden de denominación, de modo que
+    dos desgloses concurrentes nunca se esperan mutuamente en orden inverso.
+
+    :param str ubicacion: Ubicación del inventario a modificar.
+    :param lineas: Iterable de ``(denominacion_id, delta)``; ``delta`` positivo
+        suma billetes y negativo los retira. Las denominaciones repetidas se suman.
+    :param str motivo: Uno de ``TedMovimiento.MOTIVO_*``.
+    :param usuario: Usuario que registra los movimientos (opcional).
+    :param str referencia: ``transaccion_ref`` de los movimientos (se trunca a 64).
+    :param reserva_id: Reserva creada por :func:`reservar_desglose` que se consume:
+        sus unidades se descuentan de ``reservada`` y no necesitan stock libre.
+        Si ya venció y fue liberada, el retiro sólo procede con stock disponible.
+    :returns: Movimientos creados.
+    :rtype: list[monedas.models.TedMovimiento]
+    :raises StockInsuficiente: Si algún retiro supera el stock disponible; en ese
+        caso no se aplica ninguna línea del desglose.
+    """
+    lineas = _agrupar(lineas)
+    if not lineas and not reserva_id:
+        return []
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        retenidas = _tomar_reserva(reserva_id) if reserva_id else {}
+        ingresos = [did for did, delta in lineas if delta > 0]
+        if ingresos:
+            TedInventario.objects.bulk_create(
+                [TedInventario(denominacion_id=did, ubicacion=ubicacion, cantidad=0) for did in ingresos],
+                ignore_conflicts=True,
+            )
+
+        for did, delta in lineas:
+            filas = TedInventario.objects.filter(denominacion_id=did, ubicacion=ubicacion)
+            cambios = {"cantidad": F("cantidad") + delta, "updated_at": ahora}
+            if delta < 0:
+                propias = min(retenidas.get(did, 0), -delta)
+                retenidas[did] = retenidas.get(did, 0) - propias
+                filas = filas.filter(cantidad__gte=F("reservada") - delta - propias)
+                if propias:
+                    cambios["reservada"] = F("reservada") - propias
+            if not filas.update(**cambios):
+                raise StockInsuficiente(did, ubicacion, -delta, _disponible(did, ubicacion))
+
+        # Retenciones que el desglose final no usó: vuelven al stock disponible.
+        for did, unidades in sorted(retenidas.items()):
+            if unidades:
+                TedInventario.objects.filter(denominacion_id=did, ubicacion=ubicacion).update(
+                    reservada=F("reservada") - unidades
+                )
+
+        # Las filas siguen bloqueadas por los UPDATE: el saldo leído es el propio.
+        saldos = dict(
+            TedInventario.objects
+            .filter(ubicacion=ubicacion, denominacion_id__in=[did for did, _ in lineas])
+            .order_by()
+            .values_list("denominacion_id", "cantidad")
+        ) if lineas else {}
+        movimientos = TedMovimiento.objects.bulk_create([
+            TedMovimiento(
+                denominacion_id=did, ubicacion=ubicacion, delta=delta, saldo=saldos.get(did),
+                motivo=motivo, creado_por=usuario, transaccion_ref=(referencia or "")[:64],
+            )
+            for did, delta in lineas
+        ])
+
+    if movimientos:
+        invalidar_tarifario()
+        invalidar_matriz()
+    return movimientos
+
+
+def tomar_cortes(ahora=None):
+    """
+    Toma un corte de stock de todas las ubicaciones.
+
+    Cada ubicación se procesa en su propia transacción: bloquea sus filas de
+    inventario (en el mismo orden que :func:`aplicar_desglose`), de modo que los
+    desgloses en curso terminen antes de leer, y registra con las cantidades el
+    último movimiento existente.
+
+    :param ahora: Momento del corte (por defecto, ``timezone.now()``).
+    :returns: Cantidad de filas de corte creadas.
+    :rtype: int
+    """
+    ahora = ahora or timezone.now()
+    ubicaciones = TedInventario.objects.order_by().values_list("ubicacion", flat=True).distinct()
+    creadas = 0
+    for ubicacion in list(ubicaciones):
+        with transaction.atomic():
+            filas = list(
+                TedInventario.objects.select_for_update()
+                .filter(ubicacion=ubicacion)
+                .order_by("denominacion_id")
+                .values_list("denominacion_id", "cantidad")
+            )
+            hasta = TedMovimiento.objects.aggregate(ultimo=Max("pk"))["ultimo"] or 0
+            TedStockCorte.objects.bulk_create([
+                TedStockCorte(denominacion_id=did, ubicacion=ubicacion, cantidad=cantidad,
+                              hasta_movimiento_id=hasta, tomado_en=ahora)
+                for did, cantidad in filas
+            ])
+        creadas += len(filas)
+    return creadas
+
+
+def stock_al(ubicacion, momento):
+    """
+    Stock de ``ubicacion`` por denominación al ``momento`` indicado.
+
+    Usa el último corte tomado hasta ``momento`` y le suma los movimientos de la
+    ubicación posteriores a ese corte y hasta ``momento``. Las denominaciones sin
+    fila en el corte (agregadas después) se calculan con todos sus movimientos.
+
+    :returns: ``{denominacion_id: cantidad}``.
+    :rtype: dict[int, int]
+    """
+    corte_en = (
+        TedStockCorte.objects.filter(ubicacion=ubicacion, tomado_en__lte=momento)
+        .aggregate(ultimo=Max("tomado_en"))["ultimo"]
+    )
+    stock, hasta = {}, 0
+    if corte_en is not None:
+        for did, cantidad, hasta in (
+            TedStockCorte.objects.filter(ubicacion=ubicacion, tomado_en=corte_en)
+            .order_by()
+            .values_list("denominacion_id", "cantidad", "hasta_movimiento_id")
+        ):
+            stock[did] = cantidad
+
+    movimientos = TedMovimiento.objects.filter(ubicacion=ubicacion, created_at__lte=momento)
+    if stock:
+        movimientos = movimientos.filter(Q(pk__gt=hasta) | ~Q(denominacion_id__in=list(stock)))
+    for did, total in (
+        movimientos.order_by().values("denominacion_id")
+        .annotate(total=Sum("delta")).values_list("denominacion_id", "total")
+    ):
+        stock[did] = stock.get(did, 0) + total
+    return stock
+
+
+def conciliar(ubicacion):
+    """
+    Compara el stock reconstruido con :func:`stock_al` contra ``TedInventario``.
+
+    :returns: Diferencias ``{denominacion_id: (segun_movimientos, en_inventario)}``;
+        vacío si la ubicación cuadra.
+    :rtype: dict[int, tuple[int, int]]
+    """
+    esperado = stock_al(ubicacion, timezone.now())
+    actual = dict(
+        TedInventario.objects.filter(ubicacion=ubicacion).order_by()
+        .values_list("denominacion_id", "cantidad")
+    )
+    return {
+        did: (esperado.get(did, 0), actual.get(did, 0))
+        for did in sorted(set(esperado) | set(actual))
+        if esperado.get(did, 0) != actual.get(did, 0)
+    }
@@ -0,0 +1,28 @@
+# ted/tasks.py
+from celery import shared_task
+
+from .stock import liberar_reservas_vencidas, tomar_cortes
+
+
+@shared_task
+def liberar_reservas_vencidas_task():
+    """
+    Tarea periódica (``CELERY_BEAT_SCHEDULE``) que devuelve al stock disponible
+    las reservas de preconteo TED vencidas sin confirmarse.
+
+    :return: Cantidad de retenciones liberadas.
+    :rtype: int
+    """
+    return liberar_reservas_vencidas()
+
+
+@shared_task
+def tomar_cortes_task():
+    """
+    Tarea periódica (``CELERY_BEAT_SCHEDULE``) que toma un corte de stock de
+    todas las ubicaciones (ver :func:`ted.stock.tomar_cortes`).
+
+    :return: Cantidad de filas de corte creadas.
+    :rtype: int
+    """
+    return tomar_cortes()
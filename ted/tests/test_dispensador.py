@@ -0,0 +1,67 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from ted.dispensador import (
+    POLITICA_MENOS_BILLETES,
+    POLITICA_PRESERVAR_ESCASAS,
+    _resolver,
+    normalizar_stock,
+    resolver_billetes,
+    resolver_voraz,
+)
+
+
+class ResolverBilletesTests(SimpleTestCase):
+    def setUp(self):
+        _resolver.cache_clear()
+
+    def test_encuentra_combinacion_exacta_que_el_voraz_no_ve(self):
+        stock = [(50, 1), (20, 3)]
+        self.assertFalse(resolver_voraz(60, stock).exacto)
+
+        resultado = resolver_billetes(60, stock)
+        self.assertTrue(resultado.exacto)
+        self.assertEqual(resultado.billetes, ((20, 3),))
+
+    def test_sin_combinacion_exacta_devuelve_la_mas_cercana_por_debajo(self):
+        resultado = resolver_billetes(65, [(50, 1), (20, 3)])
+        self.assertFalse(resultado.exacto)
+        self.assertEqual(resultado.monto, 60)
+
+    def test_respeta_el_stock_y_normaliza_el_vector(self):
+        self.assertEqual(normalizar_stock([(10, 2), (50, 0), (10, 1), (20, 1)]), ((20, 1), (10, 3)))
+        resultado = resolver_billetes(100, [(10, 2), (10, 1), (20, 1)])
+        self.assertEqual(resultado.monto, 50)
+        self.assertEqual(resultado.billetes, ((20, 1), (10, 3)))
+
+    def test_politicas(self):
+        stock = [(50, 1), (20, 3), (10, 40)]
+        menos = resolver_billetes(60, stock, POLITICA_MENOS_BILLETES)
+        self.assertEqual(menos.billetes, ((50, 1), (10, 1)))
+
+        escasas = resolver_billetes(60, stock, POLITICA_PRESERVAR_ESCASAS)
+        self.assertEqual(escasas.billetes, ((10, 6),))
+
+        with self.assertRaises(ValueError):
+            resolver_billetes(60, stock, "al_azar")
+
+    @override_settings(TED_POLITICA_DISPENSADO=POLITICA_PRESERVAR_ESCASAS)
+    def test_politica_por_defecto_desde_settings(self):
+        self.assertEqual(resolver_billetes(60, [(50, 1), (10, 40)]).billetes, ((10, 6),))
+
+    def test_memoiza_por_stock_y_monto(self):
+        stock = [(100, 5), (20, 7), (5, 3)]
+        resolver_billetes(245, stock)
+        resolver_billetes(245, list(reversed(stock)))
+        info = _resolver.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+        resolver_billetes(245, [(100, 5), (20, 6), (5, 3)])
+        self.assertEqual(_resolver.cache_info().misses, 2)
+
+    def test_benchmark(self):
+        salida = StringIO()
+        call_command("benchmark_dispensador", casos=20, stdout=salida)
+        self.assertIn("Knapsack (memo)", salida.getvalue())
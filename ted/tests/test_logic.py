@@ -29,3 +29,13 @@ class AjusteMontoTests(TestCase):
         TedInventario.objects.filter(denominacion=self.den1).update(cantidad=1)
         result = ajustar_monto_a_denominaciones_disponibles(Decimal('200'), self.moneda, 'venta')
         self.assertLess(result['monto_ajustado'], Decimal('200'))
+
+    def test_venta_usa_combinacion_exacta_con_stock_limitado(self):
+        den50 = TedDenominacion.objects.create(moneda=self.moneda, valor=Decimal('50'))
+        den20 = TedDenominacion.objects.create(moneda=self.moneda, valor=Decimal('20'))
+        TedInventario.objects.all().delete()
+        TedInventario.objects.create(denominacion=den50, cantidad=1)
+        TedInventario.objects.create(denominacion=den20, cantidad=3)
+        result = ajustar_monto_a_denominaciones_disponibles(Decimal('60'), self.moneda, 'venta')
+        self.assertEqual(result['monto_ajustado'], Decimal('60'))
+        self.assertFalse(result['ajustado'])
@@ -0,0 +1,67 @@
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from monedas.models import Moneda, TedDenominacion, TedInventario, TedMovimiento
+from ted.matriz import construir_matriz, invalidar_matriz, obtener_matriz
+from ted.stock import aplicar_desglose
+
+
+class MatrizInventarioTest(TransactionTestCase):
+    """
+    Pruebas de :mod:`ted.matriz`.
+
+    Como en `TarjetaTasasTest`, los cambios se confirman para que la matriz
+    quede guardada en la caché entre llamadas.
+    """
+
+    def setUp(self):
+        self.usd = Moneda.objects.create(codigo="USD", nombre="Dólar", admite_terminal=True)
+        self.eur = Moneda.objects.create(codigo="EUR", nombre="Euro", admite_terminal=True)
+        self.usd10 = TedDenominacion.objects.create(moneda=self.usd, valor=10)
+        self.usd50 = TedDenominacion.objects.create(moneda=self.usd, valor=50)
+        self.eur20 = TedDenominacion.objects.create(moneda=self.eur, valor=20)
+        self.usd100 = TedDenominacion.objects.create(moneda=self.usd, valor=100, activa=False)
+        TedInventario.objects.create(denominacion=self.usd10, ubicacion="Campus", cantidad=3)
+        TedInventario.objects.create(denominacion=self.usd50, ubicacion="Centro", cantidad=2)
+        TedInventario.objects.create(denominacion=self.eur20, ubicacion="Campus", cantidad=0)
+        TedInventario.objects.create(denominacion=self.usd100, ubicacion="Aeropuerto", cantidad=4)
+
+    def tearDown(self):
+        # El flush de TransactionTestCase no emite señales.
+        invalidar_matriz()
+
+    def test_una_consulta_y_totales(self):
+        with CaptureQueriesContext(connection) as ctx:
+            matriz = construir_matriz()
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        self.assertEqual(matriz.ubicaciones, ("Aeropuerto", "Campus", "Centro"))
+        self.assertEqual(matriz.total("USD"), {"billetes": 5, "monto": 130})
+        self.assertEqual(matriz.total("USD", "Campus"), {"billetes": 3, "monto": 30})
+        self.assertEqual(matriz.total("EUR", "Centro"), {"billetes": 0, "monto": 0})
+
+        self.assertEqual(matriz.monedas_con_stock("Campus"), ["USD"])
+        self.assertEqual([m.codigo for m in matriz.monedas_con_inventario("Campus")], ["EUR", "USD"])
+
+        por_ubicacion = matriz.grupos(ubicacion="Centro", moneda="usd")
+        self.assertEqual(len(por_ubicacion), 1)
+        self.assertEqual([(i["den"].valor, i["stock"]) for i in por_ubicacion[0]["items"]], [(10, 0), (50, 2)])
+
+        todas = matriz.grupos()
+        self.assertEqual([g["moneda"].codigo for g in todas], ["EUR", "USD"])
+        # La ubicación con sólo denominaciones inactivas no aparece en las secciones.
+        self.assertEqual([s["ubicacion"] for s in todas[1]["secciones"]], ["Campus", "Centro"])
+
+    def test_cache_y_invalidacion_por_mutacion(self):
+        obtener_matriz()
+        with self.assertNumQueries(0):
+            self.assertEqual(obtener_matriz().monedas_con_stock("Centro"), ["USD"])
+
+        aplicar_desglose("Centro", [(self.eur20.id, 5)], TedMovimiento.MOTIVO_AJUSTE)
+        self.assertEqual(obtener_matriz().monedas_con_stock("Centro"), ["EUR", "USD"])
+
+        inv = TedInventario.objects.get(denominacion=self.usd50)
+        inv.cantidad = 0
+        inv.save()
+        self.assertEqual(obtener_matriz().monedas_con_stock("Centro"), ["EUR"])
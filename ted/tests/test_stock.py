@@ -0,0 +1,235 @@
+import datetime
+import threading
+import unittest
+
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.tarifario import obtener_tarifario
+from monedas.models import Moneda, TedDenominacion, TedInventario, TedMovimiento, TedReserva, TedStockCorte
+from ted.stock import (
+    StockInsuficiente,
+    aplicar_desglose,
+    conciliar,
+    liberar_reservas_vencidas,
+    reservar_desglose,
+    stock_al,
+    stock_disponible,
+    tomar_cortes,
+)
+
+UBICACION = "Campus"
+
+
+def _consultas_sin_savepoints(ctx):
+    return [q for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+
+
+class AplicarDesgloseTest(TestCase):
+    """Pruebas de :func:`ted.stock.aplicar_desglose`."""
+
+    @classmethod
+    def setUpTestData(cls):
+        usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        cls.den10 = TedDenominacion.objects.create(moneda=usd, valor=10)
+        cls.den50 = TedDenominacion.objects.create(moneda=usd, valor=50)
+        cls.den100 = TedDenominacion.objects.create(moneda=usd, valor=100)
+        TedInventario.objects.create(denominacion=cls.den10, ubicacion=UBICACION, cantidad=5)
+        TedInventario.objects.create(denominacion=cls.den50, ubicacion=UBICACION, cantidad=2)
+
+    def _stock(self, den):
+        return TedInventario.objects.get(denominacion=den, ubicacion=UBICACION).cantidad
+
+    def test_retiro_descuenta_y_registra_movimientos(self):
+        with CaptureQueriesContext(connection) as ctx:
+            movimientos = aplicar_desglose(
+                UBICACION, [(self.den10.id, -3), (self.den50.id, -2)],
+                TedMovimiento.MOTIVO_COMPRA, referencia="TX-1",
+            )
+
+        # Un UPDATE por denominación, una lectura de saldos y un único INSERT de movimientos.
+        self.assertEqual(len(_consultas_sin_savepoints(ctx)), 4)
+        self.assertEqual((self._stock(self.den10), self._stock(self.den50)), (2, 0))
+        self.assertEqual(len(movimientos), 2)
+        self.assertEqual(
+            sorted(TedMovimiento.objects.values_list("delta", "saldo", "ubicacion", "transaccion_ref")),
+            [(-3, 2, UBICACION, "TX-1"), (-2, 0, UBICACION, "TX-1")],
+        )
+
+    def test_stock_insuficiente_no_aplica_ninguna_linea(self):
+        with self.assertRaises(StockInsuficiente) as ctx:
+            aplicar_desglose(
+                UBICACION, [(self.den10.id, -1), (self.den50.id, -3)], TedMovimiento.MOTIVO_COMPRA,
+            )
+
+        self.assertEqual((ctx.exception.solicitado, ctx.exception.disponible), (3, 2))
+        self.assertEqual((self._stock(self.den10), self._stock(self.den50)), (5, 2))
+        self.assertFalse(TedMovimiento.objects.exists())
+
+    def test_retiro_sin_fila_de_inventario(self):
+        with self.assertRaises(StockInsuficiente) as ctx:
+            aplicar_desglose(UBICACION, [(self.den100.id, -1)], TedMovimiento.MOTIVO_COMPRA)
+        self.assertEqual(ctx.exception.disponible, 0)
+
+    def test_deposito_crea_fila_faltante_y_agrupa_lineas(self):
+        aplicar_desglose(
+            UBICACION, [(self.den100.id, 2), (self.den10.id, 1), (self.den100.id, 1), (self.den50.id, 0)],
+            TedMovimiento.MOTIVO_VENTA,
+        )
+
+        self.assertEqual((self._stock(self.den10), self._stock(self.den100)), (6, 3))
+        self.assertEqual(
+            sorted(TedMovimiento.objects.values_list("denominacion_id", "delta")),
+            [(self.den10.id, 1), (self.den100.id, 3)],
+        )
+
+
+class ReservasTest(TestCase):
+    """Retenciones de preconteo (:func:`ted.stock.reservar_desglose`)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        cls.den10 = TedDenominacion.objects.create(moneda=usd, valor=10)
+        cls.den50 = TedDenominacion.objects.create(moneda=usd, valor=50)
+        TedInventario.objects.create(denominacion=cls.den10, ubicacion=UBICACION, cantidad=5)
+        TedInventario.objects.create(denominacion=cls.den50, ubicacion=UBICACION, cantidad=2)
+
+    def _inventario(self, den):
+        inv = TedInventario.objects.get(denominacion=den, ubicacion=UBICACION)
+        return inv.cantidad, inv.reservada
+
+    def test_reserva_descuenta_disponible_y_bloquea_a_otro_kiosco(self):
+        reservar_desglose("r1", UBICACION, [(self.den50.id, 2), (self.den10.id, 1)], 120)
+
+        self.assertEqual(stock_disponible(UBICACION, [self.den10, self.den50]),
+                         {self.den10.id: 4, self.den50.id: 0})
+        with self.assertRaises(StockInsuficiente):
+            reservar_desglose("r2", UBICACION, [(self.den10.id, 1), (self.den50.id, 1)], 120)
+        self.assertFalse(TedReserva.objects.filter(reserva_id="r2").exists())
+        self.assertEqual(self._inventario(self.den10), (5, 1))
+        # Un retiro sin reserva tampoco puede tomar billetes retenidos.
+        with self.assertRaises(StockInsuficiente):
+            aplicar_desglose(UBICACION, [(self.den50.id, -1)], TedMovimiento.MOTIVO_COMPRA)
+
+    def test_confirmar_convierte_la_reserva_en_movimiento(self):
+        reservar_desglose("r1", UBICACION, [(self.den50.id, 2), (self.den10.id, 2)], 120)
+
+        aplicar_desglose(UBICACION, [(self.den50.id, -2), (self.den10.id, -1)],
+                         TedMovimiento.MOTIVO_COMPRA, reserva_id="r1")
+
+        self.assertEqual(self._inventario(self.den50), (0, 0))
+        # La unidad retenida que no se usó vuelve a estar disponible.
+        self.assertEqual(self._inventario(self.den10), (4, 0))
+        self.assertFalse(TedReserva.objects.exists())
+        self.assertEqual(TedMovimiento.objects.count(), 2)
+
+    def test_barrido_libera_solo_las_vencidas(self):
+        reservar_desglose("vieja", UBICACION, [(self.den10.id, 2)], 120)
+        reservar_desglose("nueva", UBICACION, [(self.den10.id, 1), (self.den50.id, 1)], 600)
+
+        liberadas = liberar_reservas_vencidas(ahora=timezone.now() + datetime.timedelta(seconds=300), lote=1)
+
+        self.assertEqual(liberadas, 1)
+        self.assertEqual(list(TedReserva.objects.values_list("reserva_id", flat=True).distinct()), ["nueva"])
+        self.assertEqual(self._inventario(self.den10), (5, 1))
+        self.assertEqual(self._inventario(self.den50), (2, 1))
+
+    def test_confirmar_con_reserva_vencida_usa_stock_libre(self):
+        reservar_desglose("r1", UBICACION, [(self.den10.id, 2)], 120)
+        liberar_reservas_vencidas(ahora=timezone.now() + datetime.timedelta(seconds=300))
+
+        aplicar_desglose(UBICACION, [(self.den10.id, -2)], TedMovimiento.MOTIVO_COMPRA, reserva_id="r1")
+
+        self.assertEqual(self._inventario(self.den10), (3, 0))
+
+    def test_tarifario_ofrece_solo_el_stock_disponible(self):
+        self.assertEqual(obtener_tarifario().stock_de("USD", UBICACION), ((50, 2), (10, 5)))
+
+        reservar_desglose("r1", UBICACION, [(self.den50.id, 2), (self.den10.id, 1)], 120)
+        self.assertEqual(obtener_tarifario().stock_de("USD", UBICACION), ((10, 4),))
+
+        liberar_reservas_vencidas(ahora=timezone.now() + datetime.timedelta(seconds=300))
+        self.assertEqual(obtener_tarifario().stock_de("USD"), ((50, 2), (10, 5)))
+
+
+class StockHistoricoTest(TestCase):
+    """Cortes y stock a una fecha (:func:`ted.stock.stock_al`)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        cls.den10 = TedDenominacion.objects.create(moneda=usd, valor=10)
+        cls.den50 = TedDenominacion.objects.create(moneda=usd, valor=50)
+
+    def _mover(self, lineas, ubicacion=UBICACION):
+        aplicar_desglose(ubicacion, lineas, TedMovimiento.MOTIVO_AJUSTE)
+        return TedMovimiento.objects.order_by("-pk").first().created_at
+
+    def test_stock_al_desde_corte_y_movimientos_acotados(self):
+        t1 = self._mover([(self.den10.id, 5), (self.den50.id, 2)])
+        self._mover([(self.den10.id, 3)], ubicacion="Centro")  # otra ubicación: no cuenta
+        self.assertEqual(tomar_cortes(), 3)
+        t2 = self._mover([(self.den10.id, -2)])
+        t3 = self._mover([(self.den50.id, -1), (self.den10.id, 4)])
+
+        self.assertEqual(stock_al(UBICACION, t1), {self.den10.id: 5, self.den50.id: 2})
+        self.assertEqual(stock_al(UBICACION, t2), {self.den10.id: 3, self.den50.id: 2})
+        self.assertEqual(stock_al(UBICACION, t3), {self.den10.id: 7, self.den50.id: 1})
+        self.assertEqual(conciliar(UBICACION), {})
+
+        # Desde el corte no se vuelven a leer los movimientos anteriores a él.
+        TedMovimiento.objects.filter(pk__lte=TedStockCorte.objects.first().hasta_movimiento_id).delete()
+        self.assertEqual(stock_al(UBICACION, t3), {self.den10.id: 7, self.den50.id: 1})
+
+    def test_conciliar_detecta_cambios_sin_movimiento(self):
+        self._mover([(self.den10.id, 5)])
+        tomar_cortes()
+        TedInventario.objects.filter(denominacion=self.den10).update(cantidad=9)
+
+        self.assertEqual(conciliar(UBICACION), {self.den10.id: (5, 9)})
+
+
+@unittest.skipIf(connection.vendor == "sqlite", "SQLite serializa las escrituras de toda la base.")
+class AplicarDesgloseConcurrenteTest(TransactionTestCase):
+    """Varias terminales retiran a la vez de la misma ubicación."""
+
+    HILOS = 8
+    RETIROS_POR_HILO = 10
+    STOCK_INICIAL = 50
+
+    def test_no_sobrevende_ni_pierde_movimientos(self):
+        usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        den = TedDenominacion.objects.create(moneda=usd, valor=20)
+        TedInventario.objects.create(denominacion=den, ubicacion=UBICACION, cantidad=self.STOCK_INICIAL)
+
+        resultados = {"ok": 0, "insuficiente": 0}
+        candado = threading.Lock()
+        inicio = threading.Barrier(self.HILOS)
+
+        def terminal():
+            try:
+                inicio.wait()
+                for _ in range(self.RETIROS_POR_HILO):
+                    try:
+                        aplicar_desglose(UBICACION, [(den.id, -1)], TedMovimiento.MOTIVO_COMPRA)
+                        clave = "ok"
+                    except StockInsuficiente:
+                        clave = "insuficiente"
+                    with candado:
+                        resultados[clave] += 1
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=terminal) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        intentos = self.HILOS * self.RETIROS_POR_HILO
+        self.assertEqual(resultados, {"ok": self.STOCK_INICIAL, "insuficiente": intentos - self.STOCK_INICIAL})
+        self.assertEqual(TedInventario.objects.get(denominacion=den).cantidad, 0)
+        self.assertEqual(TedMovimiento.objects.filter(denominacion=den).count(), self.STOCK_INICIAL)
@@ -56,6 +56,8 @@ from django.utils import timezone
 
 from monedas.models import Moneda, TedDenominacion, TedInventario, TedMovimiento
 from .services import get_cotizacion_vigente
+from .matriz import invalidar_matriz, obtener_matriz
+from .stock import StockInsuficiente, aplicar_desglose
 from .forms import AjusteInventarioForm
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -112,13 +114,7 @@ def _inv_filter_by_ubicacion(qs, ubicacion: str):
 
 
 def _inv_distinct_ubicaciones():
-    try:
-        qs = (TedInventario.objects.values_list("ubicacion", flat=True)
-              .distinct().order_by("ubicacion"))
-        vals = [u for u in qs if (u or "").strip()]
-        return vals or [TED_DIRECCION]
-    except FieldError:
-        return [TED_DIRECCION]
+    return list(obtener_matriz().ubicaciones) or [TED_DIRECCION]
 
 
 def _inv_get_or_create(den, ubicacion: str, for_update: bool = False):
@@ -256,30 +252,22 @@ def operar(request):
 
         total_pyg = (total_ext * tasa).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
 
-        # Validaciones de stock en COMPRA
-        if signo < 0:
-            for den, q in cantidades:
-                inv, _ = _inv_get_or_create(den, ubicacion, for_update=True)
-                if inv.cantidad < q:
-                    messages.error(
-                        request,
-                        f"Stock insuficiente para {den.valor} {moneda.codigo}. Disponible: {inv.cantidad}."
-                    )
-                    return redirect(f"{request.path}?moneda={moneda.id}")
-
-        # Aplica movimientos e inventario
-        for den, q in cantidades:
-            inv, _ = _inv_get_or_create(den, ubicacion, for_update=True)
-            inv.cantidad = inv.cantidad + signo * q
-            inv.save()
-
-            TedMovimiento.objects.create(
-                denominacion=den,
-                delta=signo * q,
-                motivo=motivo,
-                creado_por=request.user,
-                transaccion_ref="",  # mock
+        # Aplica inventario y movimientos; en COMPRA el UPDATE condicional valida el stock
+        try:
+            aplicar_desglose(
+                ubicacion,
+                [(den.id, signo * q) for den, q in cantidades],
+                motivo,
+                usuario=request.user,
+                referencia="",  # mock
+            )
+        except StockInsuficiente as exc:
+            den = next(d for d, _ in cantidades if d.id == exc.denominacion_id)
+            messages.error(
+                request,
+                f"Stock insuficiente para {den.valor} {moneda.codigo}. Disponible: {exc.disponible}."
             )
+            return redirect(f"{request.path}?moneda={moneda.id}")
 
         # Guarda ticket en sesión
         request.session["ted_ticket"] = {
@@ -375,26 +363,17 @@ def inventario(request):
     Flujo general:
     ----------------
     1. Verifica permisos TED mediante `_check_inv_perm`.
-    2. Obtiene filtro de ubicación y todas las ubicaciones disponibles.
-    3. Construye queryset de denominaciones activas y ordena por moneda y valor.
-    4. Filtra por moneda si se especifica en GET.
-    5. Construye queryset base de inventario (filtrando por denominaciones activas
-       y monedas visibles en terminal) y aplica filtro de ubicación si existe.
-    6. Genera lista de monedas presentes en el inventario para mostrar en filtros.
-    7. Asigna un emoji a cada moneda para visualización, usando campo `emoji` o
-       mapeo por código.
-    8. Agrupa el inventario:
-       - Si hay filtro de ubicación: muestra un grupo por moneda con items (denominación + stock)
-       - Si no hay filtro de ubicación: muestra todas las ubicaciones, creando secciones
-         por moneda y por ubicación
-    9. Prepara contexto con serial TED, grupos, ubicaciones y filtros aplicados.
-    10. Renderiza plantilla `admin_inventario.html`.
+    2. Obtiene filtros de ubicación y moneda.
+    3. Toma la matriz de inventario vigente (:func:`ted.matriz.obtener_matriz`).
+    4. Recorta de la matriz las ubicaciones, las monedas presentes en el
+       inventario y los grupos por moneda (y por ubicación si no hay filtro),
+       con totales de billetes y monto.
+    5. Renderiza plantilla `admin_inventario.html`.
 
     Notas de diseño:
     ----------------
-    - `_inv_filter_by_ubicacion` centraliza la lógica de filtrado por ubicación.
-    - Agrupamiento por moneda facilita la visualización en tablas o secciones.
-    - Se maneja caso FieldError para modelos sin campo 'ubicacion'.
+    - La matriz se arma con una sola consulta agrupada y queda en caché hasta
+      la próxima mutación de stock; esta vista no consulta el inventario.
     - Se distinguen filtros aplicados para marcar visualmente en la interfaz.
     - La función no modifica datos, solo construye el contexto para renderizar.
 
@@ -404,87 +383,20 @@ def inventario(request):
     resp = _check_inv_perm(request)
     if resp:
         return resp
-    
-    ubicacion_sel = (request.GET.get("ubicacion") or "").strip() or None  # None = sin filtro
-    ubicaciones_todas = _inv_distinct_ubicaciones()
 
-    den_qs = (
-        TedDenominacion.objects
-        .filter(activa=True, moneda__admite_terminal=True)
-        .select_related("moneda")
-        .order_by("moneda__codigo", "valor")
-    )
-
-        # --- Filtro por moneda ---
+    ubicacion_sel = (request.GET.get("ubicacion") or "").strip() or None  # None = sin filtro
     moneda_sel = (request.GET.get("moneda") or "").strip() or None
+    matriz = obtener_matriz()
 
+    ubicaciones_todas = list(matriz.ubicaciones) or [TED_DIRECCION]
     # Monedas que existen en inventario (respetando ubicación si se eligió)
-    inv_qs_base = TedInventario.objects.filter(
-        denominacion__activa=True,
-        denominacion__moneda__admite_terminal=True,
-    )
-    if ubicacion_sel:
-        inv_qs_base = _inv_filter_by_ubicacion(inv_qs_base, ubicacion_sel)
-
-    mon_ids = inv_qs_base.values_list("denominacion__moneda_id", flat=True).distinct()
-    monedas_filtro = list(Moneda.objects.filter(id__in=mon_ids).order_by("codigo"))
-
-    # Emoji display: usa campo 'emoji' si existe; si no, mapea por código
-    EMOJI_MAP = {
-        "USD": "🇺🇸", "EUR": "🇪🇺", "BRL": "🇧🇷", "ARS": "🇦🇷",
-        "CLP": "🇨🇱", "PEN": "🇵🇪", "UYU": "🇺🇾", "JPY": "🇯🇵", "GBP": "🇬🇧",
-    }
-    for m in monedas_filtro:
-        setattr(m, "emoji_display", getattr(m, "emoji", EMOJI_MAP.get(m.codigo.upper(), "💱")))
-
-    # Si eligieron una moneda, filtra las denominaciones
-    if moneda_sel:
-        den_qs = den_qs.filter(moneda__codigo__iexact=moneda_sel)
-
-    grupos = []
+    monedas_filtro = matriz.monedas_con_inventario(ubicacion_sel)
+    grupos = matriz.grupos(ubicacion=ubicacion_sel, moneda=moneda_sel)
 
     if ubicacion_sel:
-        inv_qs = TedInventario.objects.filter(denominacion__in=den_qs)
-        inv_qs = _inv_filter_by_ubicacion(inv_qs, ubicacion_sel)
-        inv_map = {i.denominacion_id: i for i in inv_qs}
-
-        actual = None
-        for den in den_qs:
-            if not actual or actual["moneda"].id != den.moneda_id:
-                actual = {"moneda": den.moneda, "items": []}
-                grupos.append(actual)
-            stock = inv_map.get(den.id)
-            actual["items"].append({"den": den, "stock": stock.cantidad if stock else 0})
-
         direccion_label = ubicacion_sel
         filtro_aplicado = True
     else:
-        # Todas las ubicaciones
-        try:
-            rows = (TedInventario.objects.filter(denominacion__in=den_qs)
-                    .values("denominacion_id", "ubicacion", "cantidad"))
-            inv_por_ubi = {}
-            for r in rows:
-                u = r.get("ubicacion") or TED_DIRECCION
-                inv_por_ubi.setdefault(u, {})[r["denominacion_id"]] = r["cantidad"]
-        except FieldError:
-            inv_map = {i.denominacion_id: i.cantidad for i in TedInventario.objects.filter(denominacion__in=den_qs)}
-            inv_por_ubi = {TED_DIRECCION: inv_map}
-
-        ubic_list = sorted(inv_por_ubi.keys())
-        moneda_denominaciones = {}
-        for den in den_qs:
-            moneda_denominaciones.setdefault(den.moneda_id, []).append(den)
-
-        for moneda_id, dens in moneda_denominaciones.items():
-            moneda = dens[0].moneda
-            grupo = {"moneda": moneda, "secciones": []}
-            for ubic in ubic_list:
-                mapa = inv_por_ubi.get(ubic, {})
-                items = [{"den": den, "stock": mapa.get(den.id, 0)} for den in dens]
-                grupo["secciones"].append({"ubicacion": ubic, "items": items})
-            grupos.append(grupo)
-
         direccion_label = "Todas las ubicaciones"
         filtro_aplicado = False
 
@@ -531,7 +443,7 @@ def inventario_ajustar(request, den_id: int):
         TedDenominacion.objects.select_related("moneda"),
         pk=den_id, activa=True
     )
-    inv, _ = _inv_get_or_create(den, ubicacion, for_update=True)
+    inv, _ = _inv_get_or_create(den, ubicacion)
 
     if request.method == "POST":
         form = AjusteInventarioForm(request.POST)
@@ -540,20 +452,14 @@ def inventario_ajustar(request, den_id: int):
             motivo = form.cleaned_data["motivo"]
             comentario = form.cleaned_data.get("comentario") or ""
 
-            nuevo = inv.cantidad + delta
-            if nuevo < 0:
+            try:
+                aplicar_desglose(
+                    ubicacion, [(den.id, delta)], motivo,
+                    usuario=request.user, referencia=comentario,
+                )
+            except StockInsuficiente:
                 messages.error(request, "El ajuste dejaría el stock negativo.")
             else:
-                inv.cantidad = nuevo
-                inv.save()
-
-                TedMovimiento.objects.create(
-                    denominacion=den,
-                    delta=delta,
-                    motivo=motivo,
-                    creado_por=request.user,
-                    transaccion_ref=comentario[:64],
-                )
                 messages.success(request, "Ajuste aplicado correctamente.")
                 if request.GET.get("ubicacion"):
                     return redirect(f"{request.build_absolute_uri('/admin_panel/ted/inventario/')}?ubicacion={ubicacion}")
@@ -571,31 +477,36 @@ def inventario_ajustar(request, den_id: int):
 @login_required
 def inventario_movimientos(request):
     """
-    Crear nueva denominación en inventario TED.
+    Lista los últimos movimientos de inventario TED.
 
-    Flujo:
-    1. Formulario de denominación y cantidad inicial
-    2. Validación de datos
-    3. Guardado en TedDenominacion y TedInventario
-    4. Registro inicial en TedMovimiento
-    5. Mensaje de éxito y redirect al inventario
+    Parámetros:
+        - GET 'ubicacion' (opcional): muestra sólo los movimientos de esa ubicación.
 
     :param request: HttpRequest
-    :return: Render de 'ted/admin_crear.html' o redirect
+    :return: Render de 'ted/admin_movimientos.html'
     """
     resp = _check_inv_perm(request)
     if resp:
         return resp
 
+    ubicacion = (request.GET.get("ubicacion") or "").strip()
     movs = (
         TedMovimiento.objects
         .select_related("denominacion", "denominacion__moneda", "creado_por")
-        .order_by("-created_at")[:200]
+        .order_by("-created_at", "-id")
     )
+    if ubicacion:
+        movs = movs.filter(ubicacion=ubicacion)
     return render(
         request,
         "ted/admin_movimientos.html",
-        {"movs": movs, "serial": TED_SERIAL, "direccion": TED_DIRECCION},
+        {
+            "movs": movs[:200],
+            "serial": TED_SERIAL,
+            "direccion": ubicacion or TED_DIRECCION,
+            "ubicaciones": _inv_distinct_ubicaciones(),
+            "ubicacion_sel": ubicacion,
+        },
     )
 
 
@@ -773,7 +684,9 @@ def crear_stock(request):
             if motivo_ajuste is not None and cantidad != 0:
                 TedMovimiento.objects.create(
                     denominacion=den,
+                    ubicacion=ubicacion,
                     delta=cantidad,
+                    saldo=cantidad,
                     motivo=motivo_ajuste,
                     creado_por=request.user,
                     transaccion_ref=f"CREAR_STOCK[{ubicacion}]",
@@ -889,7 +802,9 @@ def eliminar_denominacion(request, den_id: int):
                 try:
                     TedMovimiento.objects.create(
                         denominacion=den,
+                        ubicacion=inv.ubicacion,
                         delta=-inv.cantidad,
+                        saldo=0,
                         motivo=motivo_ajuste,
                         creado_por=request.user,
                         transaccion_ref=f"ELIMINAR_DENOMINACION_GLOBAL[{den.moneda.codigo}]",
@@ -922,7 +837,9 @@ def eliminar_denominacion(request, den_id: int):
             if motivo_ajuste is not None:
                 TedMovimiento.objects.create(
                     denominacion=den,
+                    ubicacion=inv.ubicacion,
                     delta=delta,
+                    saldo=0,
                     motivo=motivo_ajuste,
                     creado_por=request.user,
                     transaccion_ref=f"ELIMINAR_DENOMINACION[{ubicacion}]",
@@ -1031,7 +948,9 @@ def eliminar_moneda(request, moneda_id: int):
             try:
                 TedMovimiento.objects.create(
                     denominacion=inv.denominacion,
+                    ubicacion=inv.ubicacion,
                     delta=-inv.cantidad,
+                    saldo=0,
                     motivo=motivo_ajuste,
                     creado_por=request.user,
                     transaccion_ref=f"ELIMINAR_MONEDA[{moneda.codigo}]",
@@ -1048,6 +967,7 @@ def eliminar_moneda(request, moneda_id: int):
 
     # Bloque 2: desactivar denominaciones para preservar historial (no las borramos por si están referenciadas)
     den_qs.update(activa=False)
+    invalidar_matriz()  # update() no emite post_save
 
     # Bloque 3: ocultar la moneda del terminal
     if getattr(moneda, "admite_terminal", None) is not None and moneda.admite_terminal:
@@ -1068,24 +988,7 @@ def monedas_disponibles(request):
     Parámetro: ?ubicacion=...
     """
     ubicacion = (request.GET.get("ubicacion") or TED_DIRECCION).strip()
-
-    qs = (
-        TedInventario.objects
-        .filter(
-            cantidad__gt=0,
-            denominacion__activa=True,
-            denominacion__moneda__admite_terminal=True,
-        )
-        .exclude(denominacion__moneda__codigo__iexact="PYG")
-    )
-    qs = _inv_filter_by_ubicacion(qs, ubicacion)
-    qs = (qs
-        .select_related("denominacion__moneda")
-        .values_list("denominacion__moneda__codigo", flat=True)
-        .distinct()
-        .order_by("denominacion__moneda__codigo")
-    )
-    return JsonResponse({"monedas": list(qs)})
+    return JsonResponse({"monedas": obtener_matriz().monedas_con_stock(ubicacion)})
 
 
 @login_required  # ← solo login; sin permiso extra
@@ -0,0 +1,108 @@
+# transacciones/codigos.py
+"""
+Códigos de operación TAUSER.
+============================
+
+.. module:: transacciones.codigos
+   :synopsis: Emisión y normalización de ``Transaccion.codigo_operacion_tauser``.
+
+El cliente lee el código en pantalla y lo tipea en el kiosco TED, así que:
+
+- Se usa el alfabeto *Crockford base32* (``0-9`` y letras sin ``I``, ``L``, ``O``,
+  ``U``): sólo mayúsculas y sin caracteres que se confundan al leerlos.
+- Los códigos tienen :data:`LARGO_CUERPO` caracteres aleatorios (``secrets``) más
+  un dígito verificador Luhn mod 32, que detecta cualquier error de un carácter
+  y casi todas las transposiciones de dos caracteres vecinos.
+- Se guardan normalizados (:func:`normalizar_codigo`), de modo que las búsquedas
+  son ``codigo_operacion_tauser=<código normalizado>`` y usan el índice único
+  de la columna, en lugar de un ``iexact`` que recorre toda la tabla.
+
+La unicidad la garantiza la base: :func:`guardar_con_codigo_nuevo` inserta con un
+código recién generado y, si choca con uno existente, reintenta con otro dentro
+de un *savepoint*.
+
+Los códigos anteriores (prefijos de UUID como ``1b4e28ba-2d``) siguen siendo
+válidos; la migración ``0010`` sólo los pasa a mayúsculas.
+"""
+import secrets
+
+from django.db import IntegrityError, transaction
+
+ALFABETO = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+LARGO_CUERPO = 9
+LARGO_CODIGO = LARGO_CUERPO + 1
+
+# Con 32**9 códigos posibles un choque ya es improbable; varios seguidos indican otro problema.
+INTENTOS = 5
+
+_VALORES = {caracter: indice for indice, caracter in enumerate(ALFABETO)}
+
+
+def digito_verificador(cuerpo: str) -> str:
+    """
+    Dígito verificador Luhn mod N (N = ``len(ALFABETO)``) de ``cuerpo``.
+
+    :param cuerpo: caracteres de :data:`ALFABETO`.
+    """
+    base = len(ALFABETO)
+    suma = 0
+    factor = 2
+    for caracter in reversed(cuerpo):
+        sumando = factor * _VALORES[caracter]
+        suma += sumando // base + sumando % base
+        factor = 1 if factor == 2 else 2
+    return ALFABETO[(base - suma % base) % base]
+
+
+def generar_codigo() -> str:
+    """Código aleatorio de :data:`LARGO_CODIGO` caracteres con su dígito verificador."""
+    cuerpo = "".join(secrets.choice(ALFABETO) for _ in range(LARGO_CUERPO))
+    return cuerpo + digito_verificador(cuerpo)
+
+
+def normalizar_codigo(codigo) -> str:
+    """
+    Forma canónica de un código tipeado o guardado: sin espacios y en mayúsculas.
+
+    No reemplaza caracteres (``O`` → ``0``, etc.) porque los códigos anteriores
+    pueden contenerlos.
+    """
+    return "".join(str(codigo or "").split()).upper()
+
+
+def tiene_formato_emitido(codigo: str) -> bool:
+    """``True`` si ``codigo`` (normalizado) tiene el formato de :func:`generar_codigo`."""
+    return len(codigo) == LARGO_CODIGO and all(c in _VALORES for c in codigo)
+
+
+def verificador_valido(codigo: str) -> bool:
+    """``True`` si ``codigo`` (normalizado) tiene formato emitido y su dígito verificador coincide."""
+    return tiene_formato_emitido(codigo) and digito_verificador(codigo[:-1]) == codigo[-1]
+
+
+def guardar_con_codigo_nuevo(instancia, guardar, intentos: int = INTENTOS) -> None:
+    """
+    Asigna un código nuevo a ``instancia`` y ejecuta ``guardar()``; ante un choque
+    con un código existente reintenta con otro.
+
+    Cada intento corre en su propio *savepoint*, así que un ``IntegrityError``
+    no invalida la transacción externa. Los ``IntegrityError`` que no se deben
+    al código se propagan sin reintentar.
+
+    :param instancia: :class:`~transacciones.models.Transaccion` sin guardar.
+    :param guardar: callable que hace el ``INSERT``.
+    :param intentos: cantidad máxima de códigos a probar.
+    """
+    modelo = type(instancia)
+    for intento in range(1, intentos + 1):
+        instancia.codigo_operacion_tauser = generar_codigo()
+        try:
+            with transaction.atomic():
+                guardar()
+            return
+        except IntegrityError:
+            choco = modelo._default_manager.filter(
+                codigo_operacion_tauser=instancia.codigo_operacion_tauser
+            ).exists()
+            if not choco or intento == intentos:
+                raise
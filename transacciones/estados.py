@@ -0,0 +1,184 @@
+# transacciones/estados.py
+"""
+Máquina de estados de :class:`~transacciones.models.Transaccion`.
+=================================================================
+
+.. module:: transacciones.estados
+   :synopsis: Tabla de transiciones permitidas y cambios de estado con control optimista.
+
+Los cambios de estado llegan por caminos concurrentes (webhooks de pago, kiosco
+TED, tareas de facturación, el propio cliente desde la web). Un
+``tx.estado = ...; tx.save()`` sobre una instancia leída antes puede pisar el
+cambio que otro camino confirmó en el medio.
+
+:func:`transicionar` aplica el cambio con un único ``UPDATE`` condicional::
+
+    UPDATE ... SET estado = <destino>, version = version + 1
+     WHERE id = <id> AND estado = <origen> AND version = <n>
+
+donde ``<origen>`` y ``<n>`` son los de la instancia. Si otra escritura ganó
+antes, el ``UPDATE`` no afecta filas y el resultado lo informa
+(:attr:`ResultadoTransicion.aplicada` en ``False``, motivo ``conflicto``), sin
+bloquear la fila mientras se decide. :meth:`Transaccion.save` aplica la misma
+condición sobre ``version`` (o lanza
+:class:`~transacciones.models.ConflictoVersion`) y la incrementa, así que
+cualquier escritura intermedia invalida las instancias leídas antes.
+
+Las transiciones que no están en :data:`TRANSICIONES` no se intentan (motivo
+``no_permitida``).
+
+Como un ``UPDATE`` no pasa por ``save()``, :func:`transicionar`:
+
+- mueve :class:`~transacciones.models.ExposicionCliente` cuando el cambio la afecta;
+- registra los eventos de la bandeja de salida (:mod:`transacciones.outbox`) en
+  la misma transacción;
+- emite ``post_save`` igual que ``save(update_fields=...)``, para los receptores
+  existentes.
+
+Cada intento (ganado o no) emite :data:`transacciones.signals.transicion_estado`
+con su duración, como punto de enganche para medir cada transición.
+"""
+import logging
+from dataclasses import dataclass
+from time import perf_counter
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .limites import ESTADOS_SIN_EXPOSICION, aplicar_exposicion, aportes_guardados
+from .outbox import registrar_eventos
+from .signals import transicion_estado
+
+logger = logging.getLogger(__name__)
+
+_CANCELACIONES = ("cancelada", "cancelada_usuario_tasa", "cancelada_tasa_expirada", "error")
+
+# origen -> destinos permitidos. Los estados que no aparecen como origen son finales.
+TRANSICIONES = {
+    "pendiente_confirmacion_pago": frozenset({"pendiente_pago_cliente", *_CANCELACIONES}),
+    "pendiente_pago_stripe": frozenset({"pendiente_retiro_tauser", *_CANCELACIONES}),
+    "pendiente_pago_cliente": frozenset({
+        "pendiente_retiro_tauser", "procesando_acreditacion", "completada", *_CANCELACIONES,
+    }),
+    "pendiente_deposito_tauser": frozenset({"procesando_acreditacion", *_CANCELACIONES}),
+    "pendiente_retiro_tauser": frozenset({"completada", "anulada", "error"}),
+    "procesando_acreditacion": frozenset({"completada", "anulada", "error"}),
+    "completada": frozenset({"anulada"}),
+}
+
+APLICADA = "aplicada"
+NO_PERMITIDA = "no_permitida"
+CONFLICTO = "conflicto"
+
+# Campos que, además del estado, cambian el aporte a la exposición del cliente.
+_CAMPOS_EXPOSICION = frozenset({
+    "cliente", "cliente_id", "fecha_creacion",
+    "moneda_origen", "moneda_origen_id", "monto_origen",
+    "moneda_destino", "moneda_destino_id", "monto_destino",
+    "tasa_cambio_aplicada",
+})
+
+
+@dataclass(frozen=True)
+class ResultadoTransicion:
+    """
+    Resultado de :func:`transicionar`.
+
+    :param aplicada: ``True`` si este intento cambió el estado.
+    :param motivo: :data:`APLICADA`, :data:`NO_PERMITIDA` o :data:`CONFLICTO`.
+    :param origen: Estado esperado (el de la instancia al intentar).
+    :param destino: Estado pedido.
+    :param estado: Estado guardado después del intento.
+    :param version: Versión guardada después del intento.
+    :param duracion: Segundos que tomó el intento.
+    """
+    aplicada: bool
+    motivo: str
+    origen: str
+    destino: str
+    estado: str
+    version: int
+    duracion: float
+
+    def __bool__(self):
+        return self.aplicada
+
+
+def puede_transicionar(origen: str, destino: str) -> bool:
+    """``True`` si :data:`TRANSICIONES` permite pasar de ``origen`` a ``destino``."""
+    return destino in TRANSICIONES.get(origen, ())
+
+
+def _afecta_exposicion(origen, destino, campos) -> bool:
+    sin_antes = origen in ESTADOS_SIN_EXPOSICION
+    sin_despues = destino in ESTADOS_SIN_EXPOSICION
+    if sin_antes and sin_despues:
+        return False
+    return sin_antes != sin_despues or bool(_CAMPOS_EXPOSICION & set(campos))
+
+
+def transicionar(transaccion, destino: str, *, desde=None, campos=None) -> ResultadoTransicion:
+    """
+    Pasa ``transaccion`` a ``destino`` si nadie la modificó desde que se leyó.
+
+    Si se aplica, la instancia queda con el nuevo estado, versión y ``campos``;
+    si hubo conflicto, se recargan ``estado`` y ``version`` para que quien llama
+    pueda decidir con el estado actual.
+
+    :param transaccion: Instancia leída de la base.
+    :param destino: Estado nuevo.
+    :param desde: Estados de origen aceptados por quien llama (además de la tabla).
+    :param campos: Otros campos a escribir en el mismo ``UPDATE`` (``nombre -> valor``).
+    :returns: :class:`ResultadoTransicion`.
+    """
+    inicio = perf_counter()
+    origen = transaccion.estado
+    campos = dict(campos or {})
+
+    if not puede_transicionar(origen, destino) or (desde is not None and origen not in desde):
+        motivo = NO_PERMITIDA
+    else:
+        modelo = type(transaccion)
+        with transaction.atomic():
+            afecta = _afecta_exposicion(origen, destino, campos)
+            anteriores = aportes_guardados(transaccion.pk) if afecta else {}
+            ahora = timezone.now()
+            filas = (modelo.objects
+                     .filter(pk=transaccion.pk, estado=origen, version=transaccion.version)
+                     .update(estado=destino, version=F("version") + 1, fecha_actualizacion=ahora, **campos))
+            if filas:
+                if afecta:
+                    aplicar_exposicion(anteriores, aportes_guardados(transaccion.pk))
+                registrar_eventos([(transaccion.pk, origen, destino)])
+                transaccion.estado = destino
+                transaccion._estado_original = destino
+                transaccion.version += 1
+                transaccion.fecha_actualizacion = ahora
+                for nombre, valor in campos.items():
+                    setattr(transaccion, nombre, valor)
+                post_save.send(
+                    sender=modelo, instance=transaccion, created=False, raw=False,
+                    using=transaccion._state.db,
+                    update_fields=frozenset({"estado", "version", "fecha_actualizacion", *campos}),
+                )
+        if filas:
+            motivo = APLICADA
+        else:
+            motivo = CONFLICTO
+            transaccion.refresh_from_db(fields=["estado", "version"])
+
+    resultado = ResultadoTransicion(
+        aplicada=motivo == APLICADA,
+        motivo=motivo,
+        origen=origen,
+        destino=destino,
+        estado=transaccion.estado,
+        version=transaccion.version,
+        duracion=perf_counter() - inicio,
+    )
+    logger.debug("Transacción %s: %s -> %s %s en %.1f ms",
+                 transaccion.pk, origen, destino, motivo, resultado.duracion * 1000)
+    transicion_estado.send(sender=type(transaccion), transaccion=transaccion, resultado=resultado)
+    return resultado
@@ -0,0 +1,95 @@
+# transacciones/expiracion.py
+"""
+Vencimiento de tasas garantizadas.
+==================================
+
+.. module:: transacciones.expiracion
+   :synopsis: Barrido periódico que cancela las transacciones con tasa bloqueada vencida.
+
+Antes, una transacción con tasa bloqueada vencida seguía guardada como
+``pendiente_pago_cliente``/``pendiente_deposito_tauser`` y sólo se veía como
+cancelada a través de :attr:`Transaccion.estado_dinamico`, que se evalúa en
+Python fila por fila en cada listado.
+
+:func:`expirar_tasas_vencidas` (tarea
+:func:`transacciones.tasks.expirar_tasas_vencidas_task`) las pasa a
+``cancelada_tasa_expirada`` por lotes: cada lote toma los IDs con
+``SELECT ... FOR UPDATE SKIP LOCKED`` sobre el índice parcial
+``idx_tx_tasa_garantizada``, descuenta su aporte de
+:class:`~transacciones.models.ExposicionCliente` y aplica **un** ``UPDATE``.
+
+Los ``UPDATE`` en bloque no pasan por :meth:`Transaccion.save` ni emiten
+``post_save``: los eventos de la bandeja de salida (:mod:`transacciones.outbox`)
+se registran con un ``INSERT`` por lote, y al terminar se envía una única señal
+:data:`transacciones.signals.tasas_expiradas` con todos los IDs afectados.
+"""
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .limites import aplicar_exposicion, aportes_guardados_en_lote
+from .models import ESTADOS_CON_TASA_GARANTIZADA, Transaccion
+from .outbox import registrar_eventos
+from .signals import tasas_expiradas
+
+ESTADO_EXPIRADA = "cancelada_tasa_expirada"
+
+
+def filtro_tasa_vencida(ahora=None) -> Q:
+    """Transacciones pendientes con tasa bloqueada vencida a ``ahora`` (cubierto por el índice parcial)."""
+    return Q(
+        estado__in=ESTADOS_CON_TASA_GARANTIZADA,
+        modalidad_tasa="bloqueada",
+        tasa_garantizada_hasta__isnull=False,
+        tasa_garantizada_hasta__lt=ahora or timezone.now(),
+    )
+
+
+def _expirar_lote(ahora, lote):
+    """Cancela hasta ``lote`` transacciones vencidas; devuelve ``(ids, dias)``."""
+    with transaction.atomic():
+        filas = list(
+            Transaccion.objects
+            .filter(filtro_tasa_vencida(ahora))
+            .select_for_update(skip_locked=True)
+            .order_by()
+            .values_list("pk", "fecha_creacion", "estado")[:lote]
+        )
+        if not filas:
+            return [], set()
+
+        ids = [pk for pk, _, _ in filas]
+        aplicar_exposicion(aportes_guardados_en_lote(ids), {})
+        Transaccion.objects.filter(pk__in=ids).update(
+            estado=ESTADO_EXPIRADA, version=F("version") + 1, fecha_actualizacion=ahora,
+        )
+        registrar_eventos((pk, estado, ESTADO_EXPIRADA) for pk, _, estado in filas)
+    return ids, {timezone.localdate(fecha) for _, fecha, _ in filas if fecha}
+
+
+def expirar_tasas_vencidas(ahora=None, lote: int = 500) -> int:
+    """
+    Pasa a ``cancelada_tasa_expirada`` todas las transacciones con tasa bloqueada vencida.
+
+    Cada lote se confirma por separado, así que el barrido no retiene bloqueos
+    sobre toda la tabla; las filas bloqueadas por otra operación (un webhook o el
+    kiosco confirmando en ese momento) se saltean y quedan para el próximo barrido.
+
+    :param ahora: Momento de referencia; por defecto, ahora.
+    :param lote: Cantidad máxima de transacciones por ``UPDATE``.
+    :returns: Cantidad de transacciones canceladas.
+    """
+    ahora = ahora or timezone.now()
+    todos, dias = [], set()
+    while True:
+        ids, dias_lote = _expirar_lote(ahora, lote)
+        todos.extend(ids)
+        dias |= dias_lote
+        if len(ids) < lote:
+            break
+
+    if todos:
+        transaction.on_commit(lambda: tasas_expiradas.send(
+            sender=Transaccion, ids=todos, dias=sorted(dias),
+        ))
+    return len(todos)
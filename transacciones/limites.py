@@ -0,0 +1,309 @@
+# transacciones/limites.py
+"""
+Motor de límites transaccionales en PYG.
+========================================
+
+.. module:: transacciones.limites
+   :synopsis: Exposición diaria/mensual de un cliente leída de acumulados materializados.
+
+Centraliza la lógica que antes estaba repartida entre
+:meth:`transacciones.models.Transaccion.clean` (dos agregados separados) y
+:func:`core.utils.validar_limite_transaccion` (una simulación por transacción).
+
+Cada transacción aporta su monto en PYG, calculado con los valores guardados en la
+propia fila:
+
+- origen PYG  → ``monto_origen``
+- destino PYG → ``monto_destino``
+- otro caso   → ``monto_origen * tasa_cambio_aplicada``
+
+Las operaciones canceladas, anuladas o con error no consumen límite.
+
+Los aportes se acumulan en :class:`transacciones.models.ExposicionCliente` (una
+fila por cliente y día, otra por cliente y mes) al guardar o eliminar cada
+transacción, así que validar un límite es leer dos filas por índice, sin importar
+cuántas transacciones tenga el cliente. :func:`reconstruir_exposicion` recalcula
+los acumulados desde el historial.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Q, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from configuracion.models import TransactionLimit
+
+BASE_CODIGO = "PYG"
+
+# Estados que no cuentan para el acumulado del cliente.
+ESTADOS_SIN_EXPOSICION = (
+    "cancelada",
+    "cancelada_usuario_tasa",
+    "cancelada_tasa_expirada",
+    "anulada",
+    "error",
+)
+
+_DECIMAL = DecimalField(max_digits=20, decimal_places=4)
+_CUATRO_DECIMALES = Decimal("0.0001")
+
+
+def monto_pyg_expresion():
+    """Expresión SQL con el monto de cada transacción expresado en PYG."""
+    return Case(
+        When(moneda_origen__codigo=BASE_CODIGO, then=F("monto_origen")),
+        When(moneda_destino__codigo=BASE_CODIGO, then=F("monto_destino")),
+        default=ExpressionWrapper(F("monto_origen") * F("tasa_cambio_aplicada"), output_field=_DECIMAL),
+        output_field=_DECIMAL,
+    )
+
+
+def _monto_pyg(codigo_origen, codigo_destino, monto_origen, monto_destino, tasa) -> Decimal:
+    if codigo_origen == BASE_CODIGO:
+        return Decimal(monto_origen)
+    if codigo_destino == BASE_CODIGO:
+        return Decimal(monto_destino)
+    return Decimal(monto_origen) * Decimal(tasa)
+
+
+def monto_en_pyg(transaccion) -> Decimal:
+    """Equivalente en Python de :func:`monto_pyg_expresion` para una instancia."""
+    return _monto_pyg(
+        transaccion.moneda_origen.codigo,
+        transaccion.moneda_destino.codigo,
+        transaccion.monto_origen,
+        transaccion.monto_destino,
+        transaccion.tasa_cambio_aplicada,
+    )
+
+
+def _claves_periodo(dia):
+    """Fechas que identifican el día y el mes de ``dia`` en ``ExposicionCliente``."""
+    return (("dia", dia), ("mes", dia.replace(day=1)))
+
+
+def aportes_guardados(transaccion_id) -> dict:
+    """
+    Aporte a la exposición de la transacción **tal como está guardada**.
+
+    :param transaccion_id: ID de la transacción.
+    :returns: ``{(cliente_id, periodo, fecha): monto_pyg}``; vacío si la
+        transacción no existe o su estado no consume límite.
+    """
+    return aportes_guardados_en_lote([transaccion_id])
+
+
+def aportes_guardados_en_lote(transaccion_ids) -> dict:
+    """
+    Suma de los aportes guardados de varias transacciones, leídos en una consulta.
+
+    :param transaccion_ids: IDs de las transacciones.
+    :returns: El mismo formato que :func:`aportes_guardados`.
+    """
+    from transacciones.models import Transaccion
+
+    filas = (Transaccion.objects
+             .filter(pk__in=transaccion_ids)
+             .values_list("cliente_id", "estado", "fecha_creacion",
+                          "moneda_origen__codigo", "moneda_destino__codigo",
+                          "monto_origen", "monto_destino", "tasa_cambio_aplicada"))
+    aportes = defaultdict(Decimal)
+    for cliente_id, estado, fecha_creacion, *montos in filas:
+        if estado in ESTADOS_SIN_EXPOSICION or fecha_creacion is None:
+            continue
+        monto = _monto_pyg(*montos).quantize(_CUATRO_DECIMALES)
+        dia = timezone.localdate(fecha_creacion)
+        for periodo, fecha in _claves_periodo(dia):
+            aportes[(cliente_id, periodo, fecha)] += monto
+    return dict(aportes)
+
+
+def _sumar_exposicion(cliente_id, periodo, fecha, delta) -> None:
+    from transacciones.models import ExposicionCliente
+
+    filas = ExposicionCliente.objects.filter(cliente_id=cliente_id, periodo=periodo, fecha=fecha)
+    if filas.update(monto_pyg=F("monto_pyg") + delta):
+        return
+    try:
+        with transaction.atomic():
+            ExposicionCliente.objects.create(
+                cliente_id=cliente_id, periodo=periodo, fecha=fecha, monto_pyg=delta
+            )
+    except IntegrityError:
+        # Otra transacción creó la fila en paralelo: sumar sobre ella.
+        filas.update(monto_pyg=F("monto_pyg") + delta)
+
+
+def aplicar_exposicion(anteriores: dict, nuevos: dict) -> None:
+    """
+    Mueve los acumulados de ``ExposicionCliente`` de ``anteriores`` a ``nuevos``
+    (ambos con el formato de :func:`aportes_guardados`).
+
+    Sólo se escriben las claves cuya diferencia no es cero; el ``UPDATE`` con
+    ``F()`` bloquea la fila hasta el commit, así que dos operaciones simultáneas
+    del mismo cliente no se pisan.
+    """
+    deltas = defaultdict(Decimal)
+    for clave, monto in nuevos.items():
+        deltas[clave] += monto
+    for clave, monto in anteriores.items():
+        deltas[clave] -= monto
+    for (cliente_id, periodo, fecha), delta in deltas.items():
+        if delta:
+            _sumar_exposicion(cliente_id, periodo, fecha, delta)
+
+
+def obtener_limite():
+    """Devuelve el :class:`TransactionLimit` de la moneda base o ``None``."""
+    return TransactionLimit.objects.filter(moneda__codigo=BASE_CODIGO).first()
+
+
+def exposicion_cliente(cliente, excluir_id=None, momento=None) -> dict:
+    """
+    Acumulado en PYG del cliente para el día y el mes en curso.
+
+    Lee las dos filas de :class:`~transacciones.models.ExposicionCliente` en una
+    sola consulta por índice.
+
+    :param cliente: Cliente (instancia o pk).
+    :param excluir_id: ID de una transacción a ignorar (la que se está validando);
+        su aporte guardado se descuenta con una consulta adicional.
+    :param momento: Fecha/hora de referencia; por defecto, ahora.
+    :returns: ``{'dia': Decimal, 'mes': Decimal}``
+    """
+    from transacciones.models import ExposicionCliente
+
+    cliente_id = getattr(cliente, "pk", cliente)
+    claves = _claves_periodo(timezone.localdate(momento))
+    filtro = Q()
+    for periodo, fecha in claves:
+        filtro |= Q(periodo=periodo, fecha=fecha)
+
+    totales = dict(ExposicionCliente.objects
+                   .filter(filtro, cliente_id=cliente_id)
+                   .values_list("periodo", "monto_pyg"))
+    exposicion = {periodo: Decimal(totales.get(periodo) or 0) for periodo, _ in claves}
+
+    if excluir_id is not None:
+        for (otro_id, periodo, fecha), monto in aportes_guardados(excluir_id).items():
+            if str(otro_id) == str(cliente_id) and (periodo, fecha) in claves:
+                exposicion[periodo] -= monto
+    return exposicion
+
+
+def acumulados_exposicion(transacciones) -> dict:
+    """
+    Acumulados de ``transacciones`` por cliente, periodo y fecha, con una sola
+    consulta agrupada por cliente y día local (los meses se derivan en memoria).
+
+    La migración que crea :class:`~transacciones.models.ExposicionCliente` tiene
+    su propia copia congelada de este cálculo.
+
+    :param transacciones: QuerySet de transacciones (se excluyen las que no consumen límite).
+    :returns: ``{(cliente_id, periodo, fecha): monto_pyg}``.
+    """
+    filas = (transacciones
+             .exclude(estado__in=ESTADOS_SIN_EXPOSICION)
+             .annotate(dia=TruncDate("fecha_creacion", tzinfo=timezone.get_current_timezone()))
+             .values("cliente_id", "dia")
+             .annotate(total=Sum(monto_pyg_expresion()))
+             .order_by())
+
+    acumulados = defaultdict(Decimal)
+    for fila in filas:
+        if fila["dia"] is None:
+            continue
+        for periodo, fecha in _claves_periodo(fila["dia"]):
+            acumulados[(fila["cliente_id"], periodo, fecha)] += fila["total"] or Decimal("0")
+    return dict(acumulados)
+
+
+def reconstruir_exposicion(cliente=None) -> int:
+    """
+    Recalcula ``ExposicionCliente`` desde el historial de transacciones.
+
+    Calcula los acumulados con :func:`acumulados_exposicion` y reemplaza las
+    filas existentes dentro de una transacción.
+
+    :param cliente: Limita la reconstrucción a un cliente (instancia o pk).
+    :returns: Cantidad de filas creadas.
+    """
+    from transacciones.models import ExposicionCliente, Transaccion
+
+    qs = Transaccion.objects.all()
+    existentes = ExposicionCliente.objects.all()
+    if cliente is not None:
+        qs = qs.filter(cliente=cliente)
+        existentes = existentes.filter(cliente=cliente)
+
+    acumulados = acumulados_exposicion(qs)
+
+    with transaction.atomic():
+        existentes.delete()
+        ExposicionCliente.objects.bulk_create(
+            [
+                ExposicionCliente(cliente_id=cliente_id, periodo=periodo, fecha=fecha, monto_pyg=monto)
+                for (cliente_id, periodo, fecha), monto in acumulados.items()
+            ],
+            batch_size=1000,
+        )
+    return len(acumulados)
+
+
+def limite_restante(cliente, excluir_id=None, limite=None, exposicion=None) -> dict:
+    """
+    Cuánto puede operar todavía el cliente (en PYG).
+
+    :returns: Diccionario con:
+
+        - ``'limite'``: el :class:`TransactionLimit` aplicado (o ``None``).
+        - ``'exposicion'``: el resultado de :func:`exposicion_cliente`.
+        - ``'dia'`` / ``'mes'``: restante por período, ``None`` si no aplica.
+        - ``'disponible'``: el menor de los restantes aplicables, ``None`` si no hay límite.
+    """
+    if limite is None:
+        limite = obtener_limite()
+    if exposicion is None:
+        exposicion = exposicion_cliente(cliente, excluir_id=excluir_id)
+
+    restante_dia = restante_mes = None
+    if limite and limite.aplica_diario:
+        restante_dia = Decimal(limite.monto_diario) - exposicion["dia"]
+    if limite and limite.aplica_mensual:
+        restante_mes = Decimal(limite.monto_mensual) - exposicion["mes"]
+
+    aplicables = [r for r in (restante_dia, restante_mes) if r is not None]
+    return {
+        "limite": limite,
+        "exposicion": exposicion,
+        "dia": restante_dia,
+        "mes": restante_mes,
+        "disponible": min(aplicables) if aplicables else None,
+    }
+
+
+def validar_monto(cliente, monto_pyg, excluir_id=None, limite=None) -> None:
+    """
+    Lanza :class:`ValidationError` si ``monto_pyg`` supera el límite diario o mensual.
+    No valida nada si no hay límite configurado para PYG.
+    """
+    if limite is None:
+        limite = obtener_limite()
+    if not limite:
+        return
+
+    restante = limite_restante(cliente, excluir_id=excluir_id, limite=limite)
+    exposicion = restante["exposicion"]
+    monto_pyg = Decimal(monto_pyg)
+
+    if restante["dia"] is not None and monto_pyg > restante["dia"]:
+        raise ValidationError(
+            f"Límite diario excedido: {exposicion['dia'] + monto_pyg} / {limite.monto_diario} PYG"
+        )
+    if restante["mes"] is not None and monto_pyg > restante["mes"]:
+        raise ValidationError(
+            f"Límite mensual excedido: {exposicion['mes'] + monto_pyg} / {limite.monto_mensual} PYG"
+        )
@@ -7,6 +7,7 @@ from django.utils import timezone
 from django.db.models import Q
 
 from transacciones.models import Transaccion
+from transacciones.limites import reconstruir_exposicion
 
 
 class Command(BaseCommand):
@@ -220,6 +221,9 @@ class Command(BaseCommand):
             else:
                 self.stdout.write("\nNo se borrarán transacciones CLP (30% = 0).")
 
+            # Los borrados en bloque no pasan por Transaccion.delete().
+            reconstruir_exposicion()
+
         # ---------- Resumen final ----------
         self.stdout.write(self.style.SUCCESS(
             "\nAjuste completado.\n"
@@ -5,6 +5,7 @@ from django.db import transaction
 from django.db.models import Q
 
 from transacciones.models import Transaccion
+from transacciones.limites import reconstruir_exposicion
 
 
 class Command(BaseCommand):
@@ -82,6 +83,7 @@ class Command(BaseCommand):
         # 2) Borrado dentro de una transacción
         with transaction.atomic():
             borradas, _ = Transaccion.objects.filter(pk__in=ids_a_borrar).delete()
+            reconstruir_exposicion()
 
         self.stdout.write(self.style.SUCCESS(
             f"\nBorrado completado. Filas afectadas (incluye relacionadas): {borradas}.\n"
@@ -0,0 +1,34 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from clientes.models import Cliente
+from transacciones.limites import reconstruir_exposicion
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los acumulados diarios/mensuales en PYG (ExposicionCliente) "
+        "a partir del historial de transacciones.\n"
+        "Usar después de cargas o ajustes masivos que no pasan por Transaccion.save()."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cliente",
+            help="ID de un cliente; por defecto se reconstruyen todos.",
+        )
+
+    def handle(self, *args, **options):
+        cliente = None
+        if options["cliente"] is not None:
+            try:
+                cliente = Cliente.objects.get(pk=options["cliente"])
+            except (Cliente.DoesNotExist, ValidationError):
+                raise CommandError(f"No existe el cliente con ID {options['cliente']}.")
+
+        filas = reconstruir_exposicion(cliente=cliente)
+
+        alcance = f"cliente {cliente}" if cliente else "todos los clientes"
+        self.stdout.write(self.style.SUCCESS(
+            f"Exposición reconstruida para {alcance}: {filas} acumulados."
+        ))
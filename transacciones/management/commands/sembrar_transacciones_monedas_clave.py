@@ -9,6 +9,7 @@ from django.utils import timezone
 
 from monedas.models import Moneda
 from transacciones.models import Transaccion
+from transacciones.limites import reconstruir_exposicion
 from ganancias.models import RegistroGanancia
 
 
@@ -270,6 +271,9 @@ class Command(BaseCommand):
                 step_days = 1
                 dia_actual += timedelta(days=step_days)
 
+            # Las fechas se ajustaron con update(): recalcular acumulados de límites.
+            reconstruir_exposicion()
+
         self.stdout.write(self.style.SUCCESS(
             f"\nTransacciones simuladas creadas con éxito: {creadas} "
             f"(límite aplicado: max_total={max_total})."
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:35
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# Copias de transacciones.limites al momento de esta migración: cambios
+# posteriores allí no deben alterar lo que calcula el llenado inicial.
+ESTADOS_SIN_EXPOSICION = (
+    "cancelada",
+    "cancelada_usuario_tasa",
+    "cancelada_tasa_expirada",
+    "anulada",
+    "error",
+)
+_DECIMAL = DecimalField(max_digits=20, decimal_places=4)
+MONTO_PYG = Case(
+    When(moneda_origen__codigo="PYG", then=F("monto_origen")),
+    When(moneda_destino__codigo="PYG", then=F("monto_destino")),
+    default=ExpressionWrapper(F("monto_origen") * F("tasa_cambio_aplicada"), output_field=_DECIMAL),
+    output_field=_DECIMAL,
+)
+
+
+def poblar_exposicion(apps, schema_editor):
+    """
+    Carga los acumulados del historial existente (la misma consulta agrupada que
+    ``reconstruir_exposicion``), para que los límites sigan aplicando al migrar.
+    """
+    Transaccion = apps.get_model("transacciones", "Transaccion")
+    ExposicionCliente = apps.get_model("transacciones", "ExposicionCliente")
+
+    filas = (Transaccion.objects
+             .exclude(estado__in=ESTADOS_SIN_EXPOSICION)
+             .annotate(dia=TruncDate("fecha_creacion", tzinfo=timezone.get_current_timezone()))
+             .values("cliente_id", "dia")
+             .annotate(total=Sum(MONTO_PYG))
+             .order_by())
+    acumulados = defaultdict(Decimal)
+    for fila in filas:
+        if fila["dia"] is None:
+            continue
+        for periodo, fecha in (("dia", fila["dia"]), ("mes", fila["dia"].replace(day=1))):
+            acumulados[(fila["cliente_id"], periodo, fecha)] += fila["total"] or Decimal("0")
+
+    ExposicionCliente.objects.bulk_create(
+        [
+            ExposicionCliente(cliente_id=cliente_id, periodo=periodo, fecha=fecha, monto_pyg=monto)
+            for (cliente_id, periodo, fecha), monto in acumulados.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0006_medioacreditacion'),
+        ('transacciones', '0008_alter_transaccion_medio_acreditacion_cliente_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExposicionCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[('dia', 'Día'), ('mes', 'Mes')], max_length=3)),
+                ('fecha', models.DateField(help_text="Día (periodo 'dia') o primer día del mes (periodo 'mes').")),
+                ('monto_pyg', models.DecimalField(decimal_places=4, default=0, max_digits=20)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exposiciones', to='clientes.cliente')),
+            ],
+            options={
+                'verbose_name': 'Exposición de cliente',
+                'verbose_name_plural': 'Exposiciones de clientes',
+                'constraints': [models.UniqueConstraint(fields=('cliente', 'periodo', 'fecha'), name='uniq_exposicion_cliente_periodo_fecha')],
+            },
+        ),
+        migrations.RunPython(poblar_exposicion, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:50
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def _normalizar(codigo):
+    # Copia de transacciones.codigos.normalizar_codigo: quita todo espacio
+    # (también los internos, tabs y saltos de línea) y pasa a mayúsculas.
+    return "".join(str(codigo or "").split()).upper()
+
+
+def normalizar_codigos(apps, schema_editor):
+    """
+    Pasa los códigos existentes a la forma de ``transacciones.codigos.normalizar_codigo``,
+    para que las búsquedas exactas los encuentren.
+
+    Se recorre la tabla en Python porque la base de datos no tiene un equivalente
+    portable de ``str.split()``; sólo se escriben las filas que cambian.
+    """
+    Transaccion = apps.get_model("transacciones", "Transaccion")
+
+    codigos = Counter()
+    cambios = []
+    for pk, codigo in Transaccion.objects.values_list("pk", "codigo_operacion_tauser").iterator():
+        normalizado = _normalizar(codigo)
+        codigos[normalizado] += 1
+        if normalizado != codigo:
+            cambios.append(Transaccion(pk=pk, codigo_operacion_tauser=normalizado))
+
+    repetidos = sorted(codigo for codigo, n in codigos.items() if n > 1)
+    if repetidos:
+        raise RuntimeError(
+            "Hay códigos TAUSER que sólo difieren en mayúsculas/espacios: %s" % ", ".join(repetidos)
+        )
+
+    Transaccion.objects.bulk_update(cambios, ["codigo_operacion_tauser"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacciones', '0009_exposicioncliente'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaccion',
+            name='codigo_operacion_tauser',
+            field=models.CharField(blank=True, help_text='Código único para que el cliente opere en el Tauser. Se emite al crear la transacción (ver transacciones.codigos).', max_length=10, unique=True),
+        ),
+        migrations.RunPython(normalizar_codigos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacciones', '0010_normalizar_codigo_tauser'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(condition=models.Q(('estado__in', ('pendiente_pago_cliente', 'pendiente_deposito_tauser')), ('modalidad_tasa', 'bloqueada'), ('tasa_garantizada_hasta__isnull', False)), fields=['estado', 'tasa_garantizada_hasta'], name='idx_tx_tasa_garantizada'),
+        ),
+    ]
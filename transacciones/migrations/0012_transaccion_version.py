@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacciones', '0011_transaccion_idx_tasa_garantizada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaccion',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Se incrementa en cada escritura; ver transacciones.estados.'),
+        ),
+    ]
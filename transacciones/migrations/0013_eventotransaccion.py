@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacciones', '0012_transaccion_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoTransaccion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('manejador', models.CharField(help_text='Clave en transacciones.outbox.MANEJADORES.', max_length=30)),
+                ('estado_anterior', models.CharField(blank=True, help_text='Vacío si la transacción se creó.', max_length=30)),
+                ('estado', models.CharField(max_length=30)),
+                ('creado_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now, help_text='Se posterga tras cada fallo.')),
+                ('procesado_en', models.DateTimeField(blank=True, null=True)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('transaccion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='transacciones.transaccion')),
+            ],
+            options={
+                'verbose_name': 'Evento de transacción',
+                'verbose_name_plural': 'Eventos de transacciones',
+                'indexes': [models.Index(condition=models.Q(('procesado_en__isnull', True)), fields=['manejador', 'disponible_desde'], name='idx_evento_tx_pendiente'), models.Index(fields=['procesado_en'], name='idx_evento_tx_procesado')],
+            },
+        ),
+    ]
@@ -9,26 +9,39 @@ Este módulo define:
 
 - :class:`Transaccion`: Representa operaciones de compra/venta de divisa.
   Incluye montos, monedas, tasas de cambio, comisiones, estados, medios de acreditación y validación de límites.
+- :class:`ExposicionCliente`: Acumulados en PYG por cliente y día/mes, usados para validar límites.
+- :class:`EventoTransaccion`: Bandeja de salida (*outbox*) de efectos secundarios de cada transacción.
 """
-from django.db import models
+from django.db import DatabaseError, models, transaction
 from django.conf import settings
 from monedas.models import Moneda
 from clientes.models import Cliente 
 from operaciones.models import Tauser
 import uuid
 from django.core.exceptions import ValidationError
-from configuracion.models import TransactionLimit
-from django.db.models import Sum
 from django.utils.timezone import now
+from .limites import validar_monto, monto_en_pyg, aportes_guardados, aplicar_exposicion
+from .codigos import guardar_con_codigo_nuevo, normalizar_codigo
+from .outbox import registrar_eventos
 from pagos.models import TipoMedioPago
 from django.db.models import SET_NULL
 
+# Estados en los que se honra una tasa bloqueada hasta ``tasa_garantizada_hasta``.
+ESTADOS_CON_TASA_GARANTIZADA = ('pendiente_pago_cliente', 'pendiente_deposito_tauser')
+
 # Forward declaration for MedioAcreditacion
 class MedioAcreditacion(models.Model):
     class Meta:
         managed = False # This model is managed in the 'clientes' app
         db_table = 'clientes_medioacreditacion'
 
+class ConflictoVersion(DatabaseError):
+    """
+    ``save()`` de una transacción que otra escritura modificó después de leerla
+    (su ``version`` guardada ya no es la de la instancia).
+    """
+
+
 class Transaccion(models.Model):
     """
     Modelo que representa una operación de compra o venta de divisa.
@@ -130,7 +143,11 @@ class Transaccion(models.Model):
     )
 
     tauser_utilizado = models.ForeignKey(Tauser, on_delete=models.PROTECT, null=True, blank=True, help_text="Terminal donde se realizó el depósito/retiro físico.")
-    codigo_operacion_tauser = models.CharField(max_length=10, unique=True, help_text="Código único para que el cliente opere en el Tauser.")
+    codigo_operacion_tauser = models.CharField(max_length=10, unique=True, blank=True, help_text="Código único para que el cliente opere en el Tauser. Se emite al crear la transacción (ver transacciones.codigos).")
+    version = models.PositiveIntegerField(
+        default=0, editable=False,
+        help_text="Se incrementa en cada escritura; ver transacciones.estados.",
+    )
 
     # Timestamps
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -153,6 +170,15 @@ class Transaccion(models.Model):
         help_text="Define si la tasa es fija por un tiempo o indicativa."
     )
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Estado guardado, para registrar el cambio en la bandeja de salida (sin cargar campos diferidos).
+        self._estado_original = self.__dict__.get('estado')
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._estado_original = self.__dict__.get('estado')
+
     def __str__(self):
         return f"ID: {self.id} - {self.get_tipo_operacion_display()} para {self.cliente} [{self.get_estado_display()}]"
 
@@ -162,7 +188,7 @@ class Transaccion(models.Model):
         Verifica si la tasa garantizada ha expirado para una transacción pendiente.
         """
         if self.modalidad_tasa == 'bloqueada' and self.tasa_garantizada_hasta:
-            if self.estado in ['pendiente_pago_cliente', 'pendiente_deposito_tauser']:
+            if self.estado in ESTADOS_CON_TASA_GARANTIZADA:
                 return now() > self.tasa_garantizada_hasta
         return False
 
@@ -171,6 +197,9 @@ class Transaccion(models.Model):
         """
         Devuelve el estado 'cancelada_tasa_expirada' si la tasa ha expirado,
         de lo contrario, devuelve el estado actual.
+
+        Cubre el intervalo hasta que el barrido periódico
+        (:func:`transacciones.expiracion.expirar_tasas_vencidas`) cambia el estado guardado.
         """
         if self.is_tasa_expirada:
             return 'cancelada_tasa_expirada'
@@ -189,6 +218,18 @@ class Transaccion(models.Model):
         verbose_name = "Transacción"
         verbose_name_plural = "Transacciones"
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Sólo las filas que puede vencer el barrido (ver transacciones.expiracion).
+            models.Index(
+                fields=['estado', 'tasa_garantizada_hasta'],
+                name='idx_tx_tasa_garantizada',
+                condition=models.Q(
+                    estado__in=ESTADOS_CON_TASA_GARANTIZADA,
+                    modalidad_tasa='bloqueada',
+                    tasa_garantizada_hasta__isnull=False,
+                ),
+            ),
+        ]
     
     # ----------------------------
     # Validación de límites
@@ -200,44 +241,89 @@ class Transaccion(models.Model):
         Considera:
         - Límite diario y mensual del cliente.
         - Acumulado de transacciones previas (excluyendo la propia).
+
+        El acumulado se obtiene con una única consulta (ver :mod:`transacciones.limites`).
+        """
+        excluir_id = None if self._state.adding else self.id
+        validar_monto(self.cliente, monto_en_pyg(self), excluir_id=excluir_id)
+
+    # ----------------------------
+    # Exposición acumulada del cliente
+    # ----------------------------
+    def save(self, *args, **kwargs):
         """
-        limite = TransactionLimit.objects.filter(moneda__codigo="PYG").first()
-        if not limite:
-            return  # Si no hay límite configurado, no validamos
-
-        # --- 1. Calcular monto en PYG para esta transacción ---
-        if self.moneda_origen.codigo == "PYG":
-            monto_pyg = self.monto_origen
-        elif self.moneda_destino.codigo == "PYG":
-            monto_pyg = self.monto_destino
+        Guarda la transacción y actualiza :class:`ExposicionCliente` en la misma
+        transacción de base de datos.
+
+        Se compara el aporte guardado antes y después del ``save`` (estado, montos,
+        monedas, cliente o fecha), de modo que creaciones, cambios de estado y
+        cancelaciones mueven los acumulados sólo por la diferencia.
+
+        El ``codigo_operacion_tauser`` se guarda normalizado; si una transacción
+        nueva no trae código, se le emite uno con :mod:`transacciones.codigos`.
+
+        Los efectos secundarios (ganancias, facturación, notificaciones) no se
+        ejecutan acá: se registran en :class:`EventoTransaccion` dentro de la misma
+        transacción y los procesa :func:`transacciones.outbox.despachar_eventos`.
+
+        Una transacción existente sólo se escribe si nadie la modificó desde que
+        se leyó (misma ``version``); si no, se lanza :class:`ConflictoVersion` y
+        la fila queda como estaba. Los cambios de estado van por
+        :func:`transacciones.estados.transicionar`.
+        """
+        self.codigo_operacion_tauser = normalizar_codigo(self.codigo_operacion_tauser)
+        if self._state.adding and not self.codigo_operacion_tauser:
+            guardar_con_codigo_nuevo(self, lambda: self._guardar_con_exposicion(*args, **kwargs))
         else:
-            # Caso raro: ninguna moneda es PYG → convertir usando tasa
-            monto_pyg = self.monto_origen * self.tasa_cambio_aplicada
-
-        # --- 2. Calcular acumulados en PYG ---
-        hoy = now().date()
-        inicio_mes = hoy.replace(day=1)
-
-        acumulado_dia = Transaccion.objects.filter(
-            cliente=self.cliente,
-            fecha_creacion__date=hoy
-        ).exclude(id=self.id).aggregate(total=Sum("monto_destino"))["total"] or 0
-
-        acumulado_mes = Transaccion.objects.filter(
-            cliente=self.cliente,
-            fecha_creacion__date__gte=inicio_mes
-        ).exclude(id=self.id).aggregate(total=Sum("monto_destino"))["total"] or 0
-
-        # --- 3. Validaciones ---
-        if limite.aplica_diario and acumulado_dia + monto_pyg > limite.monto_diario:
-            raise ValidationError(
-                f"Límite diario excedido: {acumulado_dia + monto_pyg} / {limite.monto_diario} PYG"
-            )
+            self._guardar_con_exposicion(*args, **kwargs)
+
+    def _guardar_con_exposicion(self, *args, **kwargs):
+        adding = self._state.adding
+        # El UPDATE sólo aplica si la fila sigue en la versión leída (ver _do_update).
+        self._version_leida = None if adding else self.version
+        if not adding:
+            # Invalida las instancias leídas antes (ver transacciones.estados.transicionar).
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        try:
+            with transaction.atomic():
+                anteriores = {} if adding else aportes_guardados(self.pk)
+                super().save(*args, **kwargs)
+                aplicar_exposicion(anteriores, aportes_guardados(self.pk))
+                registrar_eventos([(self.pk, None if adding else self._estado_original, self.estado)])
+        except ConflictoVersion:
+            self.version = self._version_leida
+            raise
+        finally:
+            self._version_leida = None
+        self._estado_original = self.estado
 
-        if limite.aplica_mensual and acumulado_mes + monto_pyg > limite.monto_mensual:
-            raise ValidationError(
-                f"Límite mensual excedido: {acumulado_mes + monto_pyg} / {limite.monto_mensual} PYG"
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        """
+        ``UPDATE ... WHERE id = <id> AND version = <versión leída>``.
+
+        :raises ConflictoVersion: Si la fila existe pero otra escritura cambió su versión.
+        """
+        version = getattr(self, '_version_leida', None)
+        if version is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if base_qs.filter(pk=pk_val, version=version)._update(values) > 0:
+            return True
+        if base_qs.filter(pk=pk_val).exists():
+            raise ConflictoVersion(
+                f"La transacción {pk_val} cambió después de leerla (versión {version}); recargue y reintente."
             )
+        return False
+
+    def delete(self, *args, **kwargs):
+        """Elimina la transacción descontando su aporte de :class:`ExposicionCliente`."""
+        with transaction.atomic():
+            anteriores = aportes_guardados(self.pk)
+            resultado = super().delete(*args, **kwargs)
+            aplicar_exposicion(anteriores, {})
+        return resultado
+
     @property
     def comision_final(self):
         """
@@ -245,3 +331,82 @@ class Transaccion(models.Model):
             comision_cotizacion - comision_aplicada
         """
         return (self.comision_cotizacion or 0) - (self.comision_aplicada or 0)
+
+
+class ExposicionCliente(models.Model):
+    """
+    Acumulado en PYG de las transacciones de un cliente en un día o en un mes.
+
+    Hay una fila por ``(cliente, periodo, fecha)``: ``fecha`` es el día local de
+    creación para ``periodo='dia'`` y el primer día del mes para ``periodo='mes'``.
+    :meth:`Transaccion.save` y :meth:`Transaccion.delete` la mantienen; las
+    operaciones en bloque (``QuerySet.update``/``delete``) no pasan por ahí y deben
+    seguirse de ``manage.py reconstruir_exposicion``.
+    """
+
+    PERIODO_CHOICES = [
+        ('dia', 'Día'),
+        ('mes', 'Mes'),
+    ]
+
+    cliente = models.ForeignKey(
+        Cliente,
+        on_delete=models.CASCADE,
+        related_name='exposiciones',
+    )
+    periodo = models.CharField(max_length=3, choices=PERIODO_CHOICES)
+    fecha = models.DateField(help_text="Día (periodo 'dia') o primer día del mes (periodo 'mes').")
+    monto_pyg = models.DecimalField(max_digits=20, decimal_places=4, default=0)
+
+    class Meta:
+        verbose_name = "Exposición de cliente"
+        verbose_name_plural = "Exposiciones de clientes"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cliente', 'periodo', 'fecha'],
+                name='uniq_exposicion_cliente_periodo_fecha',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.cliente} [{self.periodo} {self.fecha}]: {self.monto_pyg} PYG"
+
+
+class EventoTransaccion(models.Model):
+    """
+    Efecto secundario pendiente de una transacción, para un manejador.
+
+    :func:`transacciones.outbox.registrar_eventos` crea las filas en la misma
+    transacción de base de datos que el cambio de estado, y
+    :func:`transacciones.outbox.despachar_eventos` las procesa en lotes desde
+    Celery. ``procesado_en`` nulo indica un evento pendiente.
+    """
+
+    transaccion = models.ForeignKey(
+        Transaccion,
+        on_delete=models.CASCADE,
+        related_name='eventos',
+    )
+    manejador = models.CharField(max_length=30, help_text="Clave en transacciones.outbox.MANEJADORES.")
+    estado_anterior = models.CharField(max_length=30, blank=True, help_text="Vacío si la transacción se creó.")
+    estado = models.CharField(max_length=30)
+    creado_en = models.DateTimeField(default=now)
+    disponible_desde = models.DateTimeField(default=now, help_text="Se posterga tras cada fallo.")
+    procesado_en = models.DateTimeField(null=True, blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Evento de transacción"
+        verbose_name_plural = "Eventos de transacciones"
+        indexes = [
+            models.Index(
+                fields=['manejador', 'disponible_desde'],
+                name='idx_evento_tx_pendiente',
+                condition=models.Q(procesado_en__isnull=True),
+            ),
+            models.Index(fields=['procesado_en'], name='idx_evento_tx_procesado'),
+        ]
+
+    def __str__(self):
+        return f"{self.manejador}: {self.transaccion_id} {self.estado_anterior or '-'} -> {self.estado}"
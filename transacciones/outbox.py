@@ -0,0 +1,257 @@
+# transacciones/outbox.py
+"""
+Bandeja de salida de transacciones
+==================================
+
+.. module:: transacciones.outbox
+   :synopsis: Efectos secundarios de los cambios de estado, registrados en la misma transacción y despachados por lotes.
+
+Antes, guardar una :class:`~transacciones.models.Transaccion` ejecutaba en línea
+el registro de ganancias (``post_save``) y los webhooks de pago disparaban la
+facturación electrónica: la latencia del request incluía todo ese trabajo y sus
+fallos llegaban al usuario.
+
+Ahora cada escritura llama a :func:`registrar_eventos`, que inserta una fila de
+:class:`~transacciones.models.EventoTransaccion` por cada manejador interesado
+**dentro de la misma transacción de base de datos** que el cambio de estado: si
+el cambio se revierte, el evento también. Lo usan
+:meth:`Transaccion.save`, :func:`transacciones.estados.transicionar` y el
+barrido de :mod:`transacciones.expiracion`.
+
+:func:`despachar_eventos` (tarea ``transacciones.tasks.despachar_eventos_task``)
+toma los pendientes de cada manejador por lotes con
+``SELECT ... FOR UPDATE SKIP LOCKED`` (varios workers no se pisan), ejecuta cada
+evento en su propio savepoint y lo marca procesado en la misma transacción. Un
+evento que falla se reintenta con espera exponencial hasta ``MAX_INTENTOS``.
+Los manejadores deben ser idempotentes: un evento puede procesarse de nuevo si
+el worker cae después de ejecutarlo y antes de confirmar.
+
+Manejadores (:data:`MANEJADORES`):
+
+- ``ganancias``: :func:`ganancias.eventos.registrar_ganancia`.
+- ``facturacion``: :func:`facturacion_electronica.eventos.emitir_factura`.
+- ``notificaciones``: :func:`notificaciones.eventos.notificar_estado`.
+
+Configuración (``settings.OUTBOX``): ``LOTE``, ``INTERVALO_SEGUNDOS`` (período
+de la tarea en ``CELERY_BEAT_SCHEDULE``), ``MAX_INTENTOS``,
+``ESPERA_SEGUNDOS`` (primera espera tras un fallo, se duplica en cada intento) y
+``DIAS_RETENCION`` (antigüedad de los eventos procesados que borra
+:func:`purgar_eventos`).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CONFIG_POR_DEFECTO = {
+    "LOTE": 200,
+    "INTERVALO_SEGUNDOS": 10,
+    "MAX_INTENTOS": 8,
+    "ESPERA_SEGUNDOS": 30,
+    "DIAS_RETENCION": 30,
+}
+
+# Espera máxima entre reintentos de un evento fallido.
+ESPERA_MAXIMA = timedelta(hours=6)
+
+ESTADOS_NOTIFICADOS = frozenset({
+    "pendiente_retiro_tauser", "completada", "cancelada", "cancelada_usuario_tasa",
+    "cancelada_tasa_expirada", "anulada", "error",
+})
+
+
+def _registra_ganancia(anterior, estado):
+    # Se recalcula en cada escritura de una transacción completada (update_or_create).
+    return estado == "completada"
+
+
+def _emite_factura(anterior, estado):
+    if anterior == estado:
+        return False
+    return estado == "procesando_acreditacion" or (
+        anterior == "pendiente_pago_cliente" and estado == "pendiente_retiro_tauser"
+    )
+
+
+def _notifica(anterior, estado):
+    return anterior is not None and anterior != estado and estado in ESTADOS_NOTIFICADOS
+
+
+# nombre -> (ruta del manejador, condición sobre (estado_anterior, estado)).
+# El manejador recibe el EventoTransaccion; se importa recién al despachar.
+MANEJADORES = {
+    "ganancias": ("ganancias.eventos.registrar_ganancia", _registra_ganancia),
+    "facturacion": ("facturacion_electronica.eventos.emitir_factura", _emite_factura),
+    "notificaciones": ("notificaciones.eventos.notificar_estado", _notifica),
+}
+
+
+def configuracion():
+    """``settings.OUTBOX`` completado con :data:`CONFIG_POR_DEFECTO`."""
+    return {**CONFIG_POR_DEFECTO, **getattr(settings, "OUTBOX", {})}
+
+
+def registrar_eventos(cambios) -> int:
+    """
+    Inserta los eventos que corresponden a ``cambios`` con un único ``INSERT``.
+
+    Debe llamarse dentro de la transacción que escribe el cambio.
+
+    :param cambios: Iterable de ``(transaccion_id, estado_anterior, estado)``;
+        ``estado_anterior`` es ``None`` para una transacción recién creada.
+    :returns: Cantidad de eventos registrados.
+    """
+    from .models import EventoTransaccion
+
+    ahora = timezone.now()
+    eventos = [
+        EventoTransaccion(
+            transaccion_id=transaccion_id,
+            manejador=nombre,
+            estado_anterior=anterior or "",
+            estado=estado,
+            creado_en=ahora,
+            disponible_desde=ahora,
+        )
+        for transaccion_id, anterior, estado in cambios
+        for nombre, (_, condicion) in MANEJADORES.items()
+        if condicion(anterior, estado)
+    ]
+    if eventos:
+        EventoTransaccion.objects.bulk_create(eventos)
+    return len(eventos)
+
+
+def _espera(intentos, base) -> timedelta:
+    return min(timedelta(seconds=base * 2 ** (intentos - 1)), ESPERA_MAXIMA)
+
+
+def _despachar_lote(nombre, manejador, ahora, config):
+    """Procesa hasta ``LOTE`` eventos pendientes de ``nombre``; devuelve ``(procesados, fallidos)``."""
+    from .models import EventoTransaccion
+
+    with transaction.atomic():
+        eventos = list(
+            EventoTransaccion.objects
+            .filter(
+                manejador=nombre,
+                procesado_en__isnull=True,
+                disponible_desde__lte=ahora,
+                intentos__lt=config["MAX_INTENTOS"],
+            )
+            .select_for_update(skip_locked=True)
+            .order_by("disponible_desde", "pk")[:config["LOTE"]]
+        )
+        procesados, fallidos = [], []
+        for evento in eventos:
+            try:
+                with transaction.atomic():
+                    manejador(evento)
+            except Exception as exc:
+                evento.intentos += 1
+                evento.ultimo_error = f"{type(exc).__name__}: {exc}"
+                evento.disponible_desde = timezone.now() + _espera(evento.intentos, config["ESPERA_SEGUNDOS"])
+                fallidos.append(evento)
+                logger.exception("Evento %s (%s) de la transacción %s falló (intento %s).",
+                                 evento.pk, nombre, evento.transaccion_id, evento.intentos)
+            else:
+                evento.procesado_en = timezone.now()
+                procesados.append(evento)
+        if eventos:
+            EventoTransaccion.objects.bulk_update(
+                eventos, ["procesado_en", "intentos", "ultimo_error", "disponible_desde"],
+            )
+    return procesados, fallidos
+
+
+def despachar_eventos(manejador=None) -> dict:
+    """
+    Procesa los eventos pendientes, por lotes y por manejador.
+
+    Los eventos que fallan quedan postergados, así que no se vuelven a tomar en
+    la misma corrida.
+
+    :param manejador: Nombre en :data:`MANEJADORES`; por defecto, todos.
+    :returns: ``{manejador: {"procesados", "fallidos", "demora_max", "demora_promedio"}}``,
+        con la demora (segundos entre el registro y el procesamiento) de los
+        eventos procesados en esta corrida.
+    """
+    config = configuracion()
+    ahora = timezone.now()
+    nombres = [manejador] if manejador else list(MANEJADORES)
+    resumen = {}
+    for nombre in nombres:
+        funcion = import_string(MANEJADORES[nombre][0])
+        procesados, fallidos = 0, 0
+        demoras = []
+        while True:
+            ok, error = _despachar_lote(nombre, funcion, ahora, config)
+            procesados += len(ok)
+            fallidos += len(error)
+            demoras.extend((e.procesado_en - e.creado_en).total_seconds() for e in ok)
+            if len(ok) + len(error) < config["LOTE"]:
+                break
+        resumen[nombre] = {
+            "procesados": procesados,
+            "fallidos": fallidos,
+            "demora_max": max(demoras, default=0.0),
+            "demora_promedio": sum(demoras) / len(demoras) if demoras else 0.0,
+        }
+        if procesados or fallidos:
+            logger.info("Outbox %s: %s procesados, %s fallidos, demora máx. %.1f s (prom. %.1f s)",
+                        nombre, procesados, fallidos,
+                        resumen[nombre]["demora_max"], resumen[nombre]["demora_promedio"])
+    return resumen
+
+
+def metricas_outbox() -> dict:
+    """
+    Estado de la bandeja por manejador, con una sola consulta agrupada.
+
+    :returns: ``{manejador: {"pendientes", "agotados", "demora"}}``; ``agotados``
+        son los que alcanzaron ``MAX_INTENTOS`` (requieren revisión manual) y
+        ``demora`` son los segundos desde el pendiente más antiguo.
+    """
+    from .models import EventoTransaccion
+
+    config = configuracion()
+    ahora = timezone.now()
+    filas = (
+        EventoTransaccion.objects
+        .filter(procesado_en__isnull=True)
+        .values("manejador")
+        .annotate(
+            pendientes=Count("pk"),
+            agotados=Count("pk", filter=Q(intentos__gte=config["MAX_INTENTOS"])),
+            mas_antiguo=Min("creado_en"),
+        )
+        .order_by()
+    )
+    metricas = {nombre: {"pendientes": 0, "agotados": 0, "demora": 0.0} for nombre in MANEJADORES}
+    for fila in filas:
+        metricas[fila["manejador"]] = {
+            "pendientes": fila["pendientes"],
+            "agotados": fila["agotados"],
+            "demora": (ahora - fila["mas_antiguo"]).total_seconds(),
+        }
+    return metricas
+
+
+def purgar_eventos(dias=None) -> int:
+    """
+    Borra los eventos procesados hace más de ``dias`` (``DIAS_RETENCION`` por defecto).
+
+    :returns: Cantidad de eventos borrados.
+    """
+    from .models import EventoTransaccion
+
+    dias = configuracion()["DIAS_RETENCION"] if dias is None else dias
+    limite = timezone.now() - timedelta(days=dias)
+    borrados, _ = EventoTransaccion.objects.filter(procesado_en__lt=limite).delete()
+    return borrados
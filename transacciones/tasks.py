@@ -0,0 +1,41 @@
+# transacciones/tasks.py
+from celery import shared_task
+
+from .expiracion import expirar_tasas_vencidas
+from .outbox import despachar_eventos, purgar_eventos
+
+
+@shared_task
+def expirar_tasas_vencidas_task():
+    """
+    Tarea periódica (``CELERY_BEAT_SCHEDULE``) que cancela las transacciones
+    con tasa bloqueada vencida (ver :func:`transacciones.expiracion.expirar_tasas_vencidas`).
+
+    :return: Cantidad de transacciones canceladas.
+    :rtype: int
+    """
+    return expirar_tasas_vencidas()
+
+
+@shared_task
+def despachar_eventos_task():
+    """
+    Tarea periódica (``CELERY_BEAT_SCHEDULE``) que procesa la bandeja de salida
+    de transacciones (ver :func:`transacciones.outbox.despachar_eventos`).
+
+    :return: Resumen por manejador (procesados, fallidos y demora).
+    :rtype: dict
+    """
+    return despachar_eventos()
+
+
+@shared_task
+def purgar_eventos_task():
+    """
+    Tarea diaria que borra los eventos ya procesados más antiguos que
+    ``settings.OUTBOX["DIAS_RETENCION"]``.
+
+    :return: Cantidad de eventos borrados.
+    :rtype: int
+    """
+    return purgar_eventos()
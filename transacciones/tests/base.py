@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from clientes.models import Cliente
+from monedas.models import Moneda
+from transacciones.models import ExposicionCliente, Transaccion
+
+User = get_user_model()
+
+
+class TransaccionTestBase(TestCase):
+    """Fixtures comunes de las pruebas de ``transacciones``.
+
+    Crea un operador, un cliente minorista y el par PYG/USD; cada subclase
+    ajusta ``email`` y ``nombre_cliente`` para distinguir sus datos.
+    """
+
+    email = "transacciones@test.com"
+    nombre_cliente = "Cliente Transacciones"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email=cls.email, password="pass123")
+        cls.cliente = Cliente.objects.create(nombre=cls.nombre_cliente, categoria=Cliente.Categoria.MINORISTA)
+        cls.pyg = Moneda.objects.create(nombre="Guaraní", codigo="PYG", decimales=0)
+        cls.usd = Moneda.objects.create(nombre="Dólar", codigo="USD")
+
+    def _crear_transaccion(self, **kwargs):
+        """Crea una venta de USD pendiente de pago; ``kwargs`` pisa cualquier campo."""
+        datos = dict(
+            cliente=self.cliente,
+            usuario_operador=self.user,
+            tipo_operacion="venta",
+            estado="pendiente_pago_cliente",
+            moneda_origen=self.pyg,
+            monto_origen=Decimal("300000"),
+            moneda_destino=self.usd,
+            monto_destino=Decimal("40"),
+            tasa_cambio_aplicada=Decimal("7500"),
+            comision_aplicada=Decimal("0"),
+        )
+        datos.update(kwargs)
+        return Transaccion.objects.create(**datos)
+
+    def _exposicion_dia(self):
+        return ExposicionCliente.objects.get(cliente=self.cliente, periodo="dia").monto_pyg
@@ -0,0 +1,67 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.db import IntegrityError
+
+from transacciones.codigos import (
+    ALFABETO,
+    LARGO_CODIGO,
+    digito_verificador,
+    generar_codigo,
+    normalizar_codigo,
+    verificador_valido,
+)
+from transacciones.models import Transaccion
+from transacciones.tests.base import TransaccionTestBase
+
+
+class CodigosTauserTest(TransaccionTestBase):
+    """Pruebas de :mod:`transacciones.codigos`."""
+
+    email = "codigos@test.com"
+    nombre_cliente = "Cliente Códigos"
+
+    def test_formato_y_digito_verificador(self):
+        codigo = generar_codigo()
+        self.assertEqual(len(codigo), LARGO_CODIGO)
+        self.assertTrue(set(codigo) <= set(ALFABETO))
+        self.assertTrue(verificador_valido(codigo))
+
+        # Cualquier carácter cambiado o dos vecinos distintos transpuestos se detectan.
+        cuerpo = "7K2M9QX4T"
+        codigo = cuerpo + digito_verificador(cuerpo)
+        self.assertFalse(verificador_valido("8" + codigo[1:]))
+        self.assertFalse(verificador_valido(codigo[1] + codigo[0] + codigo[2:]))
+        self.assertFalse(verificador_valido("1b4e28ba-2"))
+
+    def test_normalizar(self):
+        self.assertEqual(normalizar_codigo("  ab12 cd-3 "), "AB12CD-3")
+        self.assertEqual(normalizar_codigo(None), "")
+
+    def test_save_emite_codigo_y_normaliza_el_recibido(self):
+        emitida = self._crear_transaccion()
+        self.assertTrue(verificador_valido(emitida.codigo_operacion_tauser))
+
+        manual = self._crear_transaccion(codigo_operacion_tauser=" 1b4e28ba-2 ")
+        manual.refresh_from_db()
+        self.assertEqual(manual.codigo_operacion_tauser, "1B4E28BA-2")
+
+    def test_reintenta_ante_un_codigo_repetido(self):
+        existente = self._crear_transaccion()
+        nuevo = "7K2M9QX4T" + digito_verificador("7K2M9QX4T")
+        with mock.patch(
+            "transacciones.codigos.generar_codigo",
+            side_effect=[existente.codigo_operacion_tauser, nuevo],
+        ):
+            tx = self._crear_transaccion()
+
+        self.assertEqual(tx.codigo_operacion_tauser, nuevo)
+        # El intento fallido se deshizo en su savepoint: la exposición cuenta una sola vez más.
+        self.assertEqual(self._exposicion_dia(), Decimal("600000"))
+
+    def test_agota_los_intentos(self):
+        existente = self._crear_transaccion()
+        with mock.patch("transacciones.codigos.generar_codigo", return_value=existente.codigo_operacion_tauser):
+            with self.assertRaises(IntegrityError):
+                self._crear_transaccion()
+        self.assertEqual(Transaccion.objects.count(), 1)
@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+
+from ganancias.models import RegistroGanancia
+from transacciones.estados import CONFLICTO, NO_PERMITIDA, transicionar
+from transacciones.models import ConflictoVersion, Transaccion
+from transacciones.outbox import despachar_eventos
+from transacciones.signals import transicion_estado
+from transacciones.tests.base import TransaccionTestBase
+
+
+class TransicionarTest(TransaccionTestBase):
+    """Pruebas de :mod:`transacciones.estados`."""
+
+    email = "estados@test.com"
+    nombre_cliente = "Cliente Estados"
+
+    def setUp(self):
+        self.tx = self._crear_transaccion(
+            monto_origen=Decimal("75000"),
+            monto_destino=Decimal("10"),
+            comision_cotizacion=Decimal("50"),
+        )
+
+    def test_aplica_y_emite_post_save(self):
+        intentos = []
+
+        def receptor(sender, transaccion, resultado, **kwargs):
+            intentos.append(resultado)
+
+        transicion_estado.connect(receptor, dispatch_uid="test_transicion_estado")
+        self.addCleanup(transicion_estado.disconnect, dispatch_uid="test_transicion_estado")
+
+        self.assertTrue(transicionar(self.tx, "pendiente_retiro_tauser", desde={"pendiente_pago_cliente"}))
+        resultado = transicionar(self.tx, "completada")
+
+        self.assertTrue(resultado.aplicada)
+        self.assertEqual((resultado.origen, resultado.estado, resultado.version), ("pendiente_retiro_tauser", "completada", 2))
+        self.tx.refresh_from_db()
+        self.assertEqual((self.tx.estado, self.tx.version), ("completada", 2))
+        # La ganancia se registra al despachar la bandeja de salida.
+        despachar_eventos()
+        self.assertEqual(RegistroGanancia.objects.get(transaccion=self.tx).ganancia_registrada, Decimal("500"))
+        self.assertEqual([r.destino for r in intentos], ["pendiente_retiro_tauser", "completada"])
+        self.assertTrue(all(r.duracion >= 0 for r in intentos))
+
+    def test_conflicto_con_una_escritura_concurrente(self):
+        webhook = Transaccion.objects.get(pk=self.tx.pk)
+        kiosco = Transaccion.objects.get(pk=self.tx.pk)
+
+        self.assertTrue(transicionar(webhook, "cancelada"))
+        resultado = transicionar(kiosco, "completada")
+
+        self.assertFalse(resultado)
+        self.assertEqual(resultado.motivo, CONFLICTO)
+        # La instancia perdedora queda con el estado actual.
+        self.assertEqual((kiosco.estado, kiosco.version), ("cancelada", 1))
+        self.assertEqual(Transaccion.objects.get(pk=self.tx.pk).estado, "cancelada")
+
+    def test_save_invalida_instancias_leidas_antes(self):
+        vieja = Transaccion.objects.get(pk=self.tx.pk)
+        self.tx.comision_aplicada = Decimal("1")
+        self.tx.save(update_fields=["comision_aplicada"])
+
+        self.assertEqual(transicionar(vieja, "cancelada").motivo, CONFLICTO)
+
+    def test_save_de_instancia_vieja_no_pisa_la_transicion(self):
+        vieja = Transaccion.objects.get(pk=self.tx.pk)
+        self.assertTrue(transicionar(self.tx, "cancelada"))
+
+        vieja.comision_aplicada = Decimal("1")
+        with self.assertRaises(ConflictoVersion):
+            vieja.save()
+        self.assertEqual(vieja.version, 0)
+        guardada = Transaccion.objects.get(pk=self.tx.pk)
+        self.assertEqual((guardada.estado, guardada.version, guardada.comision_aplicada), ("cancelada", 1, Decimal("0")))
+        self.assertEqual(self._exposicion_dia(), Decimal("0"))
+
+    def test_no_permitida_no_consulta_la_base(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(transicionar(self.tx, "anulada").motivo, NO_PERMITIDA)
+            self.assertEqual(
+                transicionar(self.tx, "cancelada", desde={"pendiente_confirmacion_pago"}).motivo, NO_PERMITIDA,
+            )
+        self.assertEqual(self.tx.estado, "pendiente_pago_cliente")
+
+    def test_mueve_la_exposicion_del_cliente(self):
+        self.assertEqual(self._exposicion_dia(), Decimal("75000"))
+
+        transicionar(self.tx, "procesando_acreditacion", campos={"monto_origen": Decimal("80000")})
+        self.assertEqual(self._exposicion_dia(), Decimal("80000"))
+
+        transicionar(self.tx, "anulada")
+        self.assertEqual(self._exposicion_dia(), Decimal("0"))
@@ -0,0 +1,69 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from reportes.models import TrabajoReporte
+from transacciones.expiracion import expirar_tasas_vencidas
+from transacciones.models import Transaccion
+from transacciones.signals import tasas_expiradas
+from transacciones.tests.base import TransaccionTestBase
+
+
+class ExpirarTasasVencidasTest(TransaccionTestBase):
+    """Pruebas de :mod:`transacciones.expiracion`."""
+
+    email = "expiracion@test.com"
+    nombre_cliente = "Cliente Expiración"
+
+    def _crear(self, estado, hasta, modalidad="bloqueada"):
+        return self._crear_transaccion(
+            estado=estado,
+            monto_origen=Decimal("100000"),
+            monto_destino=Decimal("13"),
+            modalidad_tasa=modalidad,
+            tasa_garantizada_hasta=hasta,
+        )
+
+    def test_cancela_solo_las_vencidas_por_lotes_y_emite_un_evento(self):
+        ahora = timezone.now()
+        vencidas = [
+            self._crear("pendiente_pago_cliente", ahora - timedelta(minutes=1)),
+            self._crear("pendiente_deposito_tauser", ahora - timedelta(hours=3)),
+            self._crear("pendiente_pago_cliente", ahora - timedelta(seconds=5)),
+        ]
+        vigente = self._crear("pendiente_pago_cliente", ahora + timedelta(minutes=10))
+        flotante = self._crear("pendiente_pago_cliente", ahora - timedelta(minutes=1), modalidad="flotante")
+        completada = self._crear("completada", ahora - timedelta(minutes=1))
+        self.assertEqual(self._exposicion_dia(), Decimal("600000"))
+        trabajo = TrabajoReporte.objects.create(formato="csv", clave="x", solicitado_por=self.user)
+
+        eventos = []
+
+        def receptor(sender, ids, dias, **kwargs):
+            eventos.append((set(ids), dias))
+
+        tasas_expiradas.connect(receptor, dispatch_uid="test_tasas_expiradas")
+        self.addCleanup(tasas_expiradas.disconnect, dispatch_uid="test_tasas_expiradas")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expirar_tasas_vencidas(ahora=ahora, lote=2), 3)
+
+        self.assertEqual(
+            set(Transaccion.objects.filter(estado="cancelada_tasa_expirada").values_list("pk", flat=True)),
+            {tx.pk for tx in vencidas},
+        )
+        for tx in (vigente, flotante, completada):
+            estado_antes = tx.estado
+            tx.refresh_from_db()
+            self.assertEqual(tx.estado, estado_antes)
+
+        self.assertEqual(eventos, [({tx.pk for tx in vencidas}, [timezone.localdate()])])
+        self.assertEqual(self._exposicion_dia(), Decimal("300000"))
+        trabajo.refresh_from_db()
+        self.assertFalse(trabajo.vigente)
+
+        # Nada más para barrer: no hay evento.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expirar_tasas_vencidas(ahora=ahora), 0)
+        self.assertEqual(len(eventos), 1)
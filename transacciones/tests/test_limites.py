@@ -0,0 +1,110 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.utils import timezone
+
+from configuracion.models import TransactionLimit
+from core.utils import validar_limite_transaccion
+from transacciones.limites import exposicion_cliente, limite_restante, validar_monto
+from transacciones.models import ExposicionCliente, Transaccion
+from transacciones.tests.base import TransaccionTestBase
+
+
+class LimitesTransaccionTest(TransaccionTestBase):
+    """Pruebas del motor de límites en PYG (:mod:`transacciones.limites`)."""
+
+    email = "limites@test.com"
+    nombre_cliente = "Cliente Límites"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.limite = TransactionLimit.objects.create(
+            moneda=cls.pyg,
+            aplica_diario=True,
+            monto_diario=1000000,
+            aplica_mensual=True,
+            monto_mensual=5000000,
+        )
+
+    def _crear(self, codigo, **kwargs):
+        return self._crear_transaccion(codigo_operacion_tauser=codigo, **kwargs)
+
+    def test_exposicion_en_una_sola_consulta(self):
+        self._crear("LIM001")
+        # Compra de divisa: el tramo en PYG es el destino.
+        self._crear(
+            "LIM002",
+            tipo_operacion="compra",
+            moneda_origen=self.usd,
+            monto_origen=Decimal("20"),
+            moneda_destino=self.pyg,
+            monto_destino=Decimal("145000"),
+            tasa_cambio_aplicada=Decimal("7250"),
+        )
+        with self.assertNumQueries(1):
+            exposicion = exposicion_cliente(self.cliente)
+        self.assertEqual(exposicion["dia"], Decimal("445000"))
+        self.assertEqual(exposicion["mes"], Decimal("445000"))
+
+    def test_canceladas_no_consumen_limite(self):
+        self._crear("LIM003")
+        self._crear("LIM004", estado="cancelada")
+        self.assertEqual(exposicion_cliente(self.cliente)["dia"], Decimal("300000"))
+
+    def test_limite_restante(self):
+        self._crear("LIM005")
+        restante = limite_restante(self.cliente)
+        self.assertEqual(restante["dia"], Decimal("700000"))
+        self.assertEqual(restante["mes"], Decimal("4700000"))
+        self.assertEqual(restante["disponible"], Decimal("700000"))
+
+    def test_validar_monto_excluye_la_propia_transaccion(self):
+        tx = self._crear("LIM006", monto_origen=Decimal("900000"))
+        validar_monto(self.cliente, Decimal("900000"), excluir_id=tx.id)
+        with self.assertRaises(ValidationError):
+            validar_monto(self.cliente, Decimal("200000"))
+
+    def test_validar_limite_transaccion_sin_simular_el_historial(self):
+        for i in range(5):
+            self._crear(f"LIM1{i:02d}", monto_origen=Decimal("100000"))
+        # Límite (1) + agregado (1): el historial no se simula fila por fila.
+        with self.assertNumQueries(2):
+            ok, mensaje = validar_limite_transaccion(self.cliente, Decimal("600000"), "PYG", "USD")
+        self.assertFalse(ok)
+        self.assertIn("Disponible: 500000", mensaje)
+
+    def test_cambio_de_estado_y_borrado_actualizan_acumulados(self):
+        tx = self._crear("LIM201")
+        otra = self._crear("LIM202", monto_origen=Decimal("100000"))
+        self.assertEqual(exposicion_cliente(self.cliente)["dia"], Decimal("400000"))
+
+        tx.estado = "cancelada"
+        tx.save()
+        self.assertEqual(exposicion_cliente(self.cliente)["dia"], Decimal("100000"))
+
+        otra.delete()
+        exposicion = exposicion_cliente(self.cliente)
+        self.assertEqual(exposicion["dia"], Decimal("0"))
+        self.assertEqual(exposicion["mes"], Decimal("0"))
+        self.assertEqual(
+            ExposicionCliente.objects.filter(cliente=self.cliente).count(), 2
+        )
+
+    def test_reconstruir_exposicion_desde_historial(self):
+        tx = self._crear("LIM301")
+        self._crear("LIM302", monto_origen=Decimal("50000"))
+        # update() no pasa por save(): los acumulados quedan desfasados.
+        hace_dos_meses = timezone.now() - timedelta(days=62)
+        Transaccion.objects.filter(pk=tx.pk).update(fecha_creacion=hace_dos_meses)
+        self.assertEqual(exposicion_cliente(self.cliente)["dia"], Decimal("350000"))
+
+        call_command("reconstruir_exposicion", stdout=StringIO())
+
+        self.assertEqual(exposicion_cliente(self.cliente)["dia"], Decimal("50000"))
+        self.assertEqual(
+            exposicion_cliente(self.cliente, momento=hace_dos_meses)["mes"], Decimal("300000")
+        )
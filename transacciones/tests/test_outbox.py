@@ -0,0 +1,102 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import transaction
+from django.utils import timezone
+
+from ganancias.models import RegistroGanancia
+from notificaciones.models import Notificacion
+from transacciones.estados import transicionar
+from transacciones.models import EventoTransaccion
+from transacciones.outbox import despachar_eventos, metricas_outbox, purgar_eventos
+from transacciones.tests.base import TransaccionTestBase
+
+
+class OutboxTest(TransaccionTestBase):
+    """Pruebas de :mod:`transacciones.outbox`."""
+
+    email = "outbox@test.com"
+    nombre_cliente = "Cliente Outbox"
+
+    def setUp(self):
+        self.tx = self._crear_transaccion(
+            monto_origen=Decimal("75000"),
+            monto_destino=Decimal("10"),
+            comision_cotizacion=Decimal("50"),
+        )
+
+    def _manejadores(self):
+        return sorted(self.tx.eventos.values_list("manejador", flat=True))
+
+    def test_registra_eventos_con_el_cambio_de_estado(self):
+        self.assertEqual(self._manejadores(), [])
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            transicionar(self.tx, "completada")
+            raise RuntimeError("rollback")
+        self.assertEqual(self._manejadores(), [])
+
+        self.tx.refresh_from_db()
+        self.tx.estado = "pendiente_retiro_tauser"
+        self.tx.save()
+        evento = self.tx.eventos.get(manejador="facturacion")
+        self.assertEqual((evento.estado_anterior, evento.estado), ("pendiente_pago_cliente", "pendiente_retiro_tauser"))
+        self.assertEqual(self._manejadores(), ["facturacion", "notificaciones"])
+
+    def test_despacho_idempotente(self):
+        transicionar(self.tx, "completada")
+        self.assertFalse(RegistroGanancia.objects.filter(transaccion=self.tx).exists())
+
+        resumen = despachar_eventos()
+        self.assertEqual(resumen["ganancias"]["procesados"], 1)
+        self.assertEqual(resumen["notificaciones"]["procesados"], 1)
+        self.assertGreaterEqual(resumen["ganancias"]["demora_max"], 0)
+        self.assertEqual(RegistroGanancia.objects.get(transaccion=self.tx).ganancia_registrada, Decimal("500"))
+
+        # Volver a ejecutar un manejador (p. ej. tras una caída del worker) no duplica nada.
+        from notificaciones.eventos import notificar_estado
+        notificar_estado(self.tx.eventos.get(manejador="notificaciones"))
+        self.assertEqual(Notificacion.objects.filter(destinatario=self.user, tipo="transaccion").count(), 1)
+
+        self.assertEqual(despachar_eventos()["ganancias"]["procesados"], 0)
+        self.assertFalse(EventoTransaccion.objects.filter(procesado_en__isnull=True).exists())
+
+    def test_fallo_se_reintenta_con_espera(self):
+        transicionar(self.tx, "completada")
+
+        with mock.patch("ganancias.eventos.registrar_ganancia", side_effect=RuntimeError("sin conexión")):
+            resumen = despachar_eventos(manejador="ganancias")
+        self.assertEqual((resumen["ganancias"]["procesados"], resumen["ganancias"]["fallidos"]), (0, 1))
+        evento = self.tx.eventos.get(manejador="ganancias")
+        self.assertEqual(evento.intentos, 1)
+        self.assertIn("sin conexión", evento.ultimo_error)
+        self.assertGreater(evento.disponible_desde, timezone.now())
+        self.assertEqual(metricas_outbox()["ganancias"]["pendientes"], 1)
+
+        # Postergado: no se toma hasta que pase la espera.
+        self.assertEqual(despachar_eventos(manejador="ganancias")["ganancias"]["procesados"], 0)
+        EventoTransaccion.objects.filter(pk=evento.pk).update(disponible_desde=timezone.now())
+        self.assertEqual(despachar_eventos(manejador="ganancias")["ganancias"]["procesados"], 1)
+        self.assertTrue(RegistroGanancia.objects.filter(transaccion=self.tx).exists())
+        self.assertEqual(metricas_outbox()["ganancias"], {"pendientes": 0, "agotados": 0, "demora": 0.0})
+
+    def test_factura_se_encola_al_confirmar(self):
+        transicionar(self.tx, "procesando_acreditacion")
+
+        with mock.patch("facturacion_electronica.eventos.generar_factura_electronica_task") as tarea:
+            with self.captureOnCommitCallbacks(execute=True):
+                despachar_eventos(manejador="facturacion")
+        tarea.delay.assert_called_once_with(
+            emisor_id=None, transaccion_id=str(self.tx.id), json_de_completo=None, email_receptor=self.user.email,
+        )
+
+    def test_purga_solo_procesados_viejos(self):
+        transicionar(self.tx, "completada")
+        despachar_eventos(manejador="ganancias")
+        EventoTransaccion.objects.filter(manejador="ganancias").update(
+            procesado_en=timezone.now() - timedelta(days=31),
+        )
+
+        self.assertEqual(purgar_eventos(dias=30), 1)
+        self.assertEqual(self._manejadores(), ["notificaciones"])
@@ -13,6 +13,7 @@ from django.shortcuts import redirect
 from django.contrib import messages
 from decimal import Decimal, ROUND_HALF_UP # Necesario para manejar Decimal y redondeo
 
+from .estados import transicionar
 from .models import Transaccion
 from pagos.services import iniciar_cobro_a_cliente
 from usuarios.utils import get_cliente_activo, send_otp_email, validate_otp_code # Importar funciones OTP
@@ -32,9 +33,8 @@ from django.shortcuts import get_object_or_404
 def cancelar_por_tasa(request, transaccion_id):
     if request.method == 'POST' and request.user.is_authenticated:
         transaccion = get_object_or_404(Transaccion, id=transaccion_id)
-        transaccion.estado = 'cancelada_usuario_tasa'
-        transaccion.save()
-        return JsonResponse({'success': True})
+        resultado = transicionar(transaccion, 'cancelada_usuario_tasa')
+        return JsonResponse({'success': resultado.aplicada})
     return JsonResponse({'success': False})
 
 
@@ -91,8 +91,10 @@ class IniciarPagoTransaccionView(LoginRequiredMixin, View):
                     request.user.code_created_at = None
                     request.user.save(update_fields=['verification_code', 'code_created_at']) # Guardar cambios en el usuario
                     
-                    transaccion.estado = 'pendiente_pago_cliente' # Cambiar estado de la transacción a pendiente de pago
-                    transaccion.save(update_fields=['estado']) # Guardar solo el estado en la transacción
+                    # Cambiar estado de la transacción a pendiente de pago
+                    if not transicionar(transaccion, 'pendiente_pago_cliente', desde={'pendiente_confirmacion_pago'}):
+                        messages.error(request, "La operación cambió de estado. Revisa su detalle antes de continuar.")
+                        return redirect('core:detalle_transaccion', transaccion_id=transaccion.id)
                     #messages.success(request, "Código OTP verificado. Procediendo con el pago.")
                     return self._iniciar_cobro(request, transaccion)
                 else:
@@ -140,8 +142,7 @@ class IniciarPagoTransaccionView(LoginRequiredMixin, View):
             if url_pago:
                 return redirect(url_pago)
             else:
-                transaccion.estado = 'error'
-                transaccion.save(update_fields=['estado'])
+                transicionar(transaccion, 'error')
                 messages.error(request, "No se pudo iniciar el proceso de pago. Por favor, intente nuevamente más tarde.")
                 return redirect('core:detalle_transaccion', transaccion_id=transaccion.id)
         else:
@@ -11,8 +11,9 @@ adicionales para completar el flujo de operación en el TED:
 
 - ``POST /usuarios/ted/api/precontar/``
   Calcula una **combinación exacta de billetes** disponible en la **ubicación**
-  seleccionada para el **monto** de la transacción (modo *retiro*). Reserva
-  temporalmente esa combinación (TTL 120s) para evitar condiciones de carrera.
+  seleccionada para el **monto** de la transacción (modo *retiro*). Retiene
+  esa combinación en el inventario (:class:`~monedas.models.TedReserva`, TTL 120s)
+  para que otro kiosco no pueda precontar los mismos billetes.
 
 - ``POST /usuarios/ted/api/otp/enviar/`` y ``POST /usuarios/ted/api/otp/verificar/``
   Manejan un segundo factor (OTP) simple por correo del usuario autenticado.
@@ -44,8 +45,12 @@ from django.contrib.auth.decorators import login_required
 from django.db.models import BooleanField
 
 from usuarios.utils import get_cliente_activo
+from transacciones.codigos import normalizar_codigo, tiene_formato_emitido, verificador_valido
+from transacciones.estados import transicionar
 from transacciones.models import Transaccion
-from monedas.models import Moneda, TedDenominacion, TedInventario, TedMovimiento
+from monedas.models import Moneda, TedDenominacion, TedMovimiento
+from ted.dispensador import resolver_billetes
+from ted.stock import StockInsuficiente, aplicar_desglose, reservar_desglose, stock_disponible
 
 
 def _body_json(request: HttpRequest) -> Dict:
@@ -97,6 +102,16 @@ def _json_error(msg: str, status: int = 400, **extra) -> JsonResponse:
     return JsonResponse(payload, status=status)
 
 
+def _mensaje_codigo_no_encontrado(codigo: str) -> str:
+    """
+    Mensaje para un código sin transacción. Si tiene el formato de los códigos
+    emitidos pero el dígito verificador no coincide, casi seguro es un error de tipeo.
+    """
+    if tiene_formato_emitido(codigo) and not verificador_valido(codigo):
+        return "El código no es válido. Revise los caracteres ingresados."
+    return "No se encontró una transacción con ese código."
+
+
 def _active_client(request: HttpRequest):
     """
     Obtiene el cliente activo desde la sesión del usuario.
@@ -197,6 +212,24 @@ def _marcar_tauser_usado(tx: Transaccion) -> bool:
     return False
 
 
+MENSAJE_ESTADO_CAMBIADO = "La transacción cambió de estado durante la operación. Valide el código nuevamente."
+
+
+def _transicionar_confirmacion(tx: Transaccion, destino: str, modo: str) -> bool:
+    """
+    Aplica el estado final de :func:`confirmar` con
+    :func:`transacciones.estados.transicionar`, marcando el TAUSER en el mismo ``UPDATE``.
+
+    Devuelve ``False`` si la transacción cambió desde que se leyó (por ejemplo,
+    un webhook la canceló durante el preconteo).
+    """
+    campos = {}
+    if _marcar_tauser_usado(tx):
+        campos["tauser_utilizado"] = tx.tauser_utilizado
+    allowed = getattr(settings, "TED_ALLOWED_STATES", {}).get(modo) or None
+    return transicionar(tx, destino, desde=allowed, campos=campos).aplicada
+
+
 # ==========================================================================
 # Endpoint: VALIDAR
 # ==========================================================================
@@ -210,7 +243,7 @@ def validar_transaccion(request: HttpRequest) -> JsonResponse:
     - ``modo='retiro'``   → usa ``moneda_destino`` / ``monto_destino``.
     """
     payload = _body_json(request)
-    codigo = (payload.get("codigo") or "").strip()
+    codigo = normalizar_codigo(payload.get("codigo"))
     modo_hint = (payload.get("modo") or "").strip().lower()
 
     if not codigo:
@@ -219,11 +252,11 @@ def validar_transaccion(request: HttpRequest) -> JsonResponse:
     tx = (
         Transaccion.objects
         .select_related("cliente", "moneda_origen", "moneda_destino")
-        .filter(codigo_operacion_tauser__iexact=codigo)  # case-insensitive
+        .filter(codigo_operacion_tauser=codigo)  # guardado normalizado: usa el índice único
         .first()
     )
     if not tx:
-        return _json_error("No se encontró una transacción con ese código.", 404, code="E404-CODIGO")
+        return _json_error(_mensaje_codigo_no_encontrado(codigo), 404, code="E404-CODIGO")
 
     try:
         modo = _inferir_modo(tx, modo_hint)
@@ -286,7 +319,7 @@ def precontar(request: HttpRequest) -> JsonResponse:
     except Exception:
         return _json_error("JSON inválido.", 400)
 
-    codigo = (payload.get("codigo") or "").strip()  # sin upper(); buscamos con iexact
+    codigo = normalizar_codigo(payload.get("codigo"))
     modo_hint = (payload.get("modo") or "").strip().lower()
     ubicacion = (payload.get("ubicacion") or "").strip()
     if not codigo or not ubicacion:
@@ -299,13 +332,13 @@ def precontar(request: HttpRequest) -> JsonResponse:
         except PermissionError as e:
             return _json_error(str(e), 403)
 
-    # Búsqueda case-insensitive del código; si corresponde, filtramos por cliente activo
+    # Búsqueda exacta del código normalizado; si corresponde, filtramos por cliente activo
     try:
         qs = Transaccion.objects.select_related("moneda_origen", "moneda_destino", "cliente")
         if STRICT_CLIENT_OWNERSHIP and cliente:
-            tx = qs.get(codigo_operacion_tauser__iexact=codigo, cliente=cliente)
+            tx = qs.get(codigo_operacion_tauser=codigo, cliente=cliente)
         else:
-            tx = qs.get(codigo_operacion_tauser__iexact=codigo)
+            tx = qs.get(codigo_operacion_tauser=codigo)
     except Transaccion.DoesNotExist:
         return _json_error(
             "Código no encontrado" + (" para el cliente activo." if STRICT_CLIENT_OWNERSHIP else "."),
@@ -339,29 +372,26 @@ def precontar(request: HttpRequest) -> JsonResponse:
     breakdown: List[Tuple[int, int]] = []
     if modo == "retiro":
         objetivo = int(monto_redondeado)
-        inv_map: Dict[int, int] = {
-            inv.denominacion_id: inv.cantidad
-            for inv in TedInventario.objects.filter(ubicacion=ubicacion, denominacion__in=denoms)
-        }
+        # Disponible = existencia menos lo retenido por otros preconteos en curso.
+        inv_map: Dict[int, int] = stock_disponible(ubicacion, denoms)
         if not inv_map:
             return _json_error("No hay inventario configurado para esta ubicación.", 400)
 
-        restante = objetivo
-        for d in denoms:
-            if restante <= 0:
-                break
-            stock = inv_map.get(d.id, 0)
-            if d.valor <= 0 or stock <= 0:
-                continue
-            max_units = min(stock, restante // d.valor)
-            if max_units > 0:
-                breakdown.append((d.id, max_units))
-                restante -= max_units * d.valor
-
-        if restante != 0:
+        # Knapsack acotado: encuentra combinaciones exactas que el voraz no ve.
+        dispensacion = resolver_billetes(objetivo, [(d.valor, inv_map.get(d.id, 0)) for d in denoms])
+        if not dispensacion.exacto:
             return _json_error("No hay combinación exacta de billetes disponible en esta ubicación.", 409)
 
+        id_por_valor = {d.valor: d.id for d in denoms}
+        breakdown = [(id_por_valor[valor], unidades) for valor, unidades in dispensacion.billetes]
+
     reserva_id = secrets.token_urlsafe(12)
+    if breakdown:
+        # Retiene los billetes hasta confirmar; otro kiosco ya no puede precontarlos.
+        try:
+            reservar_desglose(reserva_id, ubicacion, breakdown, RESERVA_TTL_SECONDS)
+        except StockInsuficiente:
+            return _json_error("El stock cambió durante el preconteo. Intente nuevamente.", 409)
     reserva_data = {
         "tx_id": str(tx.id),
         "codigo": codigo,
@@ -474,7 +504,7 @@ def confirmar(request: HttpRequest) -> JsonResponse:
     - ``reserva_id``: ID devuelto por :func:`precontar`.
     - ``otp``: Código de verificación.
     - ``billetes`` *(solo depósito)*: lista ``[{valor, unidades}]`` (si no llega y
-      TED_DEPOSITO_AUTOSPLIT=True, se genera automáticamente con voraz).
+      TED_DEPOSITO_AUTOSPLIT=True, se genera automáticamente con :func:`ted.dispensador.resolver_billetes`).
 
     **Salida**
     ----------
@@ -513,53 +543,36 @@ def confirmar(request: HttpRequest) -> JsonResponse:
     monto_redondeado = Decimal(str(data["monto_redondeado"]))
 
     denoms = list(TedDenominacion.objects.filter(moneda=moneda, activa=True).order_by("-valor"))
-    id_map = {d.id: d for d in denoms}
     val_map = {d.valor: d for d in denoms}
 
     with db_transaction.atomic():
         if modo == "retiro":
-            rows = (
-                TedInventario.objects.select_for_update()
-                .filter(ubicacion=ubicacion, denominacion__in=denoms)
-            )
-            inv = {r.denominacion_id: r for r in rows}
-            for did, units in data["breakdown"]:
-                r = inv.get(did)
-                if not r or r.cantidad < units:
-                    return _json_error("Stock insuficiente al confirmar.", 409)
-
-            for did, units in data["breakdown"]:
-                r = inv[did]
-                r.cantidad -= int(units)
-                r.save(update_fields=["cantidad", "updated_at"])
-                TedMovimiento.objects.create(
-                    denominacion=id_map[did],
-                    delta=-int(units),
-                    motivo=TedMovimiento.MOTIVO_COMPRA,
-                    transaccion_ref=str(tx.codigo_operacion_tauser),
+            try:
+                aplicar_desglose(
+                    ubicacion,
+                    [(did, -int(units)) for did, units in data["breakdown"]],
+                    TedMovimiento.MOTIVO_COMPRA,
+                    referencia=str(tx.codigo_operacion_tauser),
+                    reserva_id=reserva_id,
                 )
+            except StockInsuficiente:
+                return _json_error("Stock insuficiente al confirmar.", 409)
 
-            tx.estado = "completada"
-            changed_tu = _marcar_tauser_usado(tx)
-            update_fields = ["estado", "fecha_actualizacion"]
-            if changed_tu:
-                update_fields.append("tauser_utilizado")
-            tx.save(update_fields=update_fields)
+            if not _transicionar_confirmacion(tx, "completada", modo):
+                db_transaction.set_rollback(True)
+                return _json_error(MENSAJE_ESTADO_CAMBIADO, 409, code="E409-ESTADO")
 
         else:  # deposito
-            # Si no llegó breakdown y está permitido, generamos uno vorazmente.
+            # Si no llegó breakdown y está permitido, generamos uno (sin tope de stock).
             if (not isinstance(billetes, list) or not billetes) and TED_DEPOSITO_AUTOSPLIT:
                 objetivo = int(monto_redondeado)
-                billetes = []
-                for valor in sorted(val_map.keys(), reverse=True):
-                    if objetivo <= 0:
-                        break
-                    k = objetivo // valor
-                    if k > 0:
-                        billetes.append({"valor": int(valor), "unidades": int(k)})
-                        objetivo -= valor * k
-                if objetivo != 0:
+                dispensacion = resolver_billetes(
+                    objetivo, [(valor, objetivo // valor) for valor in val_map if valor > 0]
+                )
+                if not dispensacion.exacto:
                     return _json_error("No se pudo generar breakdown automático para depósito.", 500)
+                billetes = [{"valor": int(valor), "unidades": int(unidades)}
+                            for valor, unidades in dispensacion.billetes]
 
             if not isinstance(billetes, list) or not billetes:
                 return _json_error("Debe enviar breakdown de billetes para depósito.", 400, code="E400-VALIDACION")
@@ -578,32 +591,16 @@ def confirmar(request: HttpRequest) -> JsonResponse:
             if total_calc != int(monto_redondeado):
                 return _json_error("El breakdown no coincide con el monto redondeado.", 400)
 
-            rows = (
-                TedInventario.objects.select_for_update()
-                .filter(ubicacion=ubicacion, denominacion__in=denoms)
+            aplicar_desglose(
+                ubicacion,
+                [(val_map[int(item["valor"])].id, int(item["unidades"])) for item in billetes],
+                TedMovimiento.MOTIVO_VENTA,
+                referencia=str(tx.codigo_operacion_tauser),
             )
-            inv_by_val = {r.denominacion.valor: r for r in rows}
-            for item in billetes:
-                valor = int(item["valor"])
-                unidades = int(item["unidades"])
-                r = inv_by_val.get(valor)
-                if not r:
-                    r = TedInventario.objects.create(denominacion=val_map[valor], ubicacion=ubicacion, cantidad=0)
-                r.cantidad += unidades
-                r.save(update_fields=["cantidad", "updated_at"])
-                TedMovimiento.objects.create(
-                    denominacion=val_map[valor],
-                    delta=unidades,
-                    motivo=TedMovimiento.MOTIVO_VENTA,
-                    transaccion_ref=str(tx.codigo_operacion_tauser),
-                )
 
-            tx.estado = "procesando_acreditacion"
-            changed_tu = _marcar_tauser_usado(tx)
-            update_fields = ["estado", "fecha_actualizacion"]
-            if changed_tu:
-                update_fields.append("tauser_utilizado")
-            tx.save(update_fields=update_fields)
+            if not _transicionar_confirmacion(tx, "procesando_acreditacion", modo):
+                db_transaction.set_rollback(True)
+                return _json_error(MENSAJE_ESTADO_CAMBIADO, 409, code="E409-ESTADO")
 
     ticket_url = reverse("usuarios:ted_ticket", kwargs={"codigo": tx.codigo_operacion_tauser})
     cache.delete_many([_cache_key_reserva(reserva_id), _cache_key_otp(reserva_id)])
@@ -621,7 +618,7 @@ def ticket_html(request: HttpRequest, codigo: str) -> HttpResponse:
     """
     try:
         tx = Transaccion.objects.select_related("moneda_origen", "moneda_destino").get(
-            codigo_operacion_tauser=codigo
+            codigo_operacion_tauser=normalizar_codigo(codigo)
         )
     except Transaccion.DoesNotExist:
         return HttpResponse("Transacción no encontrada.", status=404)
@@ -1,3 +1,43 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from CasaDeCambioIS2.cache import FileCacheConMetricas
+from usuarios.ted_api import _cache_key_reserva
+
+
+class CacheCompartidaTedTests(SimpleTestCase):
+    """
+    La caché de respaldo (sin Redis) debe compartir reservas TED entre procesos.
+    Cada instancia del backend simula un worker distinto apuntando al mismo directorio.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        params = {"KEY_PREFIX": "test", "TIMEOUT": 60}
+        self.worker_a = FileCacheConMetricas(self.tmp.name, params)
+        self.worker_b = FileCacheConMetricas(self.tmp.name, params)
+        self.worker_a.reiniciar_estadisticas()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reserva_creada_en_un_worker_visible_en_otro(self):
+        clave = _cache_key_reserva("abc123")
+        self.worker_a.set(clave, {"tx_id": "1", "breakdown": [[7, 2]]}, 120)
+        self.assertEqual(self.worker_b.get(clave), {"tx_id": "1", "breakdown": [[7, 2]]})
+
+    def test_contadores_de_aciertos_y_fallos(self):
+        self.worker_a.set("k", "v")
+        self.worker_a.get("k")
+        self.worker_b.get("inexistente")
+        self.assertEqual(self.worker_a.get("otra", "default"), "default")
+
+        stats = self.worker_a.estadisticas()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+
+    def test_valor_guardado_igual_al_default_cuenta_como_acierto(self):
+        self.worker_a.set("nulo", None)
+        self.assertIsNone(self.worker_a.get("nulo"))
+        self.assertEqual(self.worker_a.estadisticas()["hits"], 1)